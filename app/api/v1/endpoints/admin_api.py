@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Body
 from typing import List, Dict, Any
 from google.cloud import firestore
 from datetime import datetime
+from app.core.auth_cache import invalidate_user_profile
 
 router = APIRouter()
 
@@ -50,6 +51,7 @@ def update_user(user_id: str, data: Dict[str, Any] = Body(...)):
     if db:
         user_ref = db.collection('users').document(user_id)
         user_ref.update(data)
+        invalidate_user_profile(user_id)
         return {"detail": "Usuario actualizado"}
     return {"detail": "Usuario actualizado (mock)"}
 
@@ -6,6 +6,7 @@ from app.core.config import settings
 from app.services.auth_service import AuthService, validate_password
 from app.services.email import email_service
 from app.core.config.firebase import get_firebase_clients
+from app.core.auth_cache import invalidate_user_profile
 from app.schemas.auth import ForgotPasswordRequest, ResetPasswordRequest, TokenResponse, UserResponse
 from uuid import uuid4
 import firebase_admin
@@ -155,6 +156,7 @@ async def onboarding_preferences(data: PreferencesOnboarding, user=Depends(get_c
     user_id = user['uid']
     update_data = data.dict(exclude_unset=True)
     db.collection('users').document(user_id).update(update_data)
+    invalidate_user_profile(user_id)
     return {"message": "Preferencias guardadas correctamente"}
 
 @router.post("/onboarding/profile", summary="Onboarding: configuración inicial", tags=["onboarding"])
@@ -164,6 +166,7 @@ async def onboarding_profile(data: ProfileOnboarding, user=Depends(get_current_u
     user_id = user['uid']
     update_data = data.dict(exclude_unset=True)
     db.collection('users').document(user_id).update(update_data)
+    invalidate_user_profile(user_id)
     return {"message": "Perfil actualizado correctamente"}
 
 async def require_onboarding_completed(user=Depends(get_current_user)):
@@ -9,8 +9,15 @@ import logging
 from app.schemas.friends import (
     FriendshipRequest, Friendship, BlockedUser, BlockUserRequest, BlockedUserList
 )
-from app.services.firebase import get_firebase_client
+from app.services.firebase import (
+    get_firebase_client,
+    gather_reads,
+    get_documents_async,
+    query_collection_async
+)
 from app.services.notifications import notification_service
+from app.services import cascade_delete, counters, timeline
+from app.services.bulk_fetch import get_many
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
@@ -137,6 +144,8 @@ async def accept_friend_request(
             'created_at': datetime.now()
         }
         db.collection('friendships').document(friendship_id).set(friendship_data)
+        counters.increment_many(db, [request_data['sender_id'], current_user.id], 'friends')
+        timeline.on_friendship_created(db, [request_data['sender_id'], current_user.id])
         
         # Actualizar estado de la solicitud
         request_doc.reference.update({'status': 'accepted'})
@@ -234,35 +243,27 @@ async def get_friends_list(
     - Soporta paginación y búsqueda.
     """
     try:
-        db = get_firebase_client()
-        
-        # Obtener amistades donde el usuario es user1 o user2
-        friendships_ref = db.collection('friendships')
-        query1 = friendships_ref.where('user1_id', '==', current_user.id)
-        query2 = friendships_ref.where('user2_id', '==', current_user.id)
-        
-        # Ejecutar queries
-        results1 = query1.get()
-        results2 = query2.get()
+        # Obtener amistades donde el usuario es user1 o user2 (ambas consultas en paralelo)
+        results1, results2 = await gather_reads(
+            query_collection_async('friendships', [('user1_id', '==', current_user.id)], include_id=True),
+            query_collection_async('friendships', [('user2_id', '==', current_user.id)], include_id=True)
+        )
         
         # Combinar resultados
         friendships = []
-        for doc in results1:
-            data = doc.to_dict()
-            data['id'] = doc.id
+        for data in results1:
             data['friend_id'] = data['user2_id']
             friendships.append(data)
             
-        for doc in results2:
-            data = doc.to_dict()
-            data['id'] = doc.id
+        for data in results2:
             data['friend_id'] = data['user1_id']
             friendships.append(data)
             
         # Obtener información de los amigos
         friend_ids = [f['friend_id'] for f in friendships]
-        users_ref = db.collection('users')
-        users = {doc.id: doc.to_dict() for doc in users_ref.where('id', 'in', friend_ids).get()}
+        users = await get_documents_async('users', friend_ids)
+        for friend_id, friend_data in users.items():
+            friend_data.setdefault('id', friend_id)
         
         # Enriquecer datos de amistad con información del usuario
         enriched_friendships = []
@@ -335,8 +336,7 @@ async def get_pending_requests(
             
         # Obtener información de los remitentes
         sender_ids = [r['sender_id'] for r in requests]
-        users_ref = db.collection('users')
-        users = {doc.id: doc.to_dict() for doc in users_ref.where('id', 'in', sender_ids).get()}
+        users = get_many(db, 'users', sender_ids)
         
         # Enriquecer datos de solicitud con información del remitente
         enriched_requests = []
@@ -386,7 +386,7 @@ async def delete_friendship(
     Elimina una relación de amistad.
     - Elimina la amistad de la base de datos.
     - Notifica al otro usuario.
-    - Limpia datos relacionados.
+    - Limpia timelines, solicitudes y bloqueos entre ambos en segundo plano.
     """
     try:
         db = get_firebase_client()
@@ -417,6 +417,12 @@ async def delete_friendship(
         
         # Eliminar amistad
         friendship_doc.reference.delete()
+        counters.increment_many(db, [current_user.id, other_user_id], 'friends', -1)
+        # Solo se limpian las solicitudes y bloqueos anteriores a esta petición
+        deletion_id = cascade_delete.start_deletion(db, cascade_delete.FRIENDSHIP, friendship_id, {
+            "user_ids": [current_user.id, other_user_id],
+            "requested_at": datetime.now()
+        })
         
         # Notificar al otro usuario
         notification_service.create_notification(
@@ -426,29 +432,11 @@ async def delete_friendship(
             message=f"{current_user.name} ha eliminado la amistad contigo",
             data={"friendship_id": friendship_id}
         )
-        
-        # Limpiar datos relacionados
-        # 1. Eliminar solicitudes pendientes entre los usuarios
-        requests_ref = db.collection('friendship_requests')
-        requests = requests_ref.where('sender_id', 'in', [current_user.id, other_user_id]).where(
-            'receiver_id', 'in', [current_user.id, other_user_id]
-        ).get()
-        
-        for request in requests:
-            request.reference.delete()
-            
-        # 2. Eliminar bloqueos mutuos (opcional, depende de la lógica de negocio)
-        blocks_ref = db.collection('blocked_users')
-        blocks = blocks_ref.where('blocker_id', 'in', [current_user.id, other_user_id]).where(
-            'blocked_id', 'in', [current_user.id, other_user_id]
-        ).get()
-        
-        for block in blocks:
-            block.reference.delete()
             
         return {
             "message": "Amistad eliminada correctamente",
-            "friendship_id": friendship_id
+            "friendship_id": friendship_id,
+            "deletion_id": deletion_id
         }
         
     except HTTPException:
@@ -497,6 +485,8 @@ async def block_user(
         results = query.get()
         for doc in results:
             doc.reference.delete()
+            counters.increment_many(db, [current_user.id, user_id], 'friends', -1)
+            timeline.on_friendship_removed(db, current_user.id, user_id)
         
         # Eliminar solicitudes pendientes
         requests_ref = db.collection('friendship_requests')
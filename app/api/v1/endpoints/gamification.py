@@ -8,6 +8,9 @@ import uuid
 import logging
 from pydantic import BaseModel
 from app.services.notifications import notification_service
+from app.utils.pagination import paginate_query, InvalidCursorError
+from app.services import leaderboard
+from app.services.social_hydration import fetch_authors
 
 router = APIRouter()
 logging.basicConfig(level=logging.INFO)
@@ -177,8 +180,10 @@ async def unlock_achievement(
         db.collection("user_achievements").document(current_user.id).set({
             "user_id": current_user.id,
             "achievements": unlocked,
+            "achievement_count": len(unlocked),
             "updated_at": datetime.now()
         }, merge=True)
+        leaderboard.record_score("achievements", current_user.id, len(unlocked))
         
         # Otorgar puntos
         user_points = db.collection("user_points").document(current_user.id).get()
@@ -190,6 +195,7 @@ async def unlock_achievement(
             "points": new_points,
             "updated_at": datetime.now()
         }, merge=True)
+        leaderboard.record_score("points", current_user.id, new_points)
         
         # Registrar en historial
         history_id = str(uuid.uuid4())
@@ -389,6 +395,7 @@ async def claim_reward(
             "points": new_points,
             "updated_at": datetime.now()
         }, merge=True)
+        leaderboard.record_score("points", current_user.id, new_points)
         
         # Registrar en historial
         history_id = str(uuid.uuid4())
@@ -494,17 +501,22 @@ async def get_leaderboard(
     category: Optional[str] = Query(None, description="Categoría: points, achievements, matches"),
     time_frame: Optional[str] = Query("all", description="Período: week, month, all"),
     limit: int = Query(10, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto por la página anterior"),
     current_user: UserInDB = Depends(get_current_user)
 ):
     """
     Obtiene la tabla de líderes.
     - Múltiples categorías y períodos
+    - Paginación por cursor
     - Incluye ranking del usuario actual
+
+    El período completo se sirve desde la tabla materializada
+    (app.services.leaderboard); semana y mes filtran en Firestore.
     """
     try:
-        db = get_db()
-        
+        board = category if category in leaderboard.BOARDS else leaderboard.DEFAULT_BOARD
+        collection, order_field = leaderboard.BOARDS[board]
+
         # Determinar fecha límite según período
         if time_frame == "week":
             start_date = datetime.now() - timedelta(days=7)
@@ -512,68 +524,49 @@ async def get_leaderboard(
             start_date = datetime.now() - timedelta(days=30)
         else:
             start_date = None
-            
-        # Obtener rankings según categoría
-        if category == "points":
-            # Ranking por puntos totales
-            query = db.collection("user_points").order_by("points", direction=firestore.Query.DESCENDING)
-        elif category == "achievements":
-            # Ranking por logros desbloqueados
-            query = db.collection("user_achievements").order_by("achievement_count", direction=firestore.Query.DESCENDING)
-        elif category == "matches":
-            # Ranking por partidos ganados
-            query = db.collection("user_stats").order_by("matches_won", direction=firestore.Query.DESCENDING)
+
+        if start_date is None:
+            entries, next_cursor = leaderboard.get_page(board, limit, cursor)
         else:
-            # Ranking por puntos por defecto
-            query = db.collection("user_points").order_by("points", direction=firestore.Query.DESCENDING)
-            
-        # Aplicar filtro de fecha si es necesario
-        if start_date:
-            query = query.where("updated_at", ">=", start_date)
-            
-        # Obtener resultados
-        results = query.limit(limit).offset(offset).get()
-        
-        # Enriquecer datos
-        leaderboard = []
-        for doc in results:
-            data = doc.to_dict()
-            user_id = data["user_id"]
-            
-            # Obtener información del usuario
-            user_doc = db.collection("users").document(user_id).get()
-            user_data = user_doc.to_dict() if user_doc.exists else {}
+            db = get_db()
+            query = db.collection(collection).where("updated_at", ">=", start_date)
+            results, next_cursor = paginate_query(
+                query,
+                [(order_field, firestore.Query.DESCENDING)],
+                limit,
+                cursor
+            )
             
-            entry = {
-                "user_id": user_id,
-                "username": user_data.get("username"),
-                "name": user_data.get("name"),
-                "profile_picture": user_data.get("profile_picture"),
-                "points": data.get("points", 0),
-                "achievement_count": data.get("achievement_count", 0),
-                "matches_won": data.get("matches_won", 0)
-            }
-            leaderboard.append(entry)
+            # Enriquecer datos con los perfiles de la página en lote
+            users = fetch_authors(db, [doc.to_dict()["user_id"] for doc in results])
+            entries = []
+            for doc in results:
+                data = doc.to_dict()
+                user_id = data["user_id"]
+                user_data = users.get(user_id, {})
+                
+                entries.append({
+                    "user_id": user_id,
+                    "username": user_data.get("username"),
+                    "name": user_data.get("name"),
+                    "profile_picture": user_data.get("profile_picture"),
+                    order_field: data.get(order_field, 0)
+                })
             
-        # Obtener posición del usuario actual
-        user_position = None
-        if category == "points":
-            user_points = db.collection("user_points").document(current_user.id).get()
-            if user_points.exists:
-                points = user_points.to_dict().get("points", 0)
-                user_position = db.collection("user_points")\
-                    .where("points", ">", points)\
-                    .count()\
-                    .get()[0][0] + 1
+        # Posición del usuario actual en la tabla completa
+        user_position = leaderboard.get_rank(board, current_user.id)
                     
         return {
-            "leaderboard": leaderboard,
+            "leaderboard": entries,
             "user_position": user_position,
-            "total": len(leaderboard),
+            "total": len(entries),
             "limit": limit,
-            "offset": offset
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error al obtener tabla de líderes: {str(e)}")
         raise HTTPException(
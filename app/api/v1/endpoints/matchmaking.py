@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, status, Query, Body
 from firebase_admin import firestore
 from app.core.deps import get_current_user
+from app.core.auth_cache import invalidate_user_profile
 from app.schemas.user import UserInDB
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
@@ -9,6 +10,10 @@ import logging
 from app.services.notifications import notification_service
 from app.schemas.matchmaking import MatchRequest, MatchResponse, MatchStatus
 from app.services.firebase import get_firebase_client
+from app.services import counters, geo, matchmaking_index
+from app.services.bulk_fetch import get_many
+from app.services.push_dispatcher import send_push
+from app.services.ratings import get_reputation, record_ratings
 
 router = APIRouter()
 logging.basicConfig(level=logging.INFO)
@@ -21,40 +26,71 @@ def get_db():
         logger.error(f"Error inicializando Firestore: {str(e)}")
         raise HTTPException(status_code=500, detail="Error inicializando Firestore")
 
+# Radio por defecto (km) para buscar partidos abiertos cerca del usuario
+MATCH_SEARCH_RADIUS_KM = 20.0
+
 # Buscar partido
 @router.post("/find_match")
-async def find_match(level: Optional[str] = None, position: Optional[str] = None, current_user: UserInDB = Depends(get_current_user)):
+def find_match(
+    level: Optional[str] = None,
+    position: Optional[str] = None,
+    radius_km: float = Query(MATCH_SEARCH_RADIUS_KM, gt=0, le=20, description="Radio de búsqueda en km"),
+    current_user: UserInDB = Depends(get_current_user)
+):
     db = get_db()
-    # Simulación: crear una búsqueda de partido
+    # Registrar la búsqueda con sus cubos del índice
     search_id = str(uuid.uuid4())
+    keys = matchmaking_index.search_keys(
+        level or current_user.nivel,
+        current_user.availability,
+        current_user.clubs,
+        current_user.location,
+        radius_km
+    )
     search_data = {
         "search_id": search_id,
         "user_id": current_user.id,
         "level": level,
         "position": position,
         "status": "searching",
+        matchmaking_index.BUCKET_FIELD: keys,
         "created_at": firestore.SERVER_TIMESTAMP
     }
+    # Solo una búsqueda activa por usuario: la anterior queda reemplazada
+    previous_search = matchmaking_index.get_active(db, current_user.id).get("search_id")
+    if previous_search:
+        db.collection("match_searches").document(previous_search).update({"status": "replaced"})
     db.collection("match_searches").document(search_id).set(search_data)
-    # Buscar partidos compatibles (simulado)
-    matches = db.collection("matches").where("status", "==", "open").get()
-    available_matches = [m.to_dict() for m in matches]
+    matchmaking_index.set_active_search(db, current_user.id, search_id)
+
+    # Partidos abiertos de los mismos cubos; la distancia exacta se calcula si hay coordenadas
+    origin = geo.coords_of(current_user.location)
+    available_matches = []
+    for match in matchmaking_index.find_open_matches(db, keys):
+        match_data = match.to_dict()
+        coords = geo.coords_of(match_data.get("coordinates"))
+        if origin and coords:
+            distance = geo.haversine_km(origin, coords)
+            if distance > radius_km:
+                continue
+            match_data["distance_km"] = round(distance, 2)
+        available_matches.append(match_data)
+    available_matches.sort(key=lambda m: m.get("distance_km", float("inf")))
     return {"message": "Búsqueda iniciada", "search_id": search_id, "available_matches": available_matches}
 
 # Cancelar búsqueda
 @router.delete("/find_match")
-async def cancel_find_match(current_user: UserInDB = Depends(get_current_user)):
+def cancel_find_match(current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
-    # Buscar búsqueda activa
-    searches = db.collection("match_searches").where("user_id", "==", current_user.id).where("status", "==", "searching").get()
-    for s in searches:
-        db.collection("match_searches").document(s.id).update({"status": "cancelled"})
+    # El puntero del usuario indica su búsqueda activa y sus partidos abiertos
+    active = matchmaking_index.get_active(db, current_user.id)
+    if active.get("search_id"):
+        db.collection("match_searches").document(active["search_id"]).update({"status": "cancelled"})
+        matchmaking_index.set_active_search(db, current_user.id, None)
     # Notificar a los jugadores de partidos abiertos donde esté este usuario
-    matches = db.collection("matches").where("status", "==", "open").get()
-    for match in matches:
-        match_data = match.to_dict()
+    for match_id, match_data in get_many(db, "matches", active.get("match_ids", [])).items():
         players = match_data.get("players", [])
-        if current_user.id in players:
+        if match_data.get("status") == "open" and current_user.id in players:
             for player_id in players:
                 if player_id != current_user.id:
                     notif_id = str(uuid.uuid4())
@@ -63,25 +99,27 @@ async def cancel_find_match(current_user: UserInDB = Depends(get_current_user)):
                         "user_id": player_id,
                         "type": "match_cancelled",
                         "from_user_id": current_user.id,
-                        "match_id": match.id,
+                        "match_id": match_id,
                         "created_at": firestore.SERVER_TIMESTAMP,
                         "read": False
                     })
             # Opcional: remover al usuario del partido
             players = [pid for pid in players if pid != current_user.id]
-            db.collection("matches").document(match.id).update({"players": players})
+            db.collection("matches").document(match_id).update({"players": players})
+            matchmaking_index.remove_active_match(db, current_user.id, match_id)
+            counters.increment(db, current_user.id, "matches", -1)
     return {"message": "Búsqueda cancelada"}
 
 # Obtener partidos disponibles
 @router.get("/get_matches")
-async def get_matches(current_user: UserInDB = Depends(get_current_user)):
+def get_matches(current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
     matches = db.collection("matches").where("status", "==", "open").get()
     return [m.to_dict() for m in matches]
 
 # Aceptar partido
 @router.post("/accept/{match_id}")
-async def accept_match(match_id: str, current_user: UserInDB = Depends(get_current_user)):
+def accept_match(match_id: str, current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
     match = db.collection("matches").document(match_id).get()
     if not match.exists:
@@ -93,6 +131,8 @@ async def accept_match(match_id: str, current_user: UserInDB = Depends(get_curre
         raise HTTPException(status_code=400, detail="Ya estás en este partido")
     players.append(current_user.id)
     db.collection("matches").document(match_id).update({"players": players})
+    matchmaking_index.add_active_match(db, current_user.id, match_id)
+    counters.increment(db, current_user.id, "matches")
     # Notificar a los demás jugadores que un nuevo jugador se ha unido
     for player_id in players:
         if player_id != current_user.id:
@@ -123,7 +163,7 @@ async def accept_match(match_id: str, current_user: UserInDB = Depends(get_curre
 
 # Rechazar partido
 @router.post("/reject/{match_id}")
-async def reject_match(match_id: str, current_user: UserInDB = Depends(get_current_user)):
+def reject_match(match_id: str, current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
     match = db.collection("matches").document(match_id).get()
     if not match.exists:
@@ -149,23 +189,28 @@ async def reject_match(match_id: str, current_user: UserInDB = Depends(get_curre
 
 # Detalles de partido
 @router.get("/{match_id}")
-async def get_match_details(match_id: str, current_user: UserInDB = Depends(get_current_user)):
+def get_match_details(match_id: str, current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
     match = db.collection("matches").document(match_id).get()
     if not match.exists:
         raise HTTPException(status_code=404, detail="Partido no encontrado")
-    return match.to_dict()
+    match_data = match.to_dict()
+    # Reputación de los jugadores: un documento de agregados por jugador
+    match_data["reputation"] = get_reputation(db, match_data.get("players", []))
+    return match_data
 
 @router.get("/matches")
-async def get_matches_list():
+def get_matches_list():
     raise HTTPException(status_code=501, detail="Not Implemented")
 
 @router.post("/create_match", response_model=dict, summary="Crear partido", tags=["matchmaking"])
-async def create_match(
+def create_match(
     level: str = Query(..., description="Nivel de juego requerido"),
     position: str = Query(..., description="Posición preferida"),
     date: datetime = Query(..., description="Fecha y hora del partido"),
     location: str = Query(..., description="Ubicación del partido"),
+    latitude: Optional[float] = Query(None, ge=-90, le=90, description="Latitud de la pista"),
+    longitude: Optional[float] = Query(None, ge=-180, le=180, description="Longitud de la pista"),
     max_players: int = Query(4, ge=2, le=4, description="Número máximo de jugadores"),
     notes: Optional[str] = Query(None, description="Notas adicionales"),
     current_user: UserInDB = Depends(get_current_user)
@@ -213,21 +258,31 @@ async def create_match(
             "created_at": datetime.now(),
             "updated_at": datetime.now()
         }
+        if latitude is not None and longitude is not None:
+            # Coordenadas y geohash para que find_match lo encuentre por cercanía
+            match_data["coordinates"] = {"latitude": latitude, "longitude": longitude}
+            match_data.update(geo.geo_fields(match_data["coordinates"]))
+        match_keys = matchmaking_index.match_keys(match_data)
+        match_data[matchmaking_index.BUCKET_FIELD] = match_keys
         
         db.collection("matches").document(match_id).set(match_data)
+        matchmaking_index.add_active_match(db, current_user.id, match_id)
+        counters.increment(db, current_user.id, "matches")
         
-        # Buscar jugadores compatibles
-        compatible_players = db.collection("users")\
-            .where("level", "==", level)\
-            .where("preferred_position", "==", position)\
-            .get()
+        # Buscar jugadores compatibles: búsquedas activas en los cubos del partido
+        compatible_searches = matchmaking_index.find_searches(db, match_keys)
+        notified = set()
             
         # Notificar a jugadores compatibles
-        for player in compatible_players:
-            player_data = player.to_dict()
-            if player.id != current_user.id:
+        for search in compatible_searches:
+            search_data = search.to_dict()
+            player_id = search_data.get("user_id")
+            if search_data.get("position") not in (None, position):
+                continue
+            if player_id and player_id != current_user.id and player_id not in notified:
+                notified.add(player_id)
                 notification_service.create_notification(
-                    user_id=player.id,
+                    user_id=player_id,
                     type="new_match",
                     title="Nuevo partido disponible",
                     message=f"Se ha creado un nuevo partido que coincide con tus preferencias",
@@ -239,6 +294,12 @@ async def create_match(
                         "location": location
                     }
                 )
+        send_push(
+            notified,
+            title="Nuevo partido disponible",
+            body="Se ha creado un nuevo partido que coincide con tus preferencias",
+            data={"type": "new_match", "match_id": match_id}
+        )
                 
         return {
             "message": "Partido creado exitosamente",
@@ -256,7 +317,7 @@ async def create_match(
         )
 
 @router.post("/matches/{match_id}/message", response_model=dict, summary="Enviar mensaje en partido", tags=["matchmaking"])
-async def send_match_message(
+def send_match_message(
     match_id: str,
     message: str = Query(..., min_length=1, max_length=500, description="Contenido del mensaje"),
     current_user: UserInDB = Depends(get_current_user)
@@ -298,19 +359,25 @@ async def send_match_message(
         db.collection("match_messages").document(message_id).set(message_data)
         
         # Notificar a los demás jugadores
-        for player_id in match_data.get("players", []):
-            if player_id != current_user.id:
-                notification_service.create_notification(
-                    user_id=player_id,
-                    type="match_message",
-                    title="Nuevo mensaje en el partido",
-                    message=f"{current_user.name}: {message[:50]}...",
-                    data={
-                        "match_id": match_id,
-                        "message_id": message_id,
-                        "from_user_id": current_user.id
-                    }
-                )
+        recipients = [pid for pid in match_data.get("players", []) if pid != current_user.id]
+        for player_id in recipients:
+            notification_service.create_notification(
+                user_id=player_id,
+                type="match_message",
+                title="Nuevo mensaje en el partido",
+                message=f"{current_user.name}: {message[:50]}...",
+                data={
+                    "match_id": match_id,
+                    "message_id": message_id,
+                    "from_user_id": current_user.id
+                }
+            )
+        send_push(
+            recipients,
+            title="Nuevo mensaje en el partido",
+            body=f"{current_user.name}: {message[:50]}...",
+            data={"type": "match_message", "match_id": match_id, "message_id": message_id}
+        )
                 
         return {
             "message": "Mensaje enviado exitosamente",
@@ -328,7 +395,7 @@ async def send_match_message(
         )
 
 @router.post("/matches/{match_id}/rate", response_model=dict, summary="Calificar oponentes", tags=["matchmaking"])
-async def rate_opponents(
+def rate_opponents(
     match_id: str,
     ratings: Dict[str, int] = Body(..., description="Diccionario de calificaciones por jugador (1-5)"),
     comments: Optional[Dict[str, str]] = Body(None, description="Comentarios opcionales por jugador"),
@@ -338,7 +405,8 @@ async def rate_opponents(
     Califica a los oponentes después del partido.
     - Verifica que el partido haya terminado.
     - Valida las calificaciones.
-    - Actualiza el perfil de los jugadores.
+    - Actualiza los agregados de calificación de los jugadores
+      (app.services.ratings), sin releer sus calificaciones anteriores.
     """
     try:
         db = get_db()
@@ -388,49 +456,30 @@ async def rate_opponents(
             "created_at": datetime.now()
         }
         
-        db.collection("match_ratings").document(rating_id).set(rating_data)
+        # Guardar la calificación y actualizar los agregados de los calificados en una transacción
+        opponent_ratings = {pid: rating for pid, rating in ratings.items() if pid != current_user.id}
+        reputation = record_ratings(db, db.collection("match_ratings").document(rating_id), rating_data, opponent_ratings)
         
-        # Actualizar perfiles de jugadores
-        for player_id, rating in ratings.items():
-            if player_id != current_user.id:
-                # Obtener calificaciones existentes
-                player_ratings = db.collection("match_ratings")\
-                    .where("ratings." + player_id, "!=", None)\
-                    .get()
-                    
-                total_ratings = len(player_ratings)
-                current_avg = 0
-                
-                if total_ratings > 0:
-                    current_avg = sum(r.to_dict()["ratings"][player_id] for r in player_ratings) / total_ratings
-                    
-                # Calcular nueva media
-                new_avg = ((current_avg * total_ratings) + rating) / (total_ratings + 1)
-                
-                # Actualizar perfil
-                db.collection("users").document(player_id).update({
-                    "rating": new_avg,
-                    "total_ratings": total_ratings + 1,
-                    "updated_at": datetime.now()
-                })
-                
-                # Notificar al jugador
-                notification_service.create_notification(
-                    user_id=player_id,
-                    type="match_rating",
-                    title="Nueva calificación recibida",
-                    message=f"Has recibido una calificación de {rating}/5 en tu último partido",
-                    data={
-                        "match_id": match_id,
-                        "rating": rating,
-                        "comment": comments.get(player_id) if comments else None
-                    }
-                )
+        # Perfiles cacheados y notificación a cada jugador calificado
+        for player_id, rating in opponent_ratings.items():
+            invalidate_user_profile(player_id)
+            notification_service.create_notification(
+                user_id=player_id,
+                type="match_rating",
+                title="Nueva calificación recibida",
+                message=f"Has recibido una calificación de {rating}/5 en tu último partido",
+                data={
+                    "match_id": match_id,
+                    "rating": rating,
+                    "comment": comments.get(player_id) if comments else None
+                }
+            )
                 
         return {
             "message": "Calificaciones enviadas exitosamente",
             "rating_id": rating_id,
-            "rating_data": rating_data
+            "rating_data": rating_data,
+            "reputation": reputation
         }
         
     except HTTPException:
@@ -443,7 +492,7 @@ async def rate_opponents(
         )
 
 @router.post("/request", response_model=MatchResponse)
-async def create_match_request(
+def create_match_request(
     request: MatchRequest,
     current_user: UserInDB = Depends(get_current_user)
 ):
@@ -474,7 +523,7 @@ async def create_match_request(
         )
 
 @router.get("/requests", response_model=List[MatchResponse])
-async def get_match_requests(
+def get_match_requests(
     current_user: UserInDB = Depends(get_current_user),
     status: Optional[MatchStatus] = None
 ):
@@ -500,7 +549,7 @@ async def get_match_requests(
         )
 
 @router.put("/request/{request_id}/accept")
-async def accept_match_request(
+def accept_match_request(
     request_id: str,
     current_user: UserInDB = Depends(get_current_user)
 ):
@@ -541,7 +590,7 @@ async def accept_match_request(
         )
 
 @router.put("/request/{request_id}/reject")
-async def reject_match_request(
+def reject_match_request(
     request_id: str,
     current_user: UserInDB = Depends(get_current_user)
 ):
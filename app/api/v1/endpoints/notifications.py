@@ -1,6 +1,6 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query, WebSocket, WebSocketDisconnect
-from firebase_admin import firestore, messaging
-from app.core.deps import get_current_user
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Response, WebSocket, WebSocketDisconnect
+from firebase_admin import firestore
+from app.core.deps import get_current_user, verify_user_token
 from app.schemas.user import UserInDB
 from app.schemas.notification import NotificationResponse, NotificationCreate
 from typing import Optional, List, Dict, Any
@@ -9,6 +9,9 @@ import uuid
 import logging
 from pydantic import BaseModel
 from app.services.notifications import notification_service
+from app.utils.pagination import paginate_query, InvalidCursorError
+from app.services.push_dispatcher import send_push
+from app.services.realtime_hub import get_hub
 import json
 import asyncio
 
@@ -16,9 +19,6 @@ router = APIRouter()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Almacena las conexiones WebSocket activas
-active_connections: Dict[str, List[WebSocket]] = {}
-
 class PushNotification(BaseModel):
     """Modelo para notificaciones push."""
     title: str
@@ -36,19 +36,25 @@ def get_db():
 
 @router.get("/", response_model=List[NotificationResponse], summary="Listar notificaciones", tags=["notifications"])
 async def list_notifications(
+    response: Response,
     current_user: UserInDB = Depends(get_current_user),
     limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0),
-    unread_only: bool = Query(False, description="Filtrar solo notificaciones no leídas")
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en la cabecera X-Next-Cursor"),
+    unread_only: bool = Query(False, description="Filtrar solo notificaciones no leídas"),
+    include_total: bool = Query(False, description="Incluir el total en la cabecera X-Total-Count")
 ):
     """
     Lista las notificaciones del usuario.
     
+    El cursor de la página siguiente se devuelve en la cabecera ``X-Next-Cursor``.
+    
     Args:
+        response: Respuesta HTTP para las cabeceras de paginación
         current_user: Usuario autenticado
         limit: Número máximo de notificaciones a retornar (1-100)
-        offset: Número de notificaciones a saltar
+        cursor: Cursor de la página anterior
         unread_only: Si es True, solo retorna notificaciones no leídas
+        include_total: Si es True, calcula el total con count()
         
     Returns:
         List[NotificationResponse]: Lista de notificaciones
@@ -60,11 +66,21 @@ async def list_notifications(
         if unread_only:
             query = query.where("read", "==", False)
             
-        query = query.order_by("created_at", direction='DESCENDING')
+        notifications, next_cursor = paginate_query(
+            query,
+            [("created_at", firestore.Query.DESCENDING)],
+            limit,
+            cursor
+        )
         
-        notifications = query.limit(limit).offset(offset).get()
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        if include_total:
+            response.headers["X-Total-Count"] = str(query.count().get()[0][0])
         return [n.to_dict() for n in notifications]
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error al listar notificaciones: {str(e)}")
         raise HTTPException(
@@ -149,6 +165,9 @@ async def send_push_notification(
     """
     Envía una notificación push a un usuario.
     
+    El envío a FCM lo hace el worker (app.services.push_dispatcher); push_id es
+    el ID del trabajo encolado.
+    
     Args:
         user_id: ID del usuario destinatario
         notification: Datos de la notificación push
@@ -176,17 +195,19 @@ async def send_push_notification(
                 detail="El usuario no tiene un token de dispositivo registrado"
             )
             
-        message = messaging.Message(
-            notification=messaging.Notification(
-                title=notification.title,
-                body=notification.body,
-                image=notification.image
-            ),
-            data=notification.data or {},
-            token=device_token
+        response = send_push(
+            [user_id],
+            title=notification.title,
+            body=notification.body,
+            data=notification.data,
+            image=notification.image
         )
-        
-        response = messaging.send(message)
+        if response is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servicio de notificaciones push no disponible temporalmente",
+                headers={"Retry-After": "1"}
+            )
         
         notification_id = str(uuid.uuid4())
         notification_data = {
@@ -205,7 +226,7 @@ async def send_push_notification(
         db.collection("notifications").document(notification_id).set(notification_data)
         
         return {
-            "message": "Notificación push enviada",
+            "message": "Notificación push encolada",
             "notification_id": notification_id,
             "push_id": response
         }
@@ -354,29 +375,43 @@ async def mark_notification_as_read(
         )
 
 @router.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: str):
+async def websocket_endpoint(websocket: WebSocket, user_id: str, token: Optional[str] = Query(None)):
     """
     Endpoint WebSocket para notificaciones en tiempo real.
     
+    El cliente se autentica con el mismo token que en la API (``?token=...``);
+    si falta, no es válido o es de otro usuario, la conexión se cierra con 1008
+    sin llegar a suscribirse.
+    
+    Las notificaciones se reciben como ``{"type": "notification", ...}`` desde
+    cualquier worker (app.services.realtime_hub). El servidor envía
+    ``{"type": "ping"}`` periódicamente; cualquier mensaje del cliente (p. ej.
+    ``pong``) mantiene viva la conexión.
+    
     Args:
         websocket: Conexión WebSocket
         user_id: ID del usuario
+        token: Token de autenticación del usuario
     """
+    try:
+        token_user_id = verify_user_token(token) if token else None
+    except HTTPException:
+        token_user_id = None
+    if token_user_id != user_id:
+        logger.warning(f"WebSocket de notificaciones rechazado para {user_id}")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
     await websocket.accept()
-    
-    if user_id not in active_connections:
-        active_connections[user_id] = []
-    active_connections[user_id].append(websocket)
+    hub = get_hub()
+    await hub.connect(user_id, websocket)
     
     try:
         while True:
-            data = await websocket.receive_text()
-            # Procesar mensajes del cliente si es necesario
+            await websocket.receive_text()
+            hub.touch(user_id, websocket)
     except WebSocketDisconnect:
-        active_connections[user_id].remove(websocket)
-        if not active_connections[user_id]:
-            del active_connections[user_id]
+        pass
     except Exception as e:
         logger.error(f"Error en WebSocket: {str(e)}")
-        if websocket in active_connections.get(user_id, []):
-            active_connections[user_id].remove(websocket) 
\ No newline at end of file
+    finally:
+        await hub.disconnect(user_id, websocket) 
\ No newline at end of file
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from firebase_admin import firestore
 from app.core.deps import get_current_user
+from app.core.auth_cache import invalidate_user_profile
 from app.schemas.user import UserInDB
 from typing import List, Dict, Optional
 import uuid
@@ -44,7 +45,7 @@ def get_db():
         raise HTTPException(status_code=500, detail="Error inicializando Firestore")
 
 @router.post("/", response_model=dict, summary="Completar onboarding", tags=["onboarding"])
-async def complete_onboarding(current_user: UserInDB = Depends(get_current_user)):
+def complete_onboarding(current_user: UserInDB = Depends(get_current_user)):
     """
     Completa el proceso de onboarding.
     - Verifica que todos los pasos requeridos estén completos.
@@ -91,6 +92,7 @@ async def complete_onboarding(current_user: UserInDB = Depends(get_current_user)
             "onboarding_completed": True,
             "onboarding_completed_at": datetime.now()
         })
+        invalidate_user_profile(current_user.id)
         
         # Enviar notificación de bienvenida
         notification_service.create_notification(
@@ -117,7 +119,7 @@ async def complete_onboarding(current_user: UserInDB = Depends(get_current_user)
 
 # Estado de onboarding
 @router.get("/status/{user_id}", response_model=dict, summary="Obtener estado de onboarding", tags=["onboarding"])
-async def get_onboarding_status(user_id: str):
+def get_onboarding_status(user_id: str):
     """
     Obtiene el estado detallado del onboarding de un usuario.
     - Incluye información de cada paso.
@@ -179,12 +181,12 @@ async def get_onboarding_status(user_id: str):
 
 # Listar pasos del onboarding
 @router.get("/steps")
-async def get_onboarding_steps():
+def get_onboarding_steps():
     return ONBOARDING_STEPS
 
 # Actualizar un paso específico
 @router.put("/step/{step_id}", response_model=dict, summary="Actualizar paso de onboarding", tags=["onboarding"])
-async def update_onboarding_step(
+def update_onboarding_step(
     step_id: str,
     completed: bool,
     current_user: UserInDB = Depends(get_current_user)
@@ -252,6 +254,7 @@ async def update_onboarding_step(
                 "onboarding_completed": True,
                 "onboarding_completed_at": datetime.now()
             })
+            invalidate_user_profile(current_user.id)
             
             # Notificar completado
             notification_service.create_notification(
@@ -296,7 +299,7 @@ async def update_onboarding_step(
 
 # Progreso detallado
 @router.get("/progress/{user_id}")
-async def get_onboarding_progress(user_id: str):
+def get_onboarding_progress(user_id: str):
     db = get_db()
     doc = db.collection("onboarding").document(user_id).get()
     if not doc.exists:
@@ -317,7 +320,7 @@ async def get_onboarding_progress(user_id: str):
     }
 
 @router.post("/skip", response_model=dict, summary="Saltar onboarding", tags=["onboarding"])
-async def skip_onboarding(current_user: UserInDB = Depends(get_current_user)):
+def skip_onboarding(current_user: UserInDB = Depends(get_current_user)):
     """
     Salta el proceso de onboarding.
     - Marca todos los pasos como completados.
@@ -360,6 +363,7 @@ async def skip_onboarding(current_user: UserInDB = Depends(get_current_user)):
             "onboarding_completed_at": now,
             "onboarding_skipped": True
         })
+        invalidate_user_profile(current_user.id)
         
         # Notificar
         notification_service.create_notification(
@@ -8,6 +8,11 @@ import uuid
 import logging
 from pydantic import BaseModel
 from app.services.notifications import notification_service
+from app.services.social_hydration import hydrate_posts, comment_preview, RECENT_COMMENTS_LIMIT
+from app.services import cascade_delete, counters, timeline
+from app.services.push_dispatcher import send_push
+from app.services.bulk_fetch import chunked, get_many, group_by, query_in, unique
+from app.utils.pagination import paginate_query, InvalidCursorError
 
 router = APIRouter()
 logging.basicConfig(level=logging.INFO)
@@ -35,6 +40,19 @@ def get_db():
         logger.error(f"Error inicializando Firestore: {str(e)}")
         raise HTTPException(status_code=500, detail="Error inicializando Firestore")
 
+def _display_name(user: UserInDB) -> str:
+    """Nombre del usuario en los textos de notificaciones (UserInDB no tiene username)."""
+    return user.name or "Un usuario"
+
+def _add_comment_in_transaction(transaction, post_ref, preview: Dict) -> None:
+    # La vista previa se relee en la transacción: dos comentarios a la vez no se pisan
+    snapshot = post_ref.get(transaction=transaction)
+    post_update = {"comment_count": firestore.Increment(1)}
+    recent = (snapshot.to_dict() or {}).get("recent_comments")
+    if recent is not None:
+        post_update["recent_comments"] = ([preview] + recent)[:RECENT_COMMENTS_LIMIT]
+    transaction.update(post_ref, post_update)
+
 def get_storage():
     try:
         return storage.bucket()
@@ -43,117 +61,65 @@ def get_storage():
         raise HTTPException(status_code=500, detail="Error inicializando Storage")
 
 @router.get("/", response_model=Dict, summary="Obtener muro social", tags=["social_wall"])
-async def get_social_wall(
-    page: int = Query(1, ge=1),
+def get_social_wall(
+    cursor: Optional[str] = Query(None, description="Cursor devuelto por la página anterior"),
     limit: int = Query(10, ge=1, le=50),
     category: Optional[str] = Query(None, description="Categoría: all, friends, trending"),
+    include_total: bool = Query(False, description="Incluir el total de posts (consulta adicional)"),
     current_user: UserInDB = Depends(get_current_user)
 ):
     """
     Obtiene el muro social con posts.
-    - Paginación
+    - Paginación por cursor
     - Filtros por categoría
     - Posts de amigos y trending
     """
     try:
         db = get_db()
-        offset = (page - 1) * limit
+        order_by = [("created_at", firestore.Query.DESCENDING)]
         
         # Construir query base
         posts_ref = db.collection("posts")
         
         if category == "friends":
-            # Obtener IDs de amigos
-            friendships = db.collection("friendships")\
-                .where("user1_id", "==", current_user.id)\
-                .get()
-            friend_ids = [f.to_dict()["user2_id"] for f in friendships]
-            
-            friendships2 = db.collection("friendships")\
-                .where("user2_id", "==", current_user.id)\
-                .get()
-            friend_ids.extend([f.to_dict()["user1_id"] for f in friendships2])
-            friend_ids.append(current_user.id)
-            
-            # Filtrar posts de amigos
-            query = posts_ref.where("user_id", "in", friend_ids)
+            # Posts de amigos: timeline materializado del usuario
+            query = posts_ref
         elif category == "trending":
             # Posts con más interacciones
-            query = posts_ref.order_by("interaction_count", direction=firestore.Query.DESCENDING)
+            query = posts_ref
+            order_by.insert(0, ("interaction_count", firestore.Query.DESCENDING))
         else:
             # Todos los posts públicos
             query = posts_ref.where("visibility", "==", "public")
             
         # Aplicar paginación
-        posts = query.order_by("created_at", direction=firestore.Query.DESCENDING)\
-            .limit(limit)\
-            .offset(offset)\
-            .get()
-            
-        # Enriquecer posts con información adicional
-        enriched_posts = []
-        for post in posts:
-            post_data = post.to_dict()
-            post_id = post.id
-            
-            # Obtener información del autor
-            author = db.collection("users").document(post_data["user_id"]).get()
-            author_data = author.to_dict() if author.exists else {}
-            
-            # Obtener reacciones
-            reactions = db.collection("post_reactions")\
-                .where("post_id", "==", post_id)\
-                .get()
-            reaction_counts = {}
-            for reaction in reactions:
-                r_type = reaction.to_dict()["type"]
-                reaction_counts[r_type] = reaction_counts.get(r_type, 0) + 1
-                
-            # Obtener comentarios recientes
-            recent_comments = db.collection("comments")\
-                .where("post_id", "==", post_id)\
-                .order_by("created_at", direction=firestore.Query.DESCENDING)\
-                .limit(3)\
-                .get()
-                
-            # Verificar si el usuario actual ha reaccionado
-            user_reaction = db.collection("post_reactions")\
-                .where("post_id", "==", post_id)\
-                .where("user_id", "==", current_user.id)\
-                .get()
-                
-            enriched_post = {
-                "post_id": post_id,
-                "content": post_data["content"],
-                "media_urls": post_data.get("media_urls", []),
-                "created_at": post_data["created_at"],
-                "author": {
-                    "user_id": author_data.get("id"),
-                    "username": author_data.get("username"),
-                    "name": author_data.get("name"),
-                    "profile_picture": author_data.get("profile_picture")
-                },
-                "reactions": reaction_counts,
-                "user_reaction": user_reaction[0].to_dict()["type"] if user_reaction else None,
-                "comment_count": post_data.get("comment_count", 0),
-                "recent_comments": [c.to_dict() for c in recent_comments],
-                "visibility": post_data.get("visibility", "public"),
-                "location": post_data.get("location"),
-                "tags": post_data.get("tags", [])
-            }
-            enriched_posts.append(enriched_post)
+        if category == "friends":
+            posts, next_cursor = timeline.get_page(db, current_user.id, limit, cursor)
+        else:
+            posts, next_cursor = paginate_query(query, order_by, limit, cursor)
             
-        # Obtener total de posts para paginación
-        total = query.count().get()[0][0]
+        # Enriquecer posts con autor, reacciones y comentarios en lote
+        enriched_posts = hydrate_posts(db, posts, current_user.id)
         
-        return {
+        response = {
             "posts": enriched_posts,
-            "total": total,
-            "page": page,
             "limit": limit,
-            "has_more": (offset + limit) < total
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
+        if include_total:
+            if category == "friends":
+                friend_ids = timeline.get_friend_ids(db, current_user.id) + [current_user.id]
+                response["total"] = sum(
+                    query.where("user_id", "in", list(chunk)).count().get()[0][0]
+                    for chunk in chunked(unique(friend_ids))
+                )
+            else:
+                response["total"] = query.count().get()[0][0]
+        return response
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error al obtener muro social: {str(e)}")
         raise HTTPException(
@@ -162,7 +128,7 @@ async def get_social_wall(
         )
 
 @router.post("/", response_model=Dict, summary="Crear post", tags=["social_wall"])
-async def create_post(
+def create_post(
     content: str = Form(...),
     visibility: str = Form("public"),
     location: Optional[str] = Form(None),
@@ -222,36 +188,39 @@ async def create_post(
             "created_at": datetime.now(),
             "updated_at": datetime.now(),
             "interaction_count": 0,
-            "comment_count": 0
+            "comment_count": 0,
+            "reaction_counts": {},
+            "recent_comments": []
         }
         
         db.collection("posts").document(post_id).set(post_data)
+        counters.increment(db, current_user.id, "posts")
+        
+        # Publicar en los timelines del autor y de sus amigos
+        friend_ids = timeline.get_friend_ids(db, current_user.id)
+        timeline.fan_out_post(db, current_user.id, post_id, post_data["created_at"], friend_ids)
         
         # Notificar a amigos
         if visibility == "public":
-            # Obtener amigos
-            friendships = db.collection("friendships")\
-                .where("user1_id", "==", current_user.id)\
-                .get()
-            friend_ids = [f.to_dict()["user2_id"] for f in friendships]
-            
-            friendships2 = db.collection("friendships")\
-                .where("user2_id", "==", current_user.id)\
-                .get()
-            friend_ids.extend([f.to_dict()["user1_id"] for f in friendships2])
-            
             # Enviar notificaciones
             for friend_id in friend_ids:
                 notification_service.create_notification(
                     user_id=friend_id,
                     type="new_post",
                     title="Nuevo post de amigo",
-                    message=f"{current_user.username} ha publicado algo nuevo",
+                    message=f"{_display_name(current_user)} ha publicado algo nuevo",
                     data={
                         "post_id": post_id,
                         "author_id": current_user.id
                     }
                 )
+            # Un único trabajo de push para todos los amigos
+            send_push(
+                friend_ids,
+                title="Nuevo post de amigo",
+                body=f"{_display_name(current_user)} ha publicado algo nuevo",
+                data={"type": "new_post", "post_id": post_id, "author_id": current_user.id}
+            )
                 
         return {
             "message": "Post creado exitosamente",
@@ -267,20 +236,20 @@ async def create_post(
         )
 
 @router.get("/{user_id}", response_model=Dict, summary="Obtener posts de usuario", tags=["social_wall"])
-async def get_user_posts(
+def get_user_posts(
     user_id: str,
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto por la página anterior"),
     limit: int = Query(10, ge=1, le=50),
+    include_total: bool = Query(False, description="Incluir el total de posts (consulta adicional)"),
     current_user: UserInDB = Depends(get_current_user)
 ):
     """
     Obtiene los posts de un usuario específico.
-    - Paginación
+    - Paginación por cursor
     - Filtrado por visibilidad
     """
     try:
         db = get_db()
-        offset = (page - 1) * limit
         
         # Verificar si el usuario actual es amigo
         is_friend = False
@@ -306,57 +275,34 @@ async def get_user_posts(
             query = posts_ref.where("visibility", "==", "public")
             
         # Obtener posts
-        posts = query.order_by("created_at", direction=firestore.Query.DESCENDING)\
-            .limit(limit)\
-            .offset(offset)\
-            .get()
-            
-        # Enriquecer posts
-        enriched_posts = []
-        for post in posts:
-            post_data = post.to_dict()
-            post_id = post.id
+        posts, next_cursor = paginate_query(
+            query,
+            [("created_at", firestore.Query.DESCENDING)],
+            limit,
+            cursor
+        )
             
-            # Obtener reacciones
-            reactions = db.collection("post_reactions")\
-                .where("post_id", "==", post_id)\
-                .get()
-            reaction_counts = {}
-            for reaction in reactions:
-                r_type = reaction.to_dict()["type"]
-                reaction_counts[r_type] = reaction_counts.get(r_type, 0) + 1
-                
-            # Verificar reacción del usuario actual
-            user_reaction = db.collection("post_reactions")\
-                .where("post_id", "==", post_id)\
-                .where("user_id", "==", current_user.id)\
-                .get()
-                
-            enriched_post = {
-                "post_id": post_id,
-                "content": post_data["content"],
-                "media_urls": post_data.get("media_urls", []),
-                "created_at": post_data["created_at"],
-                "reactions": reaction_counts,
-                "user_reaction": user_reaction[0].to_dict()["type"] if user_reaction else None,
-                "comment_count": post_data.get("comment_count", 0),
-                "visibility": post_data.get("visibility", "public"),
-                "location": post_data.get("location"),
-                "tags": post_data.get("tags", [])
-            }
-            enriched_posts.append(enriched_post)
+        # Enriquecer posts con reacciones en lote
+        enriched_posts = hydrate_posts(
+            db,
+            posts,
+            current_user.id,
+            include_author=False,
+            include_recent_comments=False
+        )
             
-        # Obtener total para paginación
-        total = query.count().get()[0][0]
-        
-        return {
+        response = {
             "posts": enriched_posts,
-            "total": total,
-            "page": page,
             "limit": limit,
-            "has_more": (offset + limit) < total
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
+        if include_total:
+            response["total"] = query.count().get()[0][0]
+        return response
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error al obtener posts de usuario: {str(e)}")
         raise HTTPException(
@@ -365,7 +311,7 @@ async def get_user_posts(
         )
 
 @router.post("/{post_id}/reaction", response_model=Dict, summary="Reaccionar a post", tags=["social_wall"])
-async def react_to_post(
+def react_to_post(
     post_id: str,
     reaction: ReactionCreate,
     current_user: UserInDB = Depends(get_current_user)
@@ -395,17 +341,20 @@ async def react_to_post(
             .get()
             
         reaction_id = f"{current_user.id}_{post_id}"
-        
+        # Los posts sin contadores desnormalizados se completan al leer el muro
+        has_counts = "reaction_counts" in post_data
+
         if existing_reaction:
             # Actualizar reacción existente
             old_type = existing_reaction[0].to_dict()["type"]
             if old_type == reaction.type:
                 # Quitar reacción
                 db.collection("post_reactions").document(reaction_id).delete()
-                # Actualizar contador
-                db.collection("posts").document(post_id).update({
-                    "interaction_count": firestore.Increment(-1)
-                })
+                # Actualizar contadores
+                post_update = {"interaction_count": firestore.Increment(-1)}
+                if has_counts:
+                    post_update[f"reaction_counts.{old_type}"] = firestore.Increment(-1)
+                db.collection("posts").document(post_id).update(post_update)
                 return {"message": "Reacción eliminada"}
             else:
                 # Cambiar tipo de reacción
@@ -413,6 +362,11 @@ async def react_to_post(
                     "type": reaction.type,
                     "updated_at": datetime.now()
                 })
+                if has_counts:
+                    db.collection("posts").document(post_id).update({
+                        f"reaction_counts.{old_type}": firestore.Increment(-1),
+                        f"reaction_counts.{reaction.type}": firestore.Increment(1)
+                    })
         else:
             # Crear nueva reacción
             db.collection("post_reactions").document(reaction_id).set({
@@ -422,18 +376,19 @@ async def react_to_post(
                 "type": reaction.type,
                 "created_at": datetime.now()
             })
-            # Actualizar contador
-            db.collection("posts").document(post_id).update({
-                "interaction_count": firestore.Increment(1)
-            })
-            
+            # Actualizar contadores
+            post_update = {"interaction_count": firestore.Increment(1)}
+            if has_counts:
+                post_update[f"reaction_counts.{reaction.type}"] = firestore.Increment(1)
+            db.collection("posts").document(post_id).update(post_update)
+
         # Notificar al autor si no es el mismo usuario
         if post_data["user_id"] != current_user.id:
             notification_service.create_notification(
                 user_id=post_data["user_id"],
                 type="post_reaction",
                 title="Nueva reacción en tu post",
-                message=f"{current_user.username} reaccionó a tu post",
+                message=f"{_display_name(current_user)} reaccionó a tu post",
                 data={
                     "post_id": post_id,
                     "reaction_type": reaction.type,
@@ -456,7 +411,7 @@ async def react_to_post(
         )
 
 @router.post("/{post_id}/comment", response_model=Dict, summary="Comentar post", tags=["social_wall"])
-async def comment_post(
+def comment_post(
     post_id: str,
     comment: CommentCreate,
     current_user: UserInDB = Depends(get_current_user)
@@ -502,11 +457,11 @@ async def comment_post(
         }
         
         db.collection("comments").document(comment_id).set(comment_data)
+        counters.increment(db, current_user.id, "comments")
         
-        # Actualizar contador de comentarios
-        db.collection("posts").document(post_id).update({
-            "comment_count": firestore.Increment(1)
-        })
+        # Actualizar contador y vista previa de comentarios
+        add_comment = firestore.transactional(_add_comment_in_transaction)
+        add_comment(db.transaction(), db.collection("posts").document(post_id), comment_preview(comment_data))
         
         # Notificar al autor del post
         if post_data["user_id"] != current_user.id:
@@ -514,7 +469,7 @@ async def comment_post(
                 user_id=post_data["user_id"],
                 type="post_comment",
                 title="Nuevo comentario en tu post",
-                message=f"{current_user.username} comentó en tu post",
+                message=f"{_display_name(current_user)} comentó en tu post",
                 data={
                     "post_id": post_id,
                     "comment_id": comment_id,
@@ -530,7 +485,7 @@ async def comment_post(
                     user_id=parent_data["user_id"],
                     type="comment_reply",
                     title="Respuesta a tu comentario",
-                    message=f"{current_user.username} respondió a tu comentario",
+                    message=f"{_display_name(current_user)} respondió a tu comentario",
                     data={
                         "post_id": post_id,
                         "comment_id": comment_id,
@@ -555,20 +510,20 @@ async def comment_post(
         )
 
 @router.get("/{post_id}/comments", response_model=Dict, summary="Obtener comentarios", tags=["social_wall"])
-async def get_comments(
+def get_comments(
     post_id: str,
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto por la página anterior"),
     limit: int = Query(10, ge=1, le=50),
+    include_total: bool = Query(False, description="Incluir el total de comentarios (consulta adicional)"),
     current_user: UserInDB = Depends(get_current_user)
 ):
     """
     Obtiene los comentarios de un post.
-    - Paginación
+    - Paginación por cursor
     - Comentarios anidados
     """
     try:
         db = get_db()
-        offset = (page - 1) * limit
         
         # Verificar post
         post = db.collection("posts").document(post_id).get()
@@ -579,45 +534,43 @@ async def get_comments(
             )
             
         # Obtener comentarios principales
-        comments = db.collection("comments")\
+        comments_query = db.collection("comments")\
             .where("post_id", "==", post_id)\
-            .where("parent_comment_id", "==", None)\
-            .order_by("created_at", direction=firestore.Query.DESCENDING)\
-            .limit(limit)\
-            .offset(offset)\
-            .get()
+            .where("parent_comment_id", "==", None)
+        comments, next_cursor = paginate_query(
+            comments_query,
+            [("created_at", firestore.Query.DESCENDING)],
+            limit,
+            cursor
+        )
             
+        # Autores y reacciones de toda la página en lote
+        comment_ids = [comment.id for comment in comments]
+        authors = get_many(db, "users", [comment.to_dict().get("user_id") for comment in comments])
+        reactions_by_comment = group_by(query_in(db, "comment_reactions", "comment_id", comment_ids), "comment_id")
+        
         # Enriquecer comentarios
         enriched_comments = []
         for comment in comments:
             comment_data = comment.to_dict()
             comment_id = comment.id
+            author_data = authors.get(comment_data["user_id"], {})
             
-            # Obtener autor
-            author = db.collection("users").document(comment_data["user_id"]).get()
-            author_data = author.to_dict() if author.exists else {}
-            
-            # Obtener respuestas
+            # Obtener respuestas (las 3 primeras de cada comentario)
             replies = db.collection("comments")\
                 .where("parent_comment_id", "==", comment_id)\
                 .order_by("created_at")\
                 .limit(3)\
                 .get()
                 
-            # Obtener reacciones
-            reactions = db.collection("comment_reactions")\
-                .where("comment_id", "==", comment_id)\
-                .get()
+            # Contar reacciones y buscar la del usuario actual
             reaction_counts = {}
-            for reaction in reactions:
-                r_type = reaction.to_dict()["type"]
+            user_reaction = None
+            for reaction in reactions_by_comment.get(comment_id, []):
+                r_type = reaction["type"]
                 reaction_counts[r_type] = reaction_counts.get(r_type, 0) + 1
-                
-            # Verificar reacción del usuario actual
-            user_reaction = db.collection("comment_reactions")\
-                .where("comment_id", "==", comment_id)\
-                .where("user_id", "==", current_user.id)\
-                .get()
+                if reaction.get("user_id") == current_user.id:
+                    user_reaction = r_type
                 
             enriched_comment = {
                 "comment_id": comment_id,
@@ -630,29 +583,26 @@ async def get_comments(
                     "profile_picture": author_data.get("profile_picture")
                 },
                 "reactions": reaction_counts,
-                "user_reaction": user_reaction[0].to_dict()["type"] if user_reaction else None,
+                "user_reaction": user_reaction,
                 "reply_count": len(replies),
                 "replies": [r.to_dict() for r in replies]
             }
             enriched_comments.append(enriched_comment)
             
-        # Obtener total para paginación
-        total = db.collection("comments")\
-            .where("post_id", "==", post_id)\
-            .where("parent_comment_id", "==", None)\
-            .count()\
-            .get()[0][0]
-            
-        return {
+        response = {
             "comments": enriched_comments,
-            "total": total,
-            "page": page,
             "limit": limit,
-            "has_more": (offset + limit) < total
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         }
+        if include_total:
+            response["total"] = comments_query.count().get()[0][0]
+        return response
         
     except HTTPException:
         raise
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Error al obtener comentarios: {str(e)}")
         raise HTTPException(
@@ -661,18 +611,18 @@ async def get_comments(
         )
 
 @router.delete("/{post_id}", response_model=Dict, summary="Eliminar post", tags=["social_wall"])
-async def delete_post(
+def delete_post(
     post_id: str,
     current_user: UserInDB = Depends(get_current_user)
 ):
     """
-    Elimina un post y su contenido asociado.
-    - Elimina archivos multimedia
-    - Limpia reacciones y comentarios
+    Elimina un post.
+    - El post deja de verse al instante
+    - Archivos multimedia, reacciones, comentarios y reportes se borran en
+      segundo plano (app.services.cascade_delete)
     """
     try:
         db = get_db()
-        bucket = get_storage()
         
         # Verificar post
         post = db.collection("posts").document(post_id).get()
@@ -691,42 +641,19 @@ async def delete_post(
                 detail="No autorizado para eliminar este post"
             )
             
-        # Eliminar archivos multimedia
-        for media_url in post_data.get("media_urls", []):
-            try:
-                # Extraer nombre del archivo de la URL
-                file_name = media_url.split("/")[-1]
-                blob = bucket.blob(f"posts/{post_data['user_id']}/{file_name}")
-                blob.delete()
-            except Exception as e:
-                logger.error(f"Error al eliminar archivo multimedia: {str(e)}")
-                
-        # Eliminar reacciones
-        reactions = db.collection("post_reactions")\
-            .where("post_id", "==", post_id)\
-            .get()
-        for reaction in reactions:
-            reaction.reference.delete()
-            
-        # Eliminar comentarios y sus reacciones
-        comments = db.collection("comments")\
-            .where("post_id", "==", post_id)\
-            .get()
-        for comment in comments:
-            comment_id = comment.id
-            # Eliminar reacciones del comentario
-            comment_reactions = db.collection("comment_reactions")\
-                .where("comment_id", "==", comment_id)\
-                .get()
-            for reaction in comment_reactions:
-                reaction.reference.delete()
-            # Eliminar comentario
-            comment.reference.delete()
-            
-        # Eliminar post
-        db.collection("posts").document(post_id).delete()
+        # Eliminar post y actualizar el contador del autor en el mismo commit
+        batch = db.batch()
+        batch.delete(db.collection("posts").document(post_id))
+        counters.increment(db, post_data["user_id"], "posts", -1, batch=batch)
+        batch.commit()
+        
+        deletion_id = cascade_delete.start_deletion(db, cascade_delete.POST, post_id, {
+            "post_id": post_id,
+            "user_id": post_data["user_id"],
+            "media_urls": post_data.get("media_urls", [])
+        })
         
-        return {"message": "Post eliminado correctamente"}
+        return {"message": "Post eliminado correctamente", "deletion_id": deletion_id}
         
     except HTTPException:
         raise
@@ -738,7 +665,7 @@ async def delete_post(
         )
 
 @router.put("/{post_id}", response_model=Dict, summary="Editar post", tags=["social_wall"])
-async def edit_post(
+def edit_post(
     post_id: str,
     content: str = Form(...),
     visibility: str = Form("public"),
@@ -838,7 +765,7 @@ async def edit_post(
         )
 
 @router.post("/{post_id}/report", response_model=Dict, summary="Reportar post", tags=["social_wall"])
-async def report_post(
+def report_post(
     post_id: str,
     reason: str = Form(...),
     details: Optional[str] = Form(None),
@@ -896,7 +823,7 @@ async def report_post(
                 user_id=moderator.id,
                 type="new_report",
                 title="Nuevo reporte de post",
-                message=f"Post reportado por {current_user.username}",
+                message=f"Post reportado por {_display_name(current_user)}",
                 data={
                     "report_id": report_id,
                     "post_id": post_id,
@@ -919,7 +846,7 @@ async def report_post(
         )
 
 @router.post("/{post_id}/comments/{comment_id}/report", response_model=Dict, summary="Reportar comentario", tags=["social_wall"])
-async def report_comment(
+def report_comment(
     post_id: str,
     comment_id: str,
     reason: str = Form(...),
@@ -979,7 +906,7 @@ async def report_comment(
                 user_id=moderator.id,
                 type="new_comment_report",
                 title="Nuevo reporte de comentario",
-                message=f"Comentario reportado por {current_user.username}",
+                message=f"Comentario reportado por {_display_name(current_user)}",
                 data={
                     "report_id": report_id,
                     "post_id": post_id,
@@ -19,7 +19,7 @@ def get_db():
 
 # Listar planes disponibles
 @router.get("/plans")
-async def get_plans():
+def get_plans():
     # Simulación de planes
     plans = [
         {"plan_id": "free", "name": "Gratis", "price": 0, "features": ["Básico"]},
@@ -30,7 +30,7 @@ async def get_plans():
 
 # Crear suscripción
 @router.post("/create")
-async def create_subscription(plan_id: str, current_user: UserInDB = Depends(get_current_user)):
+def create_subscription(plan_id: str, current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
     subscription_id = str(uuid.uuid4())
     subscription_data = {
@@ -56,7 +56,7 @@ async def create_subscription(plan_id: str, current_user: UserInDB = Depends(get
 
 # Cancelar suscripción
 @router.delete("/{subscription_id}")
-async def cancel_subscription(subscription_id: str, current_user: UserInDB = Depends(get_current_user)):
+def cancel_subscription(subscription_id: str, current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
     sub = db.collection("subscriptions").document(subscription_id).get()
     if not sub.exists:
@@ -79,7 +79,7 @@ async def cancel_subscription(subscription_id: str, current_user: UserInDB = Dep
 
 # Actualizar suscripción
 @router.put("/{subscription_id}")
-async def update_subscription(subscription_id: str, plan_id: str, current_user: UserInDB = Depends(get_current_user)):
+def update_subscription(subscription_id: str, plan_id: str, current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
     sub = db.collection("subscriptions").document(subscription_id).get()
     if not sub.exists:
@@ -103,7 +103,7 @@ async def update_subscription(subscription_id: str, plan_id: str, current_user:
 
 # Consultar estado de suscripción
 @router.get("/{subscription_id}")
-async def get_subscription(subscription_id: str, current_user: UserInDB = Depends(get_current_user)):
+def get_subscription(subscription_id: str, current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
     sub = db.collection("subscriptions").document(subscription_id).get()
     if not sub.exists:
@@ -115,7 +115,7 @@ async def get_subscription(subscription_id: str, current_user: UserInDB = Depend
 
 # Simular pago de suscripción (preparado para Stripe)
 @router.post("/pay")
-async def pay_subscription(subscription_id: str, stripe_payment_intent_id: str, current_user: UserInDB = Depends(get_current_user)):
+def pay_subscription(subscription_id: str, stripe_payment_intent_id: str, current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
     sub = db.collection("subscriptions").document(subscription_id).get()
     if not sub.exists:
@@ -146,9 +146,9 @@ async def pay_subscription(subscription_id: str, stripe_payment_intent_id: str,
     return {"message": "Pago procesado (Stripe simulado)", "payment_intent_id": stripe_payment_intent_id}
 
 @router.get("/{user_id}")
-async def get_user_subscriptions(user_id: str):
+def get_user_subscriptions(user_id: str):
     raise HTTPException(status_code=501, detail="Not Implemented")
 
 @router.post("/{user_id}/subscribe")
-async def subscribe_user(user_id: str):
+def subscribe_user(user_id: str):
     raise HTTPException(status_code=501, detail="Not Implemented") 
\ No newline at end of file
@@ -1,8 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from app.schemas.user import User, UserUpdate, PrivacyUpdateRequest, PreferencesUpdateRequest, DeleteAccountRequest, UserInDB
-from app.services.firebase import get_firebase_client
+from app.services.firebase import (
+    get_firebase_client,
+    get_async_firestore_client,
+    run_sync,
+    gather_reads,
+    get_document_async,
+    query_collection_async
+)
 from app.core.security import verify_password, get_password_hash
 from app.core.deps import get_current_user
+from app.core.auth_cache import invalidate_user_profile
+from app.services.leaderboard import update_profile as update_leaderboard_profile
+from app.services.geo import geo_fields
+from app.services import cascade_delete, counters
 import logging
 from fastapi import HTTPException as RealHTTPException
 from google.cloud import firestore
@@ -26,10 +37,15 @@ async def update_user_me(user_in: UserUpdate, current_user: UserInDB = Depends(g
         db = get_firebase_client()
         user_ref = db.collection('users').document(current_user.id)
         update_data = user_in.dict(exclude_unset=True)
+        if 'location' in update_data:
+            # Mantener el geohash para las búsquedas por radio
+            update_data.update(geo_fields(update_data['location']))
         user_ref.update(update_data)
+        invalidate_user_profile(current_user.id)
         user_doc = user_ref.get()
         user_data = user_doc.to_dict()
         user_data['id'] = user_ref.id
+        update_leaderboard_profile(current_user.id, user_data)
         return UserInDB(**user_data)
     except Exception as e:
         logger.error(f"Error al actualizar usuario: {str(e)}")
@@ -47,18 +63,31 @@ async def read_user_profile(
     - Permite diferentes niveles de detalle según la relación entre usuarios
     """
     try:
-        db = get_firebase_client()
-        user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
+        is_self = user_id == current_user.id
+        pair = [current_user.id, user_id]
+
+        # Perfil, bloqueo y amistad son lecturas independientes: se lanzan a la vez
+        reads = [
+            get_document_async('users', user_id),
+            query_collection_async(
+                'blocked_users',
+                [('blocker_id', '==', current_user.id), ('blocked_id', '==', user_id)],
+                limit=1
+            )
+        ]
+        if not is_self:
+            reads.append(query_collection_async(
+                'friendships',
+                [('user1_id', 'in', pair), ('user2_id', 'in', pair)],
+                limit=1
+            ))
+        user_data, blocked, *friendship = await gather_reads(*reads)
         
-        if not user_doc.exists:
+        if user_data is None:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
-            
-        user_data = user_doc.to_dict()
         
         # Verificar si el usuario está bloqueado
-        blocked_ref = db.collection('blocked_users').where('blocker_id', '==', current_user.id).where('blocked_id', '==', user_id).get()
-        if blocked_ref:
+        if blocked:
             raise HTTPException(status_code=403, detail="No puedes ver este perfil")
             
         # Verificar configuración de privacidad
@@ -67,13 +96,7 @@ async def read_user_profile(
             raise HTTPException(status_code=403, detail="Este perfil es privado")
             
         # Determinar nivel de detalle
-        is_self = user_id == current_user.id
-        is_friend = False
-        
-        if not is_self:
-            # Verificar si son amigos
-            friendship_ref = db.collection('friendships').where('user1_id', 'in', [current_user.id, user_id]).where('user2_id', 'in', [current_user.id, user_id]).get()
-            is_friend = len(friendship_ref) > 0
+        is_friend = bool(friendship and friendship[0])
             
         # Preparar respuesta según nivel de detalle
         response = {
@@ -122,8 +145,12 @@ async def delete_user_me(request: DeleteAccountRequest, current_user: UserInDB =
         if not verify_password(request.password, user_data.get('hashed_password', '')):
             raise HTTPException(status_code=403, detail="Contraseña incorrecta")
         user_ref.delete()
-        # Opcional: eliminar datos relacionados (amigos, análisis, etc.)
-        return {"detail": "Cuenta eliminada correctamente"}
+        invalidate_user_profile(current_user.id)
+        # Posts, amistades, solicitudes, notificaciones, etc. en segundo plano
+        deletion_id = cascade_delete.start_deletion(db, cascade_delete.USER, current_user.id, {"user_id": current_user.id})
+        return {"detail": "Cuenta eliminada correctamente", "deletion_id": deletion_id}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error al eliminar cuenta: {str(e)}")
         raise HTTPException(status_code=500, detail="Error al eliminar cuenta")
@@ -135,6 +162,7 @@ async def update_privacy_me(request: PrivacyUpdateRequest, current_user: UserInD
         db = get_firebase_client()
         user_ref = db.collection('users').document(current_user.id)
         user_ref.update({"privacy": request.privacy.dict()})
+        invalidate_user_profile(current_user.id)
         return {"detail": "Privacidad actualizada"}
     except Exception as e:
         logger.error(f"Error al actualizar privacidad: {str(e)}")
@@ -147,6 +175,7 @@ async def update_preferences_me(request: PreferencesUpdateRequest, current_user:
         db = get_firebase_client()
         user_ref = db.collection('users').document(current_user.id)
         user_ref.update({"preferences": request.preferences.dict()})
+        invalidate_user_profile(current_user.id)
         return {"detail": "Preferencias actualizadas"}
     except Exception as e:
         logger.error(f"Error al actualizar preferencias: {str(e)}")
@@ -166,19 +195,42 @@ async def get_user_activity(
     - Implementa paginación
     """
     try:
-        db = get_firebase_client()
+        db = get_async_firestore_client()
         activities = []
         
-        # Obtener análisis de videos
+        # Las tres fuentes de actividad y sus totales se consultan en paralelo
+        reads = {}
+        summary_counters = [
+            name for name in ('videos', 'matches', 'social')
+            if activity_type in [None, 'all', name]
+        ]
+        reads['summary'] = run_sync(counters.get_counts, get_firebase_client(), current_user.id, summary_counters)
         if activity_type in [None, 'all', 'videos']:
-            video_analyses = db.collection('video_analysis')\
+            reads['videos'] = db.collection('video_analysis')\
+                .where('user_id', '==', current_user.id)\
+                .order_by('created_at', direction=firestore.Query.DESCENDING)\
+                .limit(limit)\
+                .offset(offset)\
+                .get()
+        if activity_type in [None, 'all', 'matches']:
+            reads['matches'] = db.collection('matches')\
+                .where('players', 'array_contains', current_user.id)\
+                .order_by('date', direction=firestore.Query.DESCENDING)\
+                .limit(limit)\
+                .offset(offset)\
+                .get()
+        if activity_type in [None, 'all', 'social']:
+            reads['social'] = db.collection('social_interactions')\
                 .where('user_id', '==', current_user.id)\
                 .order_by('created_at', direction=firestore.Query.DESCENDING)\
                 .limit(limit)\
                 .offset(offset)\
                 .get()
-                
-            for analysis in video_analyses:
+        results = dict(zip(reads, await gather_reads(*reads.values())))
+        
+        # Obtener análisis de videos
+        if 'videos' in results:
+            for analysis in results['videos']:
                 analysis_data = analysis.to_dict()
                 activities.append({
                     'type': 'video_analysis',
@@ -190,15 +242,8 @@ async def get_user_activity(
                 })
         
         # Obtener partidos jugados
-        if activity_type in [None, 'all', 'matches']:
-            matches = db.collection('matches')\
-                .where('players', 'array_contains', current_user.id)\
-                .order_by('date', direction=firestore.Query.DESCENDING)\
-                .limit(limit)\
-                .offset(offset)\
-                .get()
-                
-            for match in matches:
+        if 'matches' in results:
+            for match in results['matches']:
                 match_data = match.to_dict()
                 activities.append({
                     'type': 'match',
@@ -210,15 +255,8 @@ async def get_user_activity(
                 })
         
         # Obtener interacciones sociales
-        if activity_type in [None, 'all', 'social']:
-            social_interactions = db.collection('social_interactions')\
-                .where('user_id', '==', current_user.id)\
-                .order_by('created_at', direction=firestore.Query.DESCENDING)\
-                .limit(limit)\
-                .offset(offset)\
-                .get()
-                
-            for interaction in social_interactions:
+        if 'social' in results:
+            for interaction in results['social']:
                 interaction_data = interaction.to_dict()
                 activities.append({
                     'type': 'social',
@@ -237,7 +275,8 @@ async def get_user_activity(
         
         return {
             'activities': paginated_activities,
-            'total': len(activities),
+            'summary': results['summary'],
+            'total': sum(results['summary'].values()),
             'limit': limit,
             'offset': offset
         }
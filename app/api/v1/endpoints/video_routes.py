@@ -4,8 +4,6 @@ from app.services.video_service import get_video_blueprint
 from app.core.deps import get_current_user
 from app.schemas.user import UserInDB
 from app.services.firebase import get_firebase_client
-from app.worker import analyze_video
-from app.tasks.video import process_video
 from datetime import datetime
 import logging
 import tempfile
@@ -78,7 +76,7 @@ async def get_video_analysis(
     Obtiene el estado y resultados del análisis de un video.
     """
     try:
-        db, _ = get_firebase_client()
+        db = get_firebase_client()
         analysis_ref = db.collection('video_analyses').document(video_id)
         analysis_doc = analysis_ref.get()
         
@@ -1,12 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, BackgroundTasks, Request, Query
+from pydantic import BaseModel
 from app.services.auth_service import verify_firebase_token
 from app.services.storage_service import StorageService
 from app.services.firebase import get_firebase_client
+from app.services.job_queue import ANALYZE_VIDEO_JOB, add_job, requeue_job
 from typing import Optional
 import logging
 import uuid
 import os
+import base64
+import secrets
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
 from google.cloud import tasks_v2
+from app.core.circuit_breaker import get_breaker, CircuitOpenError, BulkheadFullError
 import json
 
 logger = logging.getLogger(__name__)
@@ -17,13 +24,85 @@ PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT")
 LOCATION = os.getenv("CLOUD_TASKS_LOCATION", "us-central1")
 QUEUE_NAME = os.getenv("CLOUD_TASKS_QUEUE", "padelyzer-analysis-queue")
 CLOUD_RUN_URL = os.getenv("CLOUD_RUN_URL")  # Debe ser la URL base de tu servicio desplegado
+# Token compartido con la suscripción push de Pub/Sub de las notificaciones de Storage.
+# Sin token configurado el endpoint rechaza todas las notificaciones.
+STORAGE_NOTIFICATION_TOKEN = os.getenv("STORAGE_NOTIFICATION_TOKEN")
+
+cloud_tasks_breaker = get_breaker("cloud_tasks", max_concurrent=10, min_calls=5)
+
+class SignedUploadRequest(BaseModel):
+    filename: str
+    content_type: str = "video/mp4"
+    video_type: Optional[str] = None
+
+class UploadCompleteRequest(BaseModel):
+    analysis_id: str
+    object_path: str
 
 def save_metrics_to_db(data: dict):
     """Guarda el estado inicial del análisis en Firestore (síncrono)."""
     db = get_firebase_client()
     db.collection('video_analyses').document(data['analysis_id']).set(data)
 
+def create_analysis_record(data: dict) -> bool:
+    """
+    Crea el estado inicial del análisis solo si no existe.
+
+    Returns:
+        False si otra llamada ya lo había creado
+    """
+    db = get_firebase_client()
+    try:
+        db.collection('video_analyses').document(data['analysis_id']).create(data)
+        return True
+    except AlreadyExists:
+        return False
+
+# Estados del análisis que pasan a 'queued' al encolar su trabajo
+QUEUEABLE_STATUSES = ('pending', 'failed')
+
+def _mark_queued_in_transaction(transaction, analysis_ref, job_id: str) -> bool:
+    snapshot = analysis_ref.get(transaction=transaction)
+    if not snapshot.exists or snapshot.to_dict().get('status') not in QUEUEABLE_STATUSES:
+        # El worker ya lo tomó (o lo terminó): no se retrocede su estado
+        return False
+    transaction.update(analysis_ref, {'status': 'queued', 'job_id': job_id})
+    return True
+
+def enqueue_analysis_job(analysis_id: str, retry: bool = False) -> str:
+    """
+    Encola el análisis en la cola de trabajos de los workers y devuelve el ID del trabajo.
+
+    El ID del trabajo es el del análisis, así que una entrega duplicada
+    (Cloud Tasks garantiza al menos una) no lo ejecuta dos veces ni cambia el
+    estado del documento. Un trabajo que agotó sus intentos solo se vuelve a
+    encolar con retry=True.
+    """
+    if not add_job(ANALYZE_VIDEO_JOB, {"analysis_id": analysis_id}, analysis_id):
+        if not (retry and requeue_job(ANALYZE_VIDEO_JOB, analysis_id)):
+            logger.info(f"Análisis {analysis_id} ya encolado; no se cambia su estado")
+            return analysis_id
+    db = get_firebase_client()
+    run = firestore.transactional(_mark_queued_in_transaction)
+    run(db.transaction(), db.collection('video_analyses').document(analysis_id), analysis_id)
+    return analysis_id
+
 def enqueue_analysis_task(analysis_id: str):
+    """
+    Lanza el análisis: vía Cloud Tasks si hay CLOUD_RUN_URL, o directamente en
+    la cola de trabajos. Si Cloud Tasks está degradado (circuito abierto) se
+    encola directamente en lugar de bloquear la subida.
+    """
+    if not CLOUD_RUN_URL:
+        enqueue_analysis_job(analysis_id)
+        return
+    try:
+        cloud_tasks_breaker.call(_create_analysis_task, analysis_id)
+    except (CircuitOpenError, BulkheadFullError) as e:
+        logger.warning(f"Cloud Tasks no disponible ({str(e)}); encolando {analysis_id} directamente")
+        enqueue_analysis_job(analysis_id)
+
+def _create_analysis_task(analysis_id: str):
     client = tasks_v2.CloudTasksClient()
     parent = client.queue_path(PROJECT_ID, LOCATION, QUEUE_NAME)
     url = f"{CLOUD_RUN_URL}/tasks/analyze_video"
@@ -35,7 +114,151 @@ def enqueue_analysis_task(analysis_id: str):
             "body": json.dumps({"analysis_id": analysis_id}).encode(),
         }
     }
-    client.create_task(parent=parent, task=task)
+    client.create_task(parent=parent, task=task, timeout=10)
+
+async def register_uploaded_video(user_id: str, analysis_id: str, object_path: str, video_type: Optional[str] = None) -> dict:
+    """
+    Verifica un video subido directamente a Storage y lanza su análisis.
+
+    Es idempotente: el callback del cliente y la notificación de Storage pueden
+    llegar ambos (incluso a la vez), pero solo la llamada que crea el documento
+    del análisis lo encola. Si ese encolado falló, el documento queda 'pending'
+    sin job_id y el siguiente reintento lo vuelve a encolar (el ID del trabajo
+    evita duplicarlo).
+
+    Raises:
+        HTTPException: Si el objeto no supera la verificación
+    """
+    db = get_firebase_client()
+    existing = db.collection('video_analyses').document(analysis_id).get()
+    if existing.exists:
+        existing_data = existing.to_dict() or {}
+        status = existing_data.get('status', 'pending')
+        if status == 'pending' and not existing_data.get('job_id'):
+            logger.info(f"Análisis {analysis_id} registrado pero sin encolar; se vuelve a encolar")
+            enqueue_analysis_task(analysis_id)
+        return {"analysis_id": analysis_id, "status": status}
+
+    video_info, error = await StorageService.verify_uploaded_video(object_path, user_id)
+    if error:
+        logger.error(f"Verificación de subida directa fallida para {object_path}: {error}")
+        raise HTTPException(status_code=400, detail=f"Error al verificar video: {error}")
+
+    analysis_data = {
+        'analysis_id': analysis_id,
+        'user_id': user_id,
+        'status': 'pending',
+        'video_url': video_info['gcs_uri'],
+        'video_size': video_info['size'],
+        'metrics': None
+    }
+    if video_type:
+        analysis_data['video_type'] = video_type
+    if not create_analysis_record(analysis_data):
+        logger.info(f"Análisis {analysis_id} ya registrado por otra llamada; no se vuelve a encolar")
+        existing = db.collection('video_analyses').document(analysis_id).get()
+        return {"analysis_id": analysis_id, "status": (existing.to_dict() or {}).get('status', 'pending')}
+    enqueue_analysis_task(analysis_id)
+
+    return {"analysis_id": analysis_id, "status": "pending"}
+
+@router.post("/upload-url")
+async def create_upload_url(
+    upload_request: SignedUploadRequest,
+    authorization: str = Header(...)
+):
+    """
+    Genera una URL firmada para que el cliente suba el video directamente a Storage.
+    El análisis se lanza al confirmar la subida en /videos/upload-complete
+    o al recibir la notificación de Storage.
+    """
+    try:
+        token = verify_firebase_token(authorization.replace("Bearer ", ""))
+        user_id = token['uid']
+
+        analysis_id = str(uuid.uuid4())
+        upload_data, error = await StorageService.create_signed_upload_url(
+            user_id=user_id,
+            analysis_id=analysis_id,
+            filename=upload_request.filename,
+            content_type=upload_request.content_type
+        )
+
+        if error:
+            logger.error(f"Error al generar URL de subida: {error}")
+            raise HTTPException(status_code=400, detail=f"Error al generar URL de subida: {error}")
+
+        return {"analysis_id": analysis_id, **upload_data}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error inesperado al generar URL de subida: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error inesperado: {str(e)}")
+
+@router.post("/upload-complete")
+async def complete_upload(
+    upload: UploadCompleteRequest,
+    authorization: str = Header(...),
+    video_type: Optional[str] = Query(None)
+):
+    """
+    Confirma una subida directa: verifica el objeto en Storage, guarda el estado
+    inicial del análisis y lo encola.
+    """
+    try:
+        token = verify_firebase_token(authorization.replace("Bearer ", ""))
+        user_id = token['uid']
+
+        parsed = StorageService.parse_upload_path(upload.object_path)
+        if not parsed or parsed != (user_id, upload.analysis_id):
+            raise HTTPException(status_code=403, detail="El objeto no corresponde a este análisis")
+
+        return await register_uploaded_video(user_id, upload.analysis_id, upload.object_path, video_type)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error inesperado al completar subida: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error inesperado: {str(e)}")
+
+@router.post("/storage-notification")
+async def storage_notification(request: Request, token: Optional[str] = Query(None)):
+    """
+    Recibe las notificaciones OBJECT_FINALIZE de Storage enviadas por Pub/Sub (push).
+    Permite lanzar el análisis aunque el cliente no llame a /videos/upload-complete.
+    """
+    if not STORAGE_NOTIFICATION_TOKEN:
+        logger.error("STORAGE_NOTIFICATION_TOKEN no configurado; notificación de Storage rechazada")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if not token or not secrets.compare_digest(token, STORAGE_NOTIFICATION_TOKEN):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    envelope = await request.json()
+    message = envelope.get('message') or {}
+    attributes = message.get('attributes') or {}
+
+    # Pub/Sub reintenta ante respuestas no 2xx: los eventos ignorados se confirman
+    if attributes.get('eventType') != 'OBJECT_FINALIZE':
+        return {"status": "ignored"}
+
+    try:
+        payload = json.loads(base64.b64decode(message.get('data', '')).decode() or '{}')
+    except Exception as e:
+        logger.error(f"Notificación de Storage inválida: {str(e)}")
+        return {"status": "ignored"}
+
+    object_path = payload.get('name') or attributes.get('objectId', '')
+    parsed = StorageService.parse_upload_path(object_path)
+    if not parsed:
+        return {"status": "ignored"}
+
+    user_id, analysis_id = parsed
+    try:
+        return await register_uploaded_video(user_id, analysis_id, object_path)
+    except HTTPException as e:
+        logger.warning(f"Subida directa rechazada {object_path}: {e.detail}")
+        return {"status": "rejected", "analysis_id": analysis_id}
 
 @router.post("/upload")
 async def upload_video(
@@ -9,10 +9,30 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from firebase_admin import auth
 from app.core.config.firebase import get_firebase_clients
+from app.core.auth_cache import verify_token_cached, get_profile_cached
 
 logger = logging.getLogger(__name__)
 security = HTTPBearer()
 
+def _load_auth_user(auth_client, uid: str) -> Dict:
+    """Obtiene los datos públicos del usuario desde Firebase Auth."""
+    user = auth_client.get_user(uid)
+    return {
+        'uid': user.uid,
+        'email': user.email,
+        'email_verified': user.email_verified,
+        'display_name': user.display_name,
+        'photo_url': user.photo_url
+    }
+
+def _get_cached_user(auth_client, token: str) -> Dict:
+    """Verifica el token y obtiene el usuario usando la caché de autenticación."""
+    decoded_token = verify_token_cached(token, auth_client.verify_id_token)
+    return get_profile_cached(
+        f"auth:{decoded_token['uid']}",
+        lambda _: _load_auth_user(auth_client, decoded_token['uid'])
+    )
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict:
     """
     Obtiene el usuario actual basado en el token de Firebase.
@@ -32,18 +52,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         
         # Verificar el token
         token = credentials.credentials
-        decoded_token = auth_client.verify_id_token(token)
-        
-        # Obtener información del usuario
-        user = auth_client.get_user(decoded_token['uid'])
-        
-        return {
-            'uid': user.uid,
-            'email': user.email,
-            'email_verified': user.email_verified,
-            'display_name': user.display_name,
-            'photo_url': user.photo_url
-        }
+        return _get_cached_user(auth_client, token)
         
     except auth.InvalidIdTokenError:
         logger.error("Token inválido")
@@ -85,18 +94,7 @@ def verify_firebase_token(token: str) -> Optional[Dict]:
         _, auth_client = get_firebase_clients()
         
         # Verificar el token
-        decoded_token = auth_client.verify_id_token(token)
-        
-        # Obtener información del usuario
-        user = auth_client.get_user(decoded_token['uid'])
-        
-        return {
-            'uid': user.uid,
-            'email': user.email,
-            'email_verified': user.email_verified,
-            'display_name': user.display_name,
-            'photo_url': user.photo_url
-        }
+        return _get_cached_user(auth_client, token)
         
     except Exception as e:
         logger.error(f"Error al verificar token: {str(e)}")
@@ -0,0 +1,132 @@
+"""
+Caché en proceso para la autenticación.
+
+Evita verificar el mismo ID token y leer el mismo perfil de usuario en cada
+petición autenticada:
+
+- Las claims verificadas se guardan por hash SHA-256 del token (nunca el token
+  en claro) y caducan al expirar el token o tras AUTH_TOKEN_CACHE_TTL, lo que
+  ocurra antes. Ese límite acota también el tiempo en que un token revocado
+  sigue aceptándose.
+- Los perfiles de usuario se guardan por uid con un TTL corto y se invalidan
+  explícitamente cuando el perfil se modifica. Con varios workers cada proceso
+  tiene su propia caché, por lo que el TTL acota la inconsistencia entre ellos;
+  lo mismo vale para lo que escriben otros procesos (workers de la cola,
+  scripts de backfill como backfill_geohash): se ve como mucho
+  USER_PROFILE_CACHE_TTL segundos después.
+
+Ambas cachés devuelven copias: el llamador puede modificar lo recibido sin
+alterar lo guardado.
+
+Las claves públicas de Firebase ya las cachea firebase_admin respetando las
+cabeceras Cache-Control de Google, así que con la caché de claims la
+verificación no sale a red en el camino caliente.
+"""
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))
+USER_PROFILE_CACHE_SIZE = int(os.getenv("USER_PROFILE_CACHE_SIZE", "10000"))
+USER_PROFILE_CACHE_TTL = int(os.getenv("USER_PROFILE_CACHE_TTL", "30"))
+
+class TTLCache:
+    """Caché LRU acotada con caducidad por entrada y segura entre hilos."""
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, self._clock() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+token_cache = TTLCache(AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_TTL)
+profile_cache = TTLCache(USER_PROFILE_CACHE_SIZE, USER_PROFILE_CACHE_TTL)
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def verify_token_cached(token: str, verify: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Devuelve las claims de un token, verificándolo solo si no está en caché.
+
+    Args:
+        token: Token recibido en la cabecera Authorization
+        verify: Función que verifica el token y devuelve sus claims (lanza si es inválido)
+
+    Returns:
+        Dict con las claims decodificadas
+    """
+    key = _token_key(token)
+    claims = token_cache.get(key)
+    if claims is None:
+        claims = verify(token)
+        exp = claims.get("exp")
+        ttl = exp - time.time() if exp else None
+        token_cache.set(key, claims, ttl)
+    return copy.deepcopy(claims)
+
+def get_profile_cached(user_id: str, load: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """
+    Devuelve el perfil de un usuario, cargándolo solo si no está en caché.
+
+    Los perfiles inexistentes (load devuelve None) no se guardan. Se devuelve
+    una copia para que el llamador pueda modificarla sin alterar la caché.
+    """
+    profile = profile_cache.get(user_id)
+    if profile is None:
+        profile = load(user_id)
+        if profile is None:
+            return None
+        profile_cache.set(user_id, copy.deepcopy(profile))
+    return copy.deepcopy(profile)
+
+def invalidate_user_profile(user_id: str):
+    """Descarta los perfiles en caché (Firestore y Firebase Auth) de un usuario tras modificarlo o eliminarlo."""
+    profile_cache.delete(user_id)
+    profile_cache.delete(f"auth:{user_id}")
@@ -0,0 +1,298 @@
+"""
+Circuit breaker y bulkhead para dependencias externas.
+
+Cada dependencia (Roboflow, hooks HTTP, descarga de videos, FCM, Cloud Tasks)
+tiene su propio breaker, que:
+
+    - Mide la tasa de fallos en una ventana deslizante de tiempo. Si supera el
+      umbral con un mínimo de llamadas, el circuito se abre y las llamadas
+      fallan al instante con CircuitOpenError en lugar de esperar timeouts.
+    - Tras open_seconds pasa a semiabierto y deja pasar unas pocas llamadas de
+      prueba: si tienen éxito se cierra y, si alguna falla, vuelve a abrirse.
+    - Limita las llamadas concurrentes (bulkhead) para que una dependencia lenta
+      no ocupe todos los hilos del worker; el exceso falla con BulkheadFullError.
+
+Funciona con código síncrono y asíncrono:
+
+    breaker = get_breaker("roboflow", max_concurrent=8)
+    response = breaker.call(requests.post, url, data=data, timeout=10)
+    result = await breaker.call_async(client.post, url)
+
+    @breaker.protect
+    def send(...): ...
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Optional, Tuple, Type
+
+from app.utils.monitoring import circuit_rejected, circuit_state_changed
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """La dependencia está marcada como caída y la llamada no se ha intentado."""
+
+    def __init__(self, name: str, retry_after: float = 0.0):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuito '{name}' abierto; reintentar en {retry_after:.0f}s")
+
+class BulkheadFullError(Exception):
+    """Se alcanzó el máximo de llamadas concurrentes a la dependencia."""
+
+    def __init__(self, name: str, max_concurrent: int):
+        self.name = name
+        super().__init__(f"Límite de {max_concurrent} llamadas concurrentes alcanzado en '{name}'")
+
+class CircuitBreaker:
+    """
+    Circuit breaker por tasa de fallos con bulkhead opcional.
+
+    Args:
+        name: Nombre de la dependencia (etiqueta en logs y métricas)
+        failure_rate: Proporción de fallos en la ventana que abre el circuito
+        min_calls: Llamadas mínimas en la ventana antes de evaluar la tasa
+        window_seconds: Duración de la ventana deslizante
+        open_seconds: Tiempo abierto antes de pasar a semiabierto
+        half_open_calls: Llamadas de prueba permitidas en semiabierto
+        max_concurrent: Límite de llamadas simultáneas (None = sin límite)
+        max_wait: Segundos que se espera a que haya hueco en el bulkhead
+        ignore_exceptions: Excepciones que no cuentan como fallo de la dependencia
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = CIRCUIT_FAILURE_RATE,
+        min_calls: int = CIRCUIT_MIN_CALLS,
+        window_seconds: float = CIRCUIT_WINDOW_SECONDS,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        half_open_calls: int = CIRCUIT_HALF_OPEN_CALLS,
+        max_concurrent: Optional[int] = None,
+        max_wait: float = 0.0,
+        ignore_exceptions: Tuple[Type[BaseException], ...] = (),
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.ignore_exceptions = ignore_exceptions
+        self.clock = clock
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._results: Deque[Tuple[float, bool]] = deque()
+        self._probes = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._slot_released = threading.Condition(self._lock)
+
+    # Estado
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh_state()
+            return self._state
+
+    def _set_state(self, state: str):
+        if state == self._state:
+            return
+        logger.warning(f"[CircuitBreaker] '{self.name}': {self._state} -> {state}")
+        self._state = state
+        circuit_state_changed(self.name, state)
+        if state == OPEN:
+            self._opened_at = self.clock()
+        self._probes = 0
+        self._results.clear()
+
+    def _refresh_state(self):
+        if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+            self._set_state(HALF_OPEN)
+
+    def _trim_window(self, now: float):
+        while self._results and now - self._results[0][0] > self.window_seconds:
+            self._results.popleft()
+
+    def stats(self) -> Dict[str, Any]:
+        """Resumen del estado para health checks."""
+        with self._lock:
+            self._refresh_state()
+            self._trim_window(self.clock())
+            failures = sum(1 for _, ok in self._results if not ok)
+            return {
+                "name": self.name,
+                "state": self._state,
+                "calls": len(self._results),
+                "failures": failures,
+                "active": self._active
+            }
+
+    def reset(self):
+        """Cierra el circuito y descarta la ventana (pruebas u operación manual)."""
+        with self._lock:
+            self._set_state(CLOSED)
+            self._results.clear()
+
+    # Admisión y registro de resultados
+
+    def _try_acquire(self) -> bool:
+        """Comprueba circuito y bulkhead; debe llamarse con el lock tomado."""
+        self._refresh_state()
+        if self._state == OPEN:
+            retry_after = self.open_seconds - (self.clock() - self._opened_at)
+            circuit_rejected(self.name, "open")
+            raise CircuitOpenError(self.name, max(retry_after, 0.0))
+        if self._state == HALF_OPEN and self._probes >= self.half_open_calls:
+            circuit_rejected(self.name, "open")
+            raise CircuitOpenError(self.name, 0.0)
+        if self.max_concurrent is not None and self._active >= self.max_concurrent:
+            return False
+        if self._state == HALF_OPEN:
+            self._probes += 1
+        self._active += 1
+        return True
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.max_wait
+        with self._lock:
+            while not self._try_acquire():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    circuit_rejected(self.name, "bulkhead")
+                    raise BulkheadFullError(self.name, self.max_concurrent)
+                self._slot_released.wait(remaining)
+
+    async def _acquire_async(self):
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    return
+            if time.monotonic() >= deadline:
+                circuit_rejected(self.name, "bulkhead")
+                raise BulkheadFullError(self.name, self.max_concurrent)
+            await asyncio.sleep(0.01)
+
+    def _record(self, success: bool):
+        with self._lock:
+            self._active -= 1
+            self._slot_released.notify()
+            now = self.clock()
+
+            if self._state == HALF_OPEN:
+                if success:
+                    self._set_state(CLOSED)
+                else:
+                    self._set_state(OPEN)
+                return
+            if self._state == OPEN:
+                return
+
+            self._results.append((now, success))
+            self._trim_window(now)
+            calls = len(self._results)
+            if calls >= self.min_calls:
+                failures = sum(1 for _, ok in self._results if not ok)
+                if failures / calls >= self.failure_rate:
+                    self._set_state(OPEN)
+
+    def _release_ignored(self):
+        with self._lock:
+            self._active -= 1
+            self._slot_released.notify()
+            if self._state == HALF_OPEN:
+                self._probes = max(self._probes - 1, 0)
+
+    # Uso
+
+    @contextmanager
+    def guard(self):
+        """Protege un bloque síncrono; cualquier excepción no ignorada cuenta como fallo."""
+        self._acquire()
+        try:
+            yield self
+        except self.ignore_exceptions:
+            self._release_ignored()
+            raise
+        except BaseException:
+            self._record(False)
+            raise
+        else:
+            self._record(True)
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Ejecuta una función síncrona a través del breaker."""
+        with self.guard():
+            return func(*args, **kwargs)
+
+    async def call_async(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Ejecuta una corrutina a través del breaker."""
+        await self._acquire_async()
+        try:
+            result = await func(*args, **kwargs)
+        except self.ignore_exceptions:
+            self._release_ignored()
+            raise
+        except BaseException:
+            self._record(False)
+            raise
+        self._record(True)
+        return result
+
+    def protect(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        """Decorador que protege una función síncrona o asíncrona."""
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await self.call_async(func, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        return wrapper
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """
+    Devuelve el breaker de una dependencia, creándolo la primera vez.
+
+    Los kwargs solo se aplican al crearlo; llamadas posteriores reciben la
+    misma instancia para que todo el proceso comparta estado.
+    """
+    with _registry_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, **kwargs)
+            _breakers[name] = breaker
+        return breaker
+
+def all_breakers() -> Dict[str, Dict[str, Any]]:
+    """Estado de todos los breakers del proceso."""
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
@@ -4,61 +4,82 @@ from app.schemas.user import UserInDB
 from app.services.firebase import get_firebase_client
 from app.core.config import settings
 from app.core.security import decode_token
+from app.core.auth_cache import verify_token_cached, get_profile_cached
+from app.utils.monitoring import track_firestore
 import logging
 
 logger = logging.getLogger(__name__)
 security = HTTPBearer()
 
+def verify_user_token(token: str, auth_client=None) -> str:
+    """
+    Verifica un token (JWT local en desarrollo, Firebase en producción).
+
+    Returns:
+        uid del usuario del token
+
+    Raises:
+        HTTPException: 401 si el token no es válido
+    """
+    if settings.ENVIRONMENT == "development":
+        # En desarrollo, usar JWT local
+        try:
+            payload = verify_token_cached(token, decode_token)
+            user_id = payload.get("sub")
+            if not user_id:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token inválido",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+        except Exception as e:
+            logger.error(f"Error decodificando token JWT: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token inválido",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    else:
+        # En producción, usar Firebase
+        try:
+            if auth_client is None:
+                _, auth_client = get_firebase_client()
+            decoded_token = verify_token_cached(token, auth_client.verify_id_token)
+            user_id = decoded_token['uid']
+        except Exception as e:
+            logger.error(f"Error verificando token Firebase: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token inválido",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    return user_id
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UserInDB:
     """
     Obtiene el usuario actual basado en el token.
     En desarrollo, acepta tokens JWT locales.
     En producción, usa Firebase Authentication.
+    Las claims verificadas y el perfil se cachean en proceso (ver app.core.auth_cache).
     """
     try:
         token = credentials.credentials
         db, auth_client = get_firebase_client()
-        
-        if settings.ENVIRONMENT == "development":
-            # En desarrollo, usar JWT local
-            try:
-                payload = decode_token(token)
-                user_id = payload.get("sub")
-                if not user_id:
-                    raise HTTPException(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        detail="Token inválido",
-                        headers={"WWW-Authenticate": "Bearer"},
-                    )
-            except Exception as e:
-                logger.error(f"Error decodificando token JWT: {str(e)}")
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token inválido",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-        else:
-            # En producción, usar Firebase
-            try:
-                decoded_token = auth_client.verify_id_token(token)
-                user_id = decoded_token['uid']
-            except Exception as e:
-                logger.error(f"Error verificando token Firebase: {str(e)}")
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token inválido",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
+        user_id = verify_user_token(token, auth_client)
         
         # Obtener datos del usuario de Firestore
-        user_doc = db.collection('users').document(user_id).get()
-        if not user_doc.exists:
+        def load_profile(uid: str):
+            with track_firestore('users', 'get'):
+                user_doc = db.collection('users').document(uid).get()
+            return user_doc.to_dict() if user_doc.exists else None
+
+        user_data = get_profile_cached(user_id, load_profile)
+        if user_data is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuario no encontrado"
             )
             
-        user_data = user_doc.to_dict()
         user_data['id'] = user_id
         return UserInDB(**user_data)
         
@@ -4,12 +4,15 @@ import logging
 import time
 from typing import Callable
 from app.api.v1.dependencies.exceptions import AppException, PadelException
+from app.utils.monitoring import observe_http_request, route_label, start_request_documents, HTTP_REQUESTS_IN_PROGRESS
 
 logger = logging.getLogger(__name__)
 
 async def error_handling_middleware(request: Request, call_next: Callable) -> Response:
     """
     Middleware para manejar excepciones de manera global y formatear las respuestas de error.
+    Registra además la latencia, el código de estado y los documentos de
+    Firestore leídos y escritos de cada petición por ruta.
 
     Args:
         request: Objeto Request de FastAPI
@@ -19,10 +22,15 @@ async def error_handling_middleware(request: Request, call_next: Callable) -> Re
         Response objeto de respuesta HTTP
     """
     start_time = time.time()
+    status_code = 500
+    in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(request.method)
+    in_progress.inc()
+    documents = start_request_documents()
 
     try:
         # Intentar ejecutar la solicitud normalmente
         response = await call_next(request)
+        status_code = response.status_code
 
         # Registrar tiempo de respuesta para métricas
         process_time = time.time() - start_time
@@ -33,6 +41,7 @@ async def error_handling_middleware(request: Request, call_next: Callable) -> Re
     except AppException as e:
         # Manejar excepciones específicas de la aplicación
         logger.error(f"Error de aplicación: {e.message}", exc_info=True)
+        status_code = e.status_code
         return JSONResponse(
             status_code=e.status_code,
             content={
@@ -48,6 +57,7 @@ async def error_handling_middleware(request: Request, call_next: Callable) -> Re
     except PadelException as e:
         # Manejar excepciones específicas de pádel
         logger.error(f"Error de pádel: {e.message}", exc_info=True)
+        status_code = e.status_code
         return JSONResponse(
             status_code=e.status_code,
             content={
@@ -73,48 +83,7 @@ async def error_handling_middleware(request: Request, call_next: Callable) -> Re
                 }
             }
         )
-    """
-    Middleware para manejar errores de manera consistente en toda la aplicación.
-    """
-    try:
-        start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        response.headers["X-Process-Time"] = str(process_time)
-        return response
-    except AppException as e:
-        logger.error(f"Error de aplicación: {e.message}", exc_info=True)
-        return JSONResponse(
-            status_code=e.status_code,
-            content={
-                "error": {
-                    "code": e.status_code,
-                    "message": e.message,
-                    "type": e.__class__.__name__
-                }
-            }
-        )
-    except PadelException as e:
-        logger.error(f"Error de dominio: {e.message}", exc_info=True)
-        return JSONResponse(
-            status_code=e.status_code,
-            content={
-                "error": {
-                    "code": e.status_code,
-                    "message": e.message,
-                    "type": e.__class__.__name__
-                }
-            }
-        )
-    except Exception as e:
-        logger.error(f"Error no manejado: {str(e)}", exc_info=True)
-        return JSONResponse(
-            status_code=500,
-            content={
-                "error": {
-                    "code": 500,
-                    "message": "Error interno del servidor",
-                    "type": "InternalServerError"
-                }
-            }
-        )
+
+    finally:
+        in_progress.dec()
+        observe_http_request(request.method, route_label(request), status_code, time.time() - start_time, documents)
@@ -0,0 +1,263 @@
+"""
+Autocompletado de búsquedas con tries de prefijos en memoria.
+
+Cada worker mantiene un trie por categoría de sugerencia:
+
+    - users: ``@usuario`` y nombres de los usuarios
+    - clubs: clubes de los usuarios
+    - content: títulos y ``#etiquetas`` de los posts
+    - searches: términos buscados (búsquedas populares)
+
+Cada nodo guarda sus AUTOCOMPLETE_TOP_K sugerencias de más peso, así que
+sugerir es bajar por el prefijo y devolver la lista del nodo, sin recorrer el
+subárbol. El peso de una sugerencia es el número de documentos que la contienen
+más el número de veces que se ha buscado (SEARCH_WEIGHT por búsqueda).
+
+El trie se actualiza incrementalmente con los mismos cambios on_snapshot que
+alimentan el índice de búsqueda (app.services.search_index); al cambiar un
+documento se restan sus términos anteriores y se suman los nuevos. Las
+búsquedas populares se cargan de search_stats al arrancar y suman en local al
+registrar cada búsqueda.
+
+Las búsquedas son texto libre de los usuarios y las sugerencias se muestran a
+todos: un término solo se sugiere cuando acumula SEARCH_SUGGESTION_MIN_COUNT
+búsquedas, y nunca si parece un email o un teléfono.
+"""
+import heapq
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services import search_index
+from app.services.search_index import fold
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_TOP_K = int(os.getenv("AUTOCOMPLETE_TOP_K", "10"))
+# Términos populares cargados de search_stats al arrancar
+AUTOCOMPLETE_POPULAR_LOAD = int(os.getenv("AUTOCOMPLETE_POPULAR_LOAD", "1000"))
+# Peso de cada búsqueda registrada frente a cada documento que contiene el término
+SEARCH_WEIGHT = 1.0
+# Búsquedas necesarias para que un término se sugiera a todos los usuarios
+SEARCH_SUGGESTION_MIN_COUNT = int(os.getenv("SEARCH_SUGGESTION_MIN_COUNT", "5"))
+# Términos por debajo del mínimo que se recuerdan por proceso
+SEARCH_CANDIDATES_MAX = 50000
+# Datos personales que no se sugieren aunque se busquen mucho
+_PRIVATE_TERM = re.compile(r"\S+@\S+\.\S+|(?:\+?\d[\s.-]?){7,}")
+
+USERS = "users"
+CLUBS = "clubs"
+CONTENT = "content"
+SEARCHES = "searches"
+# Categorías de sugerencias para cada tipo del endpoint
+SUGGESTION_TYPES = {
+    "users": (USERS, CLUBS, SEARCHES),
+    "content": (CONTENT, SEARCHES),
+    "all": (USERS, CLUBS, CONTENT, SEARCHES)
+}
+
+def _normalize(text: Any) -> str:
+    return " ".join(fold(text).split())
+
+def _match_keys(text: str) -> List[str]:
+    """Claves por las que se encuentra un texto: completo y desde cada palabra."""
+    key = _normalize(text).lstrip("@#")
+    words = key.split(" ")
+    return list(dict.fromkeys(" ".join(words[i:]) for i in range(len(words)) if words[i]))
+
+def _rank(candidates: Iterable[Tuple[float, str]], k: int) -> List[Tuple[float, str]]:
+    return heapq.nsmallest(k, candidates, key=lambda c: (-c[0], c[1]))
+
+class _Node:
+    __slots__ = ("children", "entries", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        # Sugerencias que terminan en este nodo: texto mostrado -> peso
+        self.entries: Dict[str, float] = {}
+        self.top: List[Tuple[float, str]] = []
+
+class PrefixTrie:
+    """Trie de prefijos con las top-k sugerencias por peso precalculadas en cada nodo."""
+
+    def __init__(self, top_k: int = AUTOCOMPLETE_TOP_K):
+        self.top_k = top_k
+        self.root = _Node()
+        self._lock = threading.Lock()
+
+    def add(self, display: str, weight: float = 1.0) -> None:
+        """Suma peso (o lo resta, si es negativo) a una sugerencia."""
+        for key in _match_keys(display):
+            with self._lock:
+                self._add_key(key, display, weight)
+
+    def _add_key(self, key: str, display: str, weight: float) -> None:
+        path = [self.root]
+        node = self.root
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                if weight <= 0:
+                    return
+                child = node.children[char] = _Node()
+            path.append(child)
+            node = child
+
+        total = node.entries.get(display, 0.0) + weight
+        if total > 0:
+            node.entries[display] = total
+        else:
+            node.entries.pop(display, None)
+
+        # Recalcular top-k de abajo arriba y podar nodos vacíos
+        for depth in range(len(path) - 1, -1, -1):
+            current = path[depth]
+            if depth and not current.entries and not current.children:
+                del path[depth - 1].children[key[depth - 1]]
+                continue
+            candidates = [(w, d) for d, w in current.entries.items()]
+            for child in current.children.values():
+                candidates.extend(child.top)
+            current.top = _rank(candidates, self.top_k)
+
+    def suggest(self, prefix: str, k: Optional[int] = None) -> List[Tuple[float, str]]:
+        """Top-k (peso, texto) de las sugerencias que empiezan por el prefijo."""
+        node = self.root
+        for char in _normalize(prefix).lstrip("@#"):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.top[:k or self.top_k]
+
+def _document_terms(kind: str, data: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(categoría, texto) de las sugerencias que aporta un documento indexado."""
+    if kind == search_index.USER_KIND:
+        terms = []
+        if data.get("username"):
+            terms.append((USERS, f"@{data['username']}"))
+        if data.get("name"):
+            terms.append((USERS, data["name"]))
+        terms.extend((CLUBS, club) for club in data.get("clubs") or [] if club)
+        return terms
+    if kind == "post":
+        terms = [(CONTENT, data["title"])] if data.get("title") else []
+        terms.extend((CONTENT, f"#{tag}") for tag in data.get("tags") or [] if tag)
+        return terms
+    return []
+
+class Autocomplete:
+    """Tries de sugerencias de un proceso."""
+
+    def __init__(self, top_k: int = AUTOCOMPLETE_TOP_K):
+        self.top_k = top_k
+        self.tries = {category: PrefixTrie(top_k) for category in (USERS, CLUBS, CONTENT, SEARCHES)}
+        self._doc_terms: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+        self._doc_lock = threading.Lock()
+        self._popular_loaded = False
+        # Búsquedas acumuladas por término normalizado (solo hasta llegar al mínimo)
+        self._search_counts: Dict[str, int] = {}
+        self._search_lock = threading.Lock()
+
+    def _replace_terms(self, kind: str, doc_id: str, terms: List[Tuple[str, str]]) -> None:
+        with self._doc_lock:
+            previous = self._doc_terms.pop((kind, doc_id), [])
+            if terms:
+                self._doc_terms[(kind, doc_id)] = terms
+        if previous == terms:
+            return
+        for category, display in previous:
+            self.tries[category].add(display, -1.0)
+        for category, display in terms:
+            self.tries[category].add(display, 1.0)
+
+    def on_index_change(self, kind: str, upserts: Sequence[Tuple[str, Dict[str, Any]]], removals: Sequence[str]) -> None:
+        """Listener de app.services.search_index."""
+        for doc_id, data in upserts:
+            self._replace_terms(kind, doc_id, _document_terms(kind, data or {}))
+        for doc_id in removals:
+            self._replace_terms(kind, doc_id, [])
+
+    def record_search(self, term: str, count: int = 1) -> None:
+        key = _normalize(term)
+        if not key or _PRIVATE_TERM.search(term):
+            return
+        with self._search_lock:
+            previous = self._search_counts.get(key, 0)
+            total = previous + count
+            if previous >= SEARCH_SUGGESTION_MIN_COUNT:
+                weight = count
+            elif total >= SEARCH_SUGGESTION_MIN_COUNT:
+                # Llega al mínimo: entra con todas sus búsquedas
+                weight = total
+            else:
+                weight = 0
+            if len(self._search_counts) >= SEARCH_CANDIDATES_MAX and key not in self._search_counts:
+                # Se olvidan los términos que no llegaron al mínimo
+                self._search_counts = {k: c for k, c in self._search_counts.items() if c >= SEARCH_SUGGESTION_MIN_COUNT}
+            self._search_counts[key] = total
+        if weight:
+            self.tries[SEARCHES].add(term.strip(), SEARCH_WEIGHT * weight)
+
+    def load_popular(self, db, limit: int = AUTOCOMPLETE_POPULAR_LOAD) -> int:
+        """Carga una vez los términos más buscados de search_stats."""
+        if self._popular_loaded:
+            return 0
+        self._popular_loaded = True
+        docs = db.collection("search_stats").order_by("count", direction="DESCENDING").limit(limit).get()
+        loaded = 0
+        for doc in docs:
+            data = doc.to_dict() or {}
+            if data.get("term") and data.get("count"):
+                self.record_search(data["term"], data["count"])
+                loaded += 1
+        logger.info(f"[Autocomplete] {loaded} búsquedas populares cargadas")
+        return loaded
+
+    def suggest(self, prefix: str, type: Optional[str] = None, limit: Optional[int] = None) -> List[str]:
+        """Sugerencias de más peso entre las categorías del tipo pedido, sin repetidos."""
+        limit = limit or self.top_k
+        categories = SUGGESTION_TYPES.get(type or "all", SUGGESTION_TYPES["all"])
+        candidates = []
+        for category in categories:
+            candidates.extend(self.tries[category].suggest(prefix, limit))
+        suggestions = []
+        for _, display in _rank(candidates, len(candidates)):
+            if display not in suggestions:
+                suggestions.append(display)
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+_autocomplete: Optional[Autocomplete] = None
+_autocomplete_lock = threading.Lock()
+
+def get_autocomplete() -> Autocomplete:
+    """Autocompletado del proceso."""
+    global _autocomplete
+    with _autocomplete_lock:
+        if _autocomplete is None:
+            _autocomplete = Autocomplete()
+        return _autocomplete
+
+def set_autocomplete(autocomplete: Optional[Autocomplete]) -> None:
+    """Sustituye el autocompletado del proceso (pruebas)."""
+    global _autocomplete
+    _autocomplete = autocomplete
+
+def start(db) -> Autocomplete:
+    """Arranca el índice que alimenta los tries y carga las búsquedas populares (idempotente)."""
+    autocomplete = get_autocomplete()
+    search_index.start_sync(db)
+    try:
+        autocomplete.load_popular(db)
+    except Exception as e:
+        logger.error(f"[Autocomplete] Error al cargar búsquedas populares: {str(e)}")
+    return autocomplete
+
+def _on_index_change(kind, upserts, removals):
+    get_autocomplete().on_index_change(kind, upserts, removals)
+
+# Registrado al importar para no perder la carga inicial del índice
+search_index.add_change_listener(_on_index_change)
@@ -0,0 +1,193 @@
+"""
+Lectura por lotes de documentos a partir de listas de IDs o valores.
+
+Firestore limita el operador ``in`` a 30 valores y una consulta con más falla.
+Este módulo centraliza las lecturas de "todos los documentos de estos IDs":
+
+    - Elimina duplicados y valores vacíos conservando el orden.
+    - Trocea la lista al límite del backend (30 para ``in``, GET_ALL_CHUNK_SIZE
+      referencias por ``get_all``).
+    - Lanza los trozos en paralelo, de modo que la latencia es la del trozo más
+      lento y no la suma de todos.
+    - Usa ``get_all`` sobre referencias cuando se buscan documentos por ID.
+    - Devuelve un diccionario ordenado como la lista de entrada.
+
+Ejemplo:
+    users = get_many(db, "users", sender_ids, field_paths=["name", "profile_picture"])
+    reactions = query_in(db, "comment_reactions", "comment_id", comment_ids)
+"""
+import asyncio
+import contextvars
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.utils.monitoring import count_documents, track_firestore
+
+logger = logging.getLogger(__name__)
+
+# Límite de valores del operador 'in' (y 'array_contains_any') en Firestore
+IN_QUERY_LIMIT = 30
+# Referencias por llamada a get_all
+GET_ALL_CHUNK_SIZE = int(os.getenv("BULK_FETCH_GET_ALL_CHUNK", "100"))
+# Trozos leídos en paralelo como máximo
+BULK_FETCH_CONCURRENCY = int(os.getenv("BULK_FETCH_CONCURRENCY", "8"))
+
+Filter = Tuple[str, str, Any]
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BULK_FETCH_CONCURRENCY, thread_name_prefix="bulk-fetch")
+    return _executor
+
+def unique(values: Iterable[Any]) -> List[Any]:
+    """Valores no vacíos sin duplicados, en el orden de primera aparición."""
+    return list(dict.fromkeys(v for v in values if v))
+
+def chunked(values: Sequence[Any], size: int = IN_QUERY_LIMIT) -> List[Sequence[Any]]:
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+def run_chunks(func, chunks: List[Sequence[Any]]) -> List[Any]:
+    """Ejecuta func sobre cada trozo en paralelo y devuelve los resultados en orden."""
+    if len(chunks) <= 1:
+        return [func(chunk) for chunk in chunks]
+    # Cada hilo corre con el contexto del llamador (métricas de la petición en curso)
+    contexts = [contextvars.copy_context() for _ in chunks]
+    return list(_get_executor().map(lambda pair: pair[0].run(func, pair[1]), zip(contexts, chunks)))
+
+def get_many(
+    db,
+    collection: str,
+    ids: Iterable[str],
+    field_paths: Optional[List[str]] = None,
+    chunk_size: int = GET_ALL_CHUNK_SIZE
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Obtiene documentos por ID con get_all, en trozos paralelos.
+
+    Returns:
+        Diccionario {id: datos} en el orden de ids; los inexistentes se omiten
+    """
+    unique_ids = unique(ids)
+    if not unique_ids:
+        return {}
+
+    def fetch(chunk):
+        refs = [db.collection(collection).document(doc_id) for doc_id in chunk]
+        with track_firestore(collection, "get_all"):
+            return {doc.id: doc.to_dict() for doc in db.get_all(refs, field_paths=field_paths) if doc.exists}
+
+    found: Dict[str, Dict[str, Any]] = {}
+    for result in run_chunks(fetch, chunked(unique_ids, chunk_size)):
+        found.update(result)
+    return {doc_id: found[doc_id] for doc_id in unique_ids if doc_id in found}
+
+def get_many_docs(db, collection: str, ids: Iterable[str], chunk_size: int = GET_ALL_CHUNK_SIZE) -> List[Any]:
+    """Como get_many, pero devuelve los snapshots existentes (para acceder a id y reference)."""
+    unique_ids = unique(ids)
+
+    def fetch(chunk):
+        refs = [db.collection(collection).document(doc_id) for doc_id in chunk]
+        with track_firestore(collection, "get_all"):
+            return {doc.id: doc for doc in db.get_all(refs) if doc.exists}
+
+    found: Dict[str, Any] = {}
+    for result in run_chunks(fetch, chunked(unique_ids, chunk_size)):
+        found.update(result)
+    return [found[doc_id] for doc_id in unique_ids if doc_id in found]
+
+def query_in(
+    db,
+    collection: str,
+    field: str,
+    values: Iterable[Any],
+    filters: Sequence[Filter] = ()
+) -> List[Any]:
+    """
+    Consulta ``field in values`` troceando values al límite de Firestore.
+
+    Args:
+        filters: Filtros adicionales (campo, operador, valor) aplicados a cada trozo
+
+    Returns:
+        Snapshots de los documentos encontrados, sin duplicados
+    """
+    unique_values = unique(values)
+    if not unique_values:
+        return []
+
+    def fetch(chunk):
+        query = db.collection(collection)
+        for f_field, op, value in filters:
+            query = query.where(f_field, op, value)
+        with track_firestore(collection, "query"):
+            return list(query.where(field, "in", list(chunk)).get())
+
+    docs: Dict[str, Any] = {}
+    for result in run_chunks(fetch, chunked(unique_values)):
+        for doc in result:
+            docs.setdefault(doc.id, doc)
+    return list(docs.values())
+
+def group_by(docs: Iterable[Any], field: str) -> Dict[Any, List[Dict[str, Any]]]:
+    """Agrupa los datos de varios snapshots por el valor de un campo."""
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    for doc in docs:
+        data = doc.to_dict()
+        groups.setdefault(data.get(field), []).append(data)
+    return groups
+
+async def get_many_async(
+    db,
+    collection: str,
+    ids: Iterable[str],
+    field_paths: Optional[List[str]] = None,
+    chunk_size: int = GET_ALL_CHUNK_SIZE
+) -> Dict[str, Dict[str, Any]]:
+    """Versión asíncrona de get_many sobre AsyncClient; los trozos se lanzan con gather."""
+    unique_ids = unique(ids)
+    if not unique_ids:
+        return {}
+
+    async def fetch(chunk):
+        refs = [db.collection(collection).document(doc_id) for doc_id in chunk]
+        with track_firestore(collection, "get_all"):
+            docs = [doc async for doc in db.get_all(refs, field_paths=field_paths)]
+        count_documents("read", len(docs))
+        return {doc.id: doc.to_dict() for doc in docs if doc.exists}
+
+    found: Dict[str, Dict[str, Any]] = {}
+    for result in await asyncio.gather(*(fetch(chunk) for chunk in chunked(unique_ids, chunk_size))):
+        found.update(result)
+    return {doc_id: found[doc_id] for doc_id in unique_ids if doc_id in found}
+
+async def query_in_async(
+    db,
+    collection: str,
+    field: str,
+    values: Iterable[Any],
+    filters: Sequence[Filter] = ()
+) -> List[Any]:
+    """Versión asíncrona de query_in sobre AsyncClient."""
+    unique_values = unique(values)
+    if not unique_values:
+        return []
+
+    async def fetch(chunk):
+        query = db.collection(collection)
+        for f_field, op, value in filters:
+            query = query.where(f_field, op, value)
+        with track_firestore(collection, "query"):
+            result = await query.where(field, "in", list(chunk)).get()
+        count_documents("read", len(result))
+        return result
+
+    docs: Dict[str, Any] = {}
+    for result in await asyncio.gather(*(fetch(chunk) for chunk in chunked(unique_values))):
+        for doc in result:
+            docs.setdefault(doc.id, doc)
+    return list(docs.values())
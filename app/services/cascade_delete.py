@@ -0,0 +1,471 @@
+"""
+Borrados en cascada en segundo plano.
+
+El endpoint borra solo la raíz (post, cuenta o amistad), de modo que deja de
+verse al instante, y llama a start_deletion(): se crea el registro
+deletions/{kind}:{root_id} y se encola un trabajo cascade_delete. El worker
+(app.worker) borra los dependientes con run_deletion():
+
+    - Cada tipo tiene una lista ordenada de pasos (STEPS). Cada paso borra por
+      lotes de BATCH_SIZE documentos por commit y, en el mismo commit, suma lo
+      borrado a ``progress.<paso>`` del registro y ajusta los contadores
+      afectados, así que progreso, contadores y borrados no se desincronizan.
+    - Al terminar un paso se guarda ``step``; si el trabajo falla, el
+      reintento continúa desde ese paso. Los pasos son idempotentes (borran lo
+      que quede), así que repetir uno a medias no hace daño.
+    - ``status`` pasa por pending -> running -> completed (o retrying/failed).
+      /tasks/resume_deletions vuelve a encolar los registros que no terminaron.
+    - Un trabajo reclama el registro en una transacción (``lease_owner`` y
+      ``lease_until``, que cada commit prolonga) antes de ejecutar pasos. Si
+      otro trabajo lo tiene reclamado, falla con DeletionInProgress y se
+      reintenta más tarde: dos trabajos nunca borran a la vez la misma página,
+      que restaría dos veces los contadores.
+    - Al borrar una amistad solo se eliminan las solicitudes y bloqueos entre
+      ambos creados antes de la petición (``requested_at``); un bloqueo
+      posterior, hecho mientras el trabajo esperaba en la cola, se conserva.
+    - Los posts y amistades de una cuenta siguen como borrados propios: su
+      registro se escribe en el mismo commit que borra el documento y se
+      encola después, así que si el worker cae entre ambos el registro queda
+      en pending y no se pierden sus dependientes.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from firebase_admin import firestore, storage
+
+from app.services import counters, leaderboard, timeline
+from app.services.bulk_fetch import IN_QUERY_LIMIT, chunked
+from app.services.job_queue import CASCADE_DELETE_JOB, Job, enqueue_job
+from app.utils.monitoring import track_firestore
+
+logger = logging.getLogger(__name__)
+
+DELETIONS_COLLECTION = "deletions"
+# Borrados por commit; deja hueco para contadores y progreso (Firestore admite 500)
+BATCH_SIZE = 400
+# Comentarios por página: sus reacciones y reportes se borran antes que ellos
+COMMENTS_PAGE_SIZE = 100
+# Estados que /tasks/resume_deletions vuelve a encolar
+UNFINISHED = ("pending", "retrying", "failed")
+# Duración del reclamo de un registro por un trabajo; cada commit lo prolonga
+DELETION_LEASE_SECONDS = 900
+
+POST = "post"
+USER = "user"
+FRIENDSHIP = "friendship"
+
+class DeletionInProgress(Exception):
+    """Otro trabajo está ejecutando el mismo borrado; se reintenta más tarde."""
+
+def deletion_id(kind: str, root_id: str) -> str:
+    return f"{kind}:{root_id}"
+
+def _job_id(record_id: str) -> str:
+    return f"{CASCADE_DELETE_JOB}:{record_id}"
+
+def _as_utc(value: datetime) -> datetime:
+    # Firestore devuelve fechas con zona; las escritas con datetime.now() no la llevan
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def _lease_deadline() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=DELETION_LEASE_SECONDS)
+
+def _progress(step: str, count: int) -> Dict[str, Any]:
+    """Campos del registro que se escriben con cada lote borrado."""
+    return {
+        "progress": {step: firestore.Increment(count)},
+        "lease_until": _lease_deadline(),
+        "updated_at": datetime.utcnow()
+    }
+
+def delete_query(
+    db,
+    deletion_ref,
+    step: str,
+    query,
+    extra: Optional[Callable[[Any, List[Any]], None]] = None,
+    after: Optional[Callable[[List[Any]], None]] = None
+) -> int:
+    """
+    Borra por lotes todos los documentos de una consulta.
+
+    Args:
+        extra: Escrituras adicionales para el mismo batch (batch, docs)
+        after: Llamada tras confirmar cada lote (docs)
+
+    Returns:
+        Número de documentos borrados
+    """
+    deleted = 0
+    while True:
+        with track_firestore(DELETIONS_COLLECTION, "cascade_query"):
+            docs = list(query.limit(BATCH_SIZE).get())
+        if not docs:
+            break
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        if extra is not None:
+            extra(batch, docs)
+        batch.set(deletion_ref, _progress(step, len(docs)), merge=True)
+        with track_firestore(DELETIONS_COLLECTION, "cascade_delete"):
+            batch.commit()
+        if after is not None:
+            after(docs)
+        deleted += len(docs)
+        if len(docs) < BATCH_SIZE:
+            break
+    return deleted
+
+def _created_before(doc, cutoff: datetime) -> bool:
+    created_at = (doc.to_dict() or {}).get("created_at")
+    return not isinstance(created_at, datetime) or _as_utc(created_at) < _as_utc(cutoff)
+
+def _delete_pair_queries(
+    db,
+    ref,
+    step: str,
+    collection: str,
+    fields: Tuple[str, str],
+    user_ids: Sequence[str],
+    before: Optional[datetime] = None
+) -> int:
+    """Documentos de una colección que relacionan a dos usuarios entre sí (creados antes de before, si se indica)."""
+    query = db.collection(collection).where(fields[0], "in", list(user_ids)).where(fields[1], "in", list(user_ids))
+    if before is None:
+        return delete_query(db, ref, step, query)
+    # Entre dos usuarios hay pocos documentos: se filtran en memoria
+    with track_firestore(DELETIONS_COLLECTION, "cascade_query"):
+        docs = [doc for doc in query.get() if _created_before(doc, before)]
+    if not docs:
+        return 0
+    batch = db.batch()
+    for doc in docs:
+        batch.delete(doc.reference)
+    batch.set(ref, _progress(step, len(docs)), merge=True)
+    with track_firestore(DELETIONS_COLLECTION, "cascade_delete"):
+        batch.commit()
+    return len(docs)
+
+def _delete_by_fields(db, ref, step: str, collection: str, fields: Sequence[str], value: str, **kwargs) -> int:
+    return sum(delete_query(db, ref, step, db.collection(collection).where(field, "==", value), **kwargs) for field in fields)
+
+# Pasos de un post: payload {post_id, user_id, media_urls}
+
+def _post_media(db, ref, payload):
+    if not payload.get("media_urls"):
+        return
+    bucket = storage.bucket()
+    for media_url in payload["media_urls"]:
+        try:
+            file_name = media_url.split("/")[-1]
+            bucket.blob(f"posts/{payload['user_id']}/{file_name}").delete()
+        except Exception as e:
+            # Un archivo que ya no existe no debe bloquear el borrado
+            logger.warning(f"[Cascade] No se pudo eliminar {media_url}: {str(e)}")
+
+def _post_timelines(db, ref, payload):
+    timeline.remove_post(db, payload["post_id"])
+
+def _post_reactions(db, ref, payload):
+    delete_query(db, ref, "post_reactions", db.collection("post_reactions").where("post_id", "==", payload["post_id"]))
+
+def _post_reports(db, ref, payload):
+    delete_query(db, ref, "post_reports", db.collection("post_reports").where("post_id", "==", payload["post_id"]))
+
+def _decrement_comment_authors(db):
+    def extra(batch, docs):
+        by_author: Dict[str, int] = {}
+        for doc in docs:
+            author_id = (doc.to_dict() or {}).get("user_id")
+            by_author[author_id] = by_author.get(author_id, 0) + 1
+        for author_id, deleted in by_author.items():
+            counters.increment(db, author_id, "comments", -deleted, batch=batch)
+    return extra
+
+def _post_comments(db, ref, payload):
+    comments_query = db.collection("comments").where("post_id", "==", payload["post_id"])
+    while True:
+        comments = list(comments_query.limit(COMMENTS_PAGE_SIZE).get())
+        if not comments:
+            break
+        for ids in chunked([c.id for c in comments], IN_QUERY_LIMIT):
+            delete_query(db, ref, "comment_reactions", db.collection("comment_reactions").where("comment_id", "in", list(ids)))
+            delete_query(db, ref, "comment_reports", db.collection("comment_reports").where("comment_id", "in", list(ids)))
+        # Los comentarios de la página, con el contador de sus autores en el mismo commit
+        batch = db.batch()
+        for comment in comments:
+            batch.delete(comment.reference)
+        _decrement_comment_authors(db)(batch, comments)
+        batch.set(ref, _progress("comments", len(comments)), merge=True)
+        batch.commit()
+        if len(comments) < COMMENTS_PAGE_SIZE:
+            break
+
+# Pasos de una cuenta: payload {user_id}
+
+def _user_posts(db, ref, payload):
+    # El registro de cada post va en el batch que lo borra: si el worker cae
+    # antes de encolarlo, /tasks/resume_deletions lo encuentra en pending
+    def extra(batch, posts):
+        for post in posts:
+            data = post.to_dict() or {}
+            _record_deletion(db, batch, POST, post.id, {
+                "post_id": post.id,
+                "user_id": payload["user_id"],
+                "media_urls": data.get("media_urls", [])
+            })
+
+    def after(posts):
+        for post in posts:
+            _enqueue_deletion(deletion_id(POST, post.id))
+    delete_query(db, ref, "posts", db.collection("posts").where("user_id", "==", payload["user_id"]), extra=extra, after=after)
+
+def _user_friendships(db, ref, payload):
+    user_id = payload["user_id"]
+
+    def others(docs):
+        for doc in docs:
+            data = doc.to_dict() or {}
+            yield data.get("user2_id") if data.get("user1_id") == user_id else data.get("user1_id")
+
+    def extra(batch, docs):
+        requested_at = datetime.utcnow()
+        for doc, other_id in zip(docs, others(docs)):
+            counters.increment(db, other_id, "friends", -1, batch=batch)
+            # La limpieza de los timelines sigue como borrado de la amistad
+            _record_deletion(db, batch, FRIENDSHIP, doc.id, {"user_ids": [user_id, other_id], "requested_at": requested_at})
+
+    def after(docs):
+        for doc in docs:
+            _enqueue_deletion(deletion_id(FRIENDSHIP, doc.id))
+
+    _delete_by_fields(db, ref, "friendships", "friendships", ("user1_id", "user2_id"), user_id, extra=extra, after=after)
+
+def _user_requests(db, ref, payload):
+    _delete_by_fields(db, ref, "friendship_requests", "friendship_requests", ("sender_id", "receiver_id"), payload["user_id"])
+
+def _user_blocks(db, ref, payload):
+    _delete_by_fields(db, ref, "blocked_users", "blocked_users", ("blocker_id", "blocked_id"), payload["user_id"])
+
+def _user_notifications(db, ref, payload):
+    _delete_by_fields(db, ref, "notifications", "notifications", ("user_id",), payload["user_id"])
+
+def _user_reactions(db, ref, payload):
+    _delete_by_fields(db, ref, "post_reactions", "post_reactions", ("user_id",), payload["user_id"])
+
+def _user_timeline(db, ref, payload):
+    timeline_ref = db.collection(timeline.TIMELINES_COLLECTION).document(payload["user_id"])
+    delete_query(db, ref, "timeline", timeline_ref.collection(timeline.ENTRIES_SUBCOLLECTION))
+    timeline_ref.delete()
+
+# Documentos de gamificación con el uid como ID (fuentes de la tabla de líderes)
+GAMIFICATION_COLLECTIONS = ("user_points", "user_achievements", "user_stats", "user_rewards")
+
+def _user_gamification(db, ref, payload):
+    user_id = payload["user_id"]
+    delete_query(db, ref, "gamification", db.collection("achievement_history").where("user_id", "==", user_id))
+    delete_query(db, ref, "gamification", db.collection("reward_history").where("user_id", "==", user_id))
+    batch = db.batch()
+    for collection in GAMIFICATION_COLLECTIONS:
+        batch.delete(db.collection(collection).document(user_id))
+    batch.commit()
+    # Después de Firestore: una reconciliación posterior ya no lo vuelve a añadir
+    leaderboard.remove_user(user_id)
+
+def _user_private_docs(db, ref, payload):
+    db.collection("user_search_history").document(payload["user_id"]).delete()
+    counters.reset(db, payload["user_id"])
+
+# Pasos de una amistad: payload {user_ids, requested_at}
+
+def _friendship_timelines(db, ref, payload):
+    timeline.on_friendship_removed(db, *payload["user_ids"])
+
+def _friendship_requests(db, ref, payload):
+    _delete_pair_queries(
+        db, ref, "friendship_requests", "friendship_requests", ("sender_id", "receiver_id"),
+        payload["user_ids"], before=payload.get("requested_at")
+    )
+
+def _friendship_blocks(db, ref, payload):
+    _delete_pair_queries(
+        db, ref, "blocked_users", "blocked_users", ("blocker_id", "blocked_id"),
+        payload["user_ids"], before=payload.get("requested_at")
+    )
+
+STEPS: Dict[str, List[Tuple[str, Callable[[Any, Any, Dict[str, Any]], None]]]] = {
+    POST: [
+        ("media", _post_media),
+        ("timelines", _post_timelines),
+        ("post_reactions", _post_reactions),
+        ("post_reports", _post_reports),
+        ("comments", _post_comments)
+    ],
+    USER: [
+        ("posts", _user_posts),
+        ("friendships", _user_friendships),
+        ("friendship_requests", _user_requests),
+        ("blocked_users", _user_blocks),
+        ("notifications", _user_notifications),
+        ("post_reactions", _user_reactions),
+        ("timeline", _user_timeline),
+        ("gamification", _user_gamification),
+        ("private", _user_private_docs)
+    ],
+    FRIENDSHIP: [
+        ("timelines", _friendship_timelines),
+        ("friendship_requests", _friendship_requests),
+        ("blocked_users", _friendship_blocks)
+    ]
+}
+
+def start_deletion(db, kind: str, root_id: str, payload: Dict[str, Any]) -> str:
+    """
+    Registra el borrado en cascada de una raíz ya eliminada y encola el trabajo.
+
+    Returns:
+        ID del registro en deletions (para consultar el progreso)
+    """
+    if kind not in STEPS:
+        raise ValueError(f"Tipo de borrado desconocido: {kind}")
+    record_id = deletion_id(kind, root_id)
+    db.collection(DELETIONS_COLLECTION).document(record_id).set(_deletion_record(kind, root_id, payload))
+    _enqueue_deletion(record_id)
+    return record_id
+
+def _record_deletion(db, batch, kind: str, root_id: str, payload: Dict[str, Any]) -> None:
+    """Añade al batch el registro pending de un borrado; se encola tras el commit."""
+    record_ref = db.collection(DELETIONS_COLLECTION).document(deletion_id(kind, root_id))
+    batch.set(record_ref, _deletion_record(kind, root_id, payload))
+
+def _deletion_record(kind: str, root_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "kind": kind,
+        "root_id": root_id,
+        "payload": payload,
+        "status": "pending",
+        "step": 0,
+        "steps": [name for name, _ in STEPS[kind]],
+        "progress": {},
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+
+def _enqueue_deletion(record_id: str) -> None:
+    try:
+        enqueue_job(CASCADE_DELETE_JOB, {"deletion_id": record_id}, job_id=_job_id(record_id))
+    except Exception as e:
+        # Queda en pending: /tasks/resume_deletions lo vuelve a encolar
+        logger.error(f"[Cascade] Error al encolar el borrado {record_id}: {str(e)}")
+
+def get_progress(db, record_id: str) -> Optional[Dict[str, Any]]:
+    """Estado del borrado: status, paso actual y documentos borrados por paso."""
+    doc = db.collection(DELETIONS_COLLECTION).document(record_id).get()
+    if not doc.exists:
+        return None
+    data = doc.to_dict()
+    return {
+        "deletion_id": record_id,
+        "kind": data.get("kind"),
+        "status": data.get("status"),
+        "step": data.get("step", 0),
+        "steps": data.get("steps", []),
+        "progress": data.get("progress", {}),
+        "error": data.get("error"),
+        "updated_at": data.get("updated_at")
+    }
+
+def _claim_in_transaction(transaction, ref, owner: str) -> Optional[Dict[str, Any]]:
+    """Reclama el registro para el trabajo owner; devuelve sus datos (None si no existe)."""
+    snapshot = ref.get(transaction=transaction)
+    if not snapshot.exists:
+        return None
+    data = snapshot.to_dict()
+    if data.get("status") == "completed":
+        return data
+    lease_until = data.get("lease_until")
+    if (
+        data.get("status") == "running"
+        and data.get("lease_owner") not in (None, owner)
+        and isinstance(lease_until, datetime)
+        and _as_utc(lease_until) > datetime.now(timezone.utc)
+    ):
+        raise DeletionInProgress(f"El borrado {ref.id} lo está ejecutando {data.get('lease_owner')}")
+    transaction.update(ref, {
+        "status": "running",
+        "lease_owner": owner,
+        "lease_until": _lease_deadline(),
+        "attempts": firestore.Increment(1),
+        "updated_at": datetime.utcnow()
+    })
+    return data
+
+def run_deletion(job: Job, pipeline=None, db=None) -> Dict[str, Any]:
+    """
+    Handler del worker para los trabajos cascade_delete.
+
+    Raises:
+        DeletionInProgress: Si otro trabajo tiene reclamado el registro (se reintenta)
+    """
+    db = db or firestore.client()
+    record_id = job.payload["deletion_id"]
+    ref = db.collection(DELETIONS_COLLECTION).document(record_id)
+    # El mismo trabajo reentregado (worker caído) puede retomar su propio reclamo
+    claim = firestore.transactional(_claim_in_transaction)
+    data = claim(db.transaction(), ref, job.id)
+    if data is None:
+        logger.warning(f"[Cascade] Registro de borrado {record_id} no encontrado")
+        return {"status": "missing"}
+    if data.get("status") == "completed":
+        return {"status": "completed"}
+
+    steps = STEPS[data["kind"]]
+    start = data.get("step", 0)
+    try:
+        for index in range(start, len(steps)):
+            name, step = steps[index]
+            step(db, ref, data.get("payload", {}))
+            ref.update({"step": index + 1, "lease_until": _lease_deadline(), "updated_at": datetime.utcnow()})
+            logger.info(f"[Cascade] {record_id}: paso {name} completado ({index + 1}/{len(steps)})")
+    except Exception as e:
+        ref.update({
+            "status": "failed" if job.is_last_attempt else "retrying",
+            "error": str(e),
+            "lease_owner": None,
+            "lease_until": None,
+            "updated_at": datetime.utcnow()
+        })
+        raise
+    ref.update({
+        "status": "completed",
+        "error": None,
+        "lease_owner": None,
+        "lease_until": None,
+        "completed_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    })
+    logger.info(f"[Cascade] Borrado {record_id} completado")
+    return {"status": "completed"}
+
+def resume_unfinished(db, limit: int = 100) -> List[str]:
+    """
+    Vuelve a encolar los borrados sin terminar; continúan desde su paso.
+
+    Los pendientes y en reintento usan el ID de trabajo original, así que no se
+    duplican si su trabajo sigue en la cola. Los fallidos agotaron ese trabajo:
+    se encolan con un ID por intento (volver a llamar no los duplica). En
+    cualquier caso el reclamo de run_deletion impide dos ejecuciones a la vez.
+    """
+    resumed = []
+    for status in UNFINISHED:
+        for doc in db.collection(DELETIONS_COLLECTION).where("status", "==", status).limit(limit).get():
+            job_id = _job_id(doc.id)
+            if status == "failed":
+                job_id = f"{job_id}:resume:{(doc.to_dict() or {}).get('attempts', 0)}"
+            enqueue_job(CASCADE_DELETE_JOB, {"deletion_id": doc.id}, job_id=job_id)
+            resumed.append(doc.id)
+    if resumed:
+        logger.info(f"[Cascade] {len(resumed)} borrados reanudados")
+    return resumed
@@ -0,0 +1,147 @@
+"""
+Contadores agregados por usuario para el dashboard y la actividad.
+
+Cada usuario tiene en user_counters/{user_id}/shards unos pocos documentos
+pequeños con sus totales (posts, comentarios, amigos, partidos...). Las
+escrituras suman con ``firestore.Increment`` en un shard elegido al azar, de
+modo que ráfagas de escrituras sobre el mismo usuario no compiten por un único
+documento; leer todos los contadores es una sola consulta de COUNTER_SHARDS
+documentos, sin importar cuánto historial tenga el usuario.
+
+Siembra: la primera lectura de un contador que todavía no existe lo inicializa
+con una agregación ``count()`` en el servidor y guarda la diferencia con lo ya
+incrementado en el documento ``seed-<contador>``. Ese documento se crea con
+``create()``, que falla si ya existe, así que dos lecturas simultáneas no
+siembran dos veces.
+
+Los contadores cuyas colecciones no se escriben desde esta API (p. ej. los
+análisis de video, que escribe el pipeline) no se materializan: se resuelven
+siempre con ``count()``, que tampoco descarga los documentos.
+"""
+import logging
+import os
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists
+
+from app.utils.monitoring import track_firestore
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_COLLECTION = "user_counters"
+SHARDS_SUBCOLLECTION = "shards"
+COUNTER_SHARDS = int(os.getenv("COUNTER_SHARDS", "4"))
+SEED_PREFIX = "seed-"
+
+# (colección, campo del usuario, operador) de las consultas que cuentan cada contador
+CountQuery = Tuple[str, str, str]
+
+COUNTERS: Dict[str, Dict] = {
+    "posts": {"queries": [("posts", "user_id", "==")], "materialized": True},
+    "comments": {"queries": [("comments", "user_id", "==")], "materialized": True},
+    "friends": {
+        "queries": [("friendships", "user1_id", "=="), ("friendships", "user2_id", "==")],
+        "materialized": True
+    },
+    "matches": {"queries": [("matches", "players", "array_contains")], "materialized": True},
+    "videos": {"queries": [("video_analysis", "user_id", "==")], "materialized": False},
+    "likes": {"queries": [("likes", "user_id", "==")], "materialized": False},
+    "social": {"queries": [("social_interactions", "user_id", "==")], "materialized": False},
+}
+
+def _shards_ref(db, user_id: str):
+    return db.collection(COUNTERS_COLLECTION).document(user_id).collection(SHARDS_SUBCOLLECTION)
+
+def increment(db, user_id: str, counter: str, amount: int = 1, batch=None) -> None:
+    """
+    Suma amount (negativo para restar) a un contador materializado del usuario.
+
+    Args:
+        batch: Si se indica, la escritura se añade al batch o transacción en lugar de ejecutarse
+    """
+    if not user_id or not amount:
+        return
+    if not COUNTERS.get(counter, {}).get("materialized"):
+        raise ValueError(f"Contador no materializado: {counter}")
+    shard_ref = _shards_ref(db, user_id).document(str(random.randrange(COUNTER_SHARDS)))
+    data = {counter: firestore.Increment(amount)}
+    if batch is not None:
+        batch.set(shard_ref, data, merge=True)
+        return
+    with track_firestore(COUNTERS_COLLECTION, "increment"):
+        shard_ref.set(data, merge=True)
+
+def increment_many(db, user_ids: Iterable[str], counter: str, amount: int = 1) -> None:
+    """Suma amount al mismo contador de varios usuarios en un solo batch."""
+    user_ids = [uid for uid in user_ids if uid]
+    if not user_ids:
+        return
+    batch = db.batch()
+    for user_id in user_ids:
+        increment(db, user_id, counter, amount, batch=batch)
+    with track_firestore(COUNTERS_COLLECTION, "increment"):
+        batch.commit()
+
+def count_query(db, counter: str, user_id: str) -> int:
+    """Total de un contador calculado con agregaciones count() en el servidor."""
+    total = 0
+    for collection, field, op in COUNTERS[counter]["queries"]:
+        with track_firestore(collection, "count"):
+            result = db.collection(collection).where(field, op, user_id).count().get()
+        total += int(result[0][0].value)
+    return total
+
+def _seed(db, user_id: str, counter: str, incremented: int) -> int:
+    """Inicializa un contador con count(); devuelve su valor."""
+    total = count_query(db, counter, user_id)
+    try:
+        with track_firestore(COUNTERS_COLLECTION, "seed"):
+            _shards_ref(db, user_id).document(f"{SEED_PREFIX}{counter}").create({counter: total - incremented})
+    except AlreadyExists:
+        # Otra petición lo sembró a la vez; su base es equivalente
+        logger.info(f"[Counters] {counter} de {user_id} ya sembrado")
+    return total
+
+def get_counts(db, user_id: str, counters: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Devuelve los contadores del usuario.
+
+    Los materializados salen de una única lectura de los shards (sembrándolos
+    con count() la primera vez); el resto se calcula con count().
+
+    Args:
+        counters: Nombres a devolver (por defecto, todos los de COUNTERS)
+    """
+    names = counters or list(COUNTERS)
+    materialized = [name for name in names if COUNTERS[name]["materialized"]]
+
+    sums: Dict[str, int] = {}
+    seeded = set()
+    if materialized:
+        with track_firestore(COUNTERS_COLLECTION, "get"):
+            shards = list(_shards_ref(db, user_id).get())
+        for shard in shards:
+            if shard.id.startswith(SEED_PREFIX):
+                seeded.add(shard.id[len(SEED_PREFIX):])
+            for name, value in (shard.to_dict() or {}).items():
+                if isinstance(value, (int, float)):
+                    sums[name] = sums.get(name, 0) + int(value)
+
+    counts = {}
+    for name in names:
+        if not COUNTERS[name]["materialized"]:
+            counts[name] = count_query(db, name, user_id)
+        elif name in seeded:
+            counts[name] = max(sums.get(name, 0), 0)
+        else:
+            counts[name] = _seed(db, user_id, name, sums.get(name, 0))
+    return counts
+
+def reset(db, user_id: str) -> None:
+    """Borra los contadores del usuario; se vuelven a sembrar en la siguiente lectura."""
+    batch = db.batch()
+    for shard in _shards_ref(db, user_id).get():
+        batch.delete(shard.reference)
+    batch.commit()
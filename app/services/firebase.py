@@ -16,6 +16,19 @@ import firebase_admin
 from firebase_admin import credentials, firestore, storage, auth
 from app.config.firebase import initialize_firebase
 from app.core.config.firebase import get_firebase_clients
+from app.core.auth_cache import invalidate_user_profile
+from app.utils.monitoring import track_firestore
+from app.services.firestore_async import (
+    get_async_firestore_client,
+    run_sync,
+    gather_reads,
+    create_document_async,
+    get_document_async,
+    get_documents_async,
+    update_document_async,
+    delete_document_async,
+    query_collection_async
+)
 
 from app.core.config import settings
 
@@ -68,7 +81,8 @@ def create_document(collection: str, document_id: str, data: Dict[str, Any]) ->
     """
     try:
         db = get_firebase_client()
-        db.collection(collection).document(document_id).set(data)
+        with track_firestore(collection, "set"):
+            db.collection(collection).document(document_id).set(data)
         return True
     except Exception as e:
         logger.error(f"Error al crear documento {document_id} en {collection}: {str(e)}")
@@ -87,7 +101,8 @@ def get_document(collection: str, document_id: str) -> Optional[Dict[str, Any]]:
     """
     try:
         db = get_firebase_client()
-        doc_ref = db.collection(collection).document(document_id).get()
+        with track_firestore(collection, "get"):
+            doc_ref = db.collection(collection).document(document_id).get()
 
         if doc_ref.exists:
             return doc_ref.to_dict()
@@ -110,7 +125,8 @@ def update_document(collection: str, document_id: str, data: Dict[str, Any]) ->
     """
     try:
         db = get_firebase_client()
-        db.collection(collection).document(document_id).update(data)
+        with track_firestore(collection, "update"):
+            db.collection(collection).document(document_id).update(data)
         return True
     except Exception as e:
         logger.error(f"Error al actualizar documento {document_id} en {collection}: {str(e)}")
@@ -129,7 +145,8 @@ def delete_document(collection: str, document_id: str) -> bool:
     """
     try:
         db = get_firebase_client()
-        db.collection(collection).document(document_id).delete()
+        with track_firestore(collection, "delete"):
+            db.collection(collection).document(document_id).delete()
         return True
     except Exception as e:
         logger.error(f"Error al eliminar documento {document_id} de {collection}: {str(e)}")
@@ -171,7 +188,8 @@ def query_collection(
             query = query.limit(limit)
 
         # Ejecutar consulta
-        results = query.get()
+        with track_firestore(collection, "query"):
+            results = query.get()
 
         # Convertir resultados a diccionarios
         return [doc.to_dict() for doc in results]
@@ -443,3 +461,4 @@ def update_user_document(user_id: str, update_data: dict):
     user_ref = db.collection('users').document(user_id)
     update_data['updated_at'] = datetime.utcnow()
     user_ref.update(update_data)
+    invalidate_user_profile(user_id)
@@ -0,0 +1,191 @@
+"""
+Acceso no bloqueante a Firestore para los endpoints asíncronos.
+
+Los helpers de app.services.firebase usan el cliente síncrono y bloquean el
+event loop de uvicorn mientras esperan a Firestore. Este módulo ofrece las
+mismas operaciones sobre google.cloud.firestore.AsyncClient para que un
+worker atienda otras peticiones durante la espera, y permite lanzar lecturas
+independientes en paralelo con asyncio.gather.
+
+A diferencia de los helpers síncronos, los errores de Firestore no se
+convierten en None/[]/False: se registran y se propagan, para que un fallo
+no se confunda con "no existe" o "sin resultados" (p. ej. en la comprobación
+de bloqueos de un perfil).
+
+Ejemplo:
+    user, blocked = await asyncio.gather(
+        get_document_async("users", user_id),
+        query_collection_async("blocked_users", [("blocker_id", "==", uid)])
+    )
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+import firebase_admin
+from google.cloud import firestore
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config.firebase import initialize_firebase
+from app.services.bulk_fetch import get_many_async
+from app.utils.monitoring import count_documents, track_firestore
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_async_client = None
+
+def get_async_firestore_client() -> firestore.AsyncClient:
+    """
+    Obtiene el cliente asíncrono de Firestore, compartido por el proceso.
+
+    Usa el proyecto y las credenciales de la app de Firebase Admin. El canal
+    gRPC queda ligado al event loop en el que se usa por primera vez, que en
+    uvicorn es el único loop del worker.
+    """
+    global _async_client
+    if _async_client is None:
+        if not firebase_admin._apps:
+            initialize_firebase()
+        app = firebase_admin.get_app()
+        _async_client = firestore.AsyncClient(
+            project=app.project_id,
+            credentials=app.credential.get_credential()
+        )
+    return _async_client
+
+def set_async_firestore_client(client) -> None:
+    """Sustituye el cliente asíncrono (emulador o pruebas). None fuerza a recrearlo."""
+    global _async_client
+    _async_client = client
+
+async def run_sync(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Ejecuta código síncrono de Firestore (transacciones, batches, helpers
+    existentes) en el pool de hilos para no bloquear el event loop.
+    """
+    return await run_in_threadpool(func, *args, **kwargs)
+
+async def gather_reads(*reads: Awaitable[Any]) -> List[Any]:
+    """Lanza varias lecturas independientes a la vez y devuelve sus resultados en orden."""
+    return list(await asyncio.gather(*reads))
+
+async def create_document_async(collection: str, document_id: str, data: Dict[str, Any]) -> bool:
+    """Versión asíncrona de create_document."""
+    try:
+        db = get_async_firestore_client()
+        with track_firestore(collection, "set"):
+            await db.collection(collection).document(document_id).set(data)
+        count_documents("write", 1)
+        return True
+    except Exception as e:
+        logger.error(f"Error al crear documento {document_id} en {collection}: {str(e)}")
+        raise
+
+async def get_document_async(collection: str, document_id: str) -> Optional[Dict[str, Any]]:
+    """Versión asíncrona de get_document."""
+    try:
+        db = get_async_firestore_client()
+        with track_firestore(collection, "get"):
+            doc = await db.collection(collection).document(document_id).get()
+        count_documents("read", 1)
+
+        if doc.exists:
+            return doc.to_dict()
+        return None
+    except Exception as e:
+        logger.error(f"Error al obtener documento {document_id} de {collection}: {str(e)}")
+        raise
+
+async def get_documents_async(
+    collection: str,
+    document_ids: Iterable[str],
+    field_paths: Optional[List[str]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Obtiene varios documentos de una colección con get_all por lotes concurrentes.
+
+    Returns:
+        Diccionario {document_id: datos}; los documentos inexistentes se omiten
+    """
+    try:
+        return await get_many_async(get_async_firestore_client(), collection, document_ids, field_paths)
+    except Exception as e:
+        logger.error(f"Error al obtener documentos de {collection}: {str(e)}")
+        raise
+
+async def update_document_async(collection: str, document_id: str, data: Dict[str, Any]) -> bool:
+    """Versión asíncrona de update_document."""
+    try:
+        db = get_async_firestore_client()
+        with track_firestore(collection, "update"):
+            await db.collection(collection).document(document_id).update(data)
+        count_documents("write", 1)
+        return True
+    except Exception as e:
+        logger.error(f"Error al actualizar documento {document_id} en {collection}: {str(e)}")
+        raise
+
+async def delete_document_async(collection: str, document_id: str) -> bool:
+    """Versión asíncrona de delete_document."""
+    try:
+        db = get_async_firestore_client()
+        with track_firestore(collection, "delete"):
+            await db.collection(collection).document(document_id).delete()
+        count_documents("write", 1)
+        return True
+    except Exception as e:
+        logger.error(f"Error al eliminar documento {document_id} de {collection}: {str(e)}")
+        raise
+
+async def query_collection_async(
+    collection: str,
+    filters: Optional[List[tuple]] = None,
+    order_by: Optional[str] = None,
+    limit: Optional[int] = None,
+    direction: str = firestore.Query.ASCENDING,
+    include_id: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Versión asíncrona de query_collection.
+
+    Args:
+        collection: Nombre de la colección
+        filters: Lista de tuplas (campo, operador, valor)
+        order_by: Campo para ordenar los resultados
+        limit: Número máximo de resultados
+        direction: Dirección del orden
+        include_id: Si es True, añade el ID del documento en la clave 'id'
+
+    Returns:
+        Lista de documentos que coinciden con la consulta
+    """
+    try:
+        db = get_async_firestore_client()
+        query = db.collection(collection)
+
+        if filters:
+            for field, op, value in filters:
+                query = query.where(field, op, value)
+
+        if order_by:
+            query = query.order_by(order_by, direction=direction)
+
+        if limit:
+            query = query.limit(limit)
+
+        with track_firestore(collection, "query"):
+            results = await query.get()
+        count_documents("read", len(results))
+
+        documents = []
+        for doc in results:
+            data = doc.to_dict()
+            if include_id:
+                data["id"] = doc.id
+            documents.append(data)
+        return documents
+    except Exception as e:
+        logger.error(f"Error al consultar colección {collection}: {str(e)}")
+        raise
@@ -0,0 +1,1026 @@
+"""
+Emulador de Firestore en memoria para pruebas de carga y de rendimiento.
+
+A diferencia de firestore_mock (solo get/set) y config.mock_firebase (solo
+filtros ``==``), reproduce la parte de la API de firebase_admin.firestore que
+usa la aplicación con la semántica de Firestore:
+
+    - Consultas compuestas: ==, !=, <, <=, >, >=, in, not-in, array_contains,
+      array_contains_any; order_by (con el orden implícito por ID y el orden
+      entre tipos de Firestore), limit, limit_to_last, offset, select, cursores
+      (start_at/start_after/end_at/end_before con snapshot, dict o lista),
+      count(), grupos de colecciones y subcolecciones.
+    - Escrituras: set (con merge), update (rutas con puntos), create, delete,
+      add, batches atómicos de hasta 500 escrituras y los valores especiales
+      SERVER_TIMESTAMP, DELETE_FIELD, Increment, ArrayUnion y ArrayRemove.
+    - Transacciones optimistas: lecturas antes que escrituras, conflicto
+      (Aborted) si un documento leído cambia antes del commit y reintentos con
+      transactional().
+    - Listeners on_snapshot sobre colecciones y consultas.
+
+Además cuenta las operaciones como las factura Firestore (lecturas de
+documentos, escrituras, borrados, RPCs por colección) e inyecta latencia
+configurable por operación, de modo que un benchmark mide tanto el tiempo como
+el número de lecturas y escrituras de un endpoint. patch_firestore() sustituye
+el cliente de la aplicación por el emulador (scripts/benchmark_endpoints.py).
+"""
+import copy
+import itertools
+import math
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from unittest.mock import patch
+
+from firebase_admin import firestore
+from google.api_core.exceptions import Aborted, AlreadyExists, NotFound
+
+DOCUMENT_ID = "__name__"
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+MAX_BATCH_WRITES = 500
+MAX_IN_VALUES = 30
+# Entradas de índice por lectura facturada en las agregaciones (count)
+AGGREGATION_ENTRIES_PER_READ = 1000
+TRANSACTION_MAX_ATTEMPTS = 5
+
+_MISSING = object()
+
+# Operaciones y latencias
+
+class OperationStats:
+    """Contadores de operaciones al estilo de la facturación de Firestore."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.totals: Counter = Counter()
+            self.by_collection: Counter = Counter()
+
+    def add(self, kind: str, collection: str, amount: int = 1) -> None:
+        if amount <= 0:
+            return
+        with self._lock:
+            self.totals[kind] += amount
+            self.by_collection[(collection, kind)] += amount
+
+    @property
+    def reads(self) -> int:
+        return self.totals["reads"]
+
+    @property
+    def writes(self) -> int:
+        return self.totals["writes"]
+
+    @property
+    def deletes(self) -> int:
+        return self.totals["deletes"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copia de los contadores: totales y desglose por colección."""
+        with self._lock:
+            by_collection: Dict[str, Dict[str, int]] = {}
+            for (collection, kind), amount in sorted(self.by_collection.items()):
+                by_collection.setdefault(collection, {})[kind] = amount
+            return {"totals": dict(self.totals), "by_collection": by_collection}
+
+class LatencyModel:
+    """
+    Latencia inyectada por operación.
+
+    Args:
+        per_operation: Segundos por RPC según el tipo (get, get_all, query,
+            aggregate, commit, rollback)
+        per_document: Segundos extra por documento leído o escrito
+    """
+
+    def __init__(
+        self,
+        per_operation: Optional[Dict[str, float]] = None,
+        per_document: float = 0.0,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.per_operation = dict(per_operation or {})
+        self.per_document = per_document
+        self.sleep = sleep
+
+    def apply(self, operation: str, documents: int = 0) -> None:
+        delay = self.per_operation.get(operation, 0.0) + self.per_document * documents
+        if delay > 0:
+            self.sleep(delay)
+
+# Valores y orden
+
+def _type_rank(value: Any) -> int:
+    # Orden entre tipos de Firestore: null < bool < número < fecha < texto < bytes < referencia < array < mapa
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, DocumentReference):
+        return 6
+    if isinstance(value, (list, tuple)):
+        return 8
+    if isinstance(value, dict):
+        return 9
+    return 10
+
+def _sort_key(value: Any) -> Tuple:
+    rank = _type_rank(value)
+    if rank == 2 and isinstance(value, float) and math.isnan(value):
+        return (rank, float("-inf"), 0)
+    if rank == 3:
+        # Las fechas sin zona se interpretan en UTC, como las guarda la aplicación
+        return (rank, (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp())
+    if rank == 6:
+        return (rank, value.path)
+    if rank == 8:
+        return (rank, tuple(_sort_key(v) for v in value))
+    if rank == 9:
+        return (rank, tuple((k, _sort_key(v)) for k, v in sorted(value.items())))
+    if rank == 10:
+        return (rank, repr(value))
+    return (rank, value)
+
+def _compare(a: Any, b: Any) -> int:
+    ka, kb = _sort_key(a), _sort_key(b)
+    return (ka > kb) - (ka < kb)
+
+def _equal(a: Any, b: Any) -> bool:
+    return _type_rank(a) == _type_rank(b) and _compare(a, b) == 0
+
+def _get_field(data: Dict[str, Any], field_path: str) -> Any:
+    value: Any = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _set_field(data: Dict[str, Any], field_path: str, value: Any) -> None:
+    parts = field_path.split(".")
+    for part in parts[:-1]:
+        child = data.get(part)
+        if not isinstance(child, dict):
+            child = data[part] = {}
+        data = child
+    data[parts[-1]] = value
+
+def _delete_field(data: Dict[str, Any], field_path: str) -> None:
+    parts = field_path.split(".")
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+def _is(value: Any, sentinel: str) -> bool:
+    return value is getattr(firestore, sentinel, _MISSING)
+
+def _transform(value: Any) -> Optional[str]:
+    name = type(value).__name__
+    return name if name in ("Increment", "ArrayUnion", "ArrayRemove") else None
+
+def _resolve(current: Any, value: Any, now: datetime) -> Any:
+    """Valor final de un campo tras aplicar valores especiales."""
+    if _is(value, "SERVER_TIMESTAMP"):
+        return now
+    kind = _transform(value)
+    if kind == "Increment":
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        return base + value.value
+    if kind == "ArrayUnion":
+        result = list(current) if isinstance(current, list) else []
+        for item in value.values:
+            if not any(_equal(item, existing) for existing in result):
+                result.append(copy.deepcopy(item))
+        return result
+    if kind == "ArrayRemove":
+        result = list(current) if isinstance(current, list) else []
+        return [item for item in result if not any(_equal(item, removed) for removed in value.values)]
+    if isinstance(value, dict):
+        base = current if isinstance(current, dict) else {}
+        return {k: _resolve(base.get(k, _MISSING), v, now) for k, v in value.items() if not _is(v, "DELETE_FIELD")}
+    return copy.deepcopy(value)
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any], now: datetime) -> None:
+    """set(merge=True): mezcla recursiva de mapas."""
+    for key, value in data.items():
+        if _is(value, "DELETE_FIELD"):
+            target.pop(key, None)
+        elif isinstance(value, dict) and not _transform(value):
+            child = target.get(key)
+            if not isinstance(child, dict):
+                child = target[key] = {}
+            _merge(child, value, now)
+        else:
+            target[key] = _resolve(target.get(key, _MISSING), value, now)
+
+def _collection_of(path: str) -> str:
+    return path.rsplit("/", 1)[0]
+
+def _top_collection(path: str) -> str:
+    return path.split("/", 1)[0]
+
+# Documentos
+
+class DocumentSnapshot:
+    def __init__(self, reference: "DocumentReference", data: Optional[Dict[str, Any]], create_time=None, update_time=None, read_time=None):
+        self.reference = reference
+        self._data = data
+        self.create_time = create_time
+        self.update_time = update_time
+        self.read_time = read_time
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        if self._data is None:
+            return None
+        value = _get_field(self._data, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+    def __repr__(self) -> str:
+        return f"<DocumentSnapshot {self.reference.path}>"
+
+class DocumentReference:
+    def __init__(self, client: "FirestoreEmulator", path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self) -> "CollectionReference":
+        return CollectionReference(self._client, _collection_of(self.path))
+
+    def collection(self, collection_id: str) -> "CollectionReference":
+        return CollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, field_paths: Optional[Sequence[str]] = None, transaction: Optional["Transaction"] = None) -> DocumentSnapshot:
+        if transaction is not None:
+            return transaction.get(self)
+        return self._client.get_all([self], field_paths=field_paths, _operation="get")[0]
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False):
+        return self._client._commit([("set", self, document_data, merge)])[0]
+
+    def create(self, document_data: Dict[str, Any]):
+        return self._client._commit([("create", self, document_data, False)])[0]
+
+    def update(self, field_updates: Dict[str, Any]):
+        return self._client._commit([("update", self, field_updates, False)])[0]
+
+    def delete(self):
+        return self._client._commit([("delete", self, None, False)])[0]
+
+    def collections(self) -> List["CollectionReference"]:
+        prefix = self.path + "/"
+        return [
+            CollectionReference(self._client, path)
+            for path in self._client._collection_paths()
+            if path.startswith(prefix) and "/" not in path[len(prefix):]
+        ]
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, DocumentReference) and other.path == self.path and other._client is self._client
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+    def __repr__(self) -> str:
+        return f"<DocumentReference {self.path}>"
+
+# Consultas
+
+class FieldFilter:
+    """Filtro explícito (where(filter=FieldFilter(...)))."""
+
+    def __init__(self, field_path: str, op_string: str, value: Any):
+        self.field_path = field_path
+        self.op_string = op_string
+        self.value = value
+
+class AggregationResult(int):
+    """Resultado de count(): se usa como entero o por ``.value``, como en el cliente real."""
+
+    def __new__(cls, value: int, alias: str = "count", read_time=None):
+        result = super().__new__(cls, value)
+        result.alias = alias
+        result.read_time = read_time
+        return result
+
+    @property
+    def value(self) -> int:
+        return int(self)
+
+class AggregationQuery:
+    def __init__(self, query: "Query", alias: Optional[str]):
+        self._query = query
+        self._alias = alias or "count"
+
+    def get(self, transaction: Optional["Transaction"] = None) -> List[List[AggregationResult]]:
+        client = self._query._client
+        matches = client._run(self._query, operation="aggregate", count_only=True)
+        return [[AggregationResult(len(matches), self._alias, datetime.utcnow())]]
+
+    def stream(self, transaction: Optional["Transaction"] = None):
+        yield from self.get(transaction)
+
+_INEQUALITY = {"<", "<=", ">", ">=", "!=", "not-in"}
+_OPERATORS = _INEQUALITY | {"==", "in", "array_contains", "array_contains_any"}
+
+class Query:
+    def __init__(
+        self,
+        client: "FirestoreEmulator",
+        collection_path: str,
+        all_descendants: bool = False,
+        filters: Tuple = (),
+        orders: Tuple = (),
+        limit: Optional[int] = None,
+        limit_to_last: bool = False,
+        offset: int = 0,
+        start: Optional[Tuple[Any, bool]] = None,
+        end: Optional[Tuple[Any, bool]] = None,
+        projection: Optional[Tuple[str, ...]] = None
+    ):
+        self._client = client
+        self._path = collection_path
+        self._all_descendants = all_descendants
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._limit_to_last = limit_to_last
+        self._offset = offset
+        self._start = start
+        self._end = end
+        self._projection = projection
+
+    @property
+    def _parent(self) -> "CollectionReference":
+        return CollectionReference(self._client, self._path)
+
+    def _copy(self, **changes) -> "Query":
+        fields = {
+            "all_descendants": self._all_descendants, "filters": self._filters, "orders": self._orders,
+            "limit": self._limit, "limit_to_last": self._limit_to_last, "offset": self._offset,
+            "start": self._start, "end": self._end, "projection": self._projection
+        }
+        fields.update(changes)
+        return Query(self._client, self._path, **fields)
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None, value: Any = None, *, filter: Optional[FieldFilter] = None) -> "Query":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in _OPERATORS:
+            raise ValueError(f"Operador no soportado: {op_string}")
+        if op_string in ("in", "not-in", "array_contains_any"):
+            if not isinstance(value, (list, tuple)) or not value:
+                raise ValueError(f"{op_string} necesita una lista no vacía")
+            if len(value) > MAX_IN_VALUES:
+                raise ValueError(f"{op_string} admite como máximo {MAX_IN_VALUES} valores")
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "Query":
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int) -> "Query":
+        return self._copy(limit=count, limit_to_last=False)
+
+    def limit_to_last(self, count: int) -> "Query":
+        return self._copy(limit=count, limit_to_last=True)
+
+    def offset(self, num_to_skip: int) -> "Query":
+        return self._copy(offset=num_to_skip)
+
+    def select(self, field_paths: Iterable[str]) -> "Query":
+        return self._copy(projection=tuple(field_paths))
+
+    def start_at(self, document_fields_or_snapshot: Any) -> "Query":
+        return self._copy(start=(document_fields_or_snapshot, True))
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "Query":
+        return self._copy(start=(document_fields_or_snapshot, False))
+
+    def end_at(self, document_fields_or_snapshot: Any) -> "Query":
+        return self._copy(end=(document_fields_or_snapshot, True))
+
+    def end_before(self, document_fields_or_snapshot: Any) -> "Query":
+        return self._copy(end=(document_fields_or_snapshot, False))
+
+    def count(self, alias: Optional[str] = None) -> AggregationQuery:
+        return AggregationQuery(self, alias)
+
+    def get(self, transaction: Optional["Transaction"] = None) -> List[DocumentSnapshot]:
+        if transaction is not None:
+            return transaction.get(self)
+        return self._client._run(self)
+
+    def stream(self, transaction: Optional["Transaction"] = None):
+        yield from self.get(transaction)
+
+    def on_snapshot(self, callback: Callable) -> "Watch":
+        return self._client._watch(self, callback)
+
+    # Evaluación
+
+    def _effective_orders(self) -> List[Tuple[str, str]]:
+        orders = list(self._orders)
+        ordered = {field for field, _ in orders}
+        # Firestore ordena primero por el campo de la desigualdad si no se indica
+        for field, op, _ in self._filters:
+            if op in _INEQUALITY and field not in ordered and field != DOCUMENT_ID:
+                orders.insert(0, (field, ASCENDING))
+                ordered.add(field)
+        if DOCUMENT_ID not in ordered:
+            orders.append((DOCUMENT_ID, orders[-1][1] if orders else ASCENDING))
+        return orders
+
+    def _matches(self, path: str, data: Dict[str, Any]) -> bool:
+        for field, op, expected in self._filters:
+            value = path.rsplit("/", 1)[-1] if field == DOCUMENT_ID else _get_field(data, field)
+            if field == DOCUMENT_ID:
+                expected = _document_id(expected)
+            if value is _MISSING:
+                return False
+            if op == "==":
+                ok = _equal(value, expected)
+            elif op == "!=":
+                ok = value is not None and not _equal(value, expected)
+            elif op == "in":
+                ok = any(_equal(value, item) for item in (_document_id(v) if field == DOCUMENT_ID else v for v in expected))
+            elif op == "not-in":
+                ok = value is not None and not any(_equal(value, item) for item in expected)
+            elif op == "array_contains":
+                ok = isinstance(value, list) and any(_equal(item, expected) for item in value)
+            elif op == "array_contains_any":
+                ok = isinstance(value, list) and any(_equal(item, e) for item in value for e in expected)
+            else:
+                # Los rangos solo comparan valores del mismo tipo
+                if _type_rank(value) != _type_rank(expected):
+                    return False
+                cmp = _compare(value, expected)
+                ok = {"<": cmp < 0, "<=": cmp <= 0, ">": cmp > 0, ">=": cmp >= 0}[op]
+            if not ok:
+                return False
+        return True
+
+    def _order_values(self, path: str, data: Dict[str, Any], orders: Sequence[Tuple[str, str]]) -> Optional[List[Any]]:
+        values = []
+        for field, _ in orders:
+            if field == DOCUMENT_ID:
+                values.append(path)
+                continue
+            value = _get_field(data, field)
+            if value is _MISSING:
+                # Sin el campo de orden, el documento no está en el índice
+                return None
+            values.append(value)
+        return values
+
+    def _cursor_values(self, cursor: Any, orders: Sequence[Tuple[str, str]]) -> List[Any]:
+        if isinstance(cursor, DocumentSnapshot):
+            data = cursor._data or {}
+            return [cursor.reference.path if f == DOCUMENT_ID else _get_field(data, f) for f, _ in orders]
+        if isinstance(cursor, dict):
+            values = []
+            for field, _ in orders:
+                if field in cursor:
+                    values.append(cursor[field])
+                else:
+                    value = _get_field(cursor, field)
+                    if value is _MISSING:
+                        break
+                    values.append(value)
+        else:
+            values = list(cursor)
+        # El ID del cursor puede venir como ID, ruta o referencia
+        return [self._path_value(v) if orders[i][0] == DOCUMENT_ID else v for i, v in enumerate(values)]
+
+    def _path_value(self, value: Any) -> str:
+        if isinstance(value, DocumentReference):
+            return value.path
+        value = str(value)
+        return value if "/" in value else f"{self._path}/{value}"
+
+    def _compare_to_cursor(self, values: Sequence[Any], cursor: Sequence[Any], orders: Sequence[Tuple[str, str]]) -> int:
+        for value, bound, (_, direction) in zip(values, cursor, orders):
+            cmp = _compare(value, bound)
+            if cmp:
+                return -cmp if direction == DESCENDING else cmp
+        return 0
+
+    def _evaluate(self, documents: Iterable[Tuple[str, Dict[str, Any]]]) -> List[Tuple[str, Dict[str, Any]]]:
+        orders = self._effective_orders()
+        rows = []
+        for path, data in documents:
+            if not self._matches(path, data):
+                continue
+            values = self._order_values(path, data, orders)
+            if values is not None:
+                rows.append((values, path, data))
+
+        # Orden estable campo a campo de derecha a izquierda
+        for position in range(len(orders) - 1, -1, -1):
+            rows.sort(key=lambda row: _sort_key(row[0][position]), reverse=orders[position][1] == DESCENDING)
+
+        if self._start is not None:
+            cursor, inclusive = self._start
+            bound = self._cursor_values(cursor, orders)
+            rows = [r for r in rows if self._after_start(r[0], bound, orders, inclusive)]
+        if self._end is not None:
+            cursor, inclusive = self._end
+            bound = self._cursor_values(cursor, orders)
+            rows = [r for r in rows if self._before_end(r[0], bound, orders, inclusive)]
+
+        rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[-self._limit:] if self._limit_to_last else rows[:self._limit]
+        return [(path, data) for _, path, data in rows]
+
+    def _after_start(self, values, bound, orders, inclusive) -> bool:
+        cmp = self._compare_to_cursor(values, bound, orders)
+        return cmp > 0 or (cmp == 0 and (inclusive or len(bound) < len(orders)))
+
+    def _before_end(self, values, bound, orders, inclusive) -> bool:
+        cmp = self._compare_to_cursor(values, bound, orders)
+        return cmp < 0 or (cmp == 0 and (inclusive or len(bound) < len(orders)))
+
+def _document_id(value: Any) -> Any:
+    if isinstance(value, DocumentReference):
+        return value.id
+    if isinstance(value, str) and "/" in value:
+        return value.rsplit("/", 1)[-1]
+    return value
+
+class CollectionReference(Query):
+    def __init__(self, client: "FirestoreEmulator", path: str):
+        super().__init__(client, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def _parent(self) -> "CollectionReference":
+        return self
+
+    @property
+    def parent(self) -> Optional[DocumentReference]:
+        if "/" not in self._path:
+            return None
+        return DocumentReference(self._client, _collection_of(self._path))
+
+    def document(self, document_id: Optional[str] = None) -> DocumentReference:
+        return DocumentReference(self._client, f"{self._path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        result = ref.create(document_data)
+        return result.update_time, ref
+
+    def list_documents(self) -> List[DocumentReference]:
+        return [DocumentReference(self._client, f"{self._path}/{doc_id}") for doc_id in self._client._documents(self._path)]
+
+# Escrituras
+
+class WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+class WriteBatch:
+    """Escrituras que se confirman de forma atómica en commit()."""
+
+    def __init__(self, client: "FirestoreEmulator"):
+        self._client = client
+        self._writes: List[Tuple[str, DocumentReference, Any, bool]] = []
+
+    def set(self, reference: DocumentReference, document_data: Dict[str, Any], merge: bool = False) -> "WriteBatch":
+        self._writes.append(("set", reference, document_data, merge))
+        return self
+
+    def create(self, reference: DocumentReference, document_data: Dict[str, Any]) -> "WriteBatch":
+        self._writes.append(("create", reference, document_data, False))
+        return self
+
+    def update(self, reference: DocumentReference, field_updates: Dict[str, Any]) -> "WriteBatch":
+        self._writes.append(("update", reference, field_updates, False))
+        return self
+
+    def delete(self, reference: DocumentReference) -> "WriteBatch":
+        self._writes.append(("delete", reference, None, False))
+        return self
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def commit(self) -> List[WriteResult]:
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+class Transaction(WriteBatch):
+    """
+    Transacción optimista: guarda la versión de cada documento leído y el
+    commit falla con Aborted si alguno cambió; transactional() la reintenta.
+    """
+
+    def __init__(self, client: "FirestoreEmulator", max_attempts: int = TRANSACTION_MAX_ATTEMPTS, read_only: bool = False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._read_versions: Dict[str, Any] = {}
+        self.in_progress = False
+
+    def _begin(self) -> None:
+        self._writes = []
+        self._read_versions = {}
+        self.in_progress = True
+
+    def _record(self, path: str) -> None:
+        self._read_versions.setdefault(path, self._client._version(path))
+
+    def get(self, ref_or_query):
+        if self._writes:
+            raise ValueError("Firestore exige todas las lecturas de la transacción antes de las escrituras")
+        if isinstance(ref_or_query, DocumentReference):
+            snapshot = self._client.get_all([ref_or_query], _operation="get")[0]
+            self._record(ref_or_query.path)
+            return snapshot
+        snapshots = self._client._run(ref_or_query)
+        for snapshot in snapshots:
+            self._record(snapshot.reference.path)
+        return snapshots
+
+    def get_all(self, references: Iterable[DocumentReference]) -> List[DocumentSnapshot]:
+        references = list(references)
+        snapshots = self._client.get_all(references)
+        for ref in references:
+            self._record(ref.path)
+        return snapshots
+
+    def _add_write(self, write) -> "Transaction":
+        if self._read_only:
+            raise ValueError("Transacción de solo lectura")
+        self._writes.append(write)
+        return self
+
+    def set(self, reference, document_data, merge=False):
+        return self._add_write(("set", reference, document_data, merge))
+
+    def create(self, reference, document_data):
+        return self._add_write(("create", reference, document_data, False))
+
+    def update(self, reference, field_updates):
+        return self._add_write(("update", reference, field_updates, False))
+
+    def delete(self, reference):
+        return self._add_write(("delete", reference, None, False))
+
+    def commit(self) -> List[WriteResult]:
+        writes, self._writes = self._writes, []
+        try:
+            return self._client._commit(writes, read_versions=self._read_versions)
+        finally:
+            self.in_progress = False
+            self._read_versions = {}
+
+    def rollback(self) -> None:
+        self._writes = []
+        self._read_versions = {}
+        self.in_progress = False
+        self._client.latency.apply("rollback")
+
+def transactional(to_wrap: Callable) -> Callable:
+    """Equivalente a firestore.transactional para transacciones del emulador."""
+    def wrapper(transaction: Transaction, *args, **kwargs):
+        for attempt in range(transaction._max_attempts):
+            transaction._begin()
+            try:
+                result = to_wrap(transaction, *args, **kwargs)
+                transaction.commit()
+                return result
+            except Aborted:
+                transaction._client.stats.add("aborted", "transaction")
+                if attempt + 1 == transaction._max_attempts:
+                    raise
+            except Exception:
+                transaction.rollback()
+                raise
+    return wrapper
+
+# Listeners
+
+class _ChangeType:
+    def __init__(self, name: str):
+        self.name = name
+
+class DocumentChange:
+    def __init__(self, type_name: str, document: DocumentSnapshot, old_index: int = -1, new_index: int = -1):
+        self.type = _ChangeType(type_name)
+        self.document = document
+        self.old_index = old_index
+        self.new_index = new_index
+
+class Watch:
+    """Listener on_snapshot: recibe (snapshots, cambios, read_time) tras cada commit que le afecta."""
+
+    def __init__(self, client: "FirestoreEmulator", query: Query, callback: Callable):
+        self._client = client
+        self._query = query
+        self._callback = callback
+        self._current: Dict[str, Dict[str, Any]] = {}
+        self._started = False
+        self.active = True
+
+    def _refresh(self) -> None:
+        with self._client._lock:
+            rows = self._query._evaluate(self._client._scan(self._query))
+            snapshots = [self._client._snapshot(path, data) for path, data in rows]
+        changes = []
+        current = {}
+        for snapshot in snapshots:
+            path = snapshot.reference.path
+            current[path] = snapshot._data
+            if path not in self._current:
+                changes.append(DocumentChange("ADDED", snapshot))
+            elif self._current[path] != snapshot._data:
+                changes.append(DocumentChange("MODIFIED", snapshot))
+        for path, data in self._current.items():
+            if path not in current:
+                changes.append(DocumentChange("REMOVED", self._client._snapshot(path, data)))
+        first, self._started = not self._started, True
+        self._current = current
+        self._client.stats.add("reads", _top_collection(self._query._path), len(changes))
+        # El primer snapshot se entrega aunque esté vacío (marca la carga inicial)
+        if changes or first:
+            self._callback(snapshots, changes, datetime.utcnow())
+
+    def unsubscribe(self) -> None:
+        self.active = False
+        self._client._unwatch(self)
+
+# Cliente
+
+class _Document:
+    __slots__ = ("data", "create_time", "update_time", "version")
+
+    def __init__(self, data, create_time, update_time, version):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = update_time
+        self.version = version
+
+class FirestoreEmulator:
+    """
+    Cliente de Firestore en memoria.
+
+    Args:
+        latency: Latencia inyectada por operación (por defecto ninguna)
+        stats: Contadores de operaciones (se crean si no se pasan)
+    """
+
+    def __init__(self, latency: Optional[LatencyModel] = None, stats: Optional[OperationStats] = None):
+        self.latency = latency or LatencyModel()
+        self.stats = stats or OperationStats()
+        self._lock = threading.RLock()
+        self._collections: Dict[str, Dict[str, _Document]] = {}
+        self._versions = itertools.count(1)
+        self._watches: List[Watch] = []
+
+    # API pública
+
+    def collection(self, collection_path: str) -> CollectionReference:
+        return CollectionReference(self, collection_path.strip("/"))
+
+    def document(self, document_path: str) -> DocumentReference:
+        return DocumentReference(self, document_path.strip("/"))
+
+    def collection_group(self, collection_id: str) -> Query:
+        return Query(self, collection_id, all_descendants=True)
+
+    def collections(self) -> List[CollectionReference]:
+        return [CollectionReference(self, path) for path in self._collection_paths() if "/" not in path]
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts: int = TRANSACTION_MAX_ATTEMPTS, read_only: bool = False) -> Transaction:
+        return Transaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def get_all(
+        self,
+        references: Iterable[DocumentReference],
+        field_paths: Optional[Sequence[str]] = None,
+        transaction: Optional[Transaction] = None,
+        _operation: str = "get_all"
+    ) -> List[DocumentSnapshot]:
+        references = list(references)
+        if transaction is not None:
+            return transaction.get_all(references)
+        with self._lock:
+            snapshots = [self._snapshot(ref.path, self._data(ref.path), field_paths) for ref in references]
+        # Cada documento pedido cuenta como una lectura, exista o no
+        for ref in references:
+            self.stats.add("reads", _top_collection(ref.path))
+        self.stats.add(_operation, _top_collection(references[0].path) if references else "unknown")
+        self.latency.apply(_operation, len(references))
+        return snapshots
+
+    def seed(self, collection_path: str, documents: Dict[str, Dict[str, Any]]) -> None:
+        """Carga datos de partida sin contar escrituras ni aplicar latencia."""
+        with self._lock:
+            now = datetime.utcnow()
+            docs = self._collections.setdefault(collection_path, {})
+            for doc_id, data in documents.items():
+                docs[doc_id] = _Document(copy.deepcopy(data), now, now, next(self._versions))
+        self._notify({f"{collection_path}/{doc_id}" for doc_id in documents})
+
+    def dump(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Copia de todos los datos por ruta de colección."""
+        with self._lock:
+            return {path: {doc_id: copy.deepcopy(doc.data) for doc_id, doc in docs.items()} for path, docs in self._collections.items() if docs}
+
+    def reset(self) -> None:
+        """Vacía los datos y los contadores."""
+        with self._lock:
+            self._collections.clear()
+        self.stats.reset()
+
+    # Internos
+
+    def _collection_paths(self) -> List[str]:
+        with self._lock:
+            return [path for path, docs in self._collections.items() if docs]
+
+    def _documents(self, collection_path: str) -> List[str]:
+        with self._lock:
+            return list(self._collections.get(collection_path, {}))
+
+    def _data(self, path: str) -> Optional[Dict[str, Any]]:
+        doc = self._collections.get(_collection_of(path), {}).get(path.rsplit("/", 1)[-1])
+        return doc.data if doc is not None else None
+
+    def _version(self, path: str) -> int:
+        with self._lock:
+            doc = self._collections.get(_collection_of(path), {}).get(path.rsplit("/", 1)[-1])
+            return doc.version if doc is not None else 0
+
+    def _snapshot(self, path: str, data: Optional[Dict[str, Any]], field_paths: Optional[Sequence[str]] = None) -> DocumentSnapshot:
+        doc = self._collections.get(_collection_of(path), {}).get(path.rsplit("/", 1)[-1])
+        if data is not None and field_paths is not None:
+            projected: Dict[str, Any] = {}
+            for field in field_paths:
+                value = _get_field(data, field)
+                if value is not _MISSING:
+                    _set_field(projected, field, value)
+            data = projected
+        return DocumentSnapshot(
+            DocumentReference(self, path),
+            copy.deepcopy(data),
+            doc.create_time if doc else None,
+            doc.update_time if doc else None,
+            datetime.utcnow()
+        )
+
+    def _scan(self, query: Query) -> Iterable[Tuple[str, Dict[str, Any]]]:
+        if query._all_descendants:
+            paths = [p for p in self._collections if p.rsplit("/", 1)[-1] == query._path]
+        else:
+            paths = [query._path]
+        for collection_path in paths:
+            for doc_id, doc in self._collections.get(collection_path, {}).items():
+                yield f"{collection_path}/{doc_id}", doc.data
+
+    def _run(self, query: Query, operation: str = "query", count_only: bool = False):
+        with self._lock:
+            rows = query._evaluate(self._scan(query))
+            snapshots = [] if count_only else [self._snapshot(path, data, query._projection) for path, data in rows]
+        collection = _top_collection(query._path)
+        self.stats.add(operation, collection)
+        if count_only:
+            # Se factura una lectura por cada 1000 entradas de índice (mínimo una)
+            self.stats.add("reads", collection, max(1, math.ceil(len(rows) / AGGREGATION_ENTRIES_PER_READ)))
+            self.latency.apply(operation)
+            return rows
+        # Una consulta sin resultados también factura una lectura
+        self.stats.add("reads", collection, max(1, len(rows)))
+        self.latency.apply(operation, len(rows))
+        return snapshots
+
+    def _commit(self, writes: Sequence[Tuple[str, DocumentReference, Any, bool]], read_versions: Optional[Dict[str, int]] = None) -> List[WriteResult]:
+        if len(writes) > MAX_BATCH_WRITES:
+            raise ValueError(f"Un commit admite como máximo {MAX_BATCH_WRITES} escrituras")
+        now = datetime.utcnow()
+        touched = set()
+        with self._lock:
+            for path, version in (read_versions or {}).items():
+                if self._version(path) != version:
+                    raise Aborted(f"Conflicto de transacción en {path}")
+            # Validar todas las precondiciones antes de aplicar nada (atomicidad)
+            staged: Dict[str, Optional[Dict[str, Any]]] = {}
+            for kind, ref, data, merge in writes:
+                current = staged[ref.path] if ref.path in staged else self._data(ref.path)
+                if kind == "create" and current is not None:
+                    raise AlreadyExists(f"El documento ya existe: {ref.path}")
+                if kind == "update" and current is None:
+                    raise NotFound(f"No existe el documento: {ref.path}")
+                staged[ref.path] = self._apply(current, kind, data, merge, now)
+            for path, data in staged.items():
+                collection_path, doc_id = _collection_of(path), path.rsplit("/", 1)[-1]
+                docs = self._collections.setdefault(collection_path, {})
+                if data is None:
+                    docs.pop(doc_id, None)
+                else:
+                    previous = docs.get(doc_id)
+                    docs[doc_id] = _Document(data, previous.create_time if previous else now, now, next(self._versions))
+                touched.add(path)
+        for kind, ref, _, _ in writes:
+            self.stats.add("deletes" if kind == "delete" else "writes", _top_collection(ref.path))
+        self.stats.add("commit", _top_collection(writes[0][1].path) if writes else "unknown")
+        self.latency.apply("commit", len(writes))
+        self._notify(touched)
+        return [WriteResult(now) for _ in writes]
+
+    def _apply(self, current: Optional[Dict[str, Any]], kind: str, data: Any, merge: bool, now: datetime) -> Optional[Dict[str, Any]]:
+        if kind == "delete":
+            return None
+        if kind == "update":
+            result = copy.deepcopy(current)
+            for field_path, value in data.items():
+                if _is(value, "DELETE_FIELD"):
+                    _delete_field(result, field_path)
+                else:
+                    existing = _get_field(result, field_path)
+                    _set_field(result, field_path, _resolve(None if existing is _MISSING else existing, value, now))
+            return result
+        if merge and current is not None:
+            result = copy.deepcopy(current)
+            _merge(result, data, now)
+            return result
+        result: Dict[str, Any] = {}
+        _merge(result, data, now)
+        return result
+
+    def _watch(self, query: Query, callback: Callable) -> Watch:
+        watch = Watch(self, query, callback)
+        with self._lock:
+            self._watches.append(watch)
+        watch._refresh()
+        return watch
+
+    def _unwatch(self, watch: Watch) -> None:
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _notify(self, paths: Iterable[str]) -> None:
+        paths = set(paths)
+        if not paths or not self._watches:
+            return
+        with self._lock:
+            watches = list(self._watches)
+        for watch in watches:
+            query = watch._query
+            affected = any(
+                _collection_of(path).rsplit("/", 1)[-1] == query._path if query._all_descendants else _collection_of(path) == query._path
+                for path in paths
+            )
+            if affected and watch.active:
+                watch._refresh()
+
+@contextmanager
+def patch_firestore(emulator: Optional[FirestoreEmulator] = None):
+    """
+    Sustituye el cliente de Firestore de la aplicación por el emulador.
+
+    Cubre firestore.client(), firestore.transactional y get_firebase_client().
+    """
+    emulator = emulator or FirestoreEmulator()
+    clients = {"db": emulator, "auth": None, "storage": None}
+    with patch.object(firestore, "client", lambda *args, **kwargs: emulator), \
+            patch.object(firestore, "transactional", transactional), \
+            patch("app.services.firebase.get_firebase_clients", lambda *args, **kwargs: clients):
+        yield emulator
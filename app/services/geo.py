@@ -0,0 +1,247 @@
+"""
+Índice geográfico por geohash para búsquedas por radio.
+
+Los documentos con coordenadas (usuarios y partidos) guardan su geohash en el
+campo ``geohash``. Un geohash es una cadena en la que cada prefijo es una celda
+que contiene a las más largas, así que todos los documentos de una celda forman
+un rango contiguo y se leen con ``geohash >= celda`` y ``geohash < celda + "~"``.
+
+Una búsqueda por radio:
+    1. Elige la precisión cuya celda es al menos tan grande como el radio.
+    2. Consulta la celda del centro y sus ocho vecinas (rangos acotados).
+    3. Descarta con la distancia haversine exacta lo que cae fuera del círculo.
+
+Así el número de candidatos depende de la densidad local y no del total de
+usuarios. Cada consulta con filtros de igualdad más el rango de geohash necesita
+un índice compuesto (firestore.indexes.json).
+"""
+import logging
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.utils.monitoring import track_firestore
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_FIELD = "geohash"
+# Precisión guardada en los documentos (~4.8 m x 4.8 m)
+GEOHASH_PRECISION = 9
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+# Mayor que cualquier carácter del alfabeto: cierra el rango de un prefijo
+_RANGE_END = "~"
+
+Coords = Tuple[float, float]
+Filter = Tuple[str, str, Any]
+
+def coords_of(location: Any) -> Optional[Coords]:
+    """
+    Extrae (latitud, longitud) de los formatos de ubicación usados en la app.
+
+    Acepta diccionarios con latitude/longitude o lat/lng, objetos con atributos
+    latitude/longitude (GeoPoint, UserLocation) y tuplas (lat, lon). Devuelve
+    None si la ubicación no tiene coordenadas válidas (p. ej. solo un nombre).
+    """
+    if location is None:
+        return None
+    if isinstance(location, dict):
+        lat = location.get("latitude", location.get("lat"))
+        lon = location.get("longitude", location.get("lng", location.get("lon")))
+    elif isinstance(location, (list, tuple)) and len(location) == 2:
+        lat, lon = location
+    else:
+        lat = getattr(location, "latitude", None)
+        lon = getattr(location, "longitude", None)
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+def haversine_km(a: Coords, b: Coords) -> float:
+    """Distancia en km sobre la esfera entre dos puntos (lat, lon)."""
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+def encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Geohash de un punto."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if coord >= mid:
+            value = (value << 1) | 1
+            rng[0] = mid
+        else:
+            value <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+def decode_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """Caja (lat_min, lat_max, lon_min, lon_max) de una celda."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+def neighbors(geohash: str) -> List[str]:
+    """Las ocho celdas vecinas (menos en los polos) de la misma precisión."""
+    lat_min, lat_max, lon_min, lon_max = decode_bbox(geohash)
+    lat_step = lat_max - lat_min
+    lon_step = lon_max - lon_min
+    lat_c = (lat_min + lat_max) / 2
+    lon_c = (lon_min + lon_max) / 2
+    cells = []
+    for dlat in (-1, 0, 1):
+        for dlon in (-1, 0, 1):
+            if dlat == 0 and dlon == 0:
+                continue
+            lat = lat_c + dlat * lat_step
+            if not -90 < lat < 90:
+                continue
+            lon = (lon_c + dlon * lon_step + 180) % 360 - 180
+            cell = encode(lat, lon, len(geohash))
+            if cell != geohash and cell not in cells:
+                cells.append(cell)
+    return cells
+
+def cell_size_km(geohash: str) -> Tuple[float, float]:
+    """Alto y ancho (km) de una celda; el ancho se estrecha con la latitud."""
+    lat_min, lat_max, lon_min, lon_max = decode_bbox(geohash)
+    km_per_degree = math.pi * EARTH_RADIUS_KM / 180
+    height = (lat_max - lat_min) * km_per_degree
+    width = (lon_max - lon_min) * km_per_degree * math.cos(math.radians((lat_min + lat_max) / 2))
+    return height, width
+
+def precision_for_radius(center: Coords, radius_km: float) -> int:
+    """Mayor precisión cuya celda en el centro mide al menos el radio (la vecindad 3x3 cubre el círculo)."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if min(cell_size_km(encode(center[0], center[1], precision))) >= radius_km:
+            return precision
+    return 1
+
+def covering_cells(center: Coords, radius_km: float) -> List[str]:
+    """Celdas cuyo rango de geohash contiene todos los puntos del círculo."""
+    cell = encode(center[0], center[1], precision_for_radius(center, radius_km))
+    return [cell] + neighbors(cell)
+
+def geo_fields(location: Any) -> Dict[str, Any]:
+    """
+    Campos de índice a guardar junto a una ubicación.
+
+    Devuelve {"geohash": ...} si la ubicación tiene coordenadas, o
+    {"geohash": None} para que un documento sin coordenadas salga del índice.
+    """
+    coords = coords_of(location)
+    return {GEOHASH_FIELD: encode(*coords) if coords else None}
+
+def is_within_radius(coords1: Any, coords2: Any, radius_km: float) -> bool:
+    """True si ambas ubicaciones tienen coordenadas y distan como mucho radius_km."""
+    a, b = coords_of(coords1), coords_of(coords2)
+    if a is None or b is None:
+        return False
+    return haversine_km(a, b) <= radius_km
+
+def query_within_radius(
+    db,
+    collection: str,
+    center: Any,
+    radius_km: float,
+    filters: Sequence[Filter] = (),
+    location_field: str = "location",
+    limit_per_cell: Optional[int] = None
+) -> List[Tuple[Any, float]]:
+    """
+    Documentos de una colección a menos de radius_km del centro.
+
+    Args:
+        db: Cliente de Firestore
+        collection: Colección con el campo geohash
+        center: Ubicación del centro en cualquier formato de coords_of
+        radius_km: Radio de búsqueda
+        filters: Filtros (campo, operador, valor) aplicados en cada consulta
+        location_field: Campo del documento con sus coordenadas
+        limit_per_cell: Máximo de documentos leídos por celda
+
+    Returns:
+        Lista de (documento, distancia en km) ordenada por distancia
+    """
+    origin = coords_of(center)
+    if origin is None or radius_km <= 0:
+        return []
+
+    results: Dict[str, Tuple[Any, float]] = {}
+    for cell in covering_cells(origin, radius_km):
+        query = db.collection(collection)
+        for field, op, value in filters:
+            query = query.where(field, op, value)
+        query = query.where(GEOHASH_FIELD, ">=", cell).where(GEOHASH_FIELD, "<", cell + _RANGE_END)
+        if limit_per_cell:
+            query = query.limit(limit_per_cell)
+        with track_firestore(collection, "geo_query"):
+            docs = query.get()
+        for doc in docs:
+            if doc.id in results:
+                continue
+            coords = coords_of((doc.to_dict() or {}).get(location_field))
+            if coords is None:
+                continue
+            distance = haversine_km(origin, coords)
+            if distance <= radius_km:
+                results[doc.id] = (doc, distance)
+
+    return sorted(results.values(), key=lambda item: item[1])
+
+def backfill(db, collection: str, location_field: str = "location", batch_size: int = 400) -> int:
+    """
+    Escribe el geohash en los documentos existentes que tienen coordenadas.
+
+    Returns:
+        Número de documentos actualizados
+    """
+    updated = 0
+    batch = db.batch()
+    pending = 0
+    for doc in db.collection(collection).stream():
+        data = doc.to_dict() or {}
+        fields = geo_fields(data.get(location_field))
+        if data.get(GEOHASH_FIELD) == fields[GEOHASH_FIELD]:
+            continue
+        batch.update(doc.reference, fields)
+        pending += 1
+        updated += 1
+        if pending >= batch_size:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    logger.info(f"[Geo] {updated} documentos de {collection} indexados")
+    return updated
@@ -0,0 +1,524 @@
+"""
+Cola de trabajos en segundo plano para los análisis de video.
+
+La API encola un trabajo y responde de inmediato con su ID; los procesos de
+app.worker lo reservan, lo ejecutan y lo confirman. Un trabajo reservado queda
+oculto durante el timeout de visibilidad: si el worker muere sin confirmarlo,
+vuelve a estar disponible y otro worker lo reintenta. Tras agotar los intentos
+se marca como 'dead' y solo vuelve a ejecutarse si se pide explícitamente
+con requeue_job.
+
+Los trabajos se reparten en dos colas, cada una con sus propios workers:
+    - JOB_QUEUE_NAME ("analysis"): análisis de video, largos y con un
+      pipeline de ML caliente por hilo.
+    - LIGHT_JOB_QUEUE_NAME ("background"): push, compactación de
+      notificaciones y borrados en cascada. Son cortos, no usan pipeline y no
+      esperan detrás de los análisis.
+
+Los trabajos terminados ('done') se conservan JOB_DONE_RETENTION segundos
+(para consultar su estado y deduplicar por job_id) y después purge() los
+borra; los 'dead' se conservan para inspeccionarlos.
+
+Hay dos brokers con la misma interfaz:
+    - RedisBroker (JOB_QUEUE_URL=redis://...), para producción.
+    - SQLiteBroker (JOB_QUEUE_URL=sqlite:///ruta.db), para desarrollo y pruebas.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from app.utils.monitoring import set_queue_depth
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", os.getenv("REDIS_URL", "sqlite:////tmp/padelyzer_jobs.db"))
+JOB_QUEUE_NAME = os.getenv("JOB_QUEUE_NAME", "analysis")
+# Segundos que un trabajo reservado permanece oculto a otros workers
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "1800"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Espera base antes de reintentar; se duplica en cada intento
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "30"))
+# Cola de los trabajos ligeros (sin pipeline) y su timeout de visibilidad
+LIGHT_JOB_QUEUE_NAME = os.getenv("LIGHT_JOB_QUEUE_NAME", "background")
+LIGHT_JOB_VISIBILITY_TIMEOUT = int(os.getenv("LIGHT_JOB_VISIBILITY_TIMEOUT", "300"))
+# Segundos que se conservan los trabajos terminados
+JOB_DONE_RETENTION = int(os.getenv("JOB_DONE_RETENTION", "86400"))
+
+# Tipos de trabajo
+ANALYZE_VIDEO_JOB = "analyze_video"
+COMPACT_NOTIFICATIONS_JOB = "compact_notifications"
+SEND_PUSH_JOB = "send_push"
+CASCADE_DELETE_JOB = "cascade_delete"
+
+# Tipos que necesitan un pipeline de análisis; el resto va a la cola ligera
+PIPELINE_JOBS = frozenset({ANALYZE_VIDEO_JOB})
+
+def queue_for(job_type: str) -> str:
+    """Cola en la que se encola un tipo de trabajo."""
+    return JOB_QUEUE_NAME if job_type in PIPELINE_JOBS else LIGHT_JOB_QUEUE_NAME
+
+def visibility_timeout_for(queue: str) -> int:
+    return JOB_VISIBILITY_TIMEOUT if queue == JOB_QUEUE_NAME else LIGHT_JOB_VISIBILITY_TIMEOUT
+
+class Job:
+    """Trabajo reservado por un worker."""
+
+    def __init__(self, job_id: str, job_type: str, payload: Dict[str, Any], attempts: int, max_attempts: int, lease_id: str):
+        self.id = job_id
+        self.type = job_type
+        self.payload = payload
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        self.lease_id = lease_id
+
+    @property
+    def is_last_attempt(self) -> bool:
+        return self.attempts >= self.max_attempts
+
+    def __repr__(self) -> str:
+        return f"Job(id={self.id!r}, type={self.type!r}, attempts={self.attempts}/{self.max_attempts})"
+
+def retry_delay(attempts: int, base: float = JOB_RETRY_BACKOFF) -> float:
+    """Backoff exponencial para el siguiente intento."""
+    return base * (2 ** max(attempts - 1, 0))
+
+class JobBroker:
+    """Interfaz común de los brokers."""
+
+    def enqueue(self, job_type: str, payload: Dict[str, Any], max_attempts: Optional[int] = None, job_id: Optional[str] = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        self.add(job_type, payload, job_id, max_attempts)
+        return job_id
+
+    def add(self, job_type: str, payload: Dict[str, Any], job_id: str, max_attempts: Optional[int] = None) -> bool:
+        """Encola el trabajo si no existe ya uno con ese ID; devuelve si lo insertó."""
+        raise NotImplementedError
+
+    def requeue(self, job_id: str) -> bool:
+        """Vuelve a encolar un trabajo 'dead' con los intentos a cero; devuelve si lo hizo."""
+        raise NotImplementedError
+
+    def reserve(self, visibility_timeout: int = JOB_VISIBILITY_TIMEOUT) -> Optional[Job]:
+        """Reserva el siguiente trabajo disponible o devuelve None si no hay."""
+        raise NotImplementedError
+
+    def ack(self, job: Job) -> bool:
+        """Confirma un trabajo terminado. Devuelve False si la reserva ya había expirado."""
+        raise NotImplementedError
+
+    def nack(self, job: Job, error: str, delay: Optional[float] = None, final: bool = False) -> str:
+        """
+        Devuelve un trabajo fallido a la cola para reintentarlo más tarde.
+
+        Con final=True (error permanente) no se reintenta.
+
+        Returns:
+            'queued' si se reintentará o 'dead' si agotó los intentos
+        """
+        raise NotImplementedError
+
+    def extend(self, job: Job, visibility_timeout: int = JOB_VISIBILITY_TIMEOUT) -> bool:
+        """Prolonga la reserva de un trabajo largo."""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado de un trabajo."""
+        raise NotImplementedError
+
+    def depth(self) -> int:
+        """Trabajos pendientes (disponibles o en espera de reintento)."""
+        raise NotImplementedError
+
+    def purge(self, older_than: float = JOB_DONE_RETENTION) -> int:
+        """Borra los trabajos terminados hace más de older_than segundos; devuelve cuántos."""
+        raise NotImplementedError
+
+class SQLiteBroker(JobBroker):
+    """Broker sobre una base SQLite compartida por los procesos de una máquina."""
+
+    def __init__(self, path: str, queue: str = JOB_QUEUE_NAME):
+        self.path = path
+        self.queue = queue
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    queue TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    available_at REAL NOT NULL,
+                    leased_until REAL,
+                    lease_id TEXT,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (queue, status, available_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (queue, status, updated_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, job_type, payload, job_id, max_attempts=None):
+        now = time.time()
+        cursor = self._connect().execute(
+            "INSERT OR IGNORE INTO jobs (id, queue, type, payload, status, max_attempts, available_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, self.queue, job_type, json.dumps(payload), max_attempts or JOB_MAX_ATTEMPTS, now, now, now)
+        )
+        return cursor.rowcount == 1
+
+    def requeue(self, job_id):
+        now = time.time()
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, available_at = ?, lease_id = NULL, leased_until = NULL, updated_at = ? "
+            "WHERE id = ? AND queue = ? AND status = 'dead'",
+            (now, now, job_id, self.queue)
+        )
+        return cursor.rowcount == 1
+
+    def reserve(self, visibility_timeout=JOB_VISIBILITY_TIMEOUT):
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE queue = ? AND ("
+                "(status = 'queued' AND available_at <= ?) OR (status = 'running' AND leased_until < ?)"
+                ") ORDER BY available_at LIMIT 1",
+                (self.queue, now, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            if row["status"] == "running" and row["attempts"] >= row["max_attempts"]:
+                # El worker murió durante el último intento
+                conn.execute(
+                    "UPDATE jobs SET status = 'dead', lease_id = NULL, last_error = ?, updated_at = ? WHERE id = ?",
+                    ("Timeout de visibilidad agotado", now, row["id"])
+                )
+                conn.execute("COMMIT")
+                return self.reserve(visibility_timeout)
+
+            lease_id = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, leased_until = ?, lease_id = ?, updated_at = ? WHERE id = ?",
+                (now + visibility_timeout, lease_id, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return Job(row["id"], row["type"], json.loads(row["payload"]), row["attempts"] + 1, row["max_attempts"], lease_id)
+
+    def ack(self, job):
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = 'done', lease_id = NULL, leased_until = NULL, updated_at = ? WHERE id = ? AND lease_id = ?",
+            (time.time(), job.id, job.lease_id)
+        )
+        return cursor.rowcount == 1
+
+    def nack(self, job, error, delay=None, final=False):
+        status = "dead" if final or job.is_last_attempt else "queued"
+        available_at = time.time() + (retry_delay(job.attempts) if delay is None else delay)
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = ?, available_at = ?, lease_id = NULL, leased_until = NULL, last_error = ?, updated_at = ? "
+            "WHERE id = ? AND lease_id = ?",
+            (status, available_at, error, time.time(), job.id, job.lease_id)
+        )
+        if cursor.rowcount != 1:
+            logger.warning(f"[JobQueue] La reserva del trabajo {job.id} había expirado antes del nack")
+        return status
+
+    def extend(self, job, visibility_timeout=JOB_VISIBILITY_TIMEOUT):
+        cursor = self._connect().execute(
+            "UPDATE jobs SET leased_until = ?, updated_at = ? WHERE id = ? AND lease_id = ?",
+            (time.time() + visibility_timeout, time.time(), job.id, job.lease_id)
+        )
+        return cursor.rowcount == 1
+
+    def get(self, job_id):
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        data = dict(row)
+        data["payload"] = json.loads(data["payload"])
+        return data
+
+    def depth(self):
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM jobs WHERE queue = ? AND status = 'queued'", (self.queue,)
+        ).fetchone()
+        return row[0]
+
+    def purge(self, older_than=JOB_DONE_RETENTION):
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE queue = ? AND status = 'done' AND updated_at < ?",
+            (self.queue, time.time() - older_than)
+        )
+        return cursor.rowcount
+
+# Reserva atómica en Redis: recupera reservas expiradas (anulando su lease_id
+# para que un ack tardío del worker original no las dé por terminadas),
+# promueve reintentos vencidos y mueve el primer trabajo disponible a la lista
+# de reservas. Los IDs sin entrada en el hash (purgados) se descartan.
+_REDIS_RESERVE = """
+local ready, delayed, leased, jobs = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local now, timeout, lease_id = tonumber(ARGV[1]), tonumber(ARGV[2]), ARGV[3]
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', leased, '-inf', now)) do
+    redis.call('ZREM', leased, id)
+    local raw = redis.call('HGET', jobs, id)
+    if raw then
+        local job = cjson.decode(raw)
+        job.lease_id = false
+        job.updated_at = now
+        if job.attempts >= job.max_attempts then
+            job.status = 'dead'
+            job.last_error = 'Timeout de visibilidad agotado'
+            redis.call('HSET', jobs, id, cjson.encode(job))
+        else
+            job.status = 'queued'
+            redis.call('HSET', jobs, id, cjson.encode(job))
+            redis.call('LPUSH', ready, id)
+        end
+    end
+end
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', delayed, '-inf', now)) do
+    redis.call('ZREM', delayed, id)
+    redis.call('LPUSH', ready, id)
+end
+local id, raw
+repeat
+    id = redis.call('RPOP', ready)
+    if not id then return false end
+    raw = redis.call('HGET', jobs, id)
+until raw
+local job = cjson.decode(raw)
+job.status = 'running'
+job.attempts = job.attempts + 1
+job.lease_id = lease_id
+job.updated_at = now
+redis.call('HSET', jobs, id, cjson.encode(job))
+redis.call('ZADD', leased, now + timeout, id)
+return cjson.encode(job)
+"""
+
+class RedisBroker(JobBroker):
+    """
+    Broker sobre Redis: lista de disponibles, zsets de reintentos, reservas y
+    terminados, y hash de trabajos.
+    """
+
+    def __init__(self, url: str, queue: str = JOB_QUEUE_NAME):
+        import redis
+
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self._watch_error = redis.WatchError
+        self.queue = queue
+        self.keys = [f"jobs:{queue}:{name}" for name in ("ready", "delayed", "leased", "data")]
+        # Fuera de self.keys: el script de reserva no lo usa
+        self._done = f"jobs:{queue}:done"
+        self._reserve = self.redis.register_script(_REDIS_RESERVE)
+
+    @property
+    def _ready(self):
+        return self.keys[0]
+
+    @property
+    def _delayed(self):
+        return self.keys[1]
+
+    @property
+    def _leased(self):
+        return self.keys[2]
+
+    @property
+    def _data(self):
+        return self.keys[3]
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.redis.hget(self._data, job_id)
+        return json.loads(raw) if raw else None
+
+    def add(self, job_type, payload, job_id, max_attempts=None):
+        now = time.time()
+        job = {
+            "id": job_id,
+            "type": job_type,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts or JOB_MAX_ATTEMPTS,
+            "lease_id": None,
+            "last_error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        if not self.redis.hsetnx(self._data, job_id, json.dumps(job)):
+            return False
+        self.redis.lpush(self._ready, job_id)
+        return True
+
+    def requeue(self, job_id):
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self._data)
+                    data = self._load(job_id)
+                    if not data or data.get("status") != "dead":
+                        pipe.unwatch()
+                        return False
+                    data.update({"status": "queued", "attempts": 0, "lease_id": None, "updated_at": time.time()})
+                    pipe.multi()
+                    pipe.hset(self._data, job_id, json.dumps(data))
+                    pipe.lpush(self._ready, job_id)
+                    pipe.execute()
+                    return True
+                except self._watch_error:
+                    continue
+
+    def reserve(self, visibility_timeout=JOB_VISIBILITY_TIMEOUT):
+        lease_id = uuid.uuid4().hex
+        raw = self._reserve(keys=self.keys, args=[time.time(), visibility_timeout, lease_id])
+        if not raw:
+            return None
+        job = json.loads(raw)
+        return Job(job["id"], job["type"], job["payload"], job["attempts"], job["max_attempts"], lease_id)
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None, available_at: Optional[float] = None) -> bool:
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self._data)
+                    data = self._load(job.id)
+                    if not data or data.get("lease_id") != job.lease_id:
+                        pipe.unwatch()
+                        return False
+                    now = time.time()
+                    data.update({"status": status, "lease_id": None, "last_error": error, "updated_at": now})
+                    pipe.multi()
+                    pipe.hset(self._data, job.id, json.dumps(data))
+                    pipe.zrem(self._leased, job.id)
+                    if status == "done":
+                        pipe.zadd(self._done, {job.id: now})
+                    if available_at is not None:
+                        pipe.zadd(self._delayed, {job.id: available_at})
+                    pipe.execute()
+                    return True
+                except self._watch_error:
+                    # Otro proceso modificó el hash entre WATCH y EXEC: reintentar
+                    continue
+
+    def ack(self, job):
+        return self._finish(job, "done")
+
+    def nack(self, job, error, delay=None, final=False):
+        if final or job.is_last_attempt:
+            status, available_at = "dead", None
+        else:
+            status = "queued"
+            available_at = time.time() + (retry_delay(job.attempts) if delay is None else delay)
+        if not self._finish(job, status, error, available_at):
+            logger.warning(f"[JobQueue] La reserva del trabajo {job.id} había expirado antes del nack")
+        return status
+
+    def extend(self, job, visibility_timeout=JOB_VISIBILITY_TIMEOUT):
+        data = self._load(job.id)
+        if not data or data.get("lease_id") != job.lease_id:
+            return False
+        self.redis.zadd(self._leased, {job.id: time.time() + visibility_timeout})
+        return True
+
+    def get(self, job_id):
+        return self._load(job_id)
+
+    def depth(self):
+        return self.redis.llen(self._ready) + self.redis.zcard(self._delayed)
+
+    def purge(self, older_than=JOB_DONE_RETENTION):
+        job_ids = self.redis.zrangebyscore(self._done, "-inf", time.time() - older_than)
+        if not job_ids:
+            return 0
+        with self.redis.pipeline() as pipe:
+            pipe.hdel(self._data, *job_ids)
+            pipe.zrem(self._done, *job_ids)
+            pipe.execute()
+        return len(job_ids)
+
+_brokers: Dict[str, JobBroker] = {}
+
+def create_broker(url: str = JOB_QUEUE_URL, queue: str = JOB_QUEUE_NAME) -> JobBroker:
+    """Crea el broker indicado por la URL (redis://, rediss:// o sqlite:///ruta)."""
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBroker(url, queue)
+    if url.startswith("sqlite:///"):
+        return SQLiteBroker(url[len("sqlite:///"):], queue)
+    raise ValueError(f"URL de cola no soportada: {url}")
+
+def get_broker(queue: str = JOB_QUEUE_NAME) -> JobBroker:
+    """Broker de una cola, compartido por el proceso."""
+    broker = _brokers.get(queue)
+    if broker is None:
+        broker = _brokers[queue] = create_broker(queue=queue)
+    return broker
+
+def set_broker(broker: Optional[JobBroker], queue: str = JOB_QUEUE_NAME) -> None:
+    """Sustituye el broker de una cola del proceso (pruebas)."""
+    if broker is None:
+        _brokers.pop(queue, None)
+    else:
+        _brokers[queue] = broker
+
+def enqueue_job(job_type: str, payload: Dict[str, Any], max_attempts: Optional[int] = None, job_id: Optional[str] = None) -> str:
+    """
+    Encola un trabajo y devuelve su ID sin esperar a que se ejecute.
+
+    El trabajo va a la cola de su tipo (queue_for). Si se pasa job_id, encolar
+    dos veces el mismo ID no duplica el trabajo mientras se conserve el
+    anterior (hasta JOB_DONE_RETENTION después de terminar).
+    """
+    job_id = job_id or uuid.uuid4().hex
+    add_job(job_type, payload, job_id, max_attempts=max_attempts)
+    return job_id
+
+def add_job(job_type: str, payload: Dict[str, Any], job_id: str, max_attempts: Optional[int] = None) -> bool:
+    """
+    Encola un trabajo con un ID fijo si no existe ya.
+
+    Returns:
+        False si ya había un trabajo con ese ID (en cola, en curso, terminado o 'dead')
+    """
+    queue = queue_for(job_type)
+    broker = get_broker(queue)
+    inserted = broker.add(job_type, payload, job_id, max_attempts=max_attempts)
+    set_queue_depth(f"jobs:{queue}", broker.depth())
+    if inserted:
+        logger.info(f"[JobQueue] Trabajo {job_type} encolado con ID {job_id}")
+    else:
+        logger.info(f"[JobQueue] El trabajo {job_id} ya existía; no se vuelve a encolar")
+    return inserted
+
+def requeue_job(job_type: str, job_id: str) -> bool:
+    """Vuelve a encolar un trabajo que agotó sus intentos ('dead'); devuelve si lo hizo."""
+    requeued = get_broker(queue_for(job_type)).requeue(job_id)
+    if requeued:
+        logger.info(f"[JobQueue] Trabajo {job_id} reencolado tras agotar sus intentos")
+    return requeued
@@ -0,0 +1,672 @@
+"""
+Tabla de líderes materializada.
+
+Firestore sigue siendo la fuente de verdad (user_points, user_achievements,
+user_stats), pero la tabla no se calcula en cada petición: se mantiene una
+proyección ordenada por puntuación que se actualiza de forma incremental cuando
+cambia la puntuación de un usuario (logros desbloqueados, recompensas canjeadas)
+y se reconcilia periódicamente contra Firestore.
+
+La reconciliación lee una instantánea de Firestore que puede tardar; las
+escrituras que llegan mientras tanto se registran (begin_rebuild) y replace()
+las reaplica sobre la instantánea, de modo que no se pierden. Las escrituras
+son puntuaciones absolutas leídas tras escribir en Firestore, así que
+reaplicar una que ya estaba en la instantánea no cambia nada.
+
+Solo un proceso hace la primera carga de una tabla. Los demás esperan
+LEADERBOARD_WAIT_SECONDS a que termine y, si no, sirven esa petición
+directamente desde Firestore en lugar de una tabla vacía.
+
+    - La posición de un usuario es O(log n) en lugar de un count() sobre toda
+      la colección.
+    - Una página no lee los documentos de los usuarios: los campos que se
+      muestran (username, name, profile_picture) se guardan desnormalizados
+      junto a la proyección.
+
+Hay dos almacenes con la misma interfaz:
+    - RedisLeaderboardStore (LEADERBOARD_URL=redis://...), compartido entre
+      procesos, para producción.
+    - MemoryLeaderboardStore (LEADERBOARD_URL=memory://), por proceso, para
+      desarrollo y pruebas.
+
+Las posiciones siguen el criterio anterior: 1 + número de usuarios con más
+puntuación, de modo que los empates comparten posición.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services.social_hydration import AUTHOR_FIELDS, fetch_authors
+from app.utils.monitoring import track_firestore
+from app.utils.pagination import DOCUMENT_ID_FIELD, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_URL = os.getenv("LEADERBOARD_URL", os.getenv("REDIS_URL", "memory://"))
+# Intervalo entre reconciliaciones completas contra Firestore
+LEADERBOARD_RECONCILE_SECONDS = int(os.getenv("LEADERBOARD_RECONCILE_SECONDS", "900"))
+# Espera máxima a que otro proceso termine la primera carga antes de leer de Firestore
+LEADERBOARD_WAIT_SECONDS = float(os.getenv("LEADERBOARD_WAIT_SECONDS", "2"))
+
+# Tabla -> (colección fuente, campo de puntuación)
+BOARDS: Dict[str, Tuple[str, str]] = {
+    "points": ("user_points", "points"),
+    "achievements": ("user_achievements", "achievement_count"),
+    "matches": ("user_stats", "matches_won")
+}
+DEFAULT_BOARD = "points"
+
+# Documentos de usuarios por llamada a get_all durante la reconciliación
+PROFILE_BATCH_SIZE = 300
+
+class LeaderboardStore:
+    """Interfaz común de los almacenes de la proyección."""
+
+    def set_score(self, board: str, user_id: str, score: float) -> None:
+        raise NotImplementedError
+
+    def increment(self, board: str, user_id: str, delta: float) -> float:
+        """Suma delta a la puntuación y devuelve la nueva."""
+        raise NotImplementedError
+
+    def remove(self, board: str, user_id: str) -> None:
+        raise NotImplementedError
+
+    def score(self, board: str, user_id: str) -> Optional[float]:
+        raise NotImplementedError
+
+    def rank(self, board: str, user_id: str) -> Optional[int]:
+        """Posición (1 = primero) o None si el usuario no está en la tabla."""
+        raise NotImplementedError
+
+    def count_above(self, board: str, score: float) -> int:
+        """Número de usuarios con puntuación estrictamente mayor."""
+        raise NotImplementedError
+
+    def range(self, board: str, start: int, count: int) -> List[Tuple[str, float]]:
+        """Entradas [(user_id, puntuación)] en orden descendente desde la posición start (0-based)."""
+        raise NotImplementedError
+
+    def index_after(self, board: str, score: float, user_id: str) -> int:
+        """Índice (0-based) de la primera entrada posterior a (score, user_id)."""
+        raise NotImplementedError
+
+    def size(self, board: str) -> int:
+        raise NotImplementedError
+
+    def begin_rebuild(self, board: str, ttl: int) -> None:
+        """Empieza a registrar las escrituras de la tabla para reaplicarlas en replace()."""
+        raise NotImplementedError
+
+    def replace(self, board: str, scores: Dict[str, float]) -> None:
+        """Sustituye la tabla completa (reconciliación) y reaplica las escrituras registradas."""
+        raise NotImplementedError
+
+    def set_profiles(self, profiles: Dict[str, Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def get_profiles(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError
+
+    def delete_profiles(self, user_ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def last_reconciled(self, board: str) -> float:
+        raise NotImplementedError
+
+    def try_reconcile_lock(self, board: str, ttl: int) -> bool:
+        """Reserva la reconciliación de una tabla para que solo la haga un proceso."""
+        raise NotImplementedError
+
+    def mark_reconciled(self, board: str, timestamp: float) -> None:
+        raise NotImplementedError
+
+class MemoryLeaderboardStore(LeaderboardStore):
+    """
+    Proyección en memoria del proceso.
+
+    Cada tabla es un diccionario de puntuaciones más una lista ordenada de
+    (-puntuación, user_id) sobre la que se busca con bisect.
+    """
+
+    def __init__(self):
+        self._scores: Dict[str, Dict[str, float]] = {}
+        self._order: Dict[str, List[Tuple[float, str]]] = {}
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self._reconciled: Dict[str, float] = {}
+        # Escrituras durante la reconciliación: user_id -> puntuación (None = eliminado)
+        self._journal: Dict[str, Dict[str, Optional[float]]] = {}
+        self._locks: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def _board(self, board: str) -> Tuple[Dict[str, float], List[Tuple[float, str]]]:
+        return self._scores.setdefault(board, {}), self._order.setdefault(board, [])
+
+    def _discard(self, scores, order, user_id):
+        previous = scores.pop(user_id, None)
+        if previous is not None:
+            index = bisect.bisect_left(order, (-previous, user_id))
+            del order[index]
+
+    def _record(self, board, user_id, score):
+        journal = self._journal.get(board)
+        if journal is not None:
+            journal[user_id] = score
+
+    def set_score(self, board, user_id, score):
+        with self._lock:
+            scores, order = self._board(board)
+            self._discard(scores, order, user_id)
+            scores[user_id] = score
+            bisect.insort(order, (-score, user_id))
+            self._record(board, user_id, score)
+
+    def increment(self, board, user_id, delta):
+        with self._lock:
+            score = self._scores.get(board, {}).get(user_id, 0) + delta
+            self.set_score(board, user_id, score)
+            return score
+
+    def remove(self, board, user_id):
+        with self._lock:
+            scores, order = self._board(board)
+            self._discard(scores, order, user_id)
+            self._record(board, user_id, None)
+
+    def score(self, board, user_id):
+        with self._lock:
+            return self._scores.get(board, {}).get(user_id)
+
+    def rank(self, board, user_id):
+        with self._lock:
+            score = self.score(board, user_id)
+            if score is None:
+                return None
+            return self.count_above(board, score) + 1
+
+    def count_above(self, board, score):
+        with self._lock:
+            # (-score,) ordena antes que cualquier (-score, user_id)
+            return bisect.bisect_left(self._order.get(board, []), (-score,))
+
+    def range(self, board, start, count):
+        with self._lock:
+            return [(user_id, -neg) for neg, user_id in self._order.get(board, [])[start:start + count]]
+
+    def index_after(self, board, score, user_id):
+        with self._lock:
+            return bisect.bisect_right(self._order.get(board, []), (-score, user_id))
+
+    def size(self, board):
+        with self._lock:
+            return len(self._scores.get(board, {}))
+
+    def begin_rebuild(self, board, ttl):
+        with self._lock:
+            self._journal[board] = {}
+
+    def replace(self, board, scores):
+        with self._lock:
+            scores = dict(scores)
+            for user_id, score in self._journal.pop(board, {}).items():
+                if score is None:
+                    scores.pop(user_id, None)
+                else:
+                    scores[user_id] = score
+            self._scores[board] = scores
+            self._order[board] = sorted((-score, user_id) for user_id, score in scores.items())
+
+    def set_profiles(self, profiles):
+        with self._lock:
+            self._profiles.update({uid: dict(profile) for uid, profile in profiles.items()})
+
+    def get_profiles(self, user_ids):
+        with self._lock:
+            return {uid: dict(self._profiles[uid]) for uid in user_ids if uid in self._profiles}
+
+    def delete_profiles(self, user_ids):
+        with self._lock:
+            for uid in user_ids:
+                self._profiles.pop(uid, None)
+
+    def last_reconciled(self, board):
+        return self._reconciled.get(board, 0.0)
+
+    def try_reconcile_lock(self, board, ttl):
+        with self._lock:
+            now = time.time()
+            if self._locks.get(board, 0.0) > now:
+                return False
+            self._locks[board] = now + ttl
+            return True
+
+    def mark_reconciled(self, board, timestamp):
+        self._reconciled[board] = timestamp
+
+# Escritura en la tabla que, durante una reconciliación (existe el flag), se
+# registra también en el diario. Los valores son puntuaciones negadas; '' marca
+# un usuario eliminado.
+_REDIS_WRITE = """
+local key, flag, journal = KEYS[1], KEYS[2], KEYS[3]
+local op, user_id = ARGV[1], ARGV[2]
+local value = ''
+if op == 'set' then
+    redis.call('ZADD', key, ARGV[3], user_id)
+    value = ARGV[3]
+elseif op == 'incr' then
+    value = redis.call('ZINCRBY', key, ARGV[3], user_id)
+else
+    redis.call('ZREM', key, user_id)
+end
+if redis.call('EXISTS', flag) == 1 then
+    redis.call('HSET', journal, user_id, value)
+end
+return value
+"""
+
+# Reaplica el diario sobre la tabla reconstruida y la publica de forma atómica
+_REDIS_REPLACE = """
+local key, tmp, flag, journal = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local entries = redis.call('HGETALL', journal)
+for i = 1, #entries, 2 do
+    if entries[i + 1] == '' then
+        redis.call('ZREM', tmp, entries[i])
+    else
+        redis.call('ZADD', tmp, entries[i + 1], entries[i])
+    end
+end
+if redis.call('EXISTS', tmp) == 1 then
+    redis.call('RENAME', tmp, key)
+else
+    redis.call('DEL', key)
+end
+redis.call('DEL', flag, journal)
+return #entries / 2
+"""
+
+class RedisLeaderboardStore(LeaderboardStore):
+    """
+    Proyección en sorted sets de Redis.
+
+    Se guarda la puntuación negada para que ZRANGE devuelva el orden
+    descendente con los empates ordenados por user_id ascendente, igual que
+    el almacén en memoria.
+    """
+
+    def __init__(self, url: str, prefix: str = "leaderboard"):
+        import redis
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._profiles = f"{prefix}:profiles"
+        self._meta = f"{prefix}:reconciled"
+        self._write = self.redis.register_script(_REDIS_WRITE)
+        self._replace = self.redis.register_script(_REDIS_REPLACE)
+
+    def _key(self, board: str) -> str:
+        return f"{self.prefix}:{board}"
+
+    def _write_keys(self, board: str) -> List[str]:
+        key = self._key(board)
+        return [key, f"{key}:rebuilding", f"{key}:journal"]
+
+    def set_score(self, board, user_id, score):
+        self._write(keys=self._write_keys(board), args=["set", user_id, -score])
+
+    def increment(self, board, user_id, delta):
+        return -float(self._write(keys=self._write_keys(board), args=["incr", user_id, -delta]))
+
+    def remove(self, board, user_id):
+        self._write(keys=self._write_keys(board), args=["remove", user_id])
+
+    def score(self, board, user_id):
+        value = self.redis.zscore(self._key(board), user_id)
+        return None if value is None else -value
+
+    def rank(self, board, user_id):
+        score = self.score(board, user_id)
+        if score is None:
+            return None
+        return self.count_above(board, score) + 1
+
+    def count_above(self, board, score):
+        return self.redis.zcount(self._key(board), "-inf", f"({-score}")
+
+    def range(self, board, start, count):
+        if count <= 0:
+            return []
+        entries = self.redis.zrange(self._key(board), start, start + count - 1, withscores=True)
+        return [(user_id, -value) for user_id, value in entries]
+
+    def index_after(self, board, score, user_id):
+        key = self._key(board)
+        current = self.redis.zscore(key, user_id)
+        if current is not None and -current == score:
+            return self.redis.zrank(key, user_id) + 1
+        # El usuario del cursor cambió de puntuación: se continúa tras todos
+        # los que tienen al menos la puntuación del cursor
+        return self.redis.zcount(key, "-inf", -score)
+
+    def size(self, board):
+        return self.redis.zcard(self._key(board))
+
+    def begin_rebuild(self, board, ttl):
+        key, flag, journal = self._write_keys(board)
+        with self.redis.pipeline() as pipe:
+            pipe.delete(journal)
+            pipe.set(flag, "1", ex=ttl)
+            pipe.execute()
+
+    def replace(self, board, scores):
+        key, flag, journal = self._write_keys(board)
+        tmp = f"{key}:rebuild"
+        self.redis.delete(tmp)
+        items = list(scores.items())
+        for i in range(0, len(items), 1000):
+            self.redis.zadd(tmp, {user_id: -score for user_id, score in items[i:i + 1000]})
+        # El script es atómico: los lectores ven la tabla anterior o la nueva
+        # con las escrituras del diario ya aplicadas
+        self._replace(keys=[key, tmp, flag, journal])
+
+    def set_profiles(self, profiles):
+        if profiles:
+            self.redis.hset(self._profiles, mapping={uid: json.dumps(profile, default=str) for uid, profile in profiles.items()})
+
+    def get_profiles(self, user_ids):
+        if not user_ids:
+            return {}
+        values = self.redis.hmget(self._profiles, user_ids)
+        return {uid: json.loads(raw) for uid, raw in zip(user_ids, values) if raw}
+
+    def delete_profiles(self, user_ids):
+        if user_ids:
+            self.redis.hdel(self._profiles, *user_ids)
+
+    def last_reconciled(self, board):
+        value = self.redis.hget(self._meta, board)
+        return float(value) if value else 0.0
+
+    def try_reconcile_lock(self, board, ttl):
+        return bool(self.redis.set(f"{self.prefix}:lock:{board}", "1", nx=True, ex=ttl))
+
+    def mark_reconciled(self, board, timestamp):
+        self.redis.hset(self._meta, board, timestamp)
+
+_store: Optional[LeaderboardStore] = None
+_reconciling: Dict[str, threading.Thread] = {}
+_reconcile_lock = threading.Lock()
+
+def create_store(url: str = LEADERBOARD_URL) -> LeaderboardStore:
+    """Crea el almacén indicado por la URL (redis://, rediss:// o memory://)."""
+    if url.startswith(("redis://", "rediss://")):
+        return RedisLeaderboardStore(url)
+    if url.startswith("memory://"):
+        return MemoryLeaderboardStore()
+    raise ValueError(f"URL de tabla de líderes no soportada: {url}")
+
+def get_store() -> LeaderboardStore:
+    """Almacén compartido por el proceso."""
+    global _store
+    if _store is None:
+        _store = create_store()
+    return _store
+
+def set_store(store: Optional[LeaderboardStore]) -> None:
+    """Sustituye el almacén del proceso (pruebas)."""
+    global _store
+    _store = store
+
+def _get_db():
+    from firebase_admin import firestore
+    return firestore.client()
+
+def profile_fields(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos del usuario que se muestran en la tabla."""
+    return {field: user_data.get(field) for field in AUTHOR_FIELDS}
+
+# Actualizaciones incrementales. Un fallo no debe romper la operación que ya
+# se escribió en Firestore: se registra y la reconciliación lo corrige.
+
+def record_score(board: str, user_id: str, score: float, profile: Optional[Dict[str, Any]] = None) -> None:
+    """Fija la puntuación de un usuario tras escribirla en Firestore."""
+    try:
+        store = get_store()
+        store.set_score(board, user_id, score)
+        if profile is not None:
+            store.set_profiles({user_id: profile_fields(profile)})
+    except Exception as e:
+        logger.error(f"[Leaderboard] Error al actualizar {board} de {user_id}: {str(e)}")
+
+def update_profile(user_id: str, user_data: Dict[str, Any]) -> None:
+    """Actualiza los campos desnormalizados cuando cambia el perfil del usuario."""
+    try:
+        get_store().set_profiles({user_id: profile_fields(user_data)})
+    except Exception as e:
+        logger.error(f"[Leaderboard] Error al actualizar el perfil de {user_id}: {str(e)}")
+
+def remove_user(user_id: str) -> None:
+    """Elimina a un usuario de todas las tablas y sus campos desnormalizados (cuenta borrada)."""
+    try:
+        store = get_store()
+        for board in BOARDS:
+            store.remove(board, user_id)
+        store.delete_profiles([user_id])
+    except Exception as e:
+        logger.error(f"[Leaderboard] Error al eliminar a {user_id}: {str(e)}")
+
+# Lectura
+
+def get_rank(board: str, user_id: str, db=None) -> Optional[int]:
+    """Posición del usuario en la tabla o None si no tiene puntuación."""
+    if not ensure_reconciled(board, db):
+        return _firestore_rank(db or _get_db(), board, user_id)
+    return get_store().rank(board, user_id)
+
+def _hydrate_profiles(store: LeaderboardStore, user_ids: List[str], db=None) -> Dict[str, Dict[str, Any]]:
+    profiles = store.get_profiles(user_ids)
+    missing = [uid for uid in user_ids if uid not in profiles]
+    if missing:
+        # Solo ocurre con usuarios que aún no se desnormalizaron
+        fetched = fetch_authors(db or _get_db(), missing)
+        fetched = {uid: profile_fields(fetched.get(uid, {})) for uid in missing}
+        store.set_profiles(fetched)
+        profiles.update(fetched)
+    return profiles
+
+def get_page(board: str, limit: int, cursor: Optional[str] = None, db=None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Página de la tabla de líderes con los datos del usuario desnormalizados.
+
+    Args:
+        board: Tabla (points, achievements, matches)
+        limit: Tamaño de la página
+        cursor: Token devuelto por la página anterior
+
+    Returns:
+        Tupla (entradas con user_id, campos del perfil, puntuación y posición; cursor siguiente o None)
+
+    Raises:
+        InvalidCursorError: Si el cursor no es válido
+    """
+    if not ensure_reconciled(board, db):
+        return _firestore_page(db or _get_db(), board, limit, cursor)
+    store = get_store()
+    field = BOARDS[board][1]
+
+    start = 0
+    if cursor:
+        values = decode_cursor(cursor, ["score", "id"])
+        start = store.index_after(board, values["score"], values["id"])
+
+    entries = store.range(board, start, limit + 1)
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    profiles = _hydrate_profiles(store, [uid for uid, _ in entries], db)
+
+    page = []
+    rank = None
+    previous_score = None
+    for index, (user_id, score) in enumerate(entries):
+        if score != previous_score:
+            rank = store.count_above(board, score) + 1 if previous_score is None else start + index + 1
+            previous_score = score
+        page.append({
+            "user_id": user_id,
+            **profiles.get(user_id, profile_fields({})),
+            field: int(score) if float(score).is_integer() else score,
+            "rank": rank
+        })
+
+    next_cursor = None
+    if has_more and entries:
+        last_id, last_score = entries[-1]
+        next_cursor = encode_cursor({"score": last_score, "id": last_id})
+    return page, next_cursor
+
+# Lectura directa de Firestore mientras otro proceso hace la primera carga.
+# Mismo orden (puntuación descendente, user_id ascendente) y mismo cursor.
+
+def _firestore_count_above(db, board: str, score: float) -> int:
+    collection, field = BOARDS[board]
+    with track_firestore(collection, "count"):
+        return int(db.collection(collection).where(field, ">", score).count().get()[0][0].value)
+
+def _firestore_rank(db, board: str, user_id: str) -> Optional[int]:
+    collection, field = BOARDS[board]
+    with track_firestore(collection, "get"):
+        doc = db.collection(collection).document(user_id).get()
+    value = (doc.to_dict() or {}).get(field) if doc.exists else None
+    if not isinstance(value, (int, float)):
+        return None
+    return _firestore_count_above(db, board, value) + 1
+
+def _firestore_page(db, board: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    from firebase_admin import firestore
+
+    collection, field = BOARDS[board]
+    query = (
+        db.collection(collection)
+        .order_by(field, direction=firestore.Query.DESCENDING)
+        .order_by(DOCUMENT_ID_FIELD, direction=firestore.Query.ASCENDING)
+    )
+    if cursor:
+        values = decode_cursor(cursor, ["score", "id"])
+        query = query.start_after({field: values["score"], DOCUMENT_ID_FIELD: values["id"]})
+    with track_firestore(collection, "query"):
+        docs = list(query.limit(limit + 1).get())
+    has_more = len(docs) > limit
+    entries = [(doc.id, (doc.to_dict() or {}).get(field, 0)) for doc in docs[:limit]]
+
+    authors = fetch_authors(db, [uid for uid, _ in entries])
+    page = []
+    rank = None
+    previous_score = None
+    first_index = 0
+    for index, (user_id, score) in enumerate(entries):
+        if score != previous_score:
+            rank = _firestore_count_above(db, board, score) + 1 if previous_score is None else rank + index - first_index
+            first_index = index
+            previous_score = score
+        page.append({
+            "user_id": user_id,
+            **profile_fields(authors.get(user_id, {})),
+            field: score,
+            "rank": rank
+        })
+
+    next_cursor = None
+    if has_more and entries:
+        last_id, last_score = entries[-1]
+        next_cursor = encode_cursor({"score": last_score, "id": last_id})
+    return page, next_cursor
+
+# Reconciliación
+
+def _read_scores(db, board: str) -> Dict[str, float]:
+    collection, field = BOARDS[board]
+    scores = {}
+    with track_firestore(collection, "stream"):
+        for doc in db.collection(collection).select([field]).stream():
+            value = (doc.to_dict() or {}).get(field)
+            if isinstance(value, (int, float)):
+                scores[doc.id] = value
+    return scores
+
+def _chunks(values: List[str], size: int) -> Iterable[List[str]]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def reconcile(board: str, db=None) -> int:
+    """
+    Reconstruye una tabla desde Firestore junto con los perfiles desnormalizados.
+
+    Las escrituras que llegan mientras se lee la instantánea se reaplican sobre ella.
+
+    Returns:
+        Número de usuarios en la tabla
+    """
+    db = db or _get_db()
+    store = get_store()
+    started = time.time()
+    # Antes de leer: toda escritura posterior a la lectura queda registrada
+    store.begin_rebuild(board, LEADERBOARD_RECONCILE_SECONDS)
+    scores = _read_scores(db, board)
+    for chunk in _chunks(list(scores), PROFILE_BATCH_SIZE):
+        authors = fetch_authors(db, chunk)
+        store.set_profiles({uid: profile_fields(authors.get(uid, {})) for uid in chunk})
+    store.replace(board, scores)
+    store.mark_reconciled(board, started)
+    size = store.size(board)
+    logger.info(f"[Leaderboard] Tabla {board} reconciliada: {size} usuarios en {time.time() - started:.1f}s")
+    return size
+
+def _reconcile_in_background(board: str, db=None):
+    with _reconcile_lock:
+        thread = _reconciling.get(board)
+        if thread is not None and thread.is_alive():
+            return
+
+        def run():
+            try:
+                reconcile(board, db)
+            except Exception as e:
+                logger.error(f"[Leaderboard] Error al reconciliar {board}: {str(e)}")
+
+        thread = threading.Thread(target=run, name=f"leaderboard-{board}", daemon=True)
+        _reconciling[board] = thread
+        thread.start()
+
+def ensure_reconciled(
+    board: str,
+    db=None,
+    interval: int = LEADERBOARD_RECONCILE_SECONDS,
+    wait: Optional[float] = None
+) -> bool:
+    """
+    Carga la tabla si está vacía y la reconcilia en segundo plano cuando
+    ha pasado el intervalo desde la última reconciliación.
+
+    Returns:
+        False si otro proceso sigue haciendo la primera carga tras esperar
+        wait segundos (por defecto LEADERBOARD_WAIT_SECONDS): la tabla aún no
+        se puede servir
+    """
+    store = get_store()
+    last = store.last_reconciled(board)
+    if not last:
+        # Primera carga: la tabla aún no refleja Firestore y no se puede servir
+        if store.try_reconcile_lock(board, interval):
+            reconcile(board, db)
+            return True
+        deadline = time.monotonic() + (LEADERBOARD_WAIT_SECONDS if wait is None else wait)
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            if store.last_reconciled(board):
+                return True
+        return False
+    if time.time() - last >= interval and store.try_reconcile_lock(board, interval):
+        _reconcile_in_background(board, db)
+    return True
@@ -0,0 +1,186 @@
+"""
+Índice de candidatos para el matchmaking.
+
+Partidos abiertos (matches) y búsquedas activas (match_searches) guardan en
+``bucket_keys`` las claves de los cubos a los que pertenecen:
+
+    nivel | franja horaria | lugar
+
+donde el lugar es el club normalizado o la celda de geohash de la pista o del
+jugador. Cada componente tiene además el comodín ``*`` en los partidos, para
+que una búsqueda sin nivel, sin disponibilidad o sin ubicación siga
+encontrando partidos.
+
+Los partidos guardan su celda en todas las precisiones de GEOCELL_PRECISIONS.
+La búsqueda elige la precisión según el radio y la latitud
+(geo.precision_for_radius), de modo que su vecindad 3x3 cubre el círculo
+también en latitudes altas, donde las celdas se estrechan.
+
+Encontrar candidatos es una consulta ``array_contains_any`` por cada 30 claves
+(normalmente una o dos), en lugar de recorrer todos los partidos abiertos o
+todos los usuarios. Las claves se escriben al encolar (crear partido o
+búsqueda) y la consulta filtra por estado, así que al desencolar basta con
+cambiar el estado.
+
+Cada usuario tiene además un puntero en matchmaking_active/{user_id} con su
+búsqueda activa y los partidos abiertos en los que está, de modo que cancelar
+no necesita buscar entre todos los partidos.
+"""
+import itertools
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from firebase_admin import firestore
+
+from app.services import geo
+from app.utils.monitoring import track_firestore
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_COLLECTION = "matchmaking_active"
+BUCKET_FIELD = "bucket_keys"
+WILDCARD = "*"
+# Precisiones del geohash de los cubos de los partidos (celdas de ~2500, ~150 y ~20 km)
+GEOCELL_PRECISIONS = (2, 3, 4)
+# Precisión de una búsqueda sin radio
+GEOCELL_PRECISION = 4
+# Ancho de los cubos de nivel cuando el nivel es numérico (Padel IQ)
+LEVEL_BUCKET_SIZE = 10
+# Valores máximos de array_contains_any en Firestore
+ANY_QUERY_LIMIT = 30
+
+SLOTS = ("morning", "afternoon", "evening", "night")
+
+def level_bucket(level: Any) -> str:
+    """Cubo de nivel: el texto normalizado o un rango de Padel IQ."""
+    if level is None or level == "":
+        return WILDCARD
+    if isinstance(level, (int, float)):
+        return f"iq{int(level // LEVEL_BUCKET_SIZE)}"
+    return str(level).strip().lower()
+
+def time_slot(moment: Optional[datetime]) -> str:
+    """Franja horaria de un partido."""
+    if not isinstance(moment, datetime):
+        return WILDCARD
+    if moment.hour < 12:
+        return "morning"
+    if moment.hour < 17:
+        return "afternoon"
+    if moment.hour < 21:
+        return "evening"
+    return "night"
+
+def club_key(club: str) -> str:
+    return f"club:{club.strip().lower()}"
+
+def cell_key(cell: str) -> str:
+    return f"cell:{cell}"
+
+def _bucket(level: str, slot: str, place: str) -> str:
+    return f"{level}|{slot}|{place}"
+
+def match_keys(match_data: Dict[str, Any]) -> List[str]:
+    """Claves de cubo de un partido (nivel, franja y lugar, con comodines)."""
+    levels = {level_bucket(match_data.get("level")), WILDCARD}
+    slots = {time_slot(match_data.get("date")), WILDCARD}
+    places = {WILDCARD}
+    if isinstance(match_data.get("location"), str) and match_data["location"].strip():
+        places.add(club_key(match_data["location"]))
+    coords = geo.coords_of(match_data.get("coordinates"))
+    if coords:
+        places.update(cell_key(geo.encode(coords[0], coords[1], p)) for p in GEOCELL_PRECISIONS)
+    return sorted(_bucket(*combo) for combo in itertools.product(levels, slots, places))
+
+def cell_precision(coords: geo.Coords, radius_km: Optional[float]) -> int:
+    """Precisión de las celdas de una búsqueda cuya vecindad 3x3 cubre el radio."""
+    if not radius_km:
+        return GEOCELL_PRECISION
+    precision = geo.precision_for_radius(coords, radius_km)
+    return min(max(precision, GEOCELL_PRECISIONS[0]), GEOCELL_PRECISIONS[-1])
+
+def search_keys(
+    level: Any = None,
+    availability: Iterable[str] = (),
+    clubs: Iterable[str] = (),
+    location: Any = None,
+    radius_km: Optional[float] = None
+) -> List[str]:
+    """Claves que consulta una búsqueda: una por combinación de nivel, franja y lugar aceptables."""
+    slots = sorted({a.strip().lower() for a in availability if a and a.strip().lower() in SLOTS}) or [WILDCARD]
+    places = [club_key(club) for club in clubs if club and club.strip()]
+    coords = geo.coords_of(location)
+    if coords:
+        cell = geo.encode(coords[0], coords[1], cell_precision(coords, radius_km))
+        places += [cell_key(c) for c in [cell] + geo.neighbors(cell)]
+    places = sorted(set(places)) or [WILDCARD]
+    return [_bucket(level_bucket(level), slot, place) for slot in slots for place in places]
+
+def _chunks(values: Sequence[str], size: int = ANY_QUERY_LIMIT) -> Iterable[Sequence[str]]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _lookup(db, collection: str, status: str, keys: Sequence[str], limit: Optional[int]) -> List[Any]:
+    docs: Dict[str, Any] = {}
+    for chunk in _chunks(list(dict.fromkeys(keys))):
+        query = db.collection(collection)\
+            .where("status", "==", status)\
+            .where(BUCKET_FIELD, "array_contains_any", list(chunk))
+        if limit:
+            query = query.limit(limit)
+        with track_firestore(collection, "index_lookup"):
+            for doc in query.get():
+                docs.setdefault(doc.id, doc)
+    return list(docs.values())
+
+def find_open_matches(db, keys: Sequence[str], limit: Optional[int] = 100) -> List[Any]:
+    """Partidos abiertos que comparten algún cubo con las claves."""
+    return _lookup(db, "matches", "open", keys, limit)
+
+def find_searches(db, keys: Sequence[str], limit: Optional[int] = 200) -> List[Any]:
+    """Búsquedas activas que comparten algún cubo con las claves."""
+    return _lookup(db, "match_searches", "searching", keys, limit)
+
+# Puntero por usuario
+
+def get_active(db, user_id: str) -> Dict[str, Any]:
+    """Búsqueda activa y partidos abiertos del usuario ({} si no hay)."""
+    with track_firestore(ACTIVE_COLLECTION, "get"):
+        doc = db.collection(ACTIVE_COLLECTION).document(user_id).get()
+    return (doc.to_dict() or {}) if doc.exists else {}
+
+def set_active_search(db, user_id: str, search_id: Optional[str]) -> None:
+    db.collection(ACTIVE_COLLECTION).document(user_id).set({
+        "search_id": search_id,
+        "updated_at": firestore.SERVER_TIMESTAMP
+    }, merge=True)
+
+def add_active_match(db, user_id: str, match_id: str) -> None:
+    db.collection(ACTIVE_COLLECTION).document(user_id).set({
+        "match_ids": firestore.ArrayUnion([match_id]),
+        "updated_at": firestore.SERVER_TIMESTAMP
+    }, merge=True)
+
+def remove_active_match(db, user_id: str, match_id: str) -> None:
+    db.collection(ACTIVE_COLLECTION).document(user_id).set({
+        "match_ids": firestore.ArrayRemove([match_id]),
+        "updated_at": firestore.SERVER_TIMESTAMP
+    }, merge=True)
+
+def backfill(db) -> int:
+    """
+    Indexa los partidos abiertos existentes y crea los punteros de sus jugadores.
+
+    Returns:
+        Número de partidos indexados
+    """
+    indexed = 0
+    for match in db.collection("matches").where("status", "==", "open").stream():
+        match_data = match.to_dict() or {}
+        match.reference.update({BUCKET_FIELD: match_keys(match_data)})
+        for player_id in match_data.get("players", []):
+            add_active_match(db, player_id, match.id)
+        indexed += 1
+    logger.info(f"[Matchmaking] {indexed} partidos abiertos indexados")
+    return indexed
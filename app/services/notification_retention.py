@@ -0,0 +1,152 @@
+"""
+Retención de notificaciones en segundo plano.
+
+Crear una notificación es una única escritura: el documento lleva
+``expires_at`` (created_at + NOTIFICATION_RETENTION_DAYS) para la política TTL
+de Firestore sobre notifications.expires_at, que borra las caducadas sin coste
+de lectura para la API:
+
+    gcloud firestore fields ttls update expires_at --collection-group=notifications --enable-ttl
+
+El límite de NOTIFICATION_MAX_PER_USER por usuario lo aplica un compactador
+fuera de la petición, en la cola de trabajos ligeros (no espera detrás de los
+análisis de video):
+
+    - Cada NOTIFICATION_COMPACT_EVERY notificaciones creadas para un usuario en
+      este proceso se encola un trabajo compact_notifications para él. El ID del
+      trabajo incluye la ventana de tiempo, así que como mucho hay uno por
+      usuario y ventana.
+    - El contador es de cada proceso, así que el límite es aproximado: con N
+      procesos de API un usuario puede acumular hasta unas
+      N * NOTIFICATION_COMPACT_EVERY notificaciones por encima del máximo antes
+      de que alguno encole la compactación (y el contador se pierde al
+      reiniciar). No se cuenta en Firestore para que crear una notificación
+      siga siendo una única escritura; la compactación sí cuenta en el
+      servidor y borra todo el exceso, sea cual sea.
+    - El trabajo cuenta con count() en el servidor y borra las sobrantes más
+      antiguas por rango de created_at, en commits por lotes.
+    - Sin usuario (p. ej. desde Cloud Scheduler vía /tasks/compact_notifications)
+      borra por rango todas las notificaciones anteriores a la retención,
+      incluidas las escritas directamente sin expires_at.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from firebase_admin import firestore
+
+from app.services.job_queue import COMPACT_NOTIFICATIONS_JOB, Job, enqueue_job
+from app.utils.monitoring import track_firestore
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_COLLECTION = "notifications"
+TTL_FIELD = "expires_at"
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+# Máximo aproximado por usuario (ver el docstring del módulo)
+NOTIFICATION_MAX_PER_USER = int(os.getenv("NOTIFICATION_MAX_PER_USER", "100"))
+# Notificaciones creadas para un usuario en un proceso entre dos compactaciones
+NOTIFICATION_COMPACT_EVERY = int(os.getenv("NOTIFICATION_COMPACT_EVERY", "25"))
+# Ventana (segundos) en la que se deduplican los trabajos de un usuario
+NOTIFICATION_COMPACT_WINDOW = int(os.getenv("NOTIFICATION_COMPACT_WINDOW", "3600"))
+# Borrados por commit (Firestore admite 500 escrituras por batch)
+BATCH_SIZE = 400
+
+_writes: Dict[str, int] = {}
+_writes_lock = threading.Lock()
+
+def expires_at(created_at: datetime) -> datetime:
+    """Momento en el que la política TTL puede borrar la notificación."""
+    return created_at + timedelta(days=NOTIFICATION_RETENTION_DAYS)
+
+def record_write(user_id: str) -> Optional[str]:
+    """
+    Anota una notificación creada y encola la compactación del usuario cada
+    NOTIFICATION_COMPACT_EVERY escrituras en este proceso (best-effort: no se
+    suman las de otros procesos).
+
+    Returns:
+        ID del trabajo encolado, o None si todavía no toca
+    """
+    with _writes_lock:
+        count = _writes.get(user_id, 0) + 1
+        due = count >= NOTIFICATION_COMPACT_EVERY
+        _writes[user_id] = 0 if due else count
+    if not due:
+        return None
+
+    window = int(time.time() // NOTIFICATION_COMPACT_WINDOW)
+    try:
+        return enqueue_job(
+            COMPACT_NOTIFICATIONS_JOB,
+            {"user_id": user_id},
+            job_id=f"{COMPACT_NOTIFICATIONS_JOB}:{user_id}:{window}"
+        )
+    except Exception as e:
+        # La compactación es un mantenimiento: no debe romper la notificación
+        logger.error(f"[Retention] Error al encolar compactación de {user_id}: {str(e)}")
+        return None
+
+def _delete_in_batches(db, query, max_docs: Optional[int] = None) -> int:
+    """Borra los documentos de una consulta ordenada, BATCH_SIZE por commit."""
+    deleted = 0
+    while max_docs is None or deleted < max_docs:
+        size = BATCH_SIZE if max_docs is None else min(BATCH_SIZE, max_docs - deleted)
+        with track_firestore(NOTIFICATIONS_COLLECTION, "compact_query"):
+            docs = list(query.limit(size).get())
+        if not docs:
+            break
+        batch = db.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        with track_firestore(NOTIFICATIONS_COLLECTION, "compact_delete"):
+            batch.commit()
+        deleted += len(docs)
+        if len(docs) < size:
+            break
+    return deleted
+
+def compact_user(db, user_id: str, max_notifications: int = NOTIFICATION_MAX_PER_USER, now: Optional[datetime] = None) -> int:
+    """
+    Aplica la retención a las notificaciones de un usuario.
+
+    Returns:
+        Número de notificaciones borradas
+    """
+    now = now or datetime.utcnow()
+    user_query = db.collection(NOTIFICATIONS_COLLECTION).where("user_id", "==", user_id)
+
+    # Caducadas: rango de created_at
+    cutoff = now - timedelta(days=NOTIFICATION_RETENTION_DAYS)
+    deleted = _delete_in_batches(db, user_query.where("created_at", "<", cutoff).order_by("created_at"))
+
+    # Exceso sobre el máximo: las más antiguas
+    with track_firestore(NOTIFICATIONS_COLLECTION, "count"):
+        total = int(user_query.count().get()[0][0].value)
+    overflow = total - max_notifications
+    if overflow > 0:
+        deleted += _delete_in_batches(db, user_query.order_by("created_at"), max_docs=overflow)
+
+    if deleted:
+        logger.info(f"[Retention] {deleted} notificaciones antiguas eliminadas para usuario {user_id}")
+    return deleted
+
+def compact_expired(db, now: Optional[datetime] = None) -> int:
+    """Borra por rango de created_at todas las notificaciones anteriores a la retención."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=NOTIFICATION_RETENTION_DAYS)
+    query = db.collection(NOTIFICATIONS_COLLECTION).where("created_at", "<", cutoff).order_by("created_at")
+    deleted = _delete_in_batches(db, query)
+    logger.info(f"[Retention] {deleted} notificaciones caducadas eliminadas")
+    return deleted
+
+def compact_notifications(job: Job, pipeline=None, db=None) -> Dict[str, int]:
+    """Handler del worker para los trabajos compact_notifications."""
+    db = db or firestore.client()
+    user_id = job.payload.get("user_id")
+    if user_id:
+        return {"deleted": compact_user(db, user_id)}
+    return {"deleted": compact_expired(db)}
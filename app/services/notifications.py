@@ -4,6 +4,8 @@ import uuid
 import logging
 from typing import Optional, List, Dict, Any, Callable
 from app.core.config import settings
+from app.services.realtime_hub import publish_to_user
+from app.services.notification_retention import NOTIFICATION_MAX_PER_USER, TTL_FIELD, expires_at, record_write
 
 logger = logging.getLogger(__name__)
 
@@ -11,7 +13,7 @@ class NotificationService:
     def __init__(self):
         self._db = None
         self._collection = None
-        self.max_notifications = 100  # Límite máximo de notificaciones por usuario
+        self.max_notifications = NOTIFICATION_MAX_PER_USER  # Límite máximo de notificaciones por usuario
         self._listeners: Dict[str, List[Callable]] = {}  # Almacena los listeners activos
 
     @property
@@ -54,6 +56,7 @@ class NotificationService:
                 raise ValueError(f"Tipo de notificación inválido: {type}")
             
             notification_id = str(uuid.uuid4())
+            created_at = datetime.utcnow()
             notification_data = {
                 'id': notification_id,
                 'user_id': user_id,
@@ -62,7 +65,8 @@ class NotificationService:
                 'message': message,
                 'data': data or {},
                 'read': False,
-                'created_at': datetime.utcnow()
+                'created_at': created_at,
+                TTL_FIELD: expires_at(created_at)
             }
             
             # Crear notificación en Firestore
@@ -72,8 +76,8 @@ class NotificationService:
             # Notificar a los listeners
             self._notify_listeners(user_id, notification_data)
             
-            # Limpiar notificaciones antiguas si excede el límite
-            self._cleanup_old_notifications(user_id)
+            # La retención se aplica en segundo plano (app.services.notification_retention)
+            record_write(user_id)
             
             return notification_id
             
@@ -204,12 +208,15 @@ class NotificationService:
 
     def _notify_listeners(self, user_id: str, notification_data: Dict[str, Any]) -> None:
         """
-        Notifica a todos los listeners registrados para un usuario.
+        Notifica a todos los listeners registrados para un usuario y publica la
+        notificación en su canal de tiempo real (llega a sus WebSockets en
+        cualquier worker).
         
         Args:
             user_id: ID del usuario
             notification_data: Datos de la notificación
         """
+        publish_to_user(user_id, {"type": "notification", "notification": notification_data})
         try:
             if user_id in self._listeners:
                 for callback in self._listeners[user_id]:
@@ -220,25 +227,5 @@ class NotificationService:
         except Exception as e:
             logger.error(f"Error al notificar listeners: {str(e)}")
 
-    def _cleanup_old_notifications(self, user_id: str) -> None:
-        """
-        Limpia notificaciones antiguas si el usuario excede el límite máximo.
-        
-        Args:
-            user_id: ID del usuario
-        """
-        try:
-            # Obtener todas las notificaciones del usuario ordenadas por fecha
-            query = self.collection.where('user_id', '==', user_id)
-            notifications = query.order_by('created_at', direction='DESCENDING').get()
-            
-            # Si excede el límite, eliminar las más antiguas
-            if len(notifications) > self.max_notifications:
-                for doc in notifications[self.max_notifications:]:
-                    doc.reference.delete()
-                logger.info(f"Notificaciones antiguas eliminadas para usuario {user_id}")
-        except Exception as e:
-            logger.error(f"Error al limpiar notificaciones antiguas: {str(e)}")
-
 # Instancia global del servicio de notificaciones
 notification_service = NotificationService() 
\ No newline at end of file
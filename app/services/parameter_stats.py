@@ -0,0 +1,217 @@
+"""
+Estadísticas históricas para ajustar los parámetros del análisis.
+
+En lugar de cargar todo historical_analysis y recorrerlo en cada análisis,
+cada análisis terminado se acumula en agregados por condiciones de grabación
+(iluminación, cámara y resolución) con el algoritmo de Welford: número, media
+y suma de cuadrados de las desviaciones (``m2``) de la velocidad de muñeca de
+los golpes detectados.
+
+Los agregados se guardan en parameter_stats/{condiciones}, un documento por
+combinación de condiciones más el global (ALL_KEY). Arrancar lee solo esos
+documentos (su número no crece con el histórico) y consultar los de un vídeo
+es un acceso a diccionario. Al guardar, lo nuevo de este proceso se combina
+con lo almacenado (fórmula de Chan) dentro de una transacción, así que varios
+procesos pueden acumular sobre el mismo documento sin perder análisis.
+
+Las entradas antiguas de historical_analysis guardaban en ``video_conditions``
+los parámetros ajustados (min_detection_confidence...) en vez de las medidas;
+backfill deduce de ellos la iluminación (la cámara y la resolución quedan como
+desconocidas).
+"""
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from firebase_admin import firestore
+
+logger = logging.getLogger(__name__)
+
+PARAMETER_STATS_COLLECTION = "parameter_stats"
+ALL_KEY = "all"
+# Mínimo de golpes para fiarse de las condiciones concretas en vez de las globales
+MIN_SAMPLES = 30
+
+class RunningStats:
+    """Media y varianza incrementales (Welford)."""
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other: "RunningStats") -> None:
+        """Suma los agregados de otra serie (Chan et al.)."""
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "mean": self.mean, "m2": self.m2}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "RunningStats":
+        data = data or {}
+        return cls(data.get("count", 0), data.get("mean", 0.0), data.get("m2", 0.0))
+
+def lighting_class(brightness: Optional[float]) -> str:
+    if brightness is None:
+        return "unknown"
+    if brightness < 50:
+        return "dark"
+    if brightness > 200:
+        return "bright"
+    return "normal"
+
+def resolution_class(height: Optional[int]) -> str:
+    if not height:
+        return "unknown"
+    if height < 720:
+        return "sd"
+    if height < 1080:
+        return "hd"
+    if height < 2160:
+        return "fhd"
+    return "uhd"
+
+def condition_key(conditions: Optional[Dict[str, Any]]) -> str:
+    """Clave del documento de agregados para unas condiciones de grabación."""
+    conditions = conditions or {}
+    camera = str(conditions.get("camera") or "unknown").replace("/", "-")
+    return "|".join((
+        lighting_class(conditions.get("brightness")),
+        camera,
+        resolution_class(conditions.get("height"))
+    ))
+
+# min_detection_confidence que analyze_video_conditions fijaba según el brillo
+LEGACY_LIGHTING = {0.3: 25.0, 0.6: 225.0}
+LEGACY_NORMAL_BRIGHTNESS = 125.0
+
+def legacy_conditions(video_conditions: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Condiciones medidas a partir de los parámetros que guardaban las entradas antiguas."""
+    if not video_conditions or "min_detection_confidence" not in video_conditions or "brightness" in video_conditions:
+        return video_conditions
+    confidence = video_conditions.get("min_detection_confidence")
+    return {"brightness": LEGACY_LIGHTING.get(confidence, LEGACY_NORMAL_BRIGHTNESS)}
+
+def stroke_speeds(golpes_clasificados: Dict[str, Iterable[Dict[str, Any]]]) -> Iterable[float]:
+    for golpes in (golpes_clasificados or {}).values():
+        for golpe in golpes:
+            if golpe.get("max_wrist_speed") is not None:
+                yield golpe["max_wrist_speed"]
+
+class ParameterStatsStore:
+    """Agregados de velocidad de muñeca por condiciones, en memoria y en Firestore."""
+
+    def __init__(self, db, collection: str = PARAMETER_STATS_COLLECTION, min_samples: int = MIN_SAMPLES):
+        self.db = db
+        self.collection = collection
+        self.min_samples = min_samples
+        self._stats: Dict[str, RunningStats] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def load(self) -> int:
+        """Carga los documentos de agregados (uno por combinación de condiciones)."""
+        stats = {}
+        try:
+            for doc in self.db.collection(self.collection).get():
+                stats[doc.id] = RunningStats.from_dict(doc.to_dict())
+        except Exception as e:
+            logger.error(f"Error al cargar estadísticas de parámetros: {str(e)}")
+        with self._lock:
+            self._stats = stats
+            self._loaded = True
+        logger.info(f"Cargadas estadísticas de {len(stats)} combinaciones de condiciones.")
+        return len(stats)
+
+    def lookup(self, conditions: Optional[Dict[str, Any]]) -> Optional[RunningStats]:
+        """Agregados de las condiciones; los globales si las condiciones tienen pocas muestras."""
+        if not self._loaded:
+            self.load()
+        with self._lock:
+            stats = self._stats.get(condition_key(conditions))
+            if stats is not None and stats.count >= self.min_samples:
+                return stats
+            stats = self._stats.get(ALL_KEY)
+            return stats if stats is not None and stats.count else None
+
+    def record(self, conditions: Optional[Dict[str, Any]], golpes_clasificados: Dict[str, Iterable[Dict[str, Any]]]) -> int:
+        """
+        Acumula los golpes de un análisis terminado y guarda los agregados.
+
+        Returns:
+            Número de golpes acumulados
+        """
+        delta = RunningStats()
+        for speed in stroke_speeds(golpes_clasificados):
+            delta.add(speed)
+        if not delta.count:
+            return 0
+        if not self._loaded:
+            # Lo guardado ya incluye lo de otros procesos; lo nuevo se suma encima
+            self.load()
+        for key in (condition_key(conditions), ALL_KEY):
+            stored = self._persist(key, delta)
+            with self._lock:
+                if stored is not None:
+                    # Lo guardado incluye también lo acumulado por otros procesos
+                    self._stats[key] = stored
+                else:
+                    self._stats.setdefault(key, RunningStats()).merge(delta)
+        return delta.count
+
+    def _persist(self, key: str, delta: RunningStats) -> Optional[RunningStats]:
+        try:
+            ref = self.db.collection(self.collection).document(key)
+            run = firestore.transactional(_merge_in_transaction)
+            return run(self.db.transaction(), ref, delta)
+        except Exception as e:
+            logger.error(f"Error al guardar estadísticas de parámetros {key}: {str(e)}")
+            return None
+
+def _merge_in_transaction(transaction, ref, delta: RunningStats) -> RunningStats:
+    snapshot = ref.get(transaction=transaction)
+    stored = RunningStats.from_dict(snapshot.to_dict() if snapshot.exists else None)
+    stored.merge(delta)
+    transaction.set(ref, stored.to_dict())
+    return stored
+
+def backfill(db, collection: str = PARAMETER_STATS_COLLECTION) -> int:
+    """
+    Recalcula los agregados recorriendo historical_analysis una vez.
+
+    Returns:
+        Número de análisis acumulados
+    """
+    stats: Dict[str, RunningStats] = {}
+    analyses = 0
+    for doc in db.collection("historical_analysis").stream():
+        entry = doc.to_dict() or {}
+        speeds = list(stroke_speeds(entry.get("golpes_clasificados")))
+        for key in (condition_key(legacy_conditions(entry.get("video_conditions"))), ALL_KEY):
+            bucket = stats.setdefault(key, RunningStats())
+            for speed in speeds:
+                bucket.add(speed)
+        analyses += 1
+    for key, bucket in stats.items():
+        db.collection(collection).document(key).set(bucket.to_dict())
+    logger.info(f"Estadísticas de parámetros recalculadas con {analyses} análisis.")
+    return analyses
@@ -6,6 +6,11 @@ import os
 from datetime import datetime
 from typing import Dict, Optional
 from google.cloud import storage
+from app.utils.monitoring import StageTimer
+from app.core.circuit_breaker import get_breaker
+
+# Descarga de videos remotos (HTTP o GCS); una URL no soportada no es un fallo del origen
+download_breaker = get_breaker("video_download", max_concurrent=4, min_calls=5, ignore_exceptions=(ValueError,))
 
 class PipelineManager:
     def __init__(self, model_size: str = "n", device: str = None, num_workers: int = None, batch_size: int = None, output_dir: Optional[str] = None, gcs_bucket: Optional[str] = None):
@@ -19,6 +24,14 @@ class PipelineManager:
         self.video_processor = VideoProcessor(model_size=model_size, device=self.device, num_workers=self.num_workers, batch_size=self.batch_size)
         logger.info(f"PipelineManager inicializado con device={self.device}, workers={self.num_workers}, batch_size={self.batch_size}, output_dir={self.output_dir}, gcs_bucket={self.gcs_bucket}")
 
+    def warmup(self):
+        """Calienta los modelos con un frame sintético antes del primer trabajo."""
+        self.video_processor.warmup()
+
+    def reset(self):
+        """Limpia el estado acumulado por el último análisis (tracking, buffers, frames)."""
+        self.video_processor.reset()
+
     def _download_video(self, video_url: str) -> str:
         """
         Descarga el video a /tmp si es remoto (http(s) o gs://). Devuelve la ruta local.
@@ -29,15 +42,16 @@ class PipelineManager:
         tmp_path = tmp_file.name
         tmp_file.close()
         try:
-            if video_url.startswith('http'):  # HTTP/HTTPS
-                with requests.get(video_url, stream=True, timeout=60) as r:
-                    r.raise_for_status()
-                    with open(tmp_path, 'wb') as f:
-                        shutil.copyfileobj(r.raw, f)
-            elif video_url.startswith('gs://'):  # Google Cloud Storage
-                subprocess.run(['gsutil', 'cp', video_url, tmp_path], check=True)
-            else:
+            if not video_url.startswith(('http', 'gs://')):
                 raise ValueError(f"URL de video no soportada: {video_url}")
+            with download_breaker.guard():
+                if video_url.startswith('http'):  # HTTP/HTTPS
+                    with requests.get(video_url, stream=True, timeout=60) as r:
+                        r.raise_for_status()
+                        with open(tmp_path, 'wb') as f:
+                            shutil.copyfileobj(r.raw, f)
+                else:  # Google Cloud Storage
+                    subprocess.run(['gsutil', 'cp', video_url, tmp_path], check=True, timeout=600)
             logger.info(f"[Pipeline] Video descargado temporalmente en: {tmp_path}")
             return tmp_path
         except Exception as e:
@@ -76,22 +90,27 @@ class PipelineManager:
         """
         temp_video_path = None
         output_path = None
+        timer = StageTimer()
+        job_status = "failed"
         try:
             logger.info(f"[Pipeline] Iniciando análisis para video: {video_path} (tipo={tipo}, nivel={nivel})")
             # Descargar video si es remoto
-            temp_video_path = self._download_video(video_path)
+            with timer.stage("download"):
+                temp_video_path = self._download_video(video_path)
             output_path = os.path.join(self.output_dir, f"output_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4")
             # Procesar video y extraer datos crudos
-            video_results = self.video_processor.process_video(temp_video_path, output_path=output_path)
+            video_results = self.video_processor.process_video(temp_video_path, output_path=output_path, timer=timer)
             logger.info(f"[Pipeline] Procesamiento de video completado. Frames: {video_results['total_frames']}")
             # Determinar nivel (placeholder, se puede mejorar)
             nivel_detectado = nivel
             # Calcular KPIs y Padel IQ
             datos_crudos = video_results['analysis']
-            metricas = calcular_metricas_padel_iq(datos_crudos, nivel_detectado)
+            with timer.stage("kpi"):
+                metricas = calcular_metricas_padel_iq(datos_crudos, nivel_detectado)
             logger.info(f"[Pipeline] KPIs y Padel IQ calculados correctamente.")
             # Subir video procesado a GCS
-            gcs_url = self._upload_to_gcs(output_path, user_id=user_id) if output_path and os.path.exists(output_path) else None
+            with timer.stage("upload"):
+                gcs_url = self._upload_to_gcs(output_path, user_id=user_id) if output_path and os.path.exists(output_path) else None
             # Estructura final para exportar/guardar
             resultado = {
                 "user_id": user_id,
@@ -106,12 +125,15 @@ class PipelineManager:
                 "output_video": output_path,
                 "output_video_gcs_url": gcs_url
             }
+            job_status = "completed"
             logger.info(f"[Pipeline] Análisis completo finalizado para video: {video_path}")
             return resultado
         except Exception as e:
             logger.error(f"[Pipeline] Error en el análisis del pipeline: {str(e)}", exc_info=True)
             return {"error": str(e), "video_path": video_path}
         finally:
+            timings = timer.observe(job_status)
+            logger.info(f"[Pipeline] Tiempos por etapa (s): {timings}")
             # Limpieza del archivo temporal
             if temp_video_path and temp_video_path != video_path and os.path.exists(temp_video_path):
                 try:
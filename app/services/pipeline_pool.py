@@ -0,0 +1,184 @@
+"""
+Pool de pipelines de análisis precargados para el worker.
+
+Crear un PipelineManager carga YOLO y MediaPipe, y la primera inferencia paga
+además la inicialización de kernels. El pool crea N pipelines al arrancar, los
+calienta con un frame sintético y los presta a los trabajos uno a uno. Al
+devolverlos se limpia su estado (tracking, buffers de golpes, frame_cache).
+
+Si la memoria residente del proceso crece por encima del umbral respecto a la
+medida tras el calentamiento, o un pipeline supera el máximo de trabajos, se
+descarta y se crea otro, y se registra el motivo en logs y en métricas. Si
+la creación falla, el hueco queda vacío en el pool y se vuelve a intentar al
+prestarlo, de modo que el pool nunca pierde capacidad.
+"""
+import gc
+import logging
+import os
+import queue
+import resource
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+from app.utils.monitoring import pipeline_recycled
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_POOL_SIZE = int(os.getenv("PIPELINE_POOL_SIZE", os.getenv("WORKER_CONCURRENCY", "1")))
+# Crecimiento de memoria (MB) sobre la línea base que provoca el reciclado
+PIPELINE_MAX_RSS_GROWTH_MB = float(os.getenv("PIPELINE_MAX_RSS_GROWTH_MB", "1024"))
+# Trabajos máximos por pipeline antes de recrearlo (0 = sin límite)
+PIPELINE_MAX_JOBS = int(os.getenv("PIPELINE_MAX_JOBS", "0"))
+# Espera máxima (segundos) por un pipeline libre
+PIPELINE_ACQUIRE_TIMEOUT = float(os.getenv("PIPELINE_ACQUIRE_TIMEOUT", "600"))
+
+def current_rss_mb() -> float:
+    """Memoria residente actual del proceso en MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Sin /proc (macOS): pico de memoria, que allí se expresa en bytes
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class _PooledPipeline:
+    # pipeline es None si no se pudo crear: se reintenta al prestarlo
+    def __init__(self, pipeline: Any = None):
+        self.pipeline = pipeline
+        self.jobs = 0
+
+class PipelinePool:
+    """
+    Pool de tamaño fijo de pipelines calientes.
+
+    Args:
+        factory: Crea un pipeline (por defecto PipelineManager)
+        size: Número de pipelines, normalmente igual a la concurrencia del worker
+        max_rss_growth_mb: Crecimiento de memoria que fuerza el reciclado
+        max_jobs: Trabajos por pipeline antes de recrearlo (0 = sin límite)
+        memory_probe: Función que devuelve la memoria actual en MB
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        size: int = PIPELINE_POOL_SIZE,
+        max_rss_growth_mb: float = PIPELINE_MAX_RSS_GROWTH_MB,
+        max_jobs: int = PIPELINE_MAX_JOBS,
+        memory_probe: Callable[[], float] = current_rss_mb
+    ):
+        self.factory = factory
+        self.size = size
+        self.max_rss_growth_mb = max_rss_growth_mb
+        self.max_jobs = max_jobs
+        self.memory_probe = memory_probe
+        self.recycles = 0
+        self.baseline_mb: Optional[float] = None
+        self._idle: "queue.Queue[_PooledPipeline]" = queue.Queue()
+        self._lock = threading.Lock()
+        # Protege baseline_mb, recycles y _memory_recycled entre hilos
+        self._state_lock = threading.Lock()
+        self._started = False
+        self._memory_recycled = False
+
+    def _create(self) -> _PooledPipeline:
+        pipeline = self.factory()
+        warmup = getattr(pipeline, "warmup", None)
+        if warmup:
+            try:
+                warmup()
+            except Exception as e:
+                # Un fallo de calentamiento no impide usar el pipeline
+                logger.warning(f"[PipelinePool] Error en el calentamiento del pipeline: {str(e)}")
+        return _PooledPipeline(pipeline)
+
+    def start(self):
+        """Crea y calienta todos los pipelines y fija la línea base de memoria."""
+        with self._lock:
+            if self._started:
+                return
+            # Se crean todos antes de encolarlos: si uno falla, start() puede reintentarse
+            pipelines = [self._create() for _ in range(self.size)]
+            for pooled in pipelines:
+                self._idle.put(pooled)
+            gc.collect()
+            self.baseline_mb = self.memory_probe()
+            self._started = True
+        logger.info(f"[PipelinePool] {self.size} pipelines listos; memoria base {self.baseline_mb:.0f} MB")
+
+    def _recycle_reason(self, pooled: _PooledPipeline) -> Optional[str]:
+        if self.max_jobs and pooled.jobs >= self.max_jobs:
+            return "max_jobs"
+        if self.baseline_mb is not None and self.max_rss_growth_mb:
+            memory = self.memory_probe()
+            with self._state_lock:
+                if memory - self.baseline_mb <= self.max_rss_growth_mb:
+                    self._memory_recycled = False
+                elif self._memory_recycled:
+                    # Ya se recicló por memoria y no bajó: no la retiene el pipeline.
+                    # Se toma como nueva base para no reciclar en cada trabajo.
+                    logger.warning(f"[PipelinePool] La memoria sigue en {memory:.0f} MB tras reciclar; se toma como nueva base")
+                    self.baseline_mb = memory
+                    self._memory_recycled = False
+                else:
+                    return "memory"
+        return None
+
+    def _release(self, pooled: _PooledPipeline):
+        pooled.jobs += 1
+        try:
+            reset = getattr(pooled.pipeline, "reset", None)
+            if reset:
+                reset()
+        except Exception as e:
+            logger.error(f"[PipelinePool] Error al limpiar el pipeline: {str(e)}")
+            reason = "reset_error"
+        else:
+            reason = self._recycle_reason(pooled)
+
+        if reason:
+            memory = self.memory_probe()
+            logger.warning(
+                f"[PipelinePool] Reciclando pipeline tras {pooled.jobs} trabajos "
+                f"(motivo={reason}, memoria={memory:.0f} MB, base={self.baseline_mb or 0:.0f} MB)"
+            )
+            pipeline_recycled(reason)
+            with self._state_lock:
+                self.recycles += 1
+                self._memory_recycled = reason == "memory"
+            pooled.pipeline = None
+            gc.collect()
+            try:
+                pooled = self._create()
+            except Exception as e:
+                # Se devuelve el hueco vacío; acquire() reintentará crearlo
+                logger.error(f"[PipelinePool] Error al recrear el pipeline: {str(e)}", exc_info=True)
+                pooled = _PooledPipeline()
+        self._idle.put(pooled)
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = PIPELINE_ACQUIRE_TIMEOUT):
+        """
+        Presta un pipeline caliente durante un trabajo.
+
+        Raises:
+            queue.Empty: Si no queda ninguno libre antes del timeout
+            Exception: El error de la factory si hubo que crear el pipeline y falló
+        """
+        if not self._started:
+            self.start()
+        pooled = self._idle.get(timeout=timeout)
+        if pooled.pipeline is None:
+            try:
+                pooled = self._create()
+            except Exception:
+                self._idle.put(pooled)
+                raise
+        try:
+            yield pooled.pipeline
+        finally:
+            self._release(pooled)
@@ -6,8 +6,8 @@ import mediapipe as mp
 from typing import Dict, Any, List, Tuple, Optional
 import logging
 from .yolo_detector import YOLODetector
-import requests
-import base64
+import threading
+from app.services.roboflow_client import RoboflowClient, RemoteDetectionUnavailable
 
 logger = logging.getLogger(__name__)
 
@@ -33,10 +33,15 @@ class PlayerDetector:
         self.backend = backend
         self.roboflow_api_key = roboflow_api_key
         self.roboflow_model_url = roboflow_model_url
+        self.model_size = model_size
+        self.device = device
+        self.model = None
+        self._model_lock = threading.Lock()
+        self.remote = None
         if backend == 'yolo':
-            self.model = YOLO(f'yolov8{model_size}.pt')
-            self.device = device
-            self.model.to(device)
+            self._ensure_local_model()
+        elif roboflow_api_key and roboflow_model_url:
+            self.remote = RoboflowClient(roboflow_model_url, roboflow_api_key, min_confidence=min_confidence)
         self.confidence_threshold = confidence_threshold
         self.min_confidence = min_confidence
         self.class_ids = {'jugador': 0, 'derecha': 1, 'revés': 2, 'saque': 3, 'volea': 4, 'globo': 5, 'bandeja': 6, 'smash': 7}
@@ -46,10 +51,37 @@ class PlayerDetector:
         self.track_threshold = track_threshold
         self.mp_pose = mp.solutions.pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
 
-    def detect(self, frame):
+    def reset(self):
+        """Reinicia el tracking entre videos; el modelo permanece cargado."""
+        self.track_history = {}
+        if self.remote is not None:
+            self.remote.reset()
+
+    def _ensure_local_model(self):
+        """Carga YOLO bajo demanda (backend remoto que cae al modelo local)."""
+        if self.model is None:
+            with self._model_lock:
+                if self.model is None:
+                    logger.info("Cargando modelo YOLO local como respaldo de Roboflow")
+                    model = YOLO(f'yolov8{self.model_size}.pt')
+                    model.to(self.device)
+                    self.model = model
+        return self.model
+
+    def detect(self, frame, frame_index=None):
+        """
+        Detecta jugadores y golpes en un frame.
+
+        Args:
+            frame: Frame BGR
+            frame_index: Índice del frame en el video; con Roboflow permite muestrear frames
+        """
         if self.backend == 'roboflow':
-            return self.detect_with_roboflow(frame)
-        results = self.model(frame, conf=self.confidence_threshold)
+            return self.detect_with_roboflow(frame, frame_index)
+        return self._detect_local(frame)
+
+    def _detect_local(self, frame):
+        results = self._ensure_local_model()(frame, conf=self.confidence_threshold)
         detections = []
         for result in results:
             boxes = result.boxes
@@ -68,44 +100,20 @@ class PlayerDetector:
                         })
         return detections
 
-    def detect_with_roboflow(self, frame):
-        if self.roboflow_api_key is None or self.roboflow_model_url is None:
+    def detect_with_roboflow(self, frame, frame_index=None):
+        """
+        Detecta jugadores con Roboflow. Si la detección remota no está
+        disponible (latencia fuera de presupuesto o circuito abierto) usa YOLO local.
+        """
+        if self.remote is None:
             logger.error("Roboflow API key o URL no configurados.")
             return []
-        # Convertir frame a JPEG y luego a base64
-        _, buffer = cv2.imencode('.jpg', frame)
-        img_base64 = base64.b64encode(buffer).decode('utf-8')
-        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
         try:
-            logger.info("Enviando frame a Roboflow...")
-            response = requests.post(
-                f"{self.roboflow_model_url}?api_key={self.roboflow_api_key}",
-                data=img_base64,
-                headers=headers,
-                timeout=10
-            )
-            logger.info("Respuesta recibida de Roboflow.")
-            response.raise_for_status()
-            result = response.json()
-            self.last_roboflow_response = result  # Guardar para depuración
-            detections = []
-            for pred in result.get('predictions', []):
-                if pred.get('class') == 'player' and pred.get('confidence', 0) >= self.min_confidence:
-                    x = pred['x']
-                    y = pred['y']
-                    width = pred['width']
-                    height = pred['height']
-                    x1 = x - width / 2
-                    y1 = y - height / 2
-                    x2 = x + width / 2
-                    y2 = y + height / 2
-                    detections.append({
-                        'class': 'jugador',
-                        'box': [x1, y1, x2, y2],
-                        'conf': pred['confidence'],
-                        'center': [x, y]
-                    })
+            detections = self.remote.detect(frame, frame_index)
+            self.last_roboflow_response = detections  # Guardar para depuración
             return detections
+        except RemoteDetectionUnavailable:
+            return self._detect_local(frame)
         except Exception as e:
             logger.error(f"Error en la detección con Roboflow: {e}")
             self.last_roboflow_response = str(e)
@@ -0,0 +1,297 @@
+"""
+Envío de notificaciones push por lotes fuera de la petición.
+
+Los endpoints no llaman a FCM: send_push() encola un trabajo send_push con los
+destinatarios y el worker (app.worker) lo ejecuta con deliver_push():
+
+    - Lee los device_token de todos los destinatarios con get_many.
+    - Agrupa los mensajes en lotes de hasta PUSH_BATCH_SIZE (500, el máximo de
+      FCM) y envía cada lote con una sola llamada ``messaging.send_each``.
+    - Los mensajes con errores transitorios (UNAVAILABLE, INTERNAL, cuota) se
+      reintentan hasta PUSH_MAX_RETRIES veces con backoff exponencial; solo se
+      reenvían los que fallaron, no el lote entero.
+    - Los tokens que FCM da por no registrados (UNREGISTERED,
+      SENDER_ID_MISMATCH) se borran del usuario si siguen siendo su token
+      actual. INVALID_ARGUMENT suele indicar un mensaje mal formado (data o
+      imagen), no un token caducado: se registra como error del mensaje y el
+      token se conserva.
+
+Un fan-out a miles de amigos son así unas pocas llamadas a FCM en lugar de una
+por destinatario. El transporte es intercambiable: FCMTransport en producción y
+FakeTransport en pruebas.
+"""
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from firebase_admin import firestore
+
+from app.core.circuit_breaker import BulkheadFullError, CircuitOpenError, get_breaker
+from app.services.bulk_fetch import chunked, get_many, unique
+from app.services.job_queue import SEND_PUSH_JOB, Job, enqueue_job
+
+logger = logging.getLogger(__name__)
+
+TOKEN_FIELD = "device_token"
+# Máximo de mensajes por llamada a send_each admitido por FCM
+PUSH_BATCH_SIZE = int(os.getenv("PUSH_BATCH_SIZE", "500"))
+PUSH_MAX_RETRIES = int(os.getenv("PUSH_MAX_RETRIES", "3"))
+# Espera base entre reintentos; se duplica en cada intento
+PUSH_RETRY_BACKOFF = float(os.getenv("PUSH_RETRY_BACKOFF", "1"))
+
+# Códigos de error de FCM
+INVALID_TOKEN_ERRORS = {"UNREGISTERED", "SENDER_ID_MISMATCH"}
+PAYLOAD_ERRORS = {"INVALID_ARGUMENT"}
+TRANSIENT_ERRORS = {"UNAVAILABLE", "INTERNAL", "QUOTA_EXCEEDED", "DEADLINE_EXCEEDED"}
+
+class PushMessage:
+    """Push para un token concreto."""
+
+    def __init__(self, token: str, title: str, body: str, data: Optional[Dict[str, Any]] = None, image: Optional[str] = None, user_id: Optional[str] = None):
+        self.token = token
+        self.title = title
+        self.body = body
+        # FCM solo admite valores de tipo cadena en data
+        self.data = {key: str(value) for key, value in (data or {}).items() if value is not None}
+        self.image = image
+        self.user_id = user_id
+
+    def __repr__(self) -> str:
+        return f"PushMessage(user_id={self.user_id!r}, title={self.title!r})"
+
+class PushResult:
+    """Resultado de un mensaje: message_id si se envió o el código de error de FCM."""
+
+    def __init__(self, message_id: Optional[str] = None, error: Optional[str] = None):
+        self.message_id = message_id
+        self.error = error
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+class PushTransport:
+    """Interfaz común de los transportes."""
+
+    def send_each(self, messages: Sequence[PushMessage]) -> List[PushResult]:
+        """
+        Envía un lote en una sola llamada y devuelve un resultado por mensaje.
+
+        Un error que afecta a todo el lote (red, autenticación) se propaga como
+        excepción.
+        """
+        raise NotImplementedError
+
+class FCMTransport(PushTransport):
+
+    def __init__(self):
+        from firebase_admin import messaging
+        self._messaging = messaging
+
+    def _error_code(self, exception: Exception) -> str:
+        messaging = self._messaging
+        if isinstance(exception, messaging.UnregisteredError):
+            return "UNREGISTERED"
+        if isinstance(exception, messaging.SenderIdMismatchError):
+            return "SENDER_ID_MISMATCH"
+        if isinstance(exception, messaging.QuotaExceededError):
+            return "QUOTA_EXCEEDED"
+        return str(getattr(exception, "code", "UNKNOWN")).upper()
+
+    def send_each(self, messages):
+        messaging = self._messaging
+        batch = [
+            messaging.Message(
+                notification=messaging.Notification(title=m.title, body=m.body, image=m.image),
+                data=m.data,
+                token=m.token
+            )
+            for m in messages
+        ]
+        response = messaging.send_each(batch)
+        return [
+            PushResult(message_id=r.message_id) if r.success else PushResult(error=self._error_code(r.exception))
+            for r in response.responses
+        ]
+
+class FakeTransport(PushTransport):
+    """
+    Transporte en memoria para pruebas.
+
+    Args:
+        invalid_tokens: Tokens que responden UNREGISTERED
+        invalid_payload_tokens: Tokens que responden INVALID_ARGUMENT
+        transient_failures: Token -> número de envíos que fallan con UNAVAILABLE
+    """
+
+    def __init__(
+        self,
+        invalid_tokens: Iterable[str] = (),
+        transient_failures: Optional[Dict[str, int]] = None,
+        invalid_payload_tokens: Iterable[str] = ()
+    ):
+        self.invalid_tokens = set(invalid_tokens)
+        self.invalid_payload_tokens = set(invalid_payload_tokens)
+        self.transient_failures = dict(transient_failures or {})
+        self.calls: List[List[PushMessage]] = []
+        self.sent: List[PushMessage] = []
+
+    def send_each(self, messages):
+        self.calls.append(list(messages))
+        results = []
+        for message in messages:
+            if message.token in self.invalid_tokens:
+                results.append(PushResult(error="UNREGISTERED"))
+            elif message.token in self.invalid_payload_tokens:
+                results.append(PushResult(error="INVALID_ARGUMENT"))
+            elif self.transient_failures.get(message.token, 0) > 0:
+                self.transient_failures[message.token] -= 1
+                results.append(PushResult(error="UNAVAILABLE"))
+            else:
+                self.sent.append(message)
+                results.append(PushResult(message_id=f"fake-{len(self.sent)}"))
+        return results
+
+class PushDispatcher:
+    """Envía mensajes en lotes con reintentos de los fallos transitorios."""
+
+    def __init__(
+        self,
+        transport: PushTransport,
+        batch_size: int = PUSH_BATCH_SIZE,
+        max_retries: int = PUSH_MAX_RETRIES,
+        retry_backoff: float = PUSH_RETRY_BACKOFF,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.transport = transport
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.sleep = sleep
+        self.breaker = get_breaker("fcm", max_concurrent=20)
+
+    def _send_batch(self, batch: Sequence[PushMessage]) -> List[PushResult]:
+        try:
+            return self.breaker.call(self.transport.send_each, batch)
+        except (CircuitOpenError, BulkheadFullError) as e:
+            logger.warning(f"[Push] Lote de {len(batch)} rechazado: {str(e)}")
+        except Exception as e:
+            logger.error(f"[Push] Error al enviar lote de {len(batch)}: {str(e)}")
+        # Un fallo del lote completo se trata como transitorio para cada mensaje
+        return [PushResult(error="UNAVAILABLE") for _ in batch]
+
+    def send(self, messages: Sequence[PushMessage]) -> Dict[str, Any]:
+        """
+        Envía los mensajes y devuelve el resumen.
+
+        Returns:
+            Dict con sent, failed, calls e invalid (mensajes con token inválido)
+        """
+        pending = list(messages)
+        sent = calls = 0
+        invalid: List[PushMessage] = []
+        failed: List[PushMessage] = []
+
+        for attempt in range(self.max_retries + 1):
+            retry = []
+            for batch in chunked(pending, self.batch_size):
+                calls += 1
+                for message, result in zip(batch, self._send_batch(batch)):
+                    if result.success:
+                        sent += 1
+                    elif result.error in INVALID_TOKEN_ERRORS:
+                        invalid.append(message)
+                    elif result.error in TRANSIENT_ERRORS:
+                        retry.append(message)
+                    else:
+                        if result.error in PAYLOAD_ERRORS:
+                            logger.error(f"[Push] Mensaje rechazado por FCM ({result.error}), posible payload inválido: {message!r} data={message.data}")
+                        failed.append(message)
+            if not retry:
+                break
+            if attempt == self.max_retries:
+                failed.extend(retry)
+                break
+            self.sleep(self.retry_backoff * (2 ** attempt))
+            pending = retry
+
+        if failed:
+            logger.warning(f"[Push] {len(failed)} mensajes no enviados tras {self.max_retries} reintentos")
+        return {"sent": sent, "failed": len(failed), "calls": calls, "invalid": invalid}
+
+def prune_tokens(db, messages: Sequence[PushMessage]) -> int:
+    """
+    Borra los tokens inválidos de sus usuarios.
+
+    Solo se borra si sigue siendo el token actual: el usuario puede haber
+    registrado uno nuevo mientras tanto.
+    """
+    stale = {m.user_id: m.token for m in messages if m.user_id}
+    if not stale:
+        return 0
+    current = get_many(db, "users", list(stale), field_paths=[TOKEN_FIELD])
+    user_ids = [uid for uid, token in stale.items() if current.get(uid, {}).get(TOKEN_FIELD) == token]
+    for chunk in chunked(user_ids, PUSH_BATCH_SIZE):
+        batch = db.batch()
+        for user_id in chunk:
+            batch.update(db.collection("users").document(user_id), {TOKEN_FIELD: firestore.DELETE_FIELD})
+        batch.commit()
+    if user_ids:
+        logger.info(f"[Push] {len(user_ids)} tokens inválidos eliminados")
+    return len(user_ids)
+
+_dispatcher: Optional[PushDispatcher] = None
+
+def get_dispatcher() -> PushDispatcher:
+    """Dispatcher compartido por el proceso."""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = PushDispatcher(FCMTransport())
+    return _dispatcher
+
+def set_dispatcher(dispatcher: Optional[PushDispatcher]) -> None:
+    """Sustituye el dispatcher del proceso (pruebas)."""
+    global _dispatcher
+    _dispatcher = dispatcher
+
+def send_push(user_ids: Iterable[str], title: str, body: str, data: Optional[Dict[str, Any]] = None, image: Optional[str] = None) -> Optional[str]:
+    """
+    Encola un push para varios usuarios y devuelve el ID del trabajo.
+
+    No lanza excepciones: la notificación en Firestore ya está guardada y el
+    push es un aviso adicional.
+    """
+    user_ids = unique(user_ids)
+    if not user_ids:
+        return None
+    try:
+        return enqueue_job(SEND_PUSH_JOB, {
+            "user_ids": user_ids,
+            "title": title,
+            "body": body,
+            "data": data or {},
+            "image": image
+        })
+    except Exception as e:
+        logger.error(f"[Push] Error al encolar push para {len(user_ids)} usuarios: {str(e)}")
+        return None
+
+def deliver_push(job: Job, pipeline=None, db=None, dispatcher: Optional[PushDispatcher] = None) -> Dict[str, int]:
+    """Handler del worker para los trabajos send_push."""
+    db = db or firestore.client()
+    dispatcher = dispatcher or get_dispatcher()
+    payload = job.payload
+    users = get_many(db, "users", payload.get("user_ids", []), field_paths=[TOKEN_FIELD])
+    messages = [
+        PushMessage(data[TOKEN_FIELD], payload["title"], payload["body"], payload.get("data"), payload.get("image"), user_id=user_id)
+        for user_id, data in users.items()
+        if data.get(TOKEN_FIELD)
+    ]
+    summary = dispatcher.send(messages)
+    pruned = prune_tokens(db, summary["invalid"])
+    logger.info(
+        f"[Push] Trabajo {job.id}: {summary['sent']} enviados, {summary['failed']} fallidos, "
+        f"{pruned} tokens eliminados en {summary['calls']} llamadas"
+    )
+    return {"sent": summary["sent"], "failed": summary["failed"], "pruned": pruned, "calls": summary["calls"]}
@@ -0,0 +1,138 @@
+"""
+Agregados de las calificaciones entre jugadores.
+
+Cada jugador tiene un documento rating_stats/{user_id} con los agregados de
+todas las calificaciones recibidas:
+
+    - count, sum y sum_sq: media y desviación típica sin releer el historial
+    - recent: media móvil exponencial con ventana RATING_EMA_WINDOW, que pesa
+      más los últimos partidos
+
+Calificar un partido guarda el documento de match_ratings y actualiza los
+agregados de cada jugador calificado (y la media ``rating``/``total_ratings``
+de su perfil) en una sola transacción, así que el coste no depende de cuántas
+veces se haya calificado al jugador y dos calificaciones simultáneas no se
+pisan. Consultar la reputación de un jugador es leer un documento.
+"""
+import logging
+import math
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from firebase_admin import firestore
+
+from app.services.bulk_fetch import get_many
+
+logger = logging.getLogger(__name__)
+
+RATING_STATS_COLLECTION = "rating_stats"
+# Partidos que abarca aproximadamente la media reciente
+RATING_EMA_WINDOW = int(os.getenv("RATING_EMA_WINDOW", "10"))
+
+def apply_rating(stats: Optional[Dict[str, Any]], rating: float, window: int = RATING_EMA_WINDOW) -> Dict[str, Any]:
+    """Agregados tras sumar una calificación."""
+    stats = stats or {}
+    alpha = 2.0 / (window + 1)
+    recent = stats.get("recent")
+    return {
+        "count": stats.get("count", 0) + 1,
+        "sum": stats.get("sum", 0.0) + rating,
+        "sum_sq": stats.get("sum_sq", 0.0) + rating * rating,
+        "recent": rating if recent is None else recent + alpha * (rating - recent)
+    }
+
+def summarize(stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reputación a partir de los agregados: media, número, desviación y media reciente."""
+    stats = stats or {}
+    count = stats.get("count", 0)
+    if not count:
+        return {"average": None, "count": 0, "stddev": None, "recent": None}
+    average = stats["sum"] / count
+    variance = max(stats["sum_sq"] / count - average * average, 0.0)
+    return {
+        "average": round(average, 3),
+        "count": count,
+        "stddev": round(math.sqrt(variance), 3),
+        "recent": round(stats["recent"], 3)
+    }
+
+def _record_in_transaction(transaction, db, rating_ref, rating_data: Dict[str, Any], ratings: Dict[str, float]) -> Dict[str, Dict[str, Any]]:
+    # Firestore exige todas las lecturas antes de la primera escritura
+    refs = {player_id: db.collection(RATING_STATS_COLLECTION).document(player_id) for player_id in ratings}
+    user_refs = {player_id: db.collection("users").document(player_id) for player_id in ratings}
+    current = {}
+    for player_id, ref in refs.items():
+        snapshot = ref.get(transaction=transaction)
+        current[player_id] = snapshot.to_dict() if snapshot.exists else None
+    # Una cuenta borrada no se recrea como perfil con solo la reputación
+    existing_users = {player_id for player_id, ref in user_refs.items() if ref.get(transaction=transaction).exists}
+
+    now = datetime.utcnow()
+    updated = {}
+    for player_id, rating in ratings.items():
+        stats = apply_rating(current[player_id], rating)
+        transaction.set(refs[player_id], {**stats, "updated_at": now})
+        summary = summarize(stats)
+        if player_id in existing_users:
+            transaction.update(user_refs[player_id], {
+                "rating": summary["average"],
+                "total_ratings": summary["count"],
+                "updated_at": now
+            })
+        updated[player_id] = summary
+    transaction.set(rating_ref, rating_data)
+    return updated
+
+def record_ratings(db, rating_ref, rating_data: Dict[str, Any], ratings: Dict[str, float]) -> Dict[str, Dict[str, Any]]:
+    """
+    Guarda una calificación de partido y actualiza los agregados de los calificados.
+
+    Args:
+        rating_ref: Documento de match_ratings a crear con rating_data
+        ratings: Calificación por jugador que cuenta para su reputación
+
+    Returns:
+        Reputación actualizada por jugador
+    """
+    run = firestore.transactional(_record_in_transaction)
+    return run(db.transaction(), db, rating_ref, rating_data, ratings)
+
+def get_reputation(db, user_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Reputación de varios jugadores (un documento por jugador, en una lectura agrupada)."""
+    user_ids = list(user_ids)
+    stats = get_many(db, RATING_STATS_COLLECTION, user_ids)
+    return {user_id: summarize(stats.get(user_id)) for user_id in user_ids}
+
+def backfill(db) -> int:
+    """
+    Recalcula los agregados de todos los jugadores a partir de match_ratings.
+
+    Returns:
+        Número de jugadores con agregados
+    """
+    stats: Dict[str, Dict[str, Any]] = {}
+    for doc in db.collection("match_ratings").order_by("created_at").stream():
+        data = doc.to_dict() or {}
+        for player_id, rating in (data.get("ratings") or {}).items():
+            if player_id != data.get("rater_id"):
+                stats[player_id] = apply_rating(stats.get(player_id), rating)
+
+    now = datetime.utcnow()
+    items = list(stats.items())
+    existing_users = set(get_many(db, "users", [player_id for player_id, _ in items], field_paths=["rating"]))
+    # Dos escrituras por jugador (Firestore admite 500 por batch)
+    for start in range(0, len(items), 200):
+        batch = db.batch()
+        for player_id, player_stats in items[start:start + 200]:
+            summary = summarize(player_stats)
+            batch.set(db.collection(RATING_STATS_COLLECTION).document(player_id), {**player_stats, "updated_at": now})
+            if player_id in existing_users:
+                batch.update(db.collection("users").document(player_id), {
+                    "rating": summary["average"],
+                    "total_ratings": summary["count"],
+                    "updated_at": now
+                })
+        batch.commit()
+    logger.info(f"[Ratings] Agregados recalculados para {len(items)} jugadores")
+    return len(items)
@@ -0,0 +1,312 @@
+"""
+Entrega en tiempo real de notificaciones entre workers.
+
+Con varios workers de uvicorn, el WebSocket de un usuario vive en un único
+proceso, pero la notificación puede crearse en cualquier otro (o en app.worker).
+El ConnectionHub de cada proceso guarda sus sockets locales y se suscribe al
+canal ``<REALTIME_CHANNEL_PREFIX><user_id>`` mientras tenga al menos un socket
+de ese usuario; publicar en el canal llega solo a los procesos que lo tienen
+conectado, y cada uno lo reparte a todos los sockets del usuario.
+
+Backends con la misma interfaz:
+    - RedisPubSub (REALTIME_URL=redis://...), para producción.
+    - MemoryPubSub (REALTIME_URL=memory://), para desarrollo y pruebas. Varias
+      instancias sobre el mismo MemoryBroker simulan varios workers.
+
+Heartbeat: cada REALTIME_HEARTBEAT_INTERVAL segundos el hub envía
+``{"type": "ping"}`` a cada socket; los que no han enviado nada (p. ej. un
+``pong``) en REALTIME_HEARTBEAT_TIMEOUT segundos, o fallan al escribir, se
+cierran y se dan de baja.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+REALTIME_URL = os.getenv("REALTIME_URL", os.getenv("REDIS_URL", "memory://"))
+REALTIME_CHANNEL_PREFIX = os.getenv("REALTIME_CHANNEL_PREFIX", "padelyzer:notifications:")
+REALTIME_HEARTBEAT_INTERVAL = float(os.getenv("REALTIME_HEARTBEAT_INTERVAL", "30"))
+REALTIME_HEARTBEAT_TIMEOUT = float(os.getenv("REALTIME_HEARTBEAT_TIMEOUT", "90"))
+# Espera máxima de cada lectura del canal (permite parar el listener)
+LISTEN_TIMEOUT = 1.0
+
+Message = Tuple[str, str]
+
+class PubSubBackend:
+    """Interfaz común de los backends de pub/sub."""
+
+    def publish(self, channel: str, message: str) -> None:
+        """Publica un mensaje. Síncrono y seguro desde cualquier hilo."""
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str) -> None:
+        raise NotImplementedError
+
+    async def unsubscribe(self, channel: str) -> None:
+        raise NotImplementedError
+
+    async def get_message(self, timeout: float) -> Optional[Message]:
+        """Siguiente (canal, mensaje) suscrito, o None si no llega ninguno en timeout."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+class MemoryBroker:
+    """Bus en memoria compartido por varios MemoryPubSub (uno por "worker")."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: List["MemoryPubSub"] = []
+
+    def attach(self, subscriber: "MemoryPubSub") -> None:
+        with self._lock:
+            self._subscribers.append(subscriber)
+
+    def detach(self, subscriber: "MemoryPubSub") -> None:
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def publish(self, channel: str, message: str) -> int:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        return sum(1 for subscriber in subscribers if subscriber._offer(channel, message))
+
+class MemoryPubSub(PubSubBackend):
+
+    def __init__(self, broker: Optional[MemoryBroker] = None):
+        self.broker = broker or MemoryBroker()
+        self.broker.attach(self)
+        self._channels: Set[str] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    def _offer(self, channel: str, message: str) -> bool:
+        if channel not in self._channels or self._loop is None:
+            return False
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (channel, message))
+        return True
+
+    def publish(self, channel, message):
+        self.broker.publish(channel, message)
+
+    async def subscribe(self, channel):
+        self._ensure_queue()
+        self._channels.add(channel)
+
+    async def unsubscribe(self, channel):
+        self._channels.discard(channel)
+
+    async def get_message(self, timeout):
+        queue = self._ensure_queue()
+        try:
+            return await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self.broker.detach(self)
+
+class RedisPubSub(PubSubBackend):
+
+    def __init__(self, url: str):
+        import redis
+        import redis.asyncio as aioredis
+        self._publisher = redis.Redis.from_url(url, decode_responses=True)
+        self._client = aioredis.Redis.from_url(url, decode_responses=True)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+
+    def publish(self, channel, message):
+        self._publisher.publish(channel, message)
+
+    async def subscribe(self, channel):
+        await self._pubsub.subscribe(channel)
+
+    async def unsubscribe(self, channel):
+        await self._pubsub.unsubscribe(channel)
+
+    async def get_message(self, timeout):
+        if not self._pubsub.subscribed:
+            await asyncio.sleep(timeout)
+            return None
+        message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        if not message or message.get("type") != "message":
+            return None
+        return message["channel"], message["data"]
+
+    async def close(self):
+        await self._pubsub.close()
+        await self._client.close()
+
+class _Connection:
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.last_seen = time.monotonic()
+
+class ConnectionHub:
+    """Sockets locales del proceso y su enlace con el pub/sub."""
+
+    def __init__(
+        self,
+        backend: PubSubBackend,
+        heartbeat_interval: float = REALTIME_HEARTBEAT_INTERVAL,
+        heartbeat_timeout: float = REALTIME_HEARTBEAT_TIMEOUT
+    ):
+        self.backend = backend
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self._connections: Dict[str, List[_Connection]] = {}
+        self._lock = asyncio.Lock()
+        self._tasks: List[asyncio.Task] = []
+
+    @staticmethod
+    def channel(user_id: str) -> str:
+        return f"{REALTIME_CHANNEL_PREFIX}{user_id}"
+
+    def _ensure_started(self) -> None:
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._listen()),
+                asyncio.create_task(self._heartbeat())
+            ]
+
+    async def connect(self, user_id: str, websocket) -> None:
+        """Registra un socket ya aceptado y suscribe el proceso al canal del usuario."""
+        self._ensure_started()
+        async with self._lock:
+            connections = self._connections.setdefault(user_id, [])
+            connections.append(_Connection(websocket))
+            if len(connections) == 1:
+                await self.backend.subscribe(self.channel(user_id))
+        logger.info(f"[Realtime] Socket conectado para usuario {user_id}")
+
+    async def disconnect(self, user_id: str, websocket) -> None:
+        """Da de baja un socket; sin sockets del usuario, se cancela la suscripción."""
+        async with self._lock:
+            connections = [c for c in self._connections.get(user_id, []) if c.websocket is not websocket]
+            if connections:
+                self._connections[user_id] = connections
+                return
+            if self._connections.pop(user_id, None) is not None:
+                await self.backend.unsubscribe(self.channel(user_id))
+
+    def touch(self, user_id: str, websocket) -> None:
+        """Anota actividad del cliente (cualquier mensaje, incluido pong)."""
+        for connection in self._connections.get(user_id, []):
+            if connection.websocket is websocket:
+                connection.last_seen = time.monotonic()
+
+    def connection_count(self, user_id: Optional[str] = None) -> int:
+        if user_id is not None:
+            return len(self._connections.get(user_id, []))
+        return sum(len(connections) for connections in self._connections.values())
+
+    def publish(self, user_id: str, payload: Dict[str, Any]) -> None:
+        """Envía un mensaje a todos los sockets del usuario, estén en el worker que estén."""
+        self.backend.publish(self.channel(user_id), json.dumps(payload, default=str))
+
+    async def _deliver(self, channel: str, raw: str) -> None:
+        user_id = channel[len(REALTIME_CHANNEL_PREFIX):]
+        payload = json.loads(raw)
+        for connection in list(self._connections.get(user_id, [])):
+            try:
+                await connection.websocket.send_json(payload)
+            except Exception as e:
+                logger.warning(f"[Realtime] Socket de {user_id} descartado: {str(e)}")
+                await self.disconnect(user_id, connection.websocket)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self.backend.get_message(LISTEN_TIMEOUT)
+                if message is not None:
+                    await self._deliver(*message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Realtime] Error en el listener de pub/sub: {str(e)}")
+                await asyncio.sleep(LISTEN_TIMEOUT)
+
+    async def sweep(self) -> int:
+        """Envía el ping y cierra los sockets sin actividad. Devuelve cuántos se cerraron."""
+        now = time.monotonic()
+        closed = 0
+        for user_id, connections in list(self._connections.items()):
+            for connection in list(connections):
+                stale = now - connection.last_seen > self.heartbeat_timeout
+                try:
+                    if stale:
+                        await connection.websocket.close()
+                    else:
+                        await connection.websocket.send_json({"type": "ping"})
+                        continue
+                except Exception:
+                    pass
+                await self.disconnect(user_id, connection.websocket)
+                closed += 1
+        return closed
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                closed = await self.sweep()
+                if closed:
+                    logger.info(f"[Realtime] {closed} sockets inactivos cerrados")
+            except Exception as e:
+                logger.error(f"[Realtime] Error en el heartbeat: {str(e)}")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.backend.close()
+
+def create_backend(url: str = REALTIME_URL) -> PubSubBackend:
+    """Crea el backend indicado por la URL (redis://, rediss:// o memory://)."""
+    if url.startswith(("redis://", "rediss://")):
+        return RedisPubSub(url)
+    if url.startswith("memory://"):
+        return MemoryPubSub()
+    raise ValueError(f"URL de pub/sub no soportada: {url}")
+
+_hub: Optional[ConnectionHub] = None
+
+def get_hub() -> ConnectionHub:
+    """Hub compartido por el proceso."""
+    global _hub
+    if _hub is None:
+        _hub = ConnectionHub(create_backend())
+    return _hub
+
+def set_hub(hub: Optional[ConnectionHub]) -> None:
+    """Sustituye el hub del proceso (pruebas)."""
+    global _hub
+    _hub = hub
+
+async def close_hub() -> None:
+    """Detiene el hub del proceso si se llegó a crear."""
+    global _hub
+    if _hub is not None:
+        await _hub.stop()
+        _hub = None
+
+def publish_to_user(user_id: str, payload: Dict[str, Any]) -> None:
+    """Publica sin propagar errores: la notificación ya está guardada y el cliente puede listarla."""
+    try:
+        get_hub().publish(user_id, payload)
+    except Exception as e:
+        logger.error(f"[Realtime] Error al publicar para {user_id}: {str(e)}")
@@ -0,0 +1,254 @@
+"""
+Cliente de detección remota en Roboflow.
+
+Sustituye la petición síncrona por frame de PlayerDetector.detect_with_roboflow:
+
+    - Reutiliza conexiones keep-alive con una requests.Session cuyo pool admite
+      ROBOFLOW_MAX_IN_FLIGHT peticiones simultáneas. Los hilos de
+      VideoProcessor, que procesan varios frames a la vez, comparten la sesión,
+      así que hay varias peticiones en vuelo en lugar de esperar cada ida y vuelta.
+    - Reduce resolución y calidad JPEG de forma adaptativa cuando la latencia
+      crece, y las recupera cuando baja. Las cajas se reescalan al frame original.
+    - Solo envía uno de cada ROBOFLOW_SAMPLE_EVERY frames. Las detecciones se
+      guardan por índice de frame y los demás frames reutilizan la del frame
+      muestreado anterior más cercano; como los frames se procesan en paralelo
+      y fuera de orden, no sirve "la última recibida".
+    - Si la latencia media supera el presupuesto, o el circuito está abierto,
+      indica que hay que usar el modelo local durante ROBOFLOW_FALLBACK_SECONDS.
+
+Para pruebas sin red, app.services.roboflow_stub levanta un servidor local
+compatible.
+"""
+import base64
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.core.circuit_breaker import get_breaker, CircuitOpenError, BulkheadFullError
+
+logger = logging.getLogger(__name__)
+
+ROBOFLOW_MAX_IN_FLIGHT = int(os.getenv("ROBOFLOW_MAX_IN_FLIGHT", "8"))
+ROBOFLOW_SAMPLE_EVERY = int(os.getenv("ROBOFLOW_SAMPLE_EVERY", "3"))
+# Latencia media (s) por petición a partir de la cual se usa el modelo local
+ROBOFLOW_LATENCY_BUDGET = float(os.getenv("ROBOFLOW_LATENCY_BUDGET", "0.5"))
+ROBOFLOW_FALLBACK_SECONDS = float(os.getenv("ROBOFLOW_FALLBACK_SECONDS", "60"))
+ROBOFLOW_JPEG_QUALITY = int(os.getenv("ROBOFLOW_JPEG_QUALITY", "80"))
+ROBOFLOW_MAX_WIDTH = int(os.getenv("ROBOFLOW_MAX_WIDTH", "640"))
+ROBOFLOW_TIMEOUT = float(os.getenv("ROBOFLOW_TIMEOUT", "10"))
+
+# Límites de la compresión adaptativa
+MIN_JPEG_QUALITY = 50
+MIN_WIDTH = 320
+# Peso de la última muestra en la media móvil de latencia
+LATENCY_SMOOTHING = 0.2
+# Muestras necesarias antes de decidir por latencia
+MIN_LATENCY_SAMPLES = 5
+# Frames muestreados cuyas detecciones se conservan
+DETECTION_CACHE_SIZE = 64
+
+roboflow_breaker = get_breaker("roboflow", max_concurrent=ROBOFLOW_MAX_IN_FLIGHT, max_wait=ROBOFLOW_TIMEOUT)
+
+class RemoteDetectionUnavailable(Exception):
+    """La detección remota no está disponible y debe usarse el modelo local."""
+
+def parse_predictions(result: Dict[str, Any], min_confidence: float, scale: float = 1.0) -> List[Dict[str, Any]]:
+    """
+    Convierte la respuesta de Roboflow al formato de detecciones de PlayerDetector.
+
+    Args:
+        result: JSON de respuesta con 'predictions' (centro, ancho y alto)
+        min_confidence: Confianza mínima para aceptar la detección
+        scale: Factor aplicado al frame enviado; las coordenadas se dividen por él
+    """
+    detections = []
+    for pred in result.get('predictions', []):
+        if pred.get('class') == 'player' and pred.get('confidence', 0) >= min_confidence:
+            x = pred['x'] / scale
+            y = pred['y'] / scale
+            width = pred['width'] / scale
+            height = pred['height'] / scale
+            detections.append({
+                'class': 'jugador',
+                'box': [x - width / 2, y - height / 2, x + width / 2, y + height / 2],
+                'conf': pred['confidence'],
+                'center': [x, y]
+            })
+    return detections
+
+class RoboflowClient:
+    """
+    Cliente de detección remota con sesión keep-alive, compresión adaptativa,
+    muestreo de frames y decisión de fallback por latencia.
+    """
+
+    def __init__(
+        self,
+        model_url: str,
+        api_key: str,
+        min_confidence: float = 0.1,
+        max_in_flight: int = ROBOFLOW_MAX_IN_FLIGHT,
+        sample_every: int = ROBOFLOW_SAMPLE_EVERY,
+        latency_budget: float = ROBOFLOW_LATENCY_BUDGET,
+        fallback_seconds: float = ROBOFLOW_FALLBACK_SECONDS,
+        jpeg_quality: int = ROBOFLOW_JPEG_QUALITY,
+        max_width: int = ROBOFLOW_MAX_WIDTH,
+        timeout: float = ROBOFLOW_TIMEOUT,
+        session: Optional[requests.Session] = None
+    ):
+        self.model_url = model_url
+        self.api_key = api_key
+        self.min_confidence = min_confidence
+        self.max_in_flight = max_in_flight
+        self.sample_every = max(sample_every, 1)
+        self.latency_budget = latency_budget
+        self.fallback_seconds = fallback_seconds
+        self.timeout = timeout
+        self.jpeg_quality = jpeg_quality
+        self.max_width = max_width
+        self._initial_quality = jpeg_quality
+        self._initial_width = max_width
+
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self.latency_ewma: Optional[float] = None
+        self.latency_samples = 0
+        self.requests_sent = 0
+        self._fallback_until = 0.0
+        # Detecciones por índice de frame muestreado
+        self._detections: Dict[int, List[Dict[str, Any]]] = {}
+
+    # Latencia y fallback
+
+    @property
+    def use_local(self) -> bool:
+        """True mientras dure el periodo de fallback al modelo local."""
+        return time.monotonic() < self._fallback_until
+
+    def _start_fallback(self, reason: str):
+        with self._lock:
+            if time.monotonic() < self._fallback_until:
+                return
+            self._fallback_until = time.monotonic() + self.fallback_seconds
+            # Al volver se parte de cero para no arrastrar la latencia anterior
+            self.latency_ewma = None
+            self.latency_samples = 0
+        logger.warning(f"[Roboflow] Usando el modelo local durante {self.fallback_seconds:.0f}s: {reason}")
+
+    def _observe_latency(self, seconds: float):
+        with self._lock:
+            if self.latency_ewma is None:
+                self.latency_ewma = seconds
+            else:
+                self.latency_ewma += LATENCY_SMOOTHING * (seconds - self.latency_ewma)
+            self.latency_samples += 1
+            latency = self.latency_ewma
+            samples = self.latency_samples
+            self._adapt_compression(latency)
+
+        if samples >= MIN_LATENCY_SAMPLES and latency > self.latency_budget:
+            self._start_fallback(f"latencia media {latency * 1000:.0f} ms > {self.latency_budget * 1000:.0f} ms")
+
+    def _adapt_compression(self, latency: float):
+        """Baja calidad y resolución cuando la latencia se acerca al presupuesto; las sube si sobra margen."""
+        if latency > self.latency_budget * 0.5:
+            self.jpeg_quality = max(MIN_JPEG_QUALITY, self.jpeg_quality - 10)
+            self.max_width = max(MIN_WIDTH, int(self.max_width * 0.8))
+        elif latency < self.latency_budget * 0.25:
+            self.jpeg_quality = min(self._initial_quality, self.jpeg_quality + 5)
+            self.max_width = min(self._initial_width, int(self.max_width * 1.1))
+
+    # Peticiones
+
+    def encode_frame(self, frame: np.ndarray) -> Tuple[str, float]:
+        """
+        Redimensiona y comprime el frame según los parámetros actuales.
+
+        Returns:
+            Tupla (JPEG en base64, factor de escala aplicado)
+        """
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.max_width / float(width))
+        if scale < 1.0:
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+        if not ok:
+            raise ValueError("No se pudo codificar el frame")
+        return base64.b64encode(buffer).decode('utf-8'), scale
+
+    def _post(self, data: str) -> Dict[str, Any]:
+        response = self.session.post(
+            self.model_url,
+            params={"api_key": self.api_key},
+            data=data,
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _detect_remote(self, frame: np.ndarray, frame_index: Optional[int] = None) -> List[Dict[str, Any]]:
+        if self.use_local:
+            raise RemoteDetectionUnavailable("fallback local activo")
+        data, scale = self.encode_frame(frame)
+        start = time.monotonic()
+        try:
+            result = roboflow_breaker.call(self._post, data)
+        except (CircuitOpenError, BulkheadFullError) as e:
+            self._start_fallback(str(e))
+            raise RemoteDetectionUnavailable(str(e)) from e
+        finally:
+            self.requests_sent += 1
+        self._observe_latency(time.monotonic() - start)
+        detections = parse_predictions(result, self.min_confidence, scale)
+        if frame_index is not None:
+            with self._lock:
+                self._detections[frame_index] = detections
+                if len(self._detections) > DETECTION_CACHE_SIZE:
+                    del self._detections[min(self._detections)]
+        return detections
+
+    def _nearest_sampled(self, frame_index: int) -> Optional[List[Dict[str, Any]]]:
+        """Detección del frame muestreado anterior más cercano, o None si no hay ninguno."""
+        with self._lock:
+            earlier = [i for i in self._detections if i <= frame_index]
+            if not earlier:
+                return None
+            return [dict(d) for d in self._detections[max(earlier)]]
+
+    def detect(self, frame: np.ndarray, frame_index: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Detecta jugadores en un frame.
+
+        Los frames fuera del muestreo devuelven la detección del frame
+        muestreado anterior más cercano; si aún no hay ninguna se envían.
+
+        Raises:
+            RemoteDetectionUnavailable: Si debe usarse el modelo local
+        """
+        if frame_index is not None and frame_index % self.sample_every:
+            if self.use_local:
+                raise RemoteDetectionUnavailable("fallback local activo")
+            cached = self._nearest_sampled(frame_index)
+            if cached is not None:
+                return cached
+        return self._detect_remote(frame, frame_index)
+
+    def reset(self):
+        """Olvida las detecciones guardadas antes de procesar otro video."""
+        with self._lock:
+            self._detections.clear()
+
+    def close(self):
+        self.session.close()
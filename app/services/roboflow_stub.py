@@ -0,0 +1,75 @@
+"""
+Servidor local compatible con la API de detección de Roboflow.
+
+Permite probar RoboflowClient (muestreo, fallback por latencia, reescalado de
+cajas) sin red ni API key:
+
+    with run_roboflow_stub(predictions=[...], delay=0.2) as (url, stub):
+        client = RoboflowClient(url, "test")
+        ...
+        assert stub.requests == 3
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+class RoboflowStub:
+    """
+    Estado del servidor falso.
+
+    Args:
+        predictions: Predicciones devueltas en cada respuesta
+        delay: Segundos de espera antes de responder
+        status: Código HTTP de respuesta
+    """
+
+    def __init__(self, predictions: Optional[List[Dict[str, Any]]] = None, delay: float = 0.0, status: int = 200):
+        self.predictions = predictions or []
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        self.last_query = ""
+        self._lock = threading.Lock()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                with stub._lock:
+                    stub.requests += 1
+                    stub.last_query = self.path
+                if stub.delay:
+                    time.sleep(stub.delay)
+                body = json.dumps({"predictions": stub.predictions}).encode("utf-8")
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+@contextmanager
+def run_roboflow_stub(predictions: Optional[List[Dict[str, Any]]] = None, delay: float = 0.0, status: int = 200):
+    """Levanta el servidor en un puerto libre y devuelve (url, stub)."""
+    stub = RoboflowStub(predictions, delay, status)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), stub._handler())
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/padel/1", stub
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,265 @@
+"""
+Historial de búsquedas con escrituras agrupadas.
+
+Registrar una búsqueda no escribe en Firestore: se acumula en memoria y un hilo
+la vuelca cada SEARCH_HISTORY_FLUSH_INTERVAL segundos (o al parar el proceso):
+
+    - user_search_history/{user_id}: un documento por usuario con sus
+      SEARCH_HISTORY_RECENT búsquedas más recientes (``recent``).
+    - search_stats/{hash del término}: contador global con ``Increment``, un
+      documento por término distinto y volcado, no por búsqueda. El ID es un
+      hash del término normalizado, no el texto del usuario, que podría no ser
+      un ID válido de Firestore (``..``, ``__x__``, más de 1500 bytes); el
+      término va en el campo ``term``.
+
+Las pulsaciones de una misma búsqueda ("ma", "mar", "marta") se agregan: si el
+término nuevo amplía el último pendiente del usuario, lo sustituye. Al volcar,
+los contadores se suman también a las búsquedas populares del autocompletado
+del proceso.
+
+Si un volcado falla, lo que no llegó a escribirse vuelve al buffer y se
+reintenta en el siguiente.
+
+El historial reciente de cada usuario se sirve desde una caché LRU en memoria;
+solo el primer acceso a un usuario lee su documento.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from firebase_admin import firestore
+
+from app.services.autocomplete import get_autocomplete
+from app.services.bulk_fetch import chunked, get_many
+from app.services.search_index import fold
+
+logger = logging.getLogger(__name__)
+
+HISTORY_COLLECTION = "user_search_history"
+STATS_COLLECTION = "search_stats"
+SEARCH_HISTORY_FLUSH_INTERVAL = float(os.getenv("SEARCH_HISTORY_FLUSH_INTERVAL", "30"))
+SEARCH_HISTORY_RECENT = int(os.getenv("SEARCH_HISTORY_RECENT", "20"))
+# Usuarios con historial en caché por proceso
+SEARCH_HISTORY_CACHE_USERS = int(os.getenv("SEARCH_HISTORY_CACHE_USERS", "10000"))
+# Longitud máxima de un término de búsqueda
+SEARCH_TERM_MAX_LENGTH = 100
+# Escrituras por batch (Firestore admite 500)
+BATCH_SIZE = 400
+
+def normalize_term(term: str) -> str:
+    """Término sin acentos, en minúsculas y con los espacios colapsados."""
+    return " ".join(fold(term).split())
+
+def stats_doc_id(term: str) -> str:
+    """ID del contador de un término: hash del término normalizado."""
+    return hashlib.sha1(normalize_term(term).encode("utf-8")).hexdigest()
+
+def _merge_recent(new: List[Tuple[str, float]], old: List[Tuple[str, float]], size: int) -> List[Tuple[str, float]]:
+    """Más recientes primero y sin repetir término."""
+    merged, seen = [], set()
+    for term, searched_at in sorted(new + old, key=lambda item: -item[1]):
+        key = normalize_term(term)
+        if key not in seen:
+            seen.add(key)
+            merged.append((term, searched_at))
+    return merged[:size]
+
+class SearchHistoryBuffer:
+    """Acumula búsquedas y las vuelca en lotes."""
+
+    def __init__(
+        self,
+        flush_interval: float = SEARCH_HISTORY_FLUSH_INTERVAL,
+        recent_size: int = SEARCH_HISTORY_RECENT,
+        cache_users: int = SEARCH_HISTORY_CACHE_USERS,
+        db_factory=firestore.client
+    ):
+        self.flush_interval = flush_interval
+        self.recent_size = recent_size
+        self.cache_users = cache_users
+        self.db_factory = db_factory
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Tuple[str, float]]] = {}
+        self._counts: Dict[str, int] = {}
+        self._terms: Dict[str, str] = {}
+        self._recent: "OrderedDict[str, List[Tuple[str, float]]]" = OrderedDict()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, user_id: str, term: str, now: Optional[float] = None) -> None:
+        """Anota una búsqueda del usuario."""
+        term = term.strip()[:SEARCH_TERM_MAX_LENGTH]
+        key = normalize_term(term)
+        if not key:
+            return
+        now = now or time.time()
+        with self._lock:
+            pending = self._pending.setdefault(user_id, [])
+            replaced = None
+            if pending:
+                last_key = normalize_term(pending[-1][0])
+                if key.startswith(last_key):
+                    # Misma búsqueda escrita letra a letra: cuenta una vez
+                    replaced = pending.pop()
+                    self._decrement(last_key)
+            pending.append((term, now))
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._terms[key] = term
+            if user_id in self._recent:
+                # El prefijo sustituido sale también de la caché
+                cached = [item for item in self._recent[user_id] if item != replaced]
+                self._recent[user_id] = _merge_recent([(term, now)], cached, self.recent_size)
+        self._ensure_started()
+
+    def _decrement(self, key: str) -> None:
+        count = self._counts.get(key, 0) - 1
+        if count > 0:
+            self._counts[key] = count
+        else:
+            self._counts.pop(key, None)
+            self._terms.pop(key, None)
+
+    def _cache(self, user_id: str, recent: List[Tuple[str, float]]) -> None:
+        self._recent[user_id] = recent
+        self._recent.move_to_end(user_id)
+        while len(self._recent) > self.cache_users:
+            self._recent.popitem(last=False)
+
+    def recent(self, user_id: str, db=None) -> List[str]:
+        """Búsquedas recientes del usuario, incluidas las pendientes de volcar."""
+        with self._lock:
+            cached = self._recent.get(user_id)
+            if cached is not None:
+                self._recent.move_to_end(user_id)
+                return [term for term, _ in cached]
+        data = get_many(db or self.db_factory(), HISTORY_COLLECTION, [user_id], field_paths=["recent"]).get(user_id, {})
+        stored = [(r["term"], r["searched_at"]) for r in data.get("recent", []) if r.get("term")]
+        with self._lock:
+            recent = _merge_recent(list(self._pending.get(user_id, [])), stored, self.recent_size)
+            self._cache(user_id, recent)
+        return [term for term, _ in recent]
+
+    def _restore(self, pending: Dict[str, List[Tuple[str, float]]], counts: Dict[str, int], terms: Dict[str, str]) -> None:
+        """Devuelve al buffer lo que no se pudo volcar, por delante de lo llegado después."""
+        with self._lock:
+            for user_id, searches in pending.items():
+                self._pending[user_id] = searches + self._pending.get(user_id, [])
+            for key, count in counts.items():
+                self._counts[key] = self._counts.get(key, 0) + count
+                self._terms.setdefault(key, terms.get(key, key))
+
+    def flush(self, db=None) -> int:
+        """
+        Vuelca lo acumulado. Devuelve el número de documentos escritos.
+
+        Si falla, lo no escrito vuelve al buffer y se relanza el error.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            counts, self._counts = self._counts, {}
+            terms, self._terms = self._terms, {}
+        if not pending and not counts:
+            return 0
+
+        try:
+            db = db or self.db_factory()
+            stored = get_many(db, HISTORY_COLLECTION, list(pending), field_paths=["recent"])
+        except Exception:
+            self._restore(pending, counts, terms)
+            raise
+
+        # (tipo, clave, referencia, datos, merge)
+        writes = []
+        recents = {}
+        for user_id, searches in pending.items():
+            previous = [(r["term"], r["searched_at"]) for r in stored.get(user_id, {}).get("recent", []) if r.get("term")]
+            recents[user_id] = _merge_recent(searches, previous, self.recent_size)
+            writes.append(("history", user_id, db.collection(HISTORY_COLLECTION).document(user_id), {
+                "user_id": user_id,
+                "recent": [{"term": term, "searched_at": searched_at} for term, searched_at in recents[user_id]],
+                "updated_at": datetime.utcnow()
+            }, False))
+        for key, count in counts.items():
+            writes.append(("stats", key, db.collection(STATS_COLLECTION).document(stats_doc_id(key)), {
+                "term": terms.get(key, key),
+                "count": firestore.Increment(count),
+                "updated_at": datetime.utcnow()
+            }, True))
+
+        written = 0
+        autocomplete = get_autocomplete()
+        for chunk in chunked(writes, BATCH_SIZE):
+            batch = db.batch()
+            for _, _, ref, data, merge in chunk:
+                batch.set(ref, data, merge=merge)
+            try:
+                batch.commit()
+            except Exception:
+                # Los lotes ya confirmados no se repiten: los Increment se duplicarían
+                remaining = writes[written:]
+                self._restore(
+                    {key: pending[key] for kind, key, *_ in remaining if kind == "history"},
+                    {key: counts[key] for kind, key, *_ in remaining if kind == "stats"},
+                    terms
+                )
+                raise
+            written += len(chunk)
+            for kind, key, *_ in chunk:
+                if kind == "history":
+                    with self._lock:
+                        if key in self._recent:
+                            self._cache(key, recents[key])
+                else:
+                    autocomplete.record_search(terms.get(key, key), counts[key])
+        logger.info(f"[SearchHistory] {len(pending)} historiales y {len(counts)} contadores volcados")
+        return written
+
+    def _ensure_started(self) -> None:
+        if self._thread is None and self.flush_interval > 0:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="search-history-flush", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"[SearchHistory] Error al volcar el historial: {str(e)}")
+
+    def stop(self) -> None:
+        """Detiene el hilo y vuelca lo pendiente."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"[SearchHistory] Error al volcar el historial: {str(e)}")
+
+_buffer: Optional[SearchHistoryBuffer] = None
+_buffer_lock = threading.Lock()
+
+def get_buffer() -> SearchHistoryBuffer:
+    """Buffer del proceso."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = SearchHistoryBuffer()
+        return _buffer
+
+def set_buffer(buffer: Optional[SearchHistoryBuffer]) -> None:
+    """Sustituye el buffer del proceso (pruebas)."""
+    global _buffer
+    _buffer = buffer
+
+def stop_buffer() -> None:
+    if _buffer is not None:
+        _buffer.stop()
@@ -0,0 +1,529 @@
+"""
+Índice de búsqueda local (SQLite FTS5) de usuarios y contenido.
+
+Cada worker mantiene su propio índice en SEARCH_INDEX_PATH (por defecto en
+memoria) y lo alimenta con listeners on_snapshot de Firestore sobre users,
+posts, videos y video_analysis. El primer snapshot de cada colección carga el
+índice completo; después solo llegan los cambios, así que las búsquedas no leen
+Firestore.
+
+El texto se normaliza con fold() (minúsculas y sin acentos: "Martín" ->
+"martin") y se quitan las palabras vacías en español. FTS5 guarda además los
+prefijos de 2 a 4 caracteres de cada término, de modo que cada palabra de la
+consulta se busca como prefijo ("mart" encuentra "Martínez") sin recorrer el
+vocabulario. El orden es bm25 con más peso en los campos principales
+(usuario > nombre > ubicación/email; título > texto > descripción/etiquetas) y,
+en el contenido, un impulso por popularidad.
+
+Otros componentes (p. ej. app.services.autocomplete) reciben los mismos
+cambios registrándose con add_change_listener().
+
+Los filtros (nivel, posición, ubicación, radio, edad, fechas, métricas,
+etiquetas) son columnas de la tabla docs y se aplican en la misma consulta
+SQL; la paginación es por cursor sobre (puntuación, id).
+"""
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services import geo
+from app.utils.pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", ":memory:")
+# Peso de la popularidad (views * 0.1 + likes * 0.2) frente a bm25 en el contenido
+SEARCH_POPULARITY_WEIGHT = float(os.getenv("SEARCH_POPULARITY_WEIGHT", "0.01"))
+
+USER_KIND = "user"
+# Tipo de documento -> colección de Firestore
+KIND_COLLECTIONS = {
+    USER_KIND: "users",
+    "post": "posts",
+    "video": "videos",
+    "analysis": "video_analysis"
+}
+# Pesos bm25 de las columnas c1..c4
+USER_WEIGHTS = (3.0, 2.0, 1.0, 1.0)
+CONTENT_WEIGHTS = (3.0, 2.0, 1.0, 1.0)
+
+STOPWORDS = frozenset(
+    "a al con de del el en la las lo los o para por que se sin su sus un una uno unos unas y".split()
+)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Callbacks (kind, upserts, removals) que se llaman tras indexar cada snapshot
+_change_listeners: List[Callable[[str, List[Tuple[str, Dict[str, Any]]], List[str]], None]] = []
+
+def add_change_listener(listener: Callable[[str, List[Tuple[str, Dict[str, Any]]], List[str]], None]) -> None:
+    """Registra un callback para los cambios de documentos indexados."""
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+def fold(text: Any) -> str:
+    """Minúsculas y sin diacríticos."""
+    decomposed = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+def tokenize(text: Any) -> List[str]:
+    """Términos normalizados de un texto, sin palabras vacías."""
+    return [t for t in _TOKEN_RE.findall(fold(text)) if t not in STOPWORDS]
+
+def match_expression(query: Optional[str]) -> Optional[str]:
+    """Consulta FTS5: cada término como prefijo y todos obligatorios."""
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+def _location_text(location: Any) -> str:
+    if isinstance(location, str):
+        return location
+    if isinstance(location, dict):
+        return " ".join(str(location[k]) for k in ("name", "city", "address", "region", "country") if location.get(k))
+    return ""
+
+def _timestamp(value: Any) -> Optional[float]:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+def _iso(value: Any) -> Optional[str]:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value) if value is not None else None
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def _years_ago(years: int, today: Optional[date] = None) -> str:
+    today = today or date.today()
+    try:
+        return today.replace(year=today.year - years).isoformat()
+    except ValueError:
+        # 29 de febrero
+        return today.replace(year=today.year - years, day=28).isoformat()
+
+def user_document(doc_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Fila del índice para un usuario (mismo formato de resultado que /search/users)."""
+    coords = geo.coords_of(data.get("location"))
+    location = data.get("location")
+    return {
+        "texts": (data.get("username"), data.get("name"), _location_text(location), data.get("email")),
+        "owner_id": doc_id,
+        "level": data.get("level"),
+        "position": data.get("preferred_position"),
+        "location": location if isinstance(location, str) else None,
+        "gender": data.get("gender"),
+        "availability": json.dumps(data.get("availability") or []),
+        "tags": "[]",
+        "lat": coords[0] if coords else None,
+        "lng": coords[1] if coords else None,
+        "birth_date": _iso(data.get("birth_date")),
+        "last_active": _timestamp(data.get("last_active")),
+        "created_at": None,
+        "views": 0,
+        "likes": 0,
+        "payload": {
+            "id": doc_id,
+            "username": data.get("username"),
+            "name": data.get("name"),
+            "email": data.get("email"),
+            "level": data.get("level"),
+            "preferred_position": data.get("preferred_position"),
+            "location": location,
+            "profile_picture": data.get("profile_picture"),
+            "availability": data.get("availability", []),
+            "last_active": data.get("last_active"),
+            "stats": {
+                "matches_played": data.get("matches_played", 0),
+                "win_rate": data.get("win_rate", 0),
+                "padel_iq": data.get("padel_iq", 0)
+            }
+        }
+    }
+
+def content_document(kind: str, doc_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Fila del índice para un post, video o análisis."""
+    tags = data.get("tags") or []
+    views = data.get("views", 0) or 0
+    likes = data.get("likes", 0) or 0
+    return {
+        "texts": (data.get("title"), data.get("content"), data.get("description"), " ".join(map(str, tags))),
+        "owner_id": data.get("user_id"),
+        "level": None,
+        "position": None,
+        "location": None,
+        "gender": None,
+        "availability": "[]",
+        "tags": json.dumps(tags),
+        "lat": None,
+        "lng": None,
+        "birth_date": None,
+        "last_active": None,
+        "created_at": _iso(data.get("created_at")),
+        "views": views,
+        "likes": likes,
+        "payload": {
+            "id": doc_id,
+            "type": kind,
+            "title": data.get("title"),
+            "content": data.get("content"),
+            "description": data.get("description"),
+            "user_id": data.get("user_id"),
+            "created_at": data.get("created_at"),
+            "tags": tags,
+            "metrics": {
+                "views": views,
+                "likes": likes,
+                "comments": data.get("comments", 0)
+            }
+        }
+    }
+
+def _distance_km(lat, lng, center_lat, center_lng):
+    if lat is None or lng is None:
+        return None
+    return geo.haversine_km((lat, lng), (center_lat, center_lng))
+
+class SearchIndex:
+    """Índice FTS5 de un proceso. Seguro entre hilos (los listeners escriben desde otro hilo)."""
+
+    def __init__(self, path: str = SEARCH_INDEX_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.create_function("distance_km", 4, _distance_km, deterministic=True)
+        self._loaded = set()
+        self._watches = []
+        with self._lock:
+            self._conn.executescript(
+                """CREATE TABLE IF NOT EXISTS docs (
+                    rowid INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    owner_id TEXT,
+                    level TEXT,
+                    position TEXT,
+                    location TEXT,
+                    gender TEXT,
+                    availability TEXT,
+                    tags TEXT,
+                    lat REAL,
+                    lng REAL,
+                    birth_date TEXT,
+                    last_active REAL,
+                    created_at TEXT,
+                    views INTEGER NOT NULL DEFAULT 0,
+                    likes INTEGER NOT NULL DEFAULT 0,
+                    payload TEXT NOT NULL,
+                    UNIQUE (kind, doc_id)
+                );
+                CREATE INDEX IF NOT EXISTS docs_owner ON docs (kind, owner_id);
+                CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(
+                    c1, c2, c3, c4,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3 4'
+                );"""
+            )
+
+    @property
+    def ready(self) -> bool:
+        """True cuando todas las colecciones han cargado su primer snapshot."""
+        return self._loaded >= set(KIND_COLLECTIONS)
+
+    def mark_loaded(self, kind: str) -> None:
+        self._loaded.add(kind)
+
+    def _upsert(self, kind: str, doc_id: str, data: Dict[str, Any]) -> None:
+        row = user_document(doc_id, data) if kind == USER_KIND else content_document(kind, doc_id, data)
+        columns = [
+            "owner_id", "level", "position", "location", "gender", "availability", "tags",
+            "lat", "lng", "birth_date", "last_active", "created_at", "views", "likes"
+        ]
+        values = [row[c] for c in columns] + [json.dumps(row["payload"], default=_json_default)]
+        self._conn.execute(
+            f"INSERT INTO docs (kind, doc_id, {', '.join(columns)}, payload) "
+            f"VALUES (?, ?, {', '.join('?' for _ in columns)}, ?) "
+            f"ON CONFLICT (kind, doc_id) DO UPDATE SET "
+            f"{', '.join(f'{c} = excluded.{c}' for c in columns)}, payload = excluded.payload",
+            [kind, doc_id] + values
+        )
+        rowid = self._conn.execute("SELECT rowid FROM docs WHERE kind = ? AND doc_id = ?", (kind, doc_id)).fetchone()[0]
+        texts = [" ".join(tokenize(text)) for text in row["texts"]]
+        self._conn.execute("DELETE FROM fts WHERE rowid = ?", (rowid,))
+        self._conn.execute("INSERT INTO fts (rowid, c1, c2, c3, c4) VALUES (?, ?, ?, ?, ?)", [rowid] + texts)
+
+    def _remove(self, kind: str, doc_id: str) -> None:
+        row = self._conn.execute("SELECT rowid FROM docs WHERE kind = ? AND doc_id = ?", (kind, doc_id)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM fts WHERE rowid = ?", (row[0],))
+            self._conn.execute("DELETE FROM docs WHERE rowid = ?", (row[0],))
+
+    def apply(self, kind: str, upserts: Iterable[Tuple[str, Dict[str, Any]]] = (), removals: Iterable[str] = ()) -> None:
+        """Aplica altas/modificaciones y bajas en una sola transacción."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for doc_id, data in upserts:
+                    self._upsert(kind, doc_id, data or {})
+                for doc_id in removals:
+                    self._remove(kind, doc_id)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def upsert(self, kind: str, doc_id: str, data: Dict[str, Any]) -> None:
+        self.apply(kind, upserts=[(doc_id, data)])
+
+    def remove(self, kind: str, doc_id: str) -> None:
+        self.apply(kind, removals=[doc_id])
+
+    def count(self, kind: Optional[str] = None) -> int:
+        with self._lock:
+            if kind is None:
+                return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM docs WHERE kind = ?", (kind,)).fetchone()[0]
+
+    # Sincronización con Firestore
+
+    def _on_snapshot(self, kind: str):
+        def callback(snapshots, changes, read_time):
+            upserts, removals = [], []
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    removals.append(change.document.id)
+                else:
+                    upserts.append((change.document.id, change.document.to_dict()))
+            try:
+                self.apply(kind, upserts, removals)
+            except Exception as e:
+                logger.error(f"[Search] Error al indexar cambios de {kind}: {str(e)}")
+                return
+            for listener in list(_change_listeners):
+                try:
+                    listener(kind, upserts, removals)
+                except Exception as e:
+                    logger.error(f"[Search] Error en listener de cambios de {kind}: {str(e)}")
+            if kind not in self._loaded:
+                self.mark_loaded(kind)
+                logger.info(f"[Search] Índice de {kind} cargado ({self.count(kind)} documentos)")
+        return callback
+
+    def start_sync(self, db) -> None:
+        """Registra los listeners on_snapshot de cada colección indexada."""
+        if self._watches:
+            return
+        for kind, collection in KIND_COLLECTIONS.items():
+            self._watches.append(db.collection(collection).on_snapshot(self._on_snapshot(kind)))
+
+    def stop_sync(self) -> None:
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+
+    # Consultas
+
+    def _search(
+        self,
+        kinds: Sequence[str],
+        query: Optional[str],
+        weights: Sequence[float],
+        where: List[str],
+        params: List[Any],
+        limit: int,
+        cursor: Optional[str],
+        score: str = "{rank}",
+        distance_from: Optional[Tuple[float, float]] = None
+    ) -> Tuple[List[Dict[str, Any]], int, Optional[str]]:
+        """
+        Consulta común: filtra por texto y columnas, ordena por (score, doc_id) y pagina.
+
+        score es una expresión SQL donde ``{rank}`` es la puntuación bm25 (menor
+        es mejor; 0 sin texto).
+        """
+        where = [f"d.kind IN ({', '.join('?' for _ in kinds)})"] + where
+        params = list(kinds) + params
+        match = match_expression(query)
+        if match:
+            source = "fts JOIN docs d ON d.rowid = fts.rowid"
+            where.insert(0, "fts MATCH ?")
+            params.insert(0, match)
+            rank = f"bm25(fts, {', '.join(str(w) for w in weights)})"
+        else:
+            source = "docs d"
+            rank = "0"
+        distance = "distance_km(d.lat, d.lng, ?, ?)" if distance_from else "NULL"
+        select_params = list(distance_from) if distance_from else []
+
+        inner = (
+            f"SELECT d.doc_id, d.payload, {distance} AS distance, {score.format(rank=rank)} AS score "
+            f"FROM {source} WHERE {' AND '.join(where)}"
+        )
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM ({inner})", select_params + params).fetchone()[0]
+            outer, outer_params = f"SELECT * FROM ({inner})", select_params + params
+            if cursor:
+                after = decode_cursor(cursor, ["key", "id"])
+                outer += " WHERE score > ? OR (score = ? AND doc_id > ?)"
+                outer_params += [after["key"], after["key"], after["id"]]
+            rows = self._conn.execute(f"{outer} ORDER BY score, doc_id LIMIT ?", outer_params + [limit + 1]).fetchall()
+
+        items = []
+        for row in rows[:limit]:
+            item = json.loads(row["payload"])
+            if distance_from:
+                item["distance_km"] = round(row["distance"], 2) if row["distance"] is not None else None
+            items.append(item)
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor({"key": last["score"], "id": last["doc_id"]})
+        return items, total, next_cursor
+
+    def search_users(
+        self,
+        query: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        level: Optional[str] = None,
+        position: Optional[str] = None,
+        location: Optional[str] = None,
+        gender: Optional[str] = None,
+        availability: Optional[str] = None,
+        min_age: Optional[int] = None,
+        max_age: Optional[int] = None,
+        last_active_days: Optional[int] = None,
+        center: Any = None,
+        radius_km: Optional[float] = None
+    ) -> Tuple[List[Dict[str, Any]], int, Optional[str]]:
+        """
+        Busca usuarios.
+
+        Returns:
+            Tupla (usuarios de la página, total, cursor de la siguiente página o None)
+
+        Raises:
+            InvalidCursorError: Si el cursor no es válido
+        """
+        where, params = [], []
+        for column, value in (("level", level), ("position", position), ("location", location), ("gender", gender)):
+            if value:
+                where.append(f"d.{column} = ?")
+                params.append(value)
+        if availability:
+            where.append("EXISTS (SELECT 1 FROM json_each(d.availability) WHERE value = ?)")
+            params.append(availability)
+        # Sin fecha de nacimiento o de actividad, el usuario no se excluye
+        if min_age:
+            where.append("(d.birth_date IS NULL OR d.birth_date <= ?)")
+            params.append(_years_ago(min_age))
+        if max_age:
+            where.append("(d.birth_date IS NULL OR d.birth_date > ?)")
+            params.append(_years_ago(max_age + 1))
+        if last_active_days:
+            where.append("(d.last_active IS NULL OR d.last_active >= ?)")
+            params.append((datetime.now() - timedelta(days=last_active_days + 1)).timestamp())
+
+        origin = geo.coords_of(center) if radius_km else None
+        if origin:
+            # Caja envolvente (usa las columnas) y distancia exacta
+            dlat = math.degrees(radius_km / geo.EARTH_RADIUS_KM)
+            dlng = dlat / max(math.cos(math.radians(origin[0])), 1e-6)
+            where.append("d.lat BETWEEN ? AND ? AND d.lng BETWEEN ? AND ? AND distance_km(d.lat, d.lng, ?, ?) <= ?")
+            params.extend([origin[0] - dlat, origin[0] + dlat, origin[1] - dlng, origin[1] + dlng, origin[0], origin[1], radius_km])
+
+        items, total, next_cursor = self._search([USER_KIND], query, USER_WEIGHTS, where, params, limit, cursor, distance_from=origin)
+        for item in items:
+            item.setdefault("distance_km", None)
+        return items, total, next_cursor
+
+    def search_content(
+        self,
+        query: Optional[str] = None,
+        kind: str = "post",
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        user_id: Optional[str] = None,
+        tags: Optional[Sequence[str]] = None,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        min_views: Optional[int] = None,
+        min_likes: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], int, Optional[str]]:
+        """
+        Busca posts, videos o análisis. Sin texto ordena por visualizaciones.
+
+        Returns:
+            Tupla (contenido de la página, total, cursor de la siguiente página o None)
+
+        Raises:
+            InvalidCursorError: Si el cursor no es válido
+        """
+        where, params = [], []
+        if user_id:
+            where.append("d.owner_id = ?")
+            params.append(user_id)
+        for tag in tags or []:
+            where.append("EXISTS (SELECT 1 FROM json_each(d.tags) WHERE value = ?)")
+            params.append(tag)
+        if from_date:
+            where.append("(d.created_at IS NULL OR d.created_at >= ?)")
+            params.append(from_date)
+        if to_date:
+            # to_date (YYYY-MM-DD) incluye todo ese día
+            where.append("(d.created_at IS NULL OR substr(d.created_at, 1, 10) <= ?)")
+            params.append(to_date)
+        if min_views:
+            where.append("d.views >= ?")
+            params.append(min_views)
+        if min_likes:
+            where.append("d.likes >= ?")
+            params.append(min_likes)
+
+        if match_expression(query):
+            score = f"{{rank}} - (d.views * 0.1 + d.likes * 0.2) * {SEARCH_POPULARITY_WEIGHT}"
+        else:
+            score = "-d.views"
+        return self._search([kind], query, CONTENT_WEIGHTS, where, params, limit, cursor, score=score)
+
+_index: Optional[SearchIndex] = None
+_index_lock = threading.Lock()
+
+def get_index() -> SearchIndex:
+    """Índice del proceso."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SearchIndex()
+        return _index
+
+def set_index(index: Optional[SearchIndex]) -> None:
+    """Sustituye el índice del proceso (pruebas)."""
+    global _index
+    _index = index
+
+def start_sync(db) -> SearchIndex:
+    """Crea el índice del proceso y empieza a alimentarlo desde Firestore (idempotente)."""
+    index = get_index()
+    with _index_lock:
+        index.start_sync(db)
+    return index
+
+def stop_sync() -> None:
+    if _index is not None:
+        _index.stop_sync()
@@ -0,0 +1,150 @@
+"""
+Hidratación por lotes de posts del muro social.
+
+Reúne los datos relacionados de una página completa de posts (autores,
+reacciones y comentarios recientes) con un número constante de lecturas
+a Firestore, en lugar de varias consultas por cada post.
+"""
+import logging
+from typing import Dict, Any, List, Iterable
+
+from firebase_admin import firestore
+
+from app.services.bulk_fetch import get_many, query_in
+
+logger = logging.getLogger(__name__)
+
+# Campos del autor que se muestran junto a cada post
+AUTHOR_FIELDS = ["username", "name", "profile_picture"]
+# Número de comentarios recientes desnormalizados en cada post
+RECENT_COMMENTS_LIMIT = 3
+
+def comment_preview(comment_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Resumen de un comentario que se guarda en el post para la vista del muro."""
+    return {
+        "comment_id": comment_data.get("comment_id"),
+        "user_id": comment_data.get("user_id"),
+        "content": comment_data.get("content"),
+        "created_at": comment_data.get("created_at")
+    }
+
+def fetch_authors(db, user_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Obtiene los perfiles públicos de varios usuarios con get_all por lotes.
+
+    Args:
+        db: Cliente de Firestore
+        user_ids: IDs de los usuarios (pueden repetirse)
+
+    Returns:
+        Diccionario {user_id: datos del autor}
+    """
+    return get_many(db, "users", user_ids, field_paths=AUTHOR_FIELDS)
+
+def fetch_viewer_reactions(db, viewer_id: str, post_ids: List[str]) -> Dict[str, str]:
+    """
+    Obtiene las reacciones del usuario actual a una página de posts con consultas 'in'.
+
+    Returns:
+        Diccionario {post_id: tipo de reacción}
+    """
+    reactions = {}
+    for doc in query_in(db, "post_reactions", "post_id", post_ids, filters=[("user_id", "==", viewer_id)]):
+        data = doc.to_dict()
+        reactions[data["post_id"]] = data["type"]
+    return reactions
+
+def _backfill_reaction_counts(db, post_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    """Calcula y guarda los contadores de reacciones de posts anteriores a la desnormalización."""
+    counts = {post_id: {} for post_id in post_ids}
+    for doc in query_in(db, "post_reactions", "post_id", post_ids):
+        data = doc.to_dict()
+        post_counts = counts[data["post_id"]]
+        post_counts[data["type"]] = post_counts.get(data["type"], 0) + 1
+
+    batch = db.batch()
+    for post_id, post_counts in counts.items():
+        batch.update(db.collection("posts").document(post_id), {"reaction_counts": post_counts})
+    batch.commit()
+    return counts
+
+def _backfill_recent_comments(db, post_id: str) -> List[Dict[str, Any]]:
+    """Calcula y guarda los comentarios recientes de un post anterior a la desnormalización."""
+    comments = db.collection("comments")\
+        .where("post_id", "==", post_id)\
+        .order_by("created_at", direction=firestore.Query.DESCENDING)\
+        .limit(RECENT_COMMENTS_LIMIT)\
+        .get()
+    recent = [comment_preview(c.to_dict()) for c in comments]
+    db.collection("posts").document(post_id).update({"recent_comments": recent})
+    return recent
+
+def hydrate_posts(
+    db,
+    posts: List[Any],
+    viewer_id: str,
+    include_author: bool = True,
+    include_recent_comments: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Enriquece una página de posts con autor, reacciones y comentarios recientes.
+
+    Los contadores de reacciones y comentarios se leen del propio post. Los posts
+    creados antes de la desnormalización se completan una única vez y se actualizan.
+
+    Args:
+        db: Cliente de Firestore
+        posts: Snapshots de documentos de la colección posts
+        viewer_id: ID del usuario que consulta el muro
+        include_author: Si es True, incluye los datos del autor
+        include_recent_comments: Si es True, incluye los comentarios recientes
+
+    Returns:
+        Lista de posts enriquecidos en el mismo orden de entrada
+    """
+    post_items = [(post.id, post.to_dict()) for post in posts]
+    if not post_items:
+        return []
+
+    post_ids = [post_id for post_id, _ in post_items]
+    authors = fetch_authors(db, [data.get("user_id") for _, data in post_items]) if include_author else {}
+    viewer_reactions = fetch_viewer_reactions(db, viewer_id, post_ids)
+
+    legacy_ids = [post_id for post_id, data in post_items if "reaction_counts" not in data]
+    legacy_counts = _backfill_reaction_counts(db, legacy_ids) if legacy_ids else {}
+
+    enriched_posts = []
+    for post_id, post_data in post_items:
+        reaction_counts = post_data.get("reaction_counts", legacy_counts.get(post_id, {}))
+        enriched_post = {
+            "post_id": post_id,
+            "content": post_data["content"],
+            "media_urls": post_data.get("media_urls", []),
+            "created_at": post_data["created_at"],
+            "reactions": {r_type: count for r_type, count in reaction_counts.items() if count > 0},
+            "user_reaction": viewer_reactions.get(post_id),
+            "comment_count": post_data.get("comment_count", 0),
+            "visibility": post_data.get("visibility", "public"),
+            "location": post_data.get("location"),
+            "tags": post_data.get("tags", [])
+        }
+
+        if include_author:
+            author_id = post_data.get("user_id")
+            author_data = authors.get(author_id, {})
+            enriched_post["author"] = {
+                "user_id": author_id if author_id in authors else None,
+                "username": author_data.get("username"),
+                "name": author_data.get("name"),
+                "profile_picture": author_data.get("profile_picture")
+            }
+
+        if include_recent_comments:
+            if "recent_comments" in post_data:
+                enriched_post["recent_comments"] = post_data["recent_comments"]
+            else:
+                enriched_post["recent_comments"] = _backfill_recent_comments(db, post_id)
+
+        enriched_posts.append(enriched_post)
+
+    return enriched_posts
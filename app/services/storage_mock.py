@@ -0,0 +1,90 @@
+import hashlib
+import base64
+from datetime import datetime
+from unittest.mock import patch
+from urllib.parse import quote
+
+class MockBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+        self.metadata = None
+        self.size = None
+        self.md5_hash = None
+        self.time_created = None
+        self.updated = None
+        self._data = None
+
+    @property
+    def public_url(self):
+        return f"https://storage.googleapis.com/{self.bucket.name}/{quote(self.name)}"
+
+    def exists(self):
+        return self.name in self.bucket._blobs
+
+    def upload_from_string(self, data, content_type=None):
+        if isinstance(data, str):
+            data = data.encode()
+        self._data = data
+        self.size = len(data)
+        self.content_type = content_type or self.content_type
+        self.md5_hash = base64.b64encode(hashlib.md5(data).digest()).decode()
+        now = datetime.utcnow()
+        self.time_created = self.time_created or now
+        self.updated = now
+        self.bucket._blobs[self.name] = self
+
+    def upload_from_file(self, file_obj, content_type=None):
+        self.upload_from_string(file_obj.read(), content_type=content_type)
+
+    def download_as_bytes(self):
+        if not self.exists():
+            raise FileNotFoundError(self.name)
+        return self.bucket._blobs[self.name]._data
+
+    def make_public(self):
+        return None
+
+    def delete(self):
+        if not self.exists():
+            raise FileNotFoundError(self.name)
+        del self.bucket._blobs[self.name]
+
+    def generate_signed_url(self, version="v2", expiration=None, method="GET", content_type=None, headers=None, **kwargs):
+        self.bucket.signed_url_requests.append({
+            'name': self.name,
+            'version': version,
+            'expiration': expiration,
+            'method': method,
+            'content_type': content_type,
+            'headers': headers or {}
+        })
+        return f"https://fake-gcs.local/{self.bucket.name}/{quote(self.name)}?X-Goog-Signature=fake&X-Goog-Method={method}"
+
+class MockBucket:
+    def __init__(self, name="padelyzer-test.appspot.com"):
+        self.name = name
+        self._blobs = {}
+        self.signed_url_requests = []
+
+    def blob(self, name):
+        return self._blobs.get(name) or MockBlob(self, name)
+
+    def get_blob(self, name):
+        return self._blobs.get(name)
+
+    def list_blobs(self, prefix=None):
+        return [b for n, b in sorted(self._blobs.items()) if not prefix or n.startswith(prefix)]
+
+    def put(self, name, data, content_type="video/mp4"):
+        """Simula una subida directa del cliente a la URL firmada."""
+        blob = MockBlob(self, name)
+        blob.upload_from_string(data, content_type=content_type)
+        return blob
+
+def get_mock_bucket(name="padelyzer-test.appspot.com"):
+    return MockBucket(name)
+
+def patch_storage(bucket=None, target='app.services.storage_service.storage.bucket'):
+    return patch(target, return_value=bucket or get_mock_bucket())
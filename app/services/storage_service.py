@@ -3,7 +3,7 @@ import logging
 from firebase_admin import storage
 from app.services.firebase import get_firebase_client
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import mimetypes
 
 logger = logging.getLogger(__name__)
@@ -13,6 +13,139 @@ class StorageService:
     ALLOWED_VIDEO_FORMATS = ['video/mp4', 'video/quicktime']
     # Tamaño máximo de archivo (100MB)
     MAX_FILE_SIZE = 100 * 1024 * 1024
+    # Vigencia de las URLs firmadas para subida directa
+    SIGNED_UPLOAD_URL_MINUTES = int(os.getenv("SIGNED_UPLOAD_URL_MINUTES", "15"))
+
+    @staticmethod
+    def build_upload_path(user_id: str, analysis_id: str, filename: str) -> str:
+        """
+        Construye la ruta del objeto para una subida directa.
+
+        La ruta codifica el usuario y el análisis para que la notificación
+        de Storage pueda resolverlos sin estado adicional.
+        """
+        safe_name = os.path.basename(filename).replace(" ", "_")
+        return f"videos/{user_id}/{analysis_id}/{safe_name}"
+
+    @staticmethod
+    def parse_upload_path(object_path: str) -> Optional[Tuple[str, str]]:
+        """
+        Extrae (user_id, analysis_id) de una ruta generada por build_upload_path.
+
+        Returns:
+            Tupla (user_id, analysis_id) o None si la ruta no corresponde a una subida directa
+        """
+        parts = object_path.split("/")
+        if len(parts) != 4 or parts[0] != "videos" or not all(parts[1:]):
+            return None
+        return parts[1], parts[2]
+
+    @staticmethod
+    async def create_signed_upload_url(
+        user_id: str,
+        analysis_id: str,
+        filename: str,
+        content_type: str
+    ) -> Tuple[Optional[dict], Optional[str]]:
+        """
+        Genera una URL firmada V4 para iniciar una subida reanudable directa a Storage.
+
+        El cliente hace un POST a la URL con la cabecera ``x-goog-resumable: start``
+        para obtener la sesión y después envía los bytes con PUT, sin pasar por la API.
+
+        Args:
+            user_id: ID del usuario que sube el video
+            analysis_id: ID del análisis asociado
+            filename: Nombre original del archivo
+            content_type: Tipo MIME declarado por el cliente
+
+        Returns:
+            Tuple[Optional[dict], Optional[str]]: (datos de subida, mensaje de error)
+        """
+        try:
+            if content_type not in StorageService.ALLOWED_VIDEO_FORMATS:
+                return None, f"Formato de archivo no permitido. Formatos permitidos: {StorageService.ALLOWED_VIDEO_FORMATS}"
+
+            file_extension = os.path.splitext(filename)[1].lower()
+            if file_extension not in ['.mp4', '.mov']:
+                return None, "Formato de archivo no permitido. Solo se permiten archivos MP4 y MOV"
+
+            bucket = storage.bucket()
+            object_path = StorageService.build_upload_path(user_id, analysis_id, filename)
+            blob = bucket.blob(object_path)
+
+            expiration = timedelta(minutes=StorageService.SIGNED_UPLOAD_URL_MINUTES)
+            headers = {"x-goog-resumable": "start"}
+            upload_url = blob.generate_signed_url(
+                version="v4",
+                expiration=expiration,
+                method="POST",
+                content_type=content_type,
+                headers=headers
+            )
+
+            return {
+                'upload_url': upload_url,
+                'object_path': object_path,
+                'bucket': bucket.name,
+                'method': 'POST',
+                'headers': {**headers, 'Content-Type': content_type},
+                'expires_at': (datetime.utcnow() + expiration).isoformat()
+            }, None
+
+        except Exception as e:
+            logger.error(f"Error al generar URL firmada de subida: {str(e)}")
+            return None, str(e)
+
+    @staticmethod
+    async def verify_uploaded_video(object_path: str, user_id: str) -> Tuple[Optional[dict], Optional[str]]:
+        """
+        Verifica un video subido directamente a Storage.
+
+        Comprueba que el objeto exista, pertenezca al usuario y respete el tipo
+        y tamaño permitidos. Los objetos inválidos se eliminan.
+
+        Args:
+            object_path: Ruta del objeto en el bucket
+            user_id: ID del usuario que debería ser dueño del objeto
+
+        Returns:
+            Tuple[Optional[dict], Optional[str]]: (metadatos del objeto, mensaje de error)
+        """
+        try:
+            parsed = StorageService.parse_upload_path(object_path)
+            if not parsed or parsed[0] != user_id:
+                return None, "La ruta del objeto no pertenece al usuario"
+
+            bucket = storage.bucket()
+            blob = bucket.get_blob(object_path)
+            if blob is None:
+                return None, "El video no existe en Storage"
+
+            error = None
+            if blob.content_type not in StorageService.ALLOWED_VIDEO_FORMATS:
+                error = f"Formato de archivo no permitido: {blob.content_type}"
+            elif not blob.size:
+                error = "El archivo está vacío"
+            elif blob.size > StorageService.MAX_FILE_SIZE:
+                error = "El archivo excede el tamaño máximo permitido (100MB)"
+
+            if error:
+                logger.warning(f"Eliminando subida inválida {object_path}: {error}")
+                blob.delete()
+                return None, error
+
+            return {
+                'object_path': object_path,
+                'gcs_uri': f"gs://{bucket.name}/{object_path}",
+                'size': blob.size,
+                'content_type': blob.content_type,
+                'md5_hash': blob.md5_hash
+            }, None
+
+        except Exception as e:
+            logger.error(f"Error al verificar video subido: {str(e)}")
+            return None, str(e)
 
     @staticmethod
     async def upload_video(file_data: bytes, filename: str, user_id: str) -> Tuple[Optional[str], Optional[str]]:
@@ -22,6 +22,14 @@ class StrokeDetector:
         self.min_velocity_peak = 0.5  # Reducido de 1 a 0.5 para detectar movimientos más lentos
         self.max_velocity_peak = 200  # Aumentado de 100 a 200 para permitir movimientos más rápidos
         
+    def reset(self):
+        """Descarta los buffers por jugador para empezar un video nuevo."""
+        self.stroke_buffer = []
+        self.last_frame = None
+        self.player_buffers = {}
+        self.last_player_frames = {}
+        self.last_stroke_frame = {}
+        
     def detect_stroke(self, frame: np.ndarray, player_pos: Dict[str, Any]) -> bool:
         """
         Detecta si hay un golpe en el frame actual.
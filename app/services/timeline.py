@@ -0,0 +1,184 @@
+"""
+Timelines materializados del muro de amigos (fan-out en escritura).
+
+Cada usuario tiene en timelines/{user_id}/entries una entrada por post de sus
+amigos (y suyo), con el mismo ID que el post y su created_at. Publicar escribe
+la entrada en el timeline de cada amigo con batches; leer el muro es un único
+rango ordenado sobre las entradas del lector, paginado con el cursor habitual.
+
+Cuentas con muchos amigos (más de TIMELINE_FANOUT_MAX_FRIENDS) no se replican:
+se marcan como ``timeline_pull`` y sus posts se leen al consultar el muro
+(fan-out en lectura). El documento timelines/{user_id} guarda en
+``pull_authors`` qué amigos del lector están en ese modo, de modo que la
+lectura mezcla las entradas con una consulta ``in`` acotada sobre sus posts.
+
+Un timeline sin ``built_at`` (usuario nuevo en el sistema o amistad nueva) se
+reconstruye en la primera lectura con los posts recientes de sus amigos.
+"""
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from firebase_admin import firestore
+
+from app.core.auth_cache import invalidate_user_profile
+from app.services.bulk_fetch import get_many, get_many_docs, unique
+from app.utils.monitoring import track_firestore
+from app.utils.pagination import merge_pages, paginate_query, paginate_query_in
+
+logger = logging.getLogger(__name__)
+
+TIMELINES_COLLECTION = "timelines"
+ENTRIES_SUBCOLLECTION = "entries"
+PULL_FLAG = "timeline_pull"
+# Por encima de este número de amigos, los posts se leen en lugar de replicarse
+TIMELINE_FANOUT_MAX_FRIENDS = int(os.getenv("TIMELINE_FANOUT_MAX_FRIENDS", "1000"))
+# Posts recientes copiados al reconstruir un timeline
+TIMELINE_BACKFILL_SIZE = int(os.getenv("TIMELINE_BACKFILL_SIZE", "200"))
+# Escrituras por batch (Firestore admite 500)
+BATCH_SIZE = 400
+
+ORDER_BY = [("created_at", firestore.Query.DESCENDING)]
+
+def _timeline_ref(db, user_id: str):
+    return db.collection(TIMELINES_COLLECTION).document(user_id)
+
+def _entry(post_id: str, author_id: str, created_at: Any) -> Dict[str, Any]:
+    return {"post_id": post_id, "author_id": author_id, "created_at": created_at}
+
+def get_friend_ids(db, user_id: str) -> List[str]:
+    """IDs de los amigos de un usuario (amistades en ambos sentidos)."""
+    with track_firestore("friendships", "query"):
+        friendships = db.collection("friendships").where("user1_id", "==", user_id).get()
+        friendships2 = db.collection("friendships").where("user2_id", "==", user_id).get()
+    friend_ids = [f.to_dict()["user2_id"] for f in friendships]
+    friend_ids.extend(f.to_dict()["user1_id"] for f in friendships2)
+    return unique(friend_ids)
+
+def _write_entries(db, writes: Sequence[Tuple[Any, Dict[str, Any]]]) -> None:
+    """Escribe (referencia, datos) en batches de BATCH_SIZE."""
+    for start in range(0, len(writes), BATCH_SIZE):
+        batch = db.batch()
+        for ref, data in writes[start:start + BATCH_SIZE]:
+            batch.set(ref, data)
+        with track_firestore(TIMELINES_COLLECTION, "fanout"):
+            batch.commit()
+
+def _is_pull_author(db, author_id: str) -> bool:
+    return bool(get_many(db, "users", [author_id], field_paths=[PULL_FLAG]).get(author_id, {}).get(PULL_FLAG))
+
+def _mark_pull_author(db, author_id: str, friend_ids: Sequence[str]) -> None:
+    """Pasa una cuenta a fan-out en lectura y lo anota en el timeline de sus amigos."""
+    db.collection("users").document(author_id).update({PULL_FLAG: True})
+    invalidate_user_profile(author_id)
+    writes = [
+        (_timeline_ref(db, friend_id), {"pull_authors": firestore.ArrayUnion([author_id])})
+        for friend_id in friend_ids
+    ]
+    for start in range(0, len(writes), BATCH_SIZE):
+        batch = db.batch()
+        for ref, data in writes[start:start + BATCH_SIZE]:
+            batch.set(ref, data, merge=True)
+        batch.commit()
+    logger.info(f"[Timeline] {author_id} pasa a fan-out en lectura ({len(friend_ids)} amigos)")
+
+def fan_out_post(db, author_id: str, post_id: str, created_at: Any, friend_ids: Sequence[str]) -> int:
+    """
+    Publica un post en los timelines del autor y de sus amigos.
+
+    Returns:
+        Número de timelines escritos
+    """
+    recipients = [author_id]
+    friend_ids = unique(friend_ids)
+    if len(friend_ids) > TIMELINE_FANOUT_MAX_FRIENDS:
+        if not _is_pull_author(db, author_id):
+            _mark_pull_author(db, author_id, friend_ids)
+    else:
+        recipients.extend(friend_ids)
+
+    entry = _entry(post_id, author_id, created_at)
+    _write_entries(db, [
+        (_timeline_ref(db, user_id).collection(ENTRIES_SUBCOLLECTION).document(post_id), entry)
+        for user_id in recipients
+    ])
+    return len(recipients)
+
+def remove_post(db, post_id: str) -> None:
+    """Borra las entradas de un post de todos los timelines (consulta de grupo de colecciones)."""
+    with track_firestore(ENTRIES_SUBCOLLECTION, "query"):
+        entries = list(db.collection_group(ENTRIES_SUBCOLLECTION).where("post_id", "==", post_id).get())
+    _delete_refs(db, [entry.reference for entry in entries])
+
+def _delete_refs(db, refs: Sequence[Any]) -> None:
+    for start in range(0, len(refs), BATCH_SIZE):
+        batch = db.batch()
+        for ref in refs[start:start + BATCH_SIZE]:
+            batch.delete(ref)
+        batch.commit()
+
+def on_friendship_created(db, user_ids: Sequence[str]) -> None:
+    """Marca los timelines para reconstruirse e incluir los posts del nuevo amigo."""
+    batch = db.batch()
+    for user_id in user_ids:
+        batch.set(_timeline_ref(db, user_id), {"built_at": None}, merge=True)
+    batch.commit()
+
+def on_friendship_removed(db, user_id: str, other_user_id: str) -> None:
+    """Quita de cada timeline las entradas y el modo lectura del otro usuario."""
+    for viewer_id, author_id in ((user_id, other_user_id), (other_user_id, user_id)):
+        timeline_ref = _timeline_ref(db, viewer_id)
+        entries = timeline_ref.collection(ENTRIES_SUBCOLLECTION).where("author_id", "==", author_id).get()
+        _delete_refs(db, [entry.reference for entry in entries])
+        timeline_ref.set({"pull_authors": firestore.ArrayRemove([author_id])}, merge=True)
+
+def rebuild(db, user_id: str) -> List[str]:
+    """
+    Reconstruye el timeline de un usuario con los posts recientes de sus amigos.
+
+    Returns:
+        Amigos en modo lectura (pull_authors)
+    """
+    authors = get_friend_ids(db, user_id) + [user_id]
+    flags = get_many(db, "users", authors, field_paths=[PULL_FLAG])
+    pull_authors = [uid for uid in authors if flags.get(uid, {}).get(PULL_FLAG)]
+    push_authors = [uid for uid in authors if uid not in pull_authors]
+
+    posts, _ = paginate_query_in(db.collection("posts"), "user_id", push_authors, ORDER_BY, TIMELINE_BACKFILL_SIZE)
+    entries_ref = _timeline_ref(db, user_id).collection(ENTRIES_SUBCOLLECTION)
+    _write_entries(db, [
+        (entries_ref.document(post.id), _entry(post.id, data.get("user_id"), data.get("created_at")))
+        for post, data in ((post, post.to_dict()) for post in posts)
+    ])
+    _timeline_ref(db, user_id).set({
+        "pull_authors": pull_authors,
+        "built_at": firestore.SERVER_TIMESTAMP
+    }, merge=True)
+    logger.info(f"[Timeline] Timeline de {user_id} reconstruido con {len(posts)} posts")
+    return pull_authors
+
+def get_page(db, user_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[Any], Optional[str]]:
+    """
+    Página del muro de amigos de un usuario.
+
+    Returns:
+        Tupla (snapshots de posts en orden, cursor de la siguiente página o None)
+
+    Raises:
+        InvalidCursorError: Si el cursor no es válido
+    """
+    with track_firestore(TIMELINES_COLLECTION, "get"):
+        timeline = _timeline_ref(db, user_id).get()
+    timeline_data = (timeline.to_dict() or {}) if timeline.exists else {}
+    if timeline_data.get("built_at"):
+        pull_authors = timeline_data.get("pull_authors", [])
+    else:
+        pull_authors = rebuild(db, user_id)
+
+    pages = [paginate_query(_timeline_ref(db, user_id).collection(ENTRIES_SUBCOLLECTION), ORDER_BY, limit, cursor)]
+    if pull_authors:
+        pages.append(paginate_query_in(db.collection("posts"), "user_id", pull_authors, ORDER_BY, limit, cursor))
+    entries, next_cursor = merge_pages(pages, ORDER_BY, limit)
+
+    # Las entradas de posts borrados se descartan al hidratar
+    return get_many_docs(db, "posts", [entry.id for entry in entries]), next_cursor
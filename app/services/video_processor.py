@@ -10,6 +10,7 @@ from datetime import datetime
 from .stroke_detector import StrokeDetector
 from .movement_analyzer import MovementAnalyzer
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.utils.monitoring import StageTimer, queue_item_added, queue_item_done
 
 logger = logging.getLogger(__name__)
 
@@ -37,17 +38,41 @@ class VideoProcessor:
         self.batch_size = batch_size
         self.num_workers = num_workers
         
-    def process_video(self, video_path: str, output_path: Optional[str] = None) -> Dict[str, Any]:
+    def reset(self):
+        """
+        Deja el procesador listo para otro video sin recargar los modelos:
+        vacía frame_cache y reinicia el tracking y los buffers de golpes.
+        """
+        self.frame_cache.clear()
+        self.player_detector.reset()
+        self.stroke_detector.reset()
+
+    def warmup(self):
+        """
+        Ejecuta una inferencia sobre un frame sintético para que la primera
+        petición real no pague la carga perezosa de pesos y kernels.
+        """
+        frame = np.zeros((self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
+        detections = self.player_detector.detect(frame)
+        self.stroke_detector.detect_stroke(frame, {'x': 0, 'y': 0, 'width': 64, 'height': 128})
+        self.reset()
+        return detections
+
+    def process_video(self, video_path: str, output_path: Optional[str] = None, timer: Optional[StageTimer] = None) -> Dict[str, Any]:
         """
         Procesa un video de pádel y genera métricas de análisis.
         
         Args:
             video_path: Ruta al video a procesar
             output_path: Ruta opcional para guardar el video procesado
+            timer: Acumulador de tiempos por etapa (decode, detect, pose, track, render)
             
         Returns:
             Diccionario con resultados del análisis
         """
+        timer = timer or StageTimer()
+        # Estado limpio aunque el procesador se reutilice entre trabajos
+        self.reset()
         try:
             # Abrir video
             cap = cv2.VideoCapture(video_path)
@@ -71,8 +96,10 @@ class VideoProcessor:
             results_by_index = {}
             
             def process_frame(idx, frame):
-                frame = cv2.resize(frame, self.resolution)
-                detections = self.player_detector.detect(frame)
+                with timer.stage("decode"):
+                    frame = cv2.resize(frame, self.resolution)
+                with timer.stage("detect"):
+                    detections = self.player_detector.detect(frame, frame_index=idx)
                 local_strokes = []
                 local_positions = []
                 local_active_player = self._find_active_player(detections, frame) if detections else None
@@ -80,7 +107,9 @@ class VideoProcessor:
                 stroke_info = None
                 if detections:
                     if local_active_player and (idx - last_stroke_frame) >= min_frames_between_strokes:
-                        if self.stroke_detector.detect_stroke(frame, local_active_player):
+                        with timer.stage("pose"):
+                            is_stroke = self.stroke_detector.detect_stroke(frame, local_active_player)
+                        if is_stroke:
                             stroke_info = {
                                 'frame': idx,
                                 'player_id': local_active_player.get('id', 0),
@@ -108,21 +137,28 @@ class VideoProcessor:
             
             with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
                 futures = {}
+                def submit_frame(i, f):
+                    queue_item_added("video_frames")
+                    future = executor.submit(process_frame, i, f)
+                    future.add_done_callback(lambda _: queue_item_done("video_frames"))
+                    futures[future] = i
+
                 while True:
-                    ret, frame = cap.read()
+                    with timer.stage("decode"):
+                        ret, frame = cap.read()
                     if not ret:
                         break
                     batch.append(frame)
                     batch_indices.append(frame_count)
                     if len(batch) == self.batch_size:
                         for i, f in zip(batch_indices, batch):
-                            futures[executor.submit(process_frame, i, f)] = i
+                            submit_frame(i, f)
                         batch = []
                         batch_indices = []
                     frame_count += 1
                 # Procesar los frames restantes
                 for i, f in zip(batch_indices, batch):
-                    futures[executor.submit(process_frame, i, f)] = i
+                    submit_frame(i, f)
                 for future in as_completed(futures):
                     idx = futures[future]
                     try:
@@ -145,13 +181,17 @@ class VideoProcessor:
             
             # Liberar recursos
             cap.release()
+            timer.add_frames(len(results_by_index))
             
             # Analizar movimientos
-            movements = self.movement_analyzer.analyze_movements(player_positions)
+            with timer.stage("track"):
+                movements = self.movement_analyzer.analyze_movements(player_positions)
             
             # Generar video de salida
             if output_path and self.frame_cache:
-                self._generate_output_video(output_path, fps)
+                with timer.stage("render"):
+                    self._generate_output_video(output_path, fps)
+            self.frame_cache.clear()
             
             # Preparar resultados
             results = {
@@ -0,0 +1,408 @@
+"""
+Métricas Prometheus de la aplicación.
+
+Expone histogramas de latencia HTTP por ruta, contadores y latencias de
+operaciones Firestore, tiempos por etapa del pipeline de video, FPS de
+procesamiento y profundidad de colas.
+
+Las operaciones de Firestore se miden en el propio cliente:
+instrument_firestore_client() envuelve los métodos del SDK (lecturas,
+consultas, agregaciones y escrituras), así que también cuentan las llamadas
+directas a db.collection(...) de los endpoints. Los documentos leídos y
+escritos se atribuyen a la ruta de la petición en curso. Los bloques
+track_firestore explícitos siguen poniendo la etiqueta de la operación que
+envuelven; la llamada al SDK de dentro no se cuenta dos veces.
+
+Con varios workers de uvicorn cada proceso tiene su propio registro. Si se
+define PROMETHEUS_MULTIPROC_DIR (antes de arrancar los workers y con el
+directorio vacío), prometheus_client escribe las métricas en ficheros
+compartidos y /metrics agrega las de todos los procesos.
+"""
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    REGISTRY,
+)
+
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Etapas conocidas del pipeline de análisis de video
+PIPELINE_STAGES = ("download", "decode", "detect", "pose", "track", "kpi", "render", "upload")
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Peticiones HTTP atendidas",
+    ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Latencia de las peticiones HTTP por ruta",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Peticiones HTTP en curso",
+    ["method"],
+    multiprocess_mode="livesum"
+)
+
+FIRESTORE_OPERATIONS = Counter(
+    "firestore_operations_total",
+    "Operaciones sobre Firestore",
+    ["collection", "operation", "status"]
+)
+FIRESTORE_OPERATION_DURATION = Histogram(
+    "firestore_operation_duration_seconds",
+    "Latencia de las operaciones sobre Firestore",
+    ["collection", "operation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+FIRESTORE_DOCUMENTS = Counter(
+    "firestore_documents_total",
+    "Documentos de Firestore leídos o escritos por ruta",
+    ["route", "kind"]
+)
+FIRESTORE_READS_PER_REQUEST = Histogram(
+    "firestore_reads_per_request",
+    "Documentos de Firestore leídos en cada petición HTTP",
+    ["route"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+)
+
+PIPELINE_STAGE_DURATION = Histogram(
+    "pipeline_stage_duration_seconds",
+    "Tiempo total por etapa del pipeline en cada análisis",
+    ["stage"],
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+)
+PIPELINE_FRAMES = Counter(
+    "pipeline_frames_processed_total",
+    "Frames procesados por el pipeline"
+)
+PIPELINE_FPS = Histogram(
+    "pipeline_frames_per_second",
+    "Frames por segundo de cada análisis completo",
+    buckets=(1, 2, 5, 10, 15, 20, 30, 45, 60, 90, 120, 240)
+)
+PIPELINE_JOBS = Counter(
+    "pipeline_jobs_total",
+    "Análisis de video ejecutados",
+    ["status"]
+)
+PIPELINE_RECYCLES = Counter(
+    "pipeline_recycles_total",
+    "Pipelines descartados y recreados por el pool del worker",
+    ["reason"]
+)
+
+CIRCUIT_STATE = Gauge(
+    "circuit_breaker_state",
+    "Estado del circuit breaker por dependencia (0 cerrado, 1 semiabierto, 2 abierto)",
+    ["name"],
+    multiprocess_mode="max"
+)
+CIRCUIT_REJECTIONS = Counter(
+    "circuit_breaker_rejections_total",
+    "Llamadas rechazadas sin intentarse por circuito abierto o bulkhead lleno",
+    ["name", "reason"]
+)
+
+QUEUE_DEPTH = Gauge(
+    "queue_depth",
+    "Elementos pendientes por cola",
+    ["queue"],
+    multiprocess_mode="livesum"
+)
+
+def route_label(request: Request) -> str:
+    """
+    Devuelve la plantilla de la ruta (p. ej. /api/v1/users/{user_id}) para
+    acotar la cardinalidad de las métricas.
+    """
+    route = request.scope.get("route")
+    path = getattr(route, "path", None)
+    return path or "unmatched"
+
+# Documentos leídos/escritos en la petición en curso (lo fija el middleware HTTP)
+_request_documents: contextvars.ContextVar[Optional[Dict[str, int]]] = contextvars.ContextVar(
+    "firestore_request_documents", default=None
+)
+# Dentro de un track_firestore explícito: las llamadas al SDK no repiten la operación
+_tracked: contextvars.ContextVar[bool] = contextvars.ContextVar("firestore_tracked", default=False)
+# Dentro de un método instrumentado del SDK (que puede llamar a otros instrumentados)
+_in_client: contextvars.ContextVar[bool] = contextvars.ContextVar("firestore_in_client", default=False)
+
+def start_request_documents() -> Dict[str, int]:
+    """Empieza a contar los documentos de Firestore de la petición en curso."""
+    documents = {"read": 0, "write": 0}
+    _request_documents.set(documents)
+    return documents
+
+_documents_lock = threading.Lock()
+
+def count_documents(kind: str, count: int):
+    """Suma documentos leídos ("read") o escritos ("write") a la petición en curso."""
+    documents = _request_documents.get()
+    if documents is not None and count:
+        with _documents_lock:
+            documents[kind] += count
+
+def observe_http_request(method: str, route: str, status_code: int, duration: float,
+                         documents: Optional[Dict[str, int]] = None):
+    """Registra una petición HTTP atendida (y sus documentos de Firestore, si se contaron)."""
+    HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+    HTTP_REQUEST_DURATION.labels(method, route).observe(duration)
+    if documents is not None:
+        for kind, count in documents.items():
+            if count:
+                FIRESTORE_DOCUMENTS.labels(route, kind).inc(count)
+        FIRESTORE_READS_PER_REQUEST.labels(route).observe(documents["read"])
+
+def _observe_firestore(collection: str, operation: str, status: str, seconds: float):
+    FIRESTORE_OPERATIONS.labels(collection, operation, status).inc()
+    FIRESTORE_OPERATION_DURATION.labels(collection, operation).observe(seconds)
+
+@contextmanager
+def track_firestore(collection: str, operation: str):
+    """
+    Mide una operación sobre Firestore.
+
+    Ejemplo:
+        with track_firestore("users", "get"):
+            doc = db.collection("users").document(uid).get()
+    """
+    if _tracked.get():
+        yield
+        return
+    token = _tracked.set(True)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        _tracked.reset(token)
+        _observe_firestore(collection, operation, status, time.perf_counter() - start)
+
+def _collection_name(target: Any) -> str:
+    """Colección de una referencia, consulta o agregación del SDK."""
+    path = getattr(target, "_path", None)
+    if path:
+        # DocumentReference: (..., colección, id); CollectionReference: (..., colección)
+        return path[-2] if len(path) % 2 == 0 else path[-1]
+    nested = getattr(target, "_nested_query", None)
+    parent = getattr(nested or target, "_parent", None)
+    return getattr(parent, "id", None) or "unknown"
+
+def _client_call(collection: str, operation: str, call: Callable[[], Any],
+                 documents: Callable[[Any], int], kind: str) -> Any:
+    token = _in_client.set(True)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        result = call()
+        count_documents(kind, documents(result))
+        return result
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        _in_client.reset(token)
+        if not _tracked.get():
+            _observe_firestore(collection, operation, status, time.perf_counter() - start)
+
+def _instrument(cls: type, name: str, operation: str, kind: str,
+                documents: Callable[[Any, Any], int]):
+    original = getattr(cls, name, None)
+    if original is None or getattr(original, "_monitoring_original", None):
+        return
+
+    @functools.wraps(original)
+    def wrapper(self, *args, **kwargs):
+        if _in_client.get():
+            return original(self, *args, **kwargs)
+        return _client_call(
+            _collection_name(self), operation,
+            lambda: original(self, *args, **kwargs),
+            lambda result: documents(self, result), kind
+        )
+
+    wrapper._monitoring_original = original
+    setattr(cls, name, wrapper)
+
+def _instrument_stream(cls: type, name: str, operation: str):
+    original = getattr(cls, name, None)
+    if original is None or getattr(original, "_monitoring_original", None):
+        return
+
+    @functools.wraps(original)
+    def wrapper(self, *args, **kwargs):
+        if _in_client.get():
+            return original(self, *args, **kwargs)
+        return _tracked_stream(_collection_name(self), operation, original(self, *args, **kwargs))
+
+    wrapper._monitoring_original = original
+    setattr(cls, name, wrapper)
+
+def _tracked_stream(collection: str, operation: str, results):
+    # Solo cuenta el tiempo dentro del SDK, no el del consumidor entre documentos
+    elapsed = 0.0
+    status = "ok"
+    tracked = _tracked.get()
+    iterator = iter(results)
+    try:
+        while True:
+            token = _in_client.set(True)
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - start
+                _in_client.reset(token)
+            count_documents("read", 1)
+            yield item
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        if not tracked:
+            _observe_firestore(collection, operation, status, elapsed)
+
+_client_instrumented = False
+
+def instrument_firestore_client() -> bool:
+    """
+    Instrumenta el cliente síncrono de Firestore (una vez por proceso).
+
+    Returns:
+        False si el SDK de Firestore no está disponible
+    """
+    global _client_instrumented
+    if _client_instrumented:
+        return True
+    try:
+        from google.cloud.firestore_v1.aggregation import AggregationQuery
+        from google.cloud.firestore_v1.batch import WriteBatch
+        from google.cloud.firestore_v1.client import Client
+        from google.cloud.firestore_v1.collection import CollectionReference
+        from google.cloud.firestore_v1.document import DocumentReference
+        from google.cloud.firestore_v1.query import Query
+    except ImportError:
+        return False
+
+    one = lambda target, result: 1
+    _instrument(DocumentReference, "get", "get", "read", one)
+    for name in ("set", "create", "update", "delete"):
+        _instrument(DocumentReference, name, name, "write", one)
+    _instrument(CollectionReference, "add", "add", "write", one)
+    # Query.get devuelve la lista; CollectionGroup hereda de Query
+    _instrument(Query, "get", "query", "read", lambda target, result: len(result))
+    _instrument(CollectionReference, "get", "query", "read", lambda target, result: len(result))
+    _instrument_stream(Query, "stream", "query")
+    _instrument_stream(CollectionReference, "stream", "query")
+    # Una agregación cuesta una lectura por cada 1000 entradas de índice; se cuenta una
+    _instrument(AggregationQuery, "get", "aggregate", "read", one)
+    _instrument(WriteBatch, "commit", "commit", "write", lambda target, result: len(result or []))
+    _instrument_stream(Client, "get_all", "get_all")
+    _client_instrumented = True
+    return True
+
+class StageTimer:
+    """
+    Acumula el tiempo de cada etapa del pipeline durante un análisis.
+
+    Las etapas por frame (decode, detect, pose) se ejecutan en varios hilos y
+    se suman; al terminar, observe() publica un valor por etapa y análisis.
+    """
+
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+        self.frames = 0
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def add_frames(self, count: int = 1):
+        with self._lock:
+            self.frames += count
+
+    def observe(self, status: str = "completed") -> Dict[str, float]:
+        """Publica las métricas del análisis y devuelve el desglose de tiempos."""
+        elapsed = time.perf_counter() - self._start
+        for name, seconds in self.durations.items():
+            PIPELINE_STAGE_DURATION.labels(name).observe(seconds)
+        if self.frames:
+            PIPELINE_FRAMES.inc(self.frames)
+            if elapsed > 0:
+                PIPELINE_FPS.observe(self.frames / elapsed)
+        PIPELINE_JOBS.labels(status).inc()
+        return {**{name: round(s, 3) for name, s in self.durations.items()}, "total": round(elapsed, 3)}
+
+def pipeline_recycled(reason: str):
+    """Registra el reciclado de un pipeline del pool (p. ej. por memoria)."""
+    PIPELINE_RECYCLES.labels(reason).inc()
+
+_CIRCUIT_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+def circuit_state_changed(name: str, state: str):
+    CIRCUIT_STATE.labels(name).set(_CIRCUIT_STATE_VALUES.get(state, 0))
+
+def circuit_rejected(name: str, reason: str):
+    CIRCUIT_REJECTIONS.labels(name, reason).inc()
+
+def set_queue_depth(queue: str, depth: int):
+    """Fija la profundidad actual de una cola."""
+    QUEUE_DEPTH.labels(queue).set(depth)
+
+def queue_item_added(queue: str, count: int = 1):
+    QUEUE_DEPTH.labels(queue).inc(count)
+
+def queue_item_done(queue: str, count: int = 1):
+    QUEUE_DEPTH.labels(queue).dec(count)
+
+def _registry() -> CollectorRegistry:
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+def metrics_response() -> Response:
+    """Respuesta del endpoint /metrics en formato de exposición de Prometheus."""
+    return Response(content=generate_latest(_registry()), media_type=CONTENT_TYPE_LATEST)
+
+def mark_process_dead(pid: Optional[int] = None):
+    """Descarta los gauges 'live' de un worker que termina (solo en modo multiproceso)."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,174 @@
+"""
+Paginación por cursor para los endpoints de listado.
+
+El cursor es un token opaco (base64 de JSON) con los valores de los campos de
+orden del último elemento devuelto y su ID como desempate. Se traduce a
+``start_after`` en Firestore, de modo que una página profunda cuesta lo mismo
+que la primera en lugar de leer y descartar todos los documentos anteriores.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from firebase_admin import firestore
+
+from app.services.bulk_fetch import chunked, run_chunks, unique
+from app.utils.monitoring import track_firestore
+
+# Campo interno de Firestore con la ruta del documento, usado como desempate
+DOCUMENT_ID_FIELD = "__name__"
+
+OrderField = Tuple[str, str]
+
+class InvalidCursorError(ValueError):
+    """El cursor recibido no es válido o no corresponde al orden de la consulta."""
+
+def _collection_name(query) -> str:
+    parent = getattr(query, "_parent", None)
+    return getattr(parent, "id", None) or "unknown"
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return value
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$dt" in value:
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """Codifica los valores de orden del último elemento en un token opaco."""
+    payload = {field: _encode_value(value) for field, value in values.items()}
+    raw = json.dumps(payload, separators=(",", ":"), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str, fields: Sequence[str]) -> Dict[str, Any]:
+    """
+    Decodifica un token generado por encode_cursor.
+
+    Raises:
+        InvalidCursorError: Si el token está mal formado o no contiene los campos esperados
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("Cursor de paginación inválido") from e
+
+    if not isinstance(payload, dict) or set(payload) != set(fields):
+        raise InvalidCursorError("Cursor de paginación inválido")
+    return {field: _decode_value(value) for field, value in payload.items()}
+
+def paginate_query(
+    query,
+    order_by: Sequence[OrderField],
+    limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Ejecuta una consulta de Firestore paginada por cursor.
+
+    Aplica el orden indicado más el ID del documento como desempate, continúa
+    tras el cursor y pide un documento extra para saber si hay más páginas sin
+    usar count().
+
+    Args:
+        query: Consulta de Firestore sin order_by ni límites
+        order_by: Lista de (campo, dirección) con dirección "ASCENDING" o "DESCENDING"
+        limit: Tamaño de la página
+        cursor: Token devuelto por la página anterior
+
+    Returns:
+        Tupla (documentos de la página, cursor de la siguiente página o None)
+    """
+    direction = order_by[-1][1] if order_by else firestore.Query.ASCENDING
+    fields = [field for field, _ in order_by] + [DOCUMENT_ID_FIELD]
+
+    for field, field_direction in order_by:
+        query = query.order_by(field, direction=field_direction)
+    query = query.order_by(DOCUMENT_ID_FIELD, direction=direction)
+
+    if cursor:
+        query = query.start_after(decode_cursor(cursor, fields))
+
+    with track_firestore(_collection_name(query), "query"):
+        docs = list(query.limit(limit + 1).get())
+    if len(docs) <= limit:
+        return docs, None
+
+    docs = docs[:limit]
+    last = docs[-1]
+    last_data = last.to_dict()
+    values = {field: last_data.get(field) for field, _ in order_by}
+    values[DOCUMENT_ID_FIELD] = last.id
+    return docs, encode_cursor(values)
+
+def _sort_key(value: Any) -> Tuple[bool, Any]:
+    # Null va antes que cualquier otro valor en orden ascendente, como en Firestore
+    return (value is not None, value)
+
+def paginate_query_in(
+    query,
+    field: str,
+    values: Sequence[Any],
+    order_by: Sequence[OrderField],
+    limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Pagina por cursor una consulta ``field in values`` con más valores de los que admite Firestore.
+
+    Cada trozo de 30 valores se pagina con paginate_query desde el mismo cursor y
+    en paralelo; las páginas se mezclan por el mismo orden (campos de orden y ID)
+    y se recortan a limit. El cursor resultante es compatible con paginate_query.
+
+    Returns:
+        Tupla (documentos de la página, cursor de la siguiente página o None)
+    """
+    chunks = chunked(unique(values))
+    if not chunks:
+        return [], None
+    if len(chunks) == 1:
+        return paginate_query(query.where(field, "in", list(chunks[0])), order_by, limit, cursor)
+
+    pages = run_chunks(
+        lambda chunk: paginate_query(query.where(field, "in", list(chunk)), order_by, limit, cursor),
+        chunks
+    )
+    return merge_pages(pages, order_by, limit)
+
+def merge_pages(
+    pages: Sequence[Tuple[List[Any], Optional[str]]],
+    order_by: Sequence[OrderField],
+    limit: int
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Mezcla páginas de paginate_query obtenidas desde el mismo cursor.
+
+    Ordena la unión por los campos de orden y el ID, la recorta a limit y
+    devuelve el cursor de la siguiente página, compatible con paginate_query.
+    Un documento presente en varias páginas (mismo ID) se cuenta una vez.
+    """
+    docs = {doc.id: doc for page_docs, _ in pages for doc in page_docs}
+    has_more = any(next_cursor for _, next_cursor in pages)
+
+    # Orden estable por pasadas, del criterio menos significativo al más significativo
+    direction = order_by[-1][1] if order_by else firestore.Query.ASCENDING
+    merged = sorted(docs.values(), key=lambda doc: doc.id, reverse=direction == firestore.Query.DESCENDING)
+    for order_field, order_direction in reversed(order_by):
+        merged.sort(
+            key=lambda doc: _sort_key(doc.to_dict().get(order_field)),
+            reverse=order_direction == firestore.Query.DESCENDING
+        )
+
+    page = merged[:limit]
+    if not page or (len(merged) <= limit and not has_more):
+        return page, None
+
+    last = page[-1]
+    last_data = last.to_dict()
+    cursor_values = {order_field: last_data.get(order_field) for order_field, _ in order_by}
+    cursor_values[DOCUMENT_ID_FIELD] = last.id
+    return page, encode_cursor(cursor_values)
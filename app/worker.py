@@ -0,0 +1,317 @@
+"""
+Worker de la cola de trabajos.
+
+Proceso de larga duración que reserva trabajos de una cola de
+app.services.job_queue y los ejecuta; cada hilo procesa un trabajo a la vez y
+la concurrencia total es el número de hilos por proceso.
+
+El worker de la cola de análisis crea al arrancar un PipelinePool con un
+pipeline caliente por hilo, de modo que los modelos no se inicializan en cada
+trabajo. Solo los tipos de PIPELINE_JOBS toman un pipeline del pool; el resto
+se ejecuta sin él. Los trabajos ligeros (push, compactación, borrados) tienen
+su propia cola y sus propios workers, sin modelos cargados.
+
+Cada worker purga periódicamente los trabajos terminados de su cola.
+
+Uso:
+    python -m app.worker --concurrency 2
+    python -m app.worker --queue background --concurrency 4
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+from contextlib import ExitStack
+from typing import Any, Callable, Dict, Optional
+
+from firebase_admin import firestore
+
+from app.services.job_queue import (
+    ANALYZE_VIDEO_JOB,
+    CASCADE_DELETE_JOB,
+    COMPACT_NOTIFICATIONS_JOB,
+    Job,
+    JobBroker,
+    JOB_DONE_RETENTION,
+    JOB_QUEUE_NAME,
+    LIGHT_JOB_QUEUE_NAME,
+    PIPELINE_JOBS,
+    SEND_PUSH_JOB,
+    get_broker,
+    visibility_timeout_for
+)
+from app.services.cascade_delete import run_deletion
+from app.services.notification_retention import compact_notifications
+from app.services.push_dispatcher import deliver_push
+from app.services.pipeline_pool import PipelinePool
+from app.utils.monitoring import instrument_firestore_client, set_queue_depth
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WORKER_QUEUE = os.getenv("WORKER_QUEUE", JOB_QUEUE_NAME)
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "1"))
+# Espera entre sondeos cuando la cola está vacía
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+# Segundos entre purgas de trabajos terminados
+JOB_PURGE_INTERVAL = float(os.getenv("JOB_PURGE_INTERVAL", "3600"))
+
+class PermanentJobError(Exception):
+    """Error que no se resuelve reintentando (p. ej. el documento no existe)."""
+
+def analyze_video(job: Job, pipeline, db=None) -> Dict[str, Any]:
+    """
+    Ejecuta el análisis de un documento de video_analyses y guarda su estado.
+
+    El documento pasa por 'processing' y termina en 'completed' o 'failed'; si
+    el intento falla pero quedan reintentos vuelve a 'queued'.
+
+    Raises:
+        PermanentJobError: Si el documento de análisis no existe
+        RuntimeError: Si el pipeline devuelve un error
+    """
+    if db is None:
+        from app.services.firebase import get_firebase_client
+        db = get_firebase_client()
+
+    analysis_id = job.payload["analysis_id"]
+    analysis_ref = db.collection('video_analyses').document(analysis_id)
+    analysis_doc = analysis_ref.get()
+    if not analysis_doc.exists:
+        raise PermanentJobError(f"No se encontró el documento de análisis {analysis_id}")
+
+    analysis_data = analysis_doc.to_dict()
+    if analysis_data.get('status') == 'completed':
+        logger.info(f"[Worker] El análisis {analysis_id} ya estaba completado")
+        return {"status": "completed"}
+
+    analysis_ref.update({
+        'status': 'processing',
+        'job_id': job.id,
+        'attempts': job.attempts,
+        'started_at': firestore.SERVER_TIMESTAMP
+    })
+
+    try:
+        resultado = pipeline.analyze(
+            video_path=analysis_data.get('video_url'),
+            tipo=analysis_data.get('video_type', 'game'),
+            nivel=analysis_data.get('nivel', 'intermedio'),
+            user_id=analysis_data.get('user_id')
+        )
+        if 'error' in resultado:
+            raise RuntimeError(resultado['error'])
+    except Exception as e:
+        retrying = not job.is_last_attempt
+        analysis_ref.update({
+            'status': 'queued' if retrying else 'failed',
+            'error_details': str(e),
+            'failed_at': None if retrying else firestore.SERVER_TIMESTAMP
+        })
+        raise
+
+    analysis_ref.update({
+        'status': 'completed',
+        'metrics': resultado.get('metrics'),
+        'raw_analysis': resultado.get('raw_analysis'),
+        'output_video': resultado.get('output_video'),
+        'output_video_gcs_url': resultado.get('output_video_gcs_url'),
+        'completed_at': firestore.SERVER_TIMESTAMP,
+        'error_details': None
+    })
+    return {"status": "completed"}
+
+HANDLERS: Dict[str, Callable[..., Any]] = {
+    ANALYZE_VIDEO_JOB: analyze_video,
+    COMPACT_NOTIFICATIONS_JOB: compact_notifications,
+    SEND_PUSH_JOB: deliver_push,
+    CASCADE_DELETE_JOB: run_deletion
+}
+
+def _default_pipeline_factory():
+    from app.services.pipeline_manager import PipelineManager
+    return PipelineManager()
+
+class _LeaseKeeper:
+    """Renueva la reserva de un trabajo mientras se ejecuta."""
+
+    def __init__(self, broker: JobBroker, job: Job, visibility_timeout: int):
+        self.broker = broker
+        self.job = job
+        self.visibility_timeout = visibility_timeout
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        interval = max(self.visibility_timeout / 3, 1)
+        while not self._stop.wait(interval):
+            if not self.broker.extend(self.job, self.visibility_timeout):
+                logger.warning(f"[Worker] No se pudo renovar la reserva de {self.job}")
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+class Worker:
+    """
+    Consume una cola de trabajos con un número fijo de hilos.
+
+    Args:
+        broker: Broker de la cola (por defecto el de queue en JOB_QUEUE_URL)
+        handlers: Funciones por tipo de trabajo, llamadas como handler(job, pipeline)
+            (pipeline es None para los tipos que no están en PIPELINE_JOBS)
+        pipeline_factory: Crea los pipelines del pool
+        concurrency: Trabajos simultáneos en este proceso (y tamaño del pool)
+        visibility_timeout: Por defecto el de la cola
+        pool: Pool de pipelines ya creado (por defecto uno de tamaño concurrency,
+            que solo se calienta al arrancar en la cola de análisis)
+        queue: Cola a consumir si no se pasa broker
+    """
+
+    def __init__(
+        self,
+        broker: Optional[JobBroker] = None,
+        handlers: Optional[Dict[str, Callable[..., Any]]] = None,
+        pipeline_factory: Callable[[], Any] = _default_pipeline_factory,
+        concurrency: int = WORKER_CONCURRENCY,
+        visibility_timeout: Optional[int] = None,
+        poll_interval: float = WORKER_POLL_INTERVAL,
+        pool: Optional[PipelinePool] = None,
+        queue: str = WORKER_QUEUE,
+        purge_interval: float = JOB_PURGE_INTERVAL
+    ):
+        self.broker = broker or get_broker(queue)
+        self.queue = getattr(self.broker, "queue", queue)
+        self.handlers = handlers or HANDLERS
+        self.concurrency = concurrency
+        # Crear el pool no carga modelos: se cargan en start() o al primer acquire()
+        self.pool = pool or PipelinePool(pipeline_factory, size=concurrency)
+        self.visibility_timeout = visibility_timeout or visibility_timeout_for(self.queue)
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._purge_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def run_once(self, pipeline=None) -> bool:
+        """
+        Reserva y ejecuta un trabajo. Devuelve False si la cola estaba vacía.
+
+        Sin pipeline explícito se toma uno del pool solo si el trabajo lo necesita.
+        """
+        job = self.broker.reserve(self.visibility_timeout)
+        if job is None:
+            return False
+
+        set_queue_depth(f"jobs:{self.queue}", self.broker.depth())
+        handler = self.handlers.get(job.type)
+        if handler is None:
+            logger.error(f"[Worker] Tipo de trabajo desconocido: {job.type}")
+            self.broker.nack(job, f"Tipo de trabajo desconocido: {job.type}", final=True)
+            return True
+
+        if job.type not in PIPELINE_JOBS:
+            self._execute(job, handler, None)
+        elif pipeline is None:
+            with ExitStack() as stack:
+                try:
+                    pooled_pipeline = stack.enter_context(self.pool.acquire())
+                except Exception as e:
+                    # Sin pipeline (pool agotado o fallo al crearlo): se reintenta más tarde
+                    status = self.broker.nack(job, f"Sin pipeline disponible: {str(e) or type(e).__name__}")
+                    logger.error(f"[Worker] Sin pipeline para {job} ({status}): {str(e)}")
+                    return True
+                self._execute(job, handler, pooled_pipeline)
+        else:
+            self._execute(job, handler, pipeline)
+        return True
+
+    def purge_finished(self, force: bool = False) -> int:
+        """Borra los trabajos terminados fuera de retención (como mucho una vez por purge_interval)."""
+        now = time.time()
+        with self._purge_lock:
+            if not force and now < self._next_purge:
+                return 0
+            self._next_purge = now + self.purge_interval
+        purged = self.broker.purge(JOB_DONE_RETENTION)
+        if purged:
+            logger.info(f"[Worker] Purgados {purged} trabajos terminados de la cola {self.queue}")
+        return purged
+
+    def _execute(self, job: Job, handler: Callable[..., Any], pipeline):
+        logger.info(f"[Worker] Ejecutando {job}")
+        try:
+            with _LeaseKeeper(self.broker, job, self.visibility_timeout):
+                handler(job, pipeline)
+        except PermanentJobError as e:
+            logger.error(f"[Worker] {job} falló sin reintento: {str(e)}")
+            self.broker.nack(job, str(e), final=True)
+        except Exception as e:
+            status = self.broker.nack(job, str(e))
+            logger.error(f"[Worker] {job} falló ({status}): {str(e)}", exc_info=True)
+        else:
+            if not self.broker.ack(job):
+                logger.warning(f"[Worker] La reserva de {job} expiró antes de confirmarlo")
+            logger.info(f"[Worker] {job} completado")
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.purge_finished()
+                if not self.run_once():
+                    self._stop.wait(self.poll_interval)
+            except Exception as e:
+                # Error del broker: esperar y seguir en lugar de matar el hilo
+                logger.error(f"[Worker] Error consumiendo la cola: {str(e)}", exc_info=True)
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self.queue == JOB_QUEUE_NAME:
+            # Cargar y calentar los modelos antes de aceptar análisis
+            self.pool.start()
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f"worker-{self.queue}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        warm = self.pool.size if self.queue == JOB_QUEUE_NAME else 0
+        logger.info(f"[Worker] Cola {self.queue} iniciada con {self.concurrency} hilos y {warm} pipelines calientes")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Deja de reservar trabajos y espera a que terminen los que están en curso."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_forever(self):
+        self.start()
+        try:
+            while any(t.is_alive() for t in self._threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker de la cola de trabajos")
+    parser.add_argument("--queue", default=WORKER_QUEUE, choices=[JOB_QUEUE_NAME, LIGHT_JOB_QUEUE_NAME])
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    args = parser.parse_args()
+
+    from app.core.config.firebase import initialize_firebase
+    initialize_firebase()
+    instrument_firestore_client()
+
+    worker = Worker(concurrency=args.concurrency, queue=args.queue)
+    signal.signal(signal.SIGTERM, lambda *_: worker._stop.set())
+    worker.run_forever()
+
+if __name__ == "__main__":
+    main()
@@ -9,12 +9,15 @@ from routes.onboarding import router as onboarding_router
 from routes.matchmaking import router as matchmaking_router
 from app.api.v1.endpoints.padel_iq import router as padel_iq_router
 from app.core.middleware import error_handling_middleware
+from app.utils.monitoring import instrument_firestore_client, metrics_response, mark_process_dead
+from app.core.circuit_breaker import all_breakers
 from app.core.config.firebase import initialize_firebase, get_firebase_clients
 from dotenv import load_dotenv
-from app.api.videos import router as videos_router
-from app.services.pipeline_manager import PipelineManager
+from app.api.videos import router as videos_router, enqueue_analysis_job
 from app.services.firebase import get_firebase_client
-from google.cloud import firestore
+from app.services.job_queue import COMPACT_NOTIFICATIONS_JOB, enqueue_job
+from app.services.realtime_hub import close_hub
+from app.services import autocomplete, cascade_delete, search_history, search_index
 
 # Cargar variables de entorno según el entorno
 env = os.getenv('ENV', 'development')
@@ -49,6 +52,7 @@ app = FastAPI(
 try:
     initialize_firebase()
     clients = get_firebase_clients()
+    instrument_firestore_client()
     logger.info("Firebase inicializado correctamente")
 except Exception as e:
     logger.error(f"Error al inicializar Firebase: {str(e)}", exc_info=True)
@@ -90,10 +94,25 @@ async def startup_event():
             logger.error("No se pudo establecer conexión con Firebase")
             raise Exception("Error de conexión con Firebase")
         logger.info("Conexión con Firebase verificada correctamente")
+        # El índice de búsqueda y el autocompletado del worker se cargan en segundo plano
+        autocomplete.start(get_firebase_client())
     except Exception as e:
         logger.error(f"Error en startup: {str(e)}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Evento que se ejecuta al detener el worker."""
+    await close_hub()
+    search_index.stop_sync()
+    search_history.stop_buffer()
+    mark_process_dead()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas en formato Prometheus (agregadas entre workers si hay modo multiproceso)."""
+    return metrics_response()
+
 @app.get("/")
 async def root():
     logger.debug("Root endpoint called")
@@ -119,6 +138,10 @@ async def health_check():
         logger.error(f"Health check de Firebase falló: {str(e)}")
         health_status["status"] = "unhealthy"
         health_status["components"]["firebase"] = f"unhealthy: {str(e)}"
+    # Dependencias externas con el circuito abierto en este worker
+    health_status["circuits"] = {
+        name: stats["state"] for name, stats in all_breakers().items()
+    }
     return health_status
 
 @app.get("/test-error")
@@ -128,49 +151,76 @@ async def test_error():
 
 @app.post("/tasks/analyze_video")
 async def analyze_video_task(request: Request):
-    data = await request.json()
-    analysis_id = data.get("analysis_id")
+    """
+    Receptor de Cloud Tasks: encola el análisis para los workers y responde de
+    inmediato. El procesamiento se hace en app.worker, no en la petición HTTP.
+
+    Las entregas duplicadas no cambian nada. Con ``{"retry": true}`` se vuelve
+    a encolar un análisis cuyo trabajo agotó sus intentos.
+    """
     # Protección opcional por API key
     api_key = request.headers.get("x-api-key")
     if API_TASKS_KEY and api_key != API_TASKS_KEY:
-        return {"error": "Unauthorized"}, status.HTTP_401_UNAUTHORIZED
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    data = await request.json()
+    analysis_id = data.get("analysis_id")
     if not analysis_id:
-        return {"error": "analysis_id requerido"}, status.HTTP_400_BAD_REQUEST
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="analysis_id requerido")
     try:
-        db, _ = get_firebase_client()
-        analysis_ref = db.collection('video_analyses').document(analysis_id)
-        analysis_doc = analysis_ref.get()
+        db = get_firebase_client()
+        analysis_doc = db.collection('video_analyses').document(analysis_id).get()
         if not analysis_doc.exists:
-            return {"error": "No se encontró el documento de análisis"}, status.HTTP_404_NOT_FOUND
-        analysis_data = analysis_doc.to_dict()
-        video_url = analysis_data.get('video_url')
-        video_type = analysis_data.get('video_type', 'game')
-        nivel = analysis_data.get('nivel', 'intermedio')
-        user_id = analysis_data.get('user_id')
-        pipeline = PipelineManager()
-        resultado = pipeline.analyze(
-            video_path=video_url,
-            tipo=video_type,
-            nivel=nivel,
-            user_id=user_id
-        )
-        analysis_ref.update({
-            'status': 'completed' if 'error' not in resultado else 'failed',
-            'metrics': resultado.get('metrics'),
-            'raw_analysis': resultado.get('raw_analysis'),
-            'output_video': resultado.get('output_video'),
-            'completed_at': firestore.SERVER_TIMESTAMP,
-            'error_details': resultado.get('error')
-        })
-        return {"status": "ok"}
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No se encontró el documento de análisis")
+        job_id = enqueue_analysis_job(analysis_id, retry=bool(data.get("retry")))
+        return {"status": "queued", "job_id": job_id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error al encolar análisis {analysis_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error al encolar análisis")
+
+@app.post("/tasks/compact_notifications")
+async def compact_notifications_task(request: Request):
+    """
+    Receptor de Cloud Scheduler: encola la compactación periódica de
+    notificaciones caducadas; la ejecuta app.worker.
+    """
+    api_key = request.headers.get("x-api-key")
+    if API_TASKS_KEY and api_key != API_TASKS_KEY:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    try:
+        job_id = enqueue_job(COMPACT_NOTIFICATIONS_JOB, {})
+        return {"status": "queued", "job_id": job_id}
     except Exception as e:
-        if 'analysis_ref' in locals():
-            analysis_ref.update({
-                'status': 'failed',
-                'error_details': f"Error general: {str(e)}",
-                'failed_at': firestore.SERVER_TIMESTAMP
-            })
-        return {"error": str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR
+        logger.error(f"Error al encolar compactación de notificaciones: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error al encolar compactación")
+
+@app.post("/tasks/resume_deletions")
+async def resume_deletions_task(request: Request):
+    """
+    Receptor de Cloud Scheduler: vuelve a encolar los borrados en cascada que
+    no terminaron (trabajo perdido o reintentos agotados).
+    """
+    api_key = request.headers.get("x-api-key")
+    if API_TASKS_KEY and api_key != API_TASKS_KEY:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    try:
+        resumed = cascade_delete.resume_unfinished(get_firebase_client())
+        return {"status": "queued", "resumed": resumed}
+    except Exception as e:
+        logger.error(f"Error al reanudar borrados en cascada: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error al reanudar borrados")
+
+@app.get("/tasks/deletions/{deletion_id}")
+async def deletion_progress_task(deletion_id: str, request: Request):
+    """Progreso de un borrado en cascada."""
+    api_key = request.headers.get("x-api-key")
+    if API_TASKS_KEY and api_key != API_TASKS_KEY:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
+    progress = cascade_delete.get_progress(get_firebase_client(), deletion_id)
+    if progress is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Borrado no encontrado")
+    return progress
 
 if __name__ == "__main__":
     import uvicorn
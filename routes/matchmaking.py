@@ -6,6 +6,8 @@ from datetime import datetime
 from firebase_admin import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 from app.services.notification_service import send_notification
+from app.services import geo
+from app.services.firebase import gather_reads, run_sync
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -33,14 +35,11 @@ def get_db():
         raise HTTPException(status_code=500, detail="Error inicializando Firestore")
 
 def calculate_distance(loc1, loc2):
-    """Calcula la distancia aproximada entre dos ubicaciones (latitud, longitud)."""
-    if not loc1 or not loc2 or 'latitude' not in loc1 or 'longitude' not in loc1 or 'latitude' not in loc2 or 'longitude' not in loc2:
+    """Calcula la distancia en km entre dos ubicaciones (latitud, longitud) con haversine."""
+    coords1, coords2 = geo.coords_of(loc1), geo.coords_of(loc2)
+    if coords1 is None or coords2 is None:
         return float('inf')
-    lat1, lon1 = loc1['latitude'], loc1['longitude']
-    lat2, lon2 = loc2['latitude'], loc2['longitude']
-    # Fórmula simplificada para distancia (aproximada, sin usar haversine)
-    distance = ((lat1 - lat2) ** 2 + (lon1 - lon2) ** 2) ** 0.5
-    return distance
+    return geo.haversine_km(coords1, coords2)
 
 @router.get("/matchmaking")
 async def get_matchmaking(db: firestore.Client = Depends(get_db)):
@@ -68,7 +67,12 @@ async def get_match_status(match_id: str):
 
 @router.post("/find_matches")
 async def find_matches(request: Request, db: firestore.Client = Depends(get_db)):
-    """Encuentra jugadores compatibles para un partido."""
+    """
+    Encuentra jugadores compatibles para un partido.
+
+    max_distance se expresa en km. Solo se leen los usuarios de las celdas de
+    geohash cercanas al usuario, no toda la colección.
+    """
     data = await request.json()
     user_id = data.get('user_id')
     max_distance = data.get('max_distance', 10.0)
@@ -76,6 +80,10 @@ async def find_matches(request: Request, db: firestore.Client = Depends(get_db))
     if not user_id:
         raise HTTPException(status_code=400, detail="Falta user_id")
 
+    # Las lecturas usan el cliente síncrono: fuera del event loop
+    return await run_sync(_find_compatible_users, db, user_id, max_distance)
+
+def _find_compatible_users(db: firestore.Client, user_id: str, max_distance: float) -> dict:
     # Obtener datos del usuario
     user_ref = db.collection('users').document(user_id)
     user = user_ref.get()
@@ -97,11 +105,19 @@ async def find_matches(request: Request, db: firestore.Client = Depends(get_db))
 
     logger.info(f"Usuario {user_id}: Padel IQ={padel_iq}, Clubes={user_clubs}, Disponibilidad={user_availability}, Ubicación={user_location}")
 
-    # Buscar usuarios compatibles
-    users = db.collection('users').where(filter=FieldFilter('onboarding_status', '==', 'completed')).get()
+    # Sin coordenadas no hay nadie dentro del radio
+    if geo.coords_of(user_location) is None:
+        logger.info(f"Usuario {user_id} sin coordenadas: no se buscan jugadores cercanos")
+        return {"compatible_users": []}
+
+    # Buscar usuarios compatibles en las celdas cercanas
+    nearby = geo.query_within_radius(
+        db, 'users', user_location, max_distance,
+        filters=[('onboarding_status', '==', 'completed')]
+    )
     compatible_users = []
 
-    for other_user in users:
+    for other_user, distance in nearby:
         if other_user.id == user_id:
             continue
 
@@ -127,17 +143,12 @@ async def find_matches(request: Request, db: firestore.Client = Depends(get_db))
         if not common_availability:
             continue
 
-        other_location = other_data.get('location', {})
-        distance = calculate_distance(user_location, other_location)
-        if distance > max_distance:
-            continue
-
         compatible_users.append({
             'user_id': other_user.id,
             'padel_iq': other_padel_iq,
             'clubs': list(common_clubs),
             'availability': list(common_availability),
-            'distance': distance
+            'distance': round(distance, 2)
         })
 
     compatible_users.sort(key=lambda x: abs(x['padel_iq'] - padel_iq))
@@ -156,18 +167,18 @@ async def send_request(request: Request, db: firestore.Client = Depends(get_db))
     if not all([user_id, target_user_id, club, schedule]):
         raise HTTPException(status_code=400, detail="Faltan datos requeridos")
 
-    user_ref = db.collection('users').document(user_id)
-    user = user_ref.get()
+    # Los dos perfiles son lecturas independientes: se lanzan a la vez
+    user, target_user = await gather_reads(
+        run_sync(db.collection('users').document(user_id).get),
+        run_sync(db.collection('users').document(target_user_id).get)
+    )
     if not user.exists:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
-
-    target_user_ref = db.collection('users').document(target_user_id)
-    target_user = target_user_ref.get()
     if not target_user.exists:
         raise HTTPException(status_code=404, detail="Usuario objetivo no encontrado")
 
     match_request_ref = db.collection('match_requests').document()
-    match_request_ref.set({
+    await run_sync(match_request_ref.set, {
         'from_user_id': user_id,
         'to_user_id': target_user_id,
         'club': club,
@@ -176,7 +187,7 @@ async def send_request(request: Request, db: firestore.Client = Depends(get_db))
         'timestamp': firestore.SERVER_TIMESTAMP
     })
 
-    await send_notification(target_user_id, f"Tienes una nueva solicitud de partido de {user_id} para el {schedule} en {club}. ¿Aceptas?")
+    send_notification(target_user_id, f"Tienes una nueva solicitud de partido de {user_id} para el {schedule} en {club}. ¿Aceptas?")
 
     logger.info(f"Solicitud de partido enviada de {user_id} a {target_user_id}")
     return {"message": "Solicitud de partido enviada exitosamente"}
@@ -196,7 +207,7 @@ async def respond_request(request: Request, db: firestore.Client = Depends(get_d
         raise HTTPException(status_code=400, detail="Respuesta no válida")
 
     request_ref = db.collection('match_requests').document(request_id)
-    request_doc = request_ref.get()
+    request_doc = await run_sync(request_ref.get)
     if not request_doc.exists:
         raise HTTPException(status_code=404, detail="Solicitud no encontrada")
 
@@ -207,16 +218,16 @@ async def respond_request(request: Request, db: firestore.Client = Depends(get_d
     if request_data['status'] != 'pending':
         raise HTTPException(status_code=400, detail="Esta solicitud ya ha sido respondida")
 
-    request_ref.update({'status': response})
+    await run_sync(request_ref.update, {'status': response})
 
     from_user_id = request_data['from_user_id']
     club = request_data['club']
     schedule = request_data['schedule']
     
     if response == 'accept':
-        await send_notification(from_user_id, f"{user_id} ha aceptado tu solicitud de partido para el {schedule} en {club}.")
+        send_notification(from_user_id, f"{user_id} ha aceptado tu solicitud de partido para el {schedule} en {club}.")
         match_ref = db.collection('matches').document()
-        match_ref.set({
+        await run_sync(match_ref.set, {
             'user1_id': from_user_id,
             'user2_id': user_id,
             'club': club,
@@ -224,13 +235,13 @@ async def respond_request(request: Request, db: firestore.Client = Depends(get_d
             'timestamp': firestore.SERVER_TIMESTAMP
         })
     else:
-        await send_notification(from_user_id, f"{user_id} ha rechazado tu solicitud de partido para el {schedule} en {club}.")
+        send_notification(from_user_id, f"{user_id} ha rechazado tu solicitud de partido para el {schedule} en {club}.")
 
     logger.info(f"Solicitud {request_id} respondida por {user_id}: {response}")
     return {"message": f"Solicitud {response} exitosamente"}
 
 @router.get("/get_requests")
-async def get_requests(user_id: str, db: firestore.Client = Depends(get_db)):
+def get_requests(user_id: str, db: firestore.Client = Depends(get_db)):
     """Obtiene las solicitudes de partido pendientes para un usuario."""
     if not user_id:
         raise HTTPException(status_code=400, detail="Falta user_id")
@@ -15,7 +15,7 @@ def get_db():
         raise HTTPException(status_code=500, detail="Error inicializando Firestore")
 
 @router.get("/onboarding")
-async def get_onboarding(db: firestore.Client = Depends(get_db)):
+def get_onboarding(db: firestore.Client = Depends(get_db)):
     try:
         logger.info("Obteniendo información de onboarding")
         # Aquí puedes usar db para acceder a Firestore
@@ -10,6 +10,7 @@ from typing import Dict, Any, Optional
 from app.services.padel_iq_calculator import calculate_padel_iq_granular
 from app.services.video_processor import VideoProcessor
 from app.services.player_detector import PlayerDetector
+from app.services.parameter_stats import ParameterStatsStore
 import torch
 
 # Suppress TensorFlow warnings
@@ -29,10 +30,15 @@ db = client()
 class AnalysisManager:
     """Administra la flexibilidad del análisis y aprende de históricos para mejorar la precisión."""
     
-    def __init__(self):
+    def __init__(self, video_processor: Optional[VideoProcessor] = None, player_detector: Optional[PlayerDetector] = None):
+        """
+        Args:
+            video_processor: Procesador ya inicializado para reutilizar sus modelos
+            player_detector: Detector ya inicializado; por defecto el del procesador
+        """
         logger.info("Inicializando AnalysisManager")
-        self.video_processor = VideoProcessor()
-        self.player_detector = PlayerDetector()
+        self.video_processor = video_processor or VideoProcessor()
+        self.player_detector = player_detector or self.video_processor.player_detector
         self.default_params = {
             'velocidad_umbral': 0.0001,
             'max_segment_duration': 1.5,
@@ -41,19 +47,8 @@ class AnalysisManager:
             'min_detection_confidence': 0.05,
             'min_tracking_confidence': 0.05
         }
-        self.historical_data = []
-        self.load_historical_data()
-
-    def load_historical_data(self):
-        """Carga datos históricos desde Firestore."""
-        try:
-            historical_ref = db.collection('historical_analysis').get()
-            for doc in historical_ref:
-                self.historical_data.append(doc.to_dict())
-            logger.info(f"Cargados {len(self.historical_data)} registros históricos.")
-        except Exception as e:
-            logger.error(f"Error al cargar datos históricos: {str(e)}")
-            self.historical_data = []
+        # Agregados del histórico por condiciones de grabación; se cargan al primer uso
+        self.parameter_stats = ParameterStatsStore(db)
 
     def save_historical_data(self, video_id, golpes_clasificados, video_conditions):
         """Guarda los datos del análisis en Firestore para aprendizaje futuro."""
@@ -65,18 +60,20 @@ class AnalysisManager:
                 'timestamp': datetime.now()
             }
             db.collection('historical_analysis').add(historical_entry)
-            self.historical_data.append(historical_entry)
+            self.parameter_stats.record(video_conditions, golpes_clasificados)
             logger.info(f"Datos históricos guardados para video {video_id}.")
         except Exception as e:
             logger.error(f"Error al guardar datos históricos: {str(e)}")
 
-    def analyze_video_conditions(self, video_path):
-        """Analiza las condiciones del video para ajustar parámetros dinámicamente."""
+    def measure_video_conditions(self, video_path, camera=None):
+        """Mide brillo, contraste y resolución de una muestra de frames del video."""
         try:
             cap = cv2.VideoCapture(video_path)
             if not cap.isOpened():
                 logger.error("No se pudo abrir el video para análisis de condiciones.")
-                return self.default_params
+                return None
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
             frames_to_analyze = 10
             frame_interval = 30  # Analizar cada 30 frames
@@ -112,11 +109,30 @@ class AnalysisManager:
             cap.release()
 
             if not brightness_values:
+                return None
+
+            return {
+                'brightness': float(np.mean(brightness_values)),
+                'contrast': float(np.mean(contrast_values)),
+                'width': width,
+                'height': height,
+                'camera': camera
+            }
+
+        except Exception as e:
+            logger.error(f"Error en measure_video_conditions: {str(e)}", exc_info=True)
+            return None
+
+    def analyze_video_conditions(self, video_path, conditions=None):
+        """Analiza las condiciones del video para ajustar parámetros dinámicamente."""
+        try:
+            conditions = conditions or self.measure_video_conditions(video_path)
+            if not conditions:
                 logger.warning("No se pudieron analizar frames, usando parámetros por defecto")
                 return self.default_params
 
-            avg_brightness = np.mean(brightness_values)
-            avg_contrast = np.mean(contrast_values)
+            avg_brightness = conditions['brightness']
+            avg_contrast = conditions['contrast']
 
             params = self.default_params.copy()
             
@@ -146,12 +162,15 @@ class AnalysisManager:
             logger.error(f"Error en analyze_video_conditions: {str(e)}", exc_info=True)
             return self.default_params
 
-    def optimize_parameters(self, video_path):
+    def optimize_parameters(self, video_path, conditions=None):
         """Optimiza los parámetros de análisis basándose en las condiciones del video y datos históricos."""
-        params = self.analyze_video_conditions(video_path)
+        conditions = conditions or self.measure_video_conditions(video_path)
+        params = self.analyze_video_conditions(video_path, conditions)
 
-        if self.historical_data:
-            avg_wrist_speed = np.mean([golpe['max_wrist_speed'] for entry in self.historical_data for golpe in entry['golpes_clasificados'].values() for golpe in golpe])
+        # Agregados de vídeos grabados en condiciones parecidas (o globales)
+        stats = self.parameter_stats.lookup(conditions)
+        if stats is not None:
+            avg_wrist_speed = stats.mean
             if avg_wrist_speed < 10:
                 params['velocidad_umbral'] = max(0.0001, params['velocidad_umbral'] * 0.5)
                 logger.info(f"Ajustando velocidad_umbral a {params['velocidad_umbral']} basado en datos históricos.")
@@ -176,12 +195,12 @@ class AnalysisManager:
 
         return filtered_golpes
 
-    def process_video(self, video_url, player_position, game_splits, video_id):
+    def process_video(self, video_url, player_position, game_splits, video_id, camera=None):
         """Procesa un video con parámetros optimizados, aplica post-filtro y guarda los resultados históricos."""
         try:
             logger.info(f"Iniciando procesamiento de video: {video_url}")
-            video_conditions = self.analyze_video_conditions(video_url)
-            params = self.optimize_parameters(video_url)
+            video_conditions = self.measure_video_conditions(video_url, camera=camera)
+            params = self.optimize_parameters(video_url, video_conditions)
 
             # Procesar video usando VideoProcessor
             frames = self.video_processor.process_video(video_url)
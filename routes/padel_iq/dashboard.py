@@ -4,6 +4,7 @@ from app.core.deps import get_current_user
 from app.schemas.user import UserInDB
 from typing import Optional, Dict
 import logging
+from app.services import counters
 
 router = APIRouter()
 logging.basicConfig(level=logging.INFO)
@@ -18,29 +19,22 @@ def get_db():
 
 # Métricas generales del usuario
 @router.get("/metrics")
-async def get_general_metrics(current_user: UserInDB = Depends(get_current_user)):
+def get_general_metrics(current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
     user_id = current_user.id
-    # Videos analizados
-    videos = db.collection("video_analysis").where("user_id", "==", user_id).get()
-    # Amigos
-    friendships = db.collection("friendships").where("user_id_1", "==", user_id).get()
-    friendships += db.collection("friendships").where("user_id_2", "==", user_id).get()
-    # Posts
-    posts = db.collection("posts").where("user_id", "==", user_id).get()
-    # Partidos (simulado)
-    matches = db.collection("matches").where("players", "array_contains", user_id).get()
+    # Contadores agregados: una lectura de shards más count() para los videos
+    counts = counters.get_counts(db, user_id, ["videos", "friends", "posts", "matches"])
     return {
         "user_id": user_id,
-        "videos_analysed": len(videos),
-        "friends": len(friendships),
-        "posts": len(posts),
-        "matches": len(matches)
+        "videos_analysed": counts["videos"],
+        "friends": counts["friends"],
+        "posts": counts["posts"],
+        "matches": counts["matches"]
     }
 
 # Métricas de videos
 @router.get("/metrics/videos")
-async def get_video_metrics(current_user: UserInDB = Depends(get_current_user)):
+def get_video_metrics(current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
     user_id = current_user.id
     videos = db.collection("video_analysis").where("user_id", "==", user_id).get()
@@ -55,21 +49,18 @@ async def get_video_metrics(current_user: UserInDB = Depends(get_current_user)):
 
 # Métricas sociales
 @router.get("/metrics/social")
-async def get_social_metrics(current_user: UserInDB = Depends(get_current_user)):
+def get_social_metrics(current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
-    user_id = current_user.id
-    posts = db.collection("posts").where("user_id", "==", user_id).get()
-    likes = db.collection("likes").where("user_id", "==", user_id).get()
-    comments = db.collection("comments").where("user_id", "==", user_id).get()
+    counts = counters.get_counts(db, current_user.id, ["posts", "likes", "comments"])
     return {
-        "posts": len(posts),
-        "likes": len(likes),
-        "comments": len(comments)
+        "posts": counts["posts"],
+        "likes": counts["likes"],
+        "comments": counts["comments"]
     }
 
 # Personalización del dashboard
 @router.get("/settings")
-async def get_dashboard_settings(current_user: UserInDB = Depends(get_current_user)):
+def get_dashboard_settings(current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
     doc = db.collection("dashboard_settings").document(current_user.id).get()
     if not doc.exists:
@@ -77,7 +68,7 @@ async def get_dashboard_settings(current_user: UserInDB = Depends(get_current_us
     return doc.to_dict()
 
 @router.put("/settings")
-async def update_dashboard_settings(widgets: Optional[list] = None, current_user: UserInDB = Depends(get_current_user)):
+def update_dashboard_settings(widgets: Optional[list] = None, current_user: UserInDB = Depends(get_current_user)):
     db = get_db()
     if widgets is None:
         widgets = ["metrics", "videos", "social"]
@@ -88,7 +79,7 @@ async def update_dashboard_settings(widgets: Optional[list] = None, current_user
     return {"message": "Configuración actualizada", "widgets": widgets}
 
 @router.get("/dashboard")
-async def get_dashboard(db: firestore.Client = Depends(get_db)):
+def get_dashboard(db: firestore.Client = Depends(get_db)):
     try:
         logger.info("Obteniendo dashboard")
         # Aquí puedes usar db para acceder a Firestore
@@ -0,0 +1,26 @@
+import os
+import sys
+import logging
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.firebase import get_firebase_client
+from app.services.geo import backfill
+from app.services import matchmaking_index
+
+if __name__ == "__main__":
+    try:
+        logger.info("Indexando ubicaciones existentes por geohash...")
+        db = get_firebase_client()
+        backfill(db, "users", location_field="location")
+        backfill(db, "matches", location_field="coordinates")
+        matchmaking_index.backfill(db)
+        logger.info("Indexación completada exitosamente")
+    except Exception as e:
+        logger.error(f"Error durante la indexación: {str(e)}")
+        sys.exit(1)
@@ -0,0 +1,22 @@
+import os
+import sys
+import logging
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.firebase import get_firebase_client
+from app.services import parameter_stats
+
+if __name__ == "__main__":
+    try:
+        logger.info("Recalculando estadísticas de parámetros...")
+        parameter_stats.backfill(get_firebase_client())
+        logger.info("Estadísticas recalculadas exitosamente")
+    except Exception as e:
+        logger.error(f"Error durante el recálculo: {str(e)}")
+        sys.exit(1)
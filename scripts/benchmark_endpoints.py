@@ -0,0 +1,148 @@
+"""
+Benchmark de endpoints calientes sobre el emulador de Firestore en memoria.
+
+Siembra un conjunto de datos sintético, ejecuta cada escenario varias veces y
+muestra por escenario el tiempo (p50/p95) y las lecturas y escrituras de
+Firestore por llamada. La latencia inyectada simula la red de Firestore:
+
+    python scripts/benchmark_endpoints.py --users 2000 --posts 20000 --latency-ms 5
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Agregar el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.firestore_emulator import FirestoreEmulator, LatencyModel, patch_firestore
+
+LEVELS = ["iniciación", "intermedio", "avanzado", "profesional"]
+NAMES = ["Marta", "Mario", "José", "Lucía", "Pedro", "Ana", "Javier", "Carmen", "Sergio", "Elena"]
+SURNAMES = ["Martínez", "López", "García", "Ruiz", "Sánchez", "Romero", "Navarro", "Torres"]
+CLUBS = ["Club Marbella", "Padel Indoor Madrid", "Club Náutico", "Sport Center Sevilla"]
+
+def seed(db: FirestoreEmulator, users: int, posts: int, friends: int, rng: random.Random) -> None:
+    now = datetime.utcnow()
+    user_ids = [f"u{i}" for i in range(users)]
+    db.seed("users", {
+        uid: {
+            "username": f"{NAMES[i % len(NAMES)].lower()}{i}",
+            "name": f"{NAMES[i % len(NAMES)]} {SURNAMES[i % len(SURNAMES)]}",
+            "level": LEVELS[i % len(LEVELS)],
+            "clubs": [CLUBS[i % len(CLUBS)]],
+            "location": {"latitude": 40.4 + rng.uniform(-0.5, 0.5), "longitude": -3.7 + rng.uniform(-0.5, 0.5)},
+            "profile_picture": None
+        }
+        for i, uid in enumerate(user_ids)
+    })
+
+    friendships = {}
+    for i, uid in enumerate(user_ids):
+        for other in rng.sample(user_ids, min(friends, users - 1)):
+            if other != uid:
+                a, b = sorted((uid, other))
+                friendships[f"{a}_{b}"] = {"user1_id": a, "user2_id": b, "created_at": now}
+    db.seed("friendships", friendships)
+
+    db.seed("posts", {
+        f"p{i}": {
+            "user_id": rng.choice(user_ids),
+            "content": f"Partido de pádel número {i}",
+            "visibility": "public" if i % 5 else "friends",
+            "tags": ["padel"],
+            "interaction_count": rng.randint(0, 200),
+            "reaction_counts": {},
+            "recent_comments": [],
+            "created_at": now - timedelta(minutes=i)
+        }
+        for i in range(posts)
+    })
+    db.seed("user_points", {
+        uid: {"user_id": uid, "points": rng.randint(0, 10000), "updated_at": now - timedelta(days=rng.randint(0, 60))}
+        for uid in user_ids
+    })
+
+def scenarios(user):
+    from app.api.v1.endpoints.social_wall import get_social_wall
+    from app.api.v1.endpoints.gamification import get_leaderboard
+    from app.api.v1.endpoints.search import search_users
+
+    # Los endpoints se llaman directamente: todos los parámetros de Query van explícitos
+    return {
+        "social_wall (all)": lambda: get_social_wall(cursor=None, limit=10, category=None, include_total=False, current_user=user),
+        "social_wall (friends)": lambda: get_social_wall(cursor=None, limit=10, category="friends", include_total=False, current_user=user),
+        "social_wall (trending)": lambda: get_social_wall(cursor=None, limit=10, category="trending", include_total=True, current_user=user),
+        "leaderboard (all)": lambda: get_leaderboard(category="points", time_frame="all", limit=20, cursor=None, current_user=user),
+        "leaderboard (week)": lambda: get_leaderboard(category="points", time_frame="week", limit=20, cursor=None, current_user=user),
+        "search_users": lambda: search_users(query="mart", filters=None, limit=20, cursor=None, current_user=user)
+    }
+
+def invoke(call):
+    """Llama al endpoint; los async se ejecutan en un event loop propio."""
+    result = call()
+    return asyncio.run(result) if inspect.isawaitable(result) else result
+
+def run(args) -> dict:
+    rng = random.Random(args.seed)
+    latency = LatencyModel(
+        {"get": args.latency_ms / 1000, "get_all": args.latency_ms / 1000, "query": args.latency_ms / 1000,
+         "aggregate": args.latency_ms / 1000, "commit": args.latency_ms / 1000},
+        per_document=args.per_doc_us / 1e6
+    )
+    db = FirestoreEmulator(latency=latency)
+    seed(db, args.users, args.posts, args.friends, rng)
+
+    from app.schemas.user import UserInDB
+    from app.services import search_history
+    user = UserInDB(id="u0", name="Marta Martínez")
+
+    results = {}
+    with patch_firestore(db):
+        for name, call in scenarios(user).items():
+            # Primera llamada de calentamiento (carga de índices, tablas y timelines)
+            invoke(call)
+            timings, reads, writes = [], [], []
+            for _ in range(args.iterations):
+                before = db.stats.snapshot()["totals"]
+                started = time.perf_counter()
+                invoke(call)
+                timings.append((time.perf_counter() - started) * 1000)
+                after = db.stats.snapshot()["totals"]
+                reads.append(after.get("reads", 0) - before.get("reads", 0))
+                writes.append(after.get("writes", 0) + after.get("deletes", 0) - before.get("writes", 0) - before.get("deletes", 0))
+            timings.sort()
+            results[name] = {
+                "p50_ms": round(statistics.median(timings), 2),
+                "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+                "reads": round(statistics.mean(reads), 1),
+                "writes": round(statistics.mean(writes), 1)
+            }
+        search_history.stop_buffer()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de endpoints sobre el emulador de Firestore")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--friends", type=int, default=50, help="Amigos por usuario")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latencia por RPC")
+    parser.add_argument("--per-doc-us", type=float, default=0.0, help="Latencia por documento (microsegundos)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'escenario':<26}{'p50 ms':>10}{'p95 ms':>10}{'lecturas':>10}{'escrituras':>12}")
+        for name, r in results.items():
+            print(f"{name:<26}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['reads']:>10}{r['writes']:>12}")
@@ -0,0 +1,89 @@
+"""
+Pruebas de la caché de tokens verificados y perfiles de usuario.
+"""
+import time
+import pytest
+from unittest.mock import MagicMock
+from app.core import auth_cache
+from app.core.auth_cache import (
+    TTLCache,
+    verify_token_cached,
+    get_profile_cached,
+    invalidate_user_profile
+)
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    auth_cache.token_cache.clear()
+    auth_cache.profile_cache.clear()
+    yield
+    auth_cache.token_cache.clear()
+    auth_cache.profile_cache.clear()
+
+def test_verify_token_cached_verifies_once():
+    verify = MagicMock(return_value={"uid": "user_1", "exp": time.time() + 3600})
+
+    for _ in range(5):
+        claims = verify_token_cached("token-abc", verify)
+
+    assert claims["uid"] == "user_1"
+    verify.assert_called_once_with("token-abc")
+    assert "token-abc" not in auth_cache.token_cache._data
+
+def test_verify_token_cached_returns_copies():
+    verify = MagicMock(return_value={"uid": "user_1", "exp": time.time() + 3600})
+
+    claims = verify_token_cached("token-abc", verify)
+    claims["uid"] = "otro"
+    assert verify_token_cached("token-abc", verify)["uid"] == "user_1"
+
+def test_verify_token_cached_respects_expiry():
+    verify = MagicMock(return_value={"uid": "user_1", "exp": time.time() - 1})
+
+    verify_token_cached("expired", verify)
+    verify_token_cached("expired", verify)
+
+    assert verify.call_count == 2
+
+def test_verify_token_cached_does_not_cache_failures():
+    verify = MagicMock(side_effect=ValueError("Token inválido"))
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            verify_token_cached("bad", verify)
+
+    assert verify.call_count == 2
+
+def test_profile_cache_invalidation():
+    load = MagicMock(return_value={"username": "ana"})
+
+    first = get_profile_cached("user_1", load)
+    first["username"] = "modificado"
+    assert get_profile_cached("user_1", load) == {"username": "ana"}
+    load.assert_called_once()
+
+    invalidate_user_profile("user_1")
+    get_profile_cached("user_1", load)
+    assert load.call_count == 2
+
+def test_profile_cache_skips_missing_users():
+    load = MagicMock(return_value=None)
+
+    assert get_profile_cached("ghost", load) is None
+    assert get_profile_cached("ghost", load) is None
+    assert load.call_count == 2
+
+def test_ttl_cache_lru_and_ttl():
+    now = [1000.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.get("c") is None
@@ -0,0 +1,122 @@
+"""
+Pruebas del autocompletado y del historial de búsquedas agrupado.
+"""
+import pytest
+from unittest.mock import MagicMock
+from app.services import autocomplete as autocomplete_module, search_history
+from app.services.autocomplete import Autocomplete, PrefixTrie
+from app.services.search_history import SearchHistoryBuffer
+
+def test_trie_returns_top_k_by_weight_and_updates_incrementally():
+    trie = PrefixTrie(top_k=2)
+    trie.add("Marta", 1)
+    trie.add("Martín", 3)
+    trie.add("Mario", 2)
+
+    assert [d for _, d in trie.suggest("mar")] == ["Martín", "Mario"]
+    assert [d for _, d in trie.suggest("MARTI")] == ["Martín"]
+
+    trie.add("Martín", -3)
+    assert [d for _, d in trie.suggest("mar")] == ["Mario", "Marta"]
+    assert trie.suggest("marti") == []
+    assert "t" in trie.root.children["m"].children["a"].children["r"].children
+
+def test_autocomplete_follows_index_changes_and_types():
+    autocomplete = Autocomplete(top_k=5)
+    autocomplete.on_index_change("user", [("u1", {"username": "jmartinez", "name": "José Martínez", "clubs": ["Club Marbella"]})], [])
+    autocomplete.on_index_change("post", [("p1", {"title": "Mejorar la bandeja", "tags": ["martes"]})], [])
+
+    assert autocomplete.suggest("mar", type="users") == ["Club Marbella", "José Martínez"]
+    assert autocomplete.suggest("mar", type="content") == ["#martes"]
+    assert autocomplete.suggest("jm") == ["@jmartinez"]
+
+    autocomplete.on_index_change("user", [("u1", {"username": "jose", "name": "José"})], [])
+    assert autocomplete.suggest("mar", type="users") == []
+    autocomplete.on_index_change("post", [], ["p1"])
+    assert autocomplete.suggest("mar") == []
+
+def test_buffer_collapses_keystrokes_and_flushes_in_one_batch(monkeypatch):
+    monkeypatch.setattr(search_history, "get_many", lambda db, coll, ids, field_paths=None: {})
+    recorded = []
+    monkeypatch.setattr(search_history, "get_autocomplete", lambda: MagicMock(record_search=lambda term, count: recorded.append((term, count))))
+    buffer = SearchHistoryBuffer(flush_interval=0)
+    for term in ["ma", "mar", "marta"]:
+        buffer.record("u1", term, now=1.0)
+    buffer.record("u2", "Marta", now=2.0)
+    buffer.record("u2", "pala", now=3.0)
+
+    db = MagicMock()
+    assert buffer.flush(db) == 4
+    db.batch.return_value.commit.assert_called_once()
+    assert recorded == [("Marta", 2), ("pala", 1)]
+
+    sets = db.batch.return_value.set.call_args_list
+    history = {c.args[1]["user_id"]: [r["term"] for r in c.args[1]["recent"]] for c in sets if "user_id" in c.args[1]}
+    assert history == {"u1": ["marta"], "u2": ["pala", "Marta"]}
+    assert buffer.flush(db) == 0
+
+def test_recent_reads_once_and_merges_pending(monkeypatch):
+    reads = []
+    def fake_get_many(db, coll, ids, field_paths=None):
+        reads.append(ids)
+        return {"u1": {"recent": [{"term": "padel", "searched_at": 1.0}]}}
+    monkeypatch.setattr(search_history, "get_many", fake_get_many)
+    buffer = SearchHistoryBuffer(flush_interval=0)
+
+    buffer.record("u1", "bandeja", now=5.0)
+    assert buffer.recent("u1", db=MagicMock()) == ["bandeja", "padel"]
+    buffer.record("u1", "vibora", now=6.0)
+    assert buffer.recent("u1", db=MagicMock()) == ["vibora", "bandeja", "padel"]
+    assert len(reads) == 1
+
+def test_recent_cache_collapses_keystrokes_like_pending(monkeypatch):
+    monkeypatch.setattr(search_history, "get_many", lambda db, coll, ids, field_paths=None: {})
+    buffer = SearchHistoryBuffer(flush_interval=0)
+    buffer.record("u1", "padel", now=1.0)
+    assert buffer.recent("u1", db=MagicMock()) == ["padel"]
+
+    for i, term in enumerate(["ma", "mar", "marta"]):
+        buffer.record("u1", term, now=2.0 + i)
+    assert buffer.recent("u1", db=MagicMock()) == ["marta", "padel"]
+
+def test_searches_become_global_suggestions_only_after_the_minimum(monkeypatch):
+    monkeypatch.setattr(autocomplete_module, "SEARCH_SUGGESTION_MIN_COUNT", 3)
+    autocomplete = Autocomplete(top_k=5)
+    autocomplete.record_search("Marta Pérez")
+    autocomplete.record_search("marta perez")
+    assert autocomplete.suggest("mar") == []
+
+    autocomplete.record_search("Marta Pérez")
+    assert autocomplete.tries["searches"].suggest("mar") == [(3.0, "Marta Pérez")]
+    autocomplete.record_search("Marta Pérez", 2)
+    assert autocomplete.tries["searches"].suggest("mar")[0][0] == 5.0
+
+    for term in ["ana.lopez@correo.com", "+34 612 345 678"]:
+        autocomplete.record_search(term, 10)
+    assert autocomplete.suggest("ana") == [] and autocomplete.suggest("+34") == []
+
+def test_stats_doc_id_is_a_hash_of_the_normalized_term():
+    assert search_history.stats_doc_id("  Marta ") == search_history.stats_doc_id("marta")
+    for term in ["..", "__name__", "a/b", "x" * 2000]:
+        doc_id = search_history.stats_doc_id(term)
+        assert len(doc_id) == 40 and doc_id.isalnum()
+
+def test_failed_flush_keeps_the_searches(monkeypatch):
+    monkeypatch.setattr(search_history, "get_many", lambda db, coll, ids, field_paths=None: {})
+    monkeypatch.setattr(search_history, "get_autocomplete", MagicMock)
+    buffer = SearchHistoryBuffer(flush_interval=0)
+    buffer.record("u1", "marta", now=1.0)
+
+    db = MagicMock()
+    db.batch.return_value.commit.side_effect = RuntimeError("sin red")
+    with pytest.raises(RuntimeError):
+        buffer.flush(db)
+    buffer.record("u1", "pala", now=2.0)
+
+    db.batch.return_value.commit.side_effect = None
+    assert buffer.flush(db) == 3
+    sets = db.batch.return_value.set.call_args_list[-3:]
+    history = [c.args[1] for c in sets if "user_id" in c.args[1]][0]
+    assert [r["term"] for r in history["recent"]] == ["pala", "marta"]
+    counts = {c.args[1]["term"]: c.args[1]["count"] for c in sets if "term" in c.args[1]}
+    assert set(counts) == {"marta", "pala"}
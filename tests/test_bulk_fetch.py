@@ -0,0 +1,87 @@
+"""
+Pruebas de la lectura por lotes de documentos por ID.
+"""
+import asyncio
+from unittest.mock import MagicMock
+from firebase_admin import firestore
+from app.services import bulk_fetch
+from app.utils.pagination import paginate_query_in, decode_cursor, DOCUMENT_ID_FIELD
+
+def make_doc(doc_id, data, exists=True):
+    doc = MagicMock()
+    doc.id = doc_id
+    doc.exists = exists
+    doc.to_dict.return_value = data
+    return doc
+
+def make_db(existing):
+    """Cliente cuyo get_all devuelve los documentos existentes de cada lote."""
+    db = MagicMock()
+    db.collection.return_value.document.side_effect = lambda doc_id: doc_id
+    db.get_all.side_effect = lambda refs, field_paths=None: [
+        make_doc(ref, existing.get(ref), exists=ref in existing) for ref in refs
+    ]
+    return db
+
+def test_get_many_deduplicates_chunks_and_keeps_order():
+    ids = [f"u{i}" for i in range(250)]
+    existing = {uid: {"name": uid} for uid in ids if uid != "u7"}
+    db = make_db(existing)
+
+    result = bulk_fetch.get_many(db, "users", ids + ["u3", None, ""], field_paths=["name"])
+
+    assert list(result) == [uid for uid in ids if uid != "u7"]
+    # Los trozos se leen en paralelo: el orden de las llamadas no está garantizado
+    assert sorted(len(c.args[0]) for c in db.get_all.call_args_list) == [50, 100, 100]
+    assert all(c.kwargs["field_paths"] == ["name"] for c in db.get_all.call_args_list)
+
+def test_get_many_without_ids_does_not_read():
+    db = make_db({})
+    assert bulk_fetch.get_many(db, "users", [None, ""]) == {}
+    db.get_all.assert_not_called()
+
+def test_query_in_chunks_values_and_applies_filters():
+    db = MagicMock()
+    filtered = db.collection.return_value.where.return_value
+    filtered.where.return_value.get.side_effect = lambda: [make_doc("r1", {"comment_id": "c1", "type": "like"})]
+
+    docs = bulk_fetch.query_in(db, "comment_reactions", "comment_id", [f"c{i}" for i in range(45)],
+                               filters=[("user_id", "==", "u1")])
+
+    assert [doc.id for doc in docs] == ["r1"]
+    assert db.collection.return_value.where.call_args_list[0].args == ("user_id", "==", "u1")
+    assert [len(c.args[2]) for c in filtered.where.call_args_list] == [30, 15]
+    assert bulk_fetch.group_by(docs, "comment_id") == {"c1": [{"comment_id": "c1", "type": "like"}]}
+
+def test_get_many_async_gathers_chunks():
+    existing = {"a": {"n": 1}, "b": {"n": 2}}
+    db = MagicMock()
+    db.collection.return_value.document.side_effect = lambda doc_id: doc_id
+
+    def get_all(refs, field_paths=None):
+        async def gen():
+            for ref in refs:
+                yield make_doc(ref, existing.get(ref), exists=ref in existing)
+        return gen()
+    db.get_all.side_effect = get_all
+
+    result = asyncio.run(bulk_fetch.get_many_async(db, "users", ["b", "x", "a"], chunk_size=1))
+    assert result == {"b": {"n": 2}, "a": {"n": 1}}
+    assert db.get_all.call_count == 3
+
+def test_paginate_query_in_merges_chunk_pages():
+    posts = {f"u{i}": make_doc(f"p{i}", {"user_id": f"u{i}", "created_at": i}) for i in range(40)}
+    query = MagicMock()
+
+    def where(field, op, values):
+        chunk_query = MagicMock()
+        chunk_query.order_by.return_value = chunk_query
+        chunk_query.limit.side_effect = lambda n: MagicMock(get=lambda: sorted(
+            (posts[v] for v in values), key=lambda d: d.to_dict()["created_at"], reverse=True)[:n])
+        return chunk_query
+    query.where.side_effect = where
+
+    page, cursor = paginate_query_in(query, "user_id", list(posts), [("created_at", firestore.Query.DESCENDING)], 5)
+
+    assert [doc.id for doc in page] == ["p39", "p38", "p37", "p36", "p35"]
+    assert decode_cursor(cursor, ["created_at", DOCUMENT_ID_FIELD]) == {"created_at": 35, DOCUMENT_ID_FIELD: "p35"}
@@ -0,0 +1,179 @@
+"""
+Pruebas de los borrados en cascada en segundo plano.
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import pytest
+from app.services import cascade_delete
+from app.services.firestore_emulator import FirestoreEmulator, transactional
+from app.services.job_queue import Job
+
+def make_docs(n, **data):
+    return [SimpleNamespace(id=f"d{i}", reference=MagicMock(), to_dict=lambda: dict(data)) for i in range(n)]
+
+def make_query(pages):
+    query = MagicMock()
+    query.limit.return_value.get.side_effect = pages
+    return query
+
+def make_record(db, data):
+    ref = db.collection.return_value.document.return_value
+    ref.get.return_value = SimpleNamespace(exists=True, to_dict=lambda: data)
+    return ref
+
+def test_delete_query_commits_pages_with_progress(monkeypatch):
+    monkeypatch.setattr(cascade_delete, "BATCH_SIZE", 3)
+    db = MagicMock()
+    ref = MagicMock()
+    committed = []
+    query = make_query([make_docs(3), make_docs(1)])
+
+    deleted = cascade_delete.delete_query(db, ref, "post_reactions", query, after=committed.append)
+
+    assert deleted == 4
+    assert [len(docs) for docs in committed] == [3, 1]
+    assert db.batch.return_value.commit.call_count == 2
+    assert db.batch.return_value.delete.call_count == 4
+    progress = [c for c in db.batch.return_value.set.call_args_list if c.args[0] is ref]
+    assert len(progress) == 2 and all(c.kwargs["merge"] for c in progress)
+
+def test_start_deletion_records_and_enqueues_once(monkeypatch):
+    enqueued = []
+    monkeypatch.setattr(cascade_delete, "enqueue_job", lambda job_type, payload, job_id=None: enqueued.append((payload, job_id)))
+    db = MagicMock()
+
+    record_id = cascade_delete.start_deletion(db, cascade_delete.FRIENDSHIP, "f1", {"user_ids": ["a", "b"]})
+
+    assert record_id == "friendship:f1"
+    record = db.collection.return_value.document.return_value.set.call_args.args[0]
+    assert record["status"] == "pending"
+    assert record["steps"] == ["timelines", "friendship_requests", "blocked_users"]
+    assert enqueued == [({"deletion_id": "friendship:f1"}, "cascade_delete:friendship:f1")]
+    with pytest.raises(ValueError):
+        cascade_delete.start_deletion(db, "video", "v1", {})
+
+def test_run_deletion_resumes_from_stored_step(monkeypatch):
+    calls = []
+    steps = [(name, lambda db, ref, payload, name=name: calls.append(name)) for name in ("a", "b", "c")]
+    monkeypatch.setitem(cascade_delete.STEPS, "test", steps)
+    db = MagicMock()
+    ref = make_record(db, {"kind": "test", "status": "retrying", "step": 1, "payload": {}})
+
+    assert cascade_delete.run_deletion(Job("j1", "cascade_delete", {"deletion_id": "test:x"}, 2, 3, "l"), db=db) == {"status": "completed"}
+
+    assert calls == ["b", "c"]
+    updates = [c.args[0] for c in ref.update.call_args_list]
+    assert [u["step"] for u in updates if "step" in u] == [2, 3]
+    assert updates[-1]["status"] == "completed"
+
+def test_run_deletion_records_failure_for_retry(monkeypatch):
+    def failing(db, ref, payload):
+        raise RuntimeError("cuota agotada")
+    monkeypatch.setitem(cascade_delete.STEPS, "test", [("a", lambda db, ref, payload: None), ("b", failing)])
+    db = MagicMock()
+    ref = make_record(db, {"kind": "test", "status": "pending", "step": 0, "payload": {}})
+
+    with pytest.raises(RuntimeError):
+        cascade_delete.run_deletion(Job("j1", "cascade_delete", {"deletion_id": "test:x"}, 1, 3, "l"), db=db)
+
+    updates = [c.args[0] for c in ref.update.call_args_list]
+    assert [u["step"] for u in updates if "step" in u] == [1]
+    assert updates[-1]["status"] == "retrying"
+    assert updates[-1]["error"] == "cuota agotada"
+
+def test_friendship_blocks_keeps_blocks_created_after_the_request():
+    db = FirestoreEmulator()
+    requested_at = datetime(2024, 1, 1, 12)
+    db.seed("blocked_users", {
+        "viejo": {"blocker_id": "a", "blocked_id": "b", "created_at": requested_at - timedelta(minutes=5)},
+        "nuevo": {"blocker_id": "b", "blocked_id": "a", "created_at": requested_at + timedelta(minutes=5)},
+        "ajeno": {"blocker_id": "a", "blocked_id": "c", "created_at": requested_at - timedelta(minutes=5)}
+    })
+    ref = db.collection(cascade_delete.DELETIONS_COLLECTION).document("friendship:f1")
+
+    cascade_delete._friendship_blocks(db, ref, {"user_ids": ["a", "b"], "requested_at": requested_at})
+
+    assert sorted(d.id for d in db.collection("blocked_users").get()) == ["ajeno", "nuevo"]
+    assert ref.get().to_dict()["progress"]["blocked_users"] == 1
+
+def test_run_deletion_waits_while_another_job_holds_the_lease(monkeypatch):
+    monkeypatch.setattr(cascade_delete.firestore, "transactional", transactional)
+    calls = []
+    monkeypatch.setitem(cascade_delete.STEPS, "test", [("a", lambda db, ref, payload: calls.append("a"))])
+    db = FirestoreEmulator()
+    lease_until = datetime.now(timezone.utc) + timedelta(minutes=5)
+    db.seed(cascade_delete.DELETIONS_COLLECTION, {
+        "test:x": {"kind": "test", "status": "running", "step": 0, "payload": {}, "attempts": 1, "lease_owner": "j1", "lease_until": lease_until}
+    })
+    job = Job("j2", "cascade_delete", {"deletion_id": "test:x"}, 1, 3, "l")
+
+    with pytest.raises(cascade_delete.DeletionInProgress):
+        cascade_delete.run_deletion(job, db=db)
+    record = db.collection(cascade_delete.DELETIONS_COLLECTION).document("test:x").get().to_dict()
+    assert calls == [] and record["attempts"] == 1 and record["lease_owner"] == "j1"
+
+    # Con el reclamo vencido otro trabajo lo retoma
+    db.collection(cascade_delete.DELETIONS_COLLECTION).document("test:x").update({"lease_until": lease_until - timedelta(minutes=10)})
+    assert cascade_delete.run_deletion(job, db=db) == {"status": "completed"}
+    record = db.collection(cascade_delete.DELETIONS_COLLECTION).document("test:x").get().to_dict()
+    assert calls == ["a"] and record["attempts"] == 2 and record["lease_until"] is None
+
+def test_resume_unfinished_reuses_the_original_job_ids(monkeypatch):
+    enqueued = []
+    monkeypatch.setattr(cascade_delete, "enqueue_job", lambda job_type, payload, job_id=None: enqueued.append(job_id))
+    db = FirestoreEmulator()
+    db.seed(cascade_delete.DELETIONS_COLLECTION, {
+        "post:p1": {"status": "pending", "attempts": 0},
+        "post:p2": {"status": "failed", "attempts": 3},
+        "post:p3": {"status": "completed", "attempts": 1}
+    })
+
+    cascade_delete.resume_unfinished(db)
+    cascade_delete.resume_unfinished(db)
+
+    assert enqueued == ["cascade_delete:post:p1", "cascade_delete:post:p2:resume:3"] * 2
+
+def test_user_steps_record_child_deletions_in_the_same_commit(monkeypatch):
+    def crash(*args, **kwargs):
+        raise RuntimeError("worker caído")
+    monkeypatch.setattr(cascade_delete, "enqueue_job", crash)
+    db = FirestoreEmulator()
+    db.seed("posts", {"p1": {"user_id": "u1", "media_urls": ["a/b.jpg"]}, "p2": {"user_id": "otro"}})
+    db.seed("friendships", {"f1": {"user1_id": "u2", "user2_id": "u1"}})
+    ref = db.collection(cascade_delete.DELETIONS_COLLECTION).document("user:u1")
+
+    cascade_delete._user_posts(db, ref, {"user_id": "u1"})
+    cascade_delete._user_friendships(db, ref, {"user_id": "u1"})
+
+    records = db.dump()[cascade_delete.DELETIONS_COLLECTION]
+    assert [d.id for d in db.collection("posts").get()] == ["p2"]
+    assert not db.collection("friendships").document("f1").get().exists
+    assert records["post:p1"]["status"] == "pending"
+    assert records["post:p1"]["payload"]["media_urls"] == ["a/b.jpg"]
+    assert records["friendship:f1"]["payload"]["user_ids"] == ["u1", "u2"]
+    assert records["friendship:f1"]["status"] == "pending"
+
+def test_user_gamification_removes_sources_and_leaderboard_entries():
+    from app.services import leaderboard
+
+    store = leaderboard.MemoryLeaderboardStore()
+    store.set_score("points", "u1", 120)
+    store.set_score("points", "u2", 80)
+    store.set_profiles({"u1": {"username": "ana"}})
+    leaderboard.set_store(store)
+    db = FirestoreEmulator()
+    for collection in cascade_delete.GAMIFICATION_COLLECTIONS:
+        db.seed(collection, {"u1": {"user_id": "u1"}, "u2": {"user_id": "u2"}})
+    db.seed("achievement_history", {"h1": {"user_id": "u1"}, "h2": {"user_id": "u2"}})
+    ref = db.collection(cascade_delete.DELETIONS_COLLECTION).document("user:u1")
+    try:
+        cascade_delete._user_gamification(db, ref, {"user_id": "u1"})
+    finally:
+        leaderboard.set_store(None)
+
+    for collection in cascade_delete.GAMIFICATION_COLLECTIONS:
+        assert [d.id for d in db.collection(collection).get()] == ["u2"]
+    assert [d.id for d in db.collection("achievement_history").get()] == ["h2"]
+    assert store.range("points", 0, 10) == [("u2", 80)]
+    assert store.get_profiles(["u1"]) == {}
@@ -0,0 +1,119 @@
+"""
+Pruebas del circuit breaker y del bulkhead.
+"""
+import threading
+import pytest
+from app.core.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    BulkheadFullError,
+    CLOSED,
+    OPEN,
+    HALF_OPEN
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def fail():
+    raise ConnectionError("caído")
+
+def make_breaker(clock, **kwargs):
+    kwargs.setdefault("min_calls", 4)
+    kwargs.setdefault("failure_rate", 0.5)
+    kwargs.setdefault("window_seconds", 60)
+    kwargs.setdefault("open_seconds", 30)
+    return CircuitBreaker("test", clock=clock, **kwargs)
+
+def test_opens_when_failure_rate_exceeded_and_fails_fast():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    assert breaker.call(lambda: "ok") == "ok"
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+    assert breaker.state == OPEN
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: calls.append(1))
+    assert calls == []
+
+def test_old_failures_leave_the_window():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+    clock.now = 120
+    breaker.call(lambda: None)
+    assert breaker.state == CLOSED
+
+def test_half_open_probe_closes_or_reopens():
+    clock = FakeClock()
+    breaker = make_breaker(clock, min_calls=2)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+    clock.now = 31
+    assert breaker.state == HALF_OPEN
+
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+    assert breaker.state == OPEN
+
+    clock.now = 62
+    breaker.call(lambda: None)
+    assert breaker.state == CLOSED
+
+def test_ignored_exceptions_do_not_count():
+    clock = FakeClock()
+    breaker = make_breaker(clock, min_calls=1, ignore_exceptions=(ValueError,))
+    def bad_input():
+        raise ValueError("URL no soportada")
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            breaker.call(bad_input)
+    assert breaker.state == CLOSED
+
+def test_bulkhead_rejects_excess_concurrency():
+    breaker = make_breaker(FakeClock(), max_concurrent=1)
+    inside = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        inside.set()
+        release.wait(1)
+
+    thread = threading.Thread(target=breaker.call, args=(slow,))
+    thread.start()
+    inside.wait(1)
+    with pytest.raises(BulkheadFullError):
+        breaker.call(lambda: None)
+    release.set()
+    thread.join()
+    assert breaker.call(lambda: "ok") == "ok"
+
+@pytest.mark.asyncio
+async def test_async_calls_and_decorator():
+    clock = FakeClock()
+    breaker = make_breaker(clock, min_calls=3)
+
+    @breaker.protect
+    async def remote(ok):
+        if not ok:
+            raise ConnectionError("caído")
+        return "ok"
+
+    assert await remote(True) == "ok"
+    with pytest.raises(ConnectionError):
+        await remote(False)
+    with pytest.raises(ConnectionError):
+        await remote(False)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        await remote(True)
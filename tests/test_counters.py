@@ -0,0 +1,101 @@
+"""
+Pruebas de los contadores agregados por usuario.
+"""
+import pytest
+from unittest.mock import MagicMock
+from google.api_core.exceptions import AlreadyExists
+from app.services import counters
+
+class FakeShardRef:
+    def __init__(self, store, doc_id):
+        self.store = store
+        self.id = doc_id
+
+    def set(self, data, merge=False):
+        shard = self.store.setdefault(self.id, {})
+        for name, value in data.items():
+            shard[name] = shard.get(name, 0) + value.amount
+
+    def create(self, data):
+        if self.id in self.store:
+            raise AlreadyExists("existe")
+        self.store[self.id] = dict(data)
+
+class FakeShards:
+    def __init__(self):
+        self.store = {}
+
+    def document(self, doc_id):
+        return FakeShardRef(self.store, doc_id)
+
+    def get(self):
+        docs = []
+        for doc_id, data in self.store.items():
+            doc = MagicMock()
+            doc.id = doc_id
+            doc.to_dict.return_value = data
+            docs.append(doc)
+        return docs
+
+class Increment:
+    def __init__(self, amount):
+        self.amount = amount
+
+@pytest.fixture
+def fake(monkeypatch):
+    monkeypatch.setattr(counters.firestore, "Increment", Increment)
+    shards = FakeShards()
+    totals = {}
+    db = MagicMock()
+
+    def collection(name):
+        ref = MagicMock()
+        if name == counters.COUNTERS_COLLECTION:
+            ref.document.return_value.collection.return_value = shards
+            return ref
+
+        def where(field, op, user_id):
+            aggregate = MagicMock()
+            aggregate.value = totals.get((name, field), 0)
+            query = MagicMock()
+            query.count.return_value.get.return_value = [[aggregate]]
+            return query
+        ref.where.side_effect = where
+        return ref
+    db.collection.side_effect = collection
+    return db, shards, totals
+
+def test_first_read_seeds_with_count_then_uses_shards(fake):
+    db, shards, totals = fake
+    totals[("posts", "user_id")] = 7
+    counters.increment(db, "u1", "posts")
+
+    assert counters.get_counts(db, "u1", ["posts"]) == {"posts": 7}
+    assert shards.store["seed-posts"] == {"posts": 6}
+
+    totals[("posts", "user_id")] = 100
+    counters.increment(db, "u1", "posts", 2)
+    assert counters.get_counts(db, "u1", ["posts"]) == {"posts": 9}
+
+def test_concurrent_seed_is_ignored(fake):
+    db, shards, totals = fake
+    totals[("friendships", "user1_id")] = 2
+    totals[("friendships", "user2_id")] = 3
+    shards.store["seed-friends"] = {"friends": 5}
+
+    assert counters._seed(db, "u1", "friends", 0) == 5
+    assert shards.store["seed-friends"] == {"friends": 5}
+
+def test_unmaterialized_counters_use_count(fake):
+    db, shards, totals = fake
+    totals[("video_analysis", "user_id")] = 4
+    assert counters.get_counts(db, "u1", ["videos"]) == {"videos": 4}
+    assert shards.store == {}
+    with pytest.raises(ValueError):
+        counters.increment(db, "u1", "videos")
+
+def test_increment_many_uses_one_batch(fake):
+    db, _, _ = fake
+    counters.increment_many(db, ["u1", "u2", None], "friends", -1)
+    assert db.batch.return_value.set.call_count == 2
+    db.batch.return_value.commit.assert_called_once()
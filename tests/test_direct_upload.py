@@ -0,0 +1,157 @@
+"""
+Pruebas de la subida directa a Storage con URLs firmadas.
+"""
+import base64
+import json
+import pytest
+from unittest.mock import patch, MagicMock
+from fastapi import HTTPException
+from google.api_core.exceptions import AlreadyExists
+from app.services.storage_service import StorageService
+from app.services.storage_mock import get_mock_bucket, patch_storage
+
+USER_ID = "user_123"
+ANALYSIS_ID = "analysis_456"
+
+@pytest.fixture
+def bucket():
+    bucket = get_mock_bucket()
+    with patch_storage(bucket):
+        yield bucket
+
+def test_upload_path_roundtrip():
+    path = StorageService.build_upload_path(USER_ID, ANALYSIS_ID, "mi partido.mp4")
+    assert path == f"videos/{USER_ID}/{ANALYSIS_ID}/mi_partido.mp4"
+    assert StorageService.parse_upload_path(path) == (USER_ID, ANALYSIS_ID)
+    assert StorageService.parse_upload_path(f"videos/{USER_ID}/legacy.mp4") is None
+
+@pytest.mark.asyncio
+async def test_create_signed_upload_url(bucket):
+    data, error = await StorageService.create_signed_upload_url(USER_ID, ANALYSIS_ID, "video.mp4", "video/mp4")
+    assert error is None
+    assert data['object_path'] == f"videos/{USER_ID}/{ANALYSIS_ID}/video.mp4"
+    assert data['method'] == 'POST'
+    assert data['headers']['x-goog-resumable'] == 'start'
+    request = bucket.signed_url_requests[0]
+    assert request['version'] == 'v4'
+    assert request['method'] == 'POST'
+
+@pytest.mark.asyncio
+async def test_create_signed_upload_url_rejects_format(bucket):
+    data, error = await StorageService.create_signed_upload_url(USER_ID, ANALYSIS_ID, "video.avi", "video/x-msvideo")
+    assert data is None
+    assert "no permitido" in error
+    assert not bucket.signed_url_requests
+
+@pytest.mark.asyncio
+async def test_verify_uploaded_video(bucket):
+    path = StorageService.build_upload_path(USER_ID, ANALYSIS_ID, "video.mp4")
+    bucket.put(path, b"fake video content")
+
+    info, error = await StorageService.verify_uploaded_video(path, USER_ID)
+    assert error is None
+    assert info['gcs_uri'] == f"gs://{bucket.name}/{path}"
+    assert info['size'] == len(b"fake video content")
+
+@pytest.mark.asyncio
+async def test_verify_uploaded_video_wrong_owner(bucket):
+    path = StorageService.build_upload_path(USER_ID, ANALYSIS_ID, "video.mp4")
+    bucket.put(path, b"fake video content")
+
+    info, error = await StorageService.verify_uploaded_video(path, "other_user")
+    assert info is None
+    assert error
+
+@pytest.mark.asyncio
+async def test_verify_uploaded_video_deletes_invalid_object(bucket):
+    path = StorageService.build_upload_path(USER_ID, ANALYSIS_ID, "video.mp4")
+    bucket.put(path, b"not a video", content_type="text/plain")
+
+    info, error = await StorageService.verify_uploaded_video(path, USER_ID)
+    assert info is None
+    assert "no permitido" in error
+    assert bucket.get_blob(path) is None
+
+@pytest.mark.asyncio
+async def test_register_uploaded_video_enqueues_once(bucket):
+    from app.api import videos
+
+    path = StorageService.build_upload_path(USER_ID, ANALYSIS_ID, "video.mp4")
+    bucket.put(path, b"fake video content")
+
+    mock_db = MagicMock()
+    mock_db.collection.return_value.document.return_value.get.return_value.exists = False
+    with patch.object(videos, 'get_firebase_client', return_value=mock_db), \
+         patch.object(videos, 'enqueue_analysis_task') as mock_enqueue:
+        result = await videos.register_uploaded_video(USER_ID, ANALYSIS_ID, path)
+
+    assert result == {"analysis_id": ANALYSIS_ID, "status": "pending"}
+    saved = mock_db.collection.return_value.document.return_value.create.call_args[0][0]
+    assert saved['video_url'] == f"gs://{bucket.name}/{path}"
+    mock_enqueue.assert_called_once_with(ANALYSIS_ID)
+
+@pytest.mark.asyncio
+async def test_register_uploaded_video_concurrent_duplicate_is_not_enqueued(bucket):
+    from app.api import videos
+
+    path = StorageService.build_upload_path(USER_ID, ANALYSIS_ID, "video.mp4")
+    bucket.put(path, b"fake video content")
+
+    # Ambas llamadas pasan la comprobación inicial; la segunda pierde en create()
+    mock_db = MagicMock()
+    document = mock_db.collection.return_value.document.return_value
+    document.get.return_value.exists = False
+    document.get.return_value.to_dict.return_value = {'status': 'queued'}
+    document.create.side_effect = AlreadyExists("existe")
+    with patch.object(videos, 'get_firebase_client', return_value=mock_db), \
+         patch.object(videos, 'enqueue_analysis_task') as mock_enqueue:
+        result = await videos.register_uploaded_video(USER_ID, ANALYSIS_ID, path)
+
+    assert result == {"analysis_id": ANALYSIS_ID, "status": "queued"}
+    mock_enqueue.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_register_uploaded_video_retry_enqueues_a_pending_analysis_without_job(bucket):
+    from app.api import videos
+
+    path = StorageService.build_upload_path(USER_ID, ANALYSIS_ID, "video.mp4")
+    mock_db = MagicMock()
+    document = mock_db.collection.return_value.document.return_value
+    document.get.return_value.exists = True
+    # El primer intento creó el documento pero falló al encolar
+    document.get.return_value.to_dict.return_value = {'status': 'pending'}
+    with patch.object(videos, 'get_firebase_client', return_value=mock_db), \
+         patch.object(videos, 'enqueue_analysis_task') as mock_enqueue:
+        result = await videos.register_uploaded_video(USER_ID, ANALYSIS_ID, path)
+        assert result == {"analysis_id": ANALYSIS_ID, "status": "pending"}
+        mock_enqueue.assert_called_once_with(ANALYSIS_ID)
+
+        document.get.return_value.to_dict.return_value = {'status': 'queued', 'job_id': ANALYSIS_ID}
+        await videos.register_uploaded_video(USER_ID, ANALYSIS_ID, path)
+        mock_enqueue.assert_called_once_with(ANALYSIS_ID)
+    document.create.assert_not_called()
+
+def notification_request(path):
+    request = MagicMock()
+    data = base64.b64encode(json.dumps({"name": path}).encode()).decode()
+
+    async def body():
+        return {"message": {"attributes": {"eventType": "OBJECT_FINALIZE"}, "data": data}}
+    request.json = body
+    return request
+
+@pytest.mark.asyncio
+async def test_storage_notification_requires_configured_token():
+    from app.api import videos
+
+    request = notification_request(StorageService.build_upload_path(USER_ID, ANALYSIS_ID, "video.mp4"))
+    with patch.object(videos, 'STORAGE_NOTIFICATION_TOKEN', None), \
+         patch.object(videos, 'register_uploaded_video') as mock_register:
+        with pytest.raises(HTTPException) as exc:
+            await videos.storage_notification(request, token=None)
+    assert exc.value.status_code == 401
+    mock_register.assert_not_called()
+
+    with patch.object(videos, 'STORAGE_NOTIFICATION_TOKEN', "secreto"):
+        with pytest.raises(HTTPException):
+            await videos.storage_notification(request, token="otro")
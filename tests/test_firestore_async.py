@@ -0,0 +1,141 @@
+"""
+Pruebas de la capa asíncrona de acceso a Firestore.
+"""
+import asyncio
+import pytest
+from app.services import firestore_async
+from app.services.firestore_async import (
+    set_async_firestore_client,
+    gather_reads,
+    get_document_async,
+    get_documents_async,
+    query_collection_async
+)
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+class FakeDocument:
+    def __init__(self, client, collection, doc_id):
+        self.client = client
+        self.collection = collection
+        self.id = doc_id
+
+    async def get(self):
+        await asyncio.sleep(self.client.delay)
+        return FakeSnapshot(self.id, self.client.data.get(self.collection, {}).get(self.id))
+
+class FakeQuery:
+    def __init__(self, client, collection, filters=None):
+        self.client = client
+        self.collection = collection
+        self.filters = filters or []
+
+    def where(self, field, op, value):
+        return FakeQuery(self.client, self.collection, self.filters + [(field, op, value)])
+
+    def document(self, doc_id):
+        return FakeDocument(self.client, self.collection, doc_id)
+
+    def order_by(self, field, direction=None):
+        return self
+
+    def limit(self, count):
+        return self
+
+    async def get(self):
+        await asyncio.sleep(self.client.delay)
+        docs = self.client.data.get(self.collection, {})
+        return [
+            FakeSnapshot(doc_id, data) for doc_id, data in docs.items()
+            if all(op == "==" and data.get(field) == value for field, op, value in self.filters)
+        ]
+
+class FakeAsyncClient:
+    def __init__(self, data, delay=0.0):
+        self.data = data
+        self.delay = delay
+        self.get_all_calls = 0
+
+    def collection(self, name):
+        return FakeQuery(self, name)
+
+    async def get_all(self, refs, field_paths=None):
+        self.get_all_calls += 1
+        for ref in refs:
+            yield await ref.get()
+
+@pytest.fixture
+def fake_client():
+    client = FakeAsyncClient({
+        "users": {"u1": {"name": "Ana"}, "u2": {"name": "Luis"}},
+        "friendships": {"f1": {"user1_id": "u1", "user2_id": "u2"}}
+    })
+    set_async_firestore_client(client)
+    yield client
+    set_async_firestore_client(None)
+
+@pytest.mark.asyncio
+async def test_get_document_async(fake_client):
+    assert await get_document_async("users", "u1") == {"name": "Ana"}
+    assert await get_document_async("users", "missing") is None
+
+@pytest.mark.asyncio
+async def test_get_documents_async_uses_single_get_all(fake_client):
+    users = await get_documents_async("users", ["u1", "u2", "u1", "missing", None])
+    assert users == {"u1": {"name": "Ana"}, "u2": {"name": "Luis"}}
+    assert fake_client.get_all_calls == 1
+
+@pytest.mark.asyncio
+async def test_query_collection_async_includes_id(fake_client):
+    results = await query_collection_async("friendships", [("user1_id", "==", "u1")], include_id=True)
+    assert results == [{"user1_id": "u1", "user2_id": "u2", "id": "f1"}]
+
+@pytest.mark.asyncio
+async def test_gather_reads_runs_reads_concurrently(fake_client):
+    fake_client.delay = 0.05
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    user, friendships = await gather_reads(
+        get_document_async("users", "u2"),
+        query_collection_async("friendships", [("user2_id", "==", "u2")])
+    )
+    assert user == {"name": "Luis"}
+    assert len(friendships) == 1
+    assert loop.time() - start < 0.09
+
+@pytest.mark.asyncio
+async def test_errors_propagate(monkeypatch):
+    def broken_client():
+        raise RuntimeError("sin conexión")
+    monkeypatch.setattr(firestore_async, "get_async_firestore_client", broken_client)
+    with pytest.raises(RuntimeError):
+        await get_document_async("users", "u1")
+    with pytest.raises(RuntimeError):
+        await query_collection_async("users")
+
+@pytest.mark.asyncio
+async def test_profile_is_refused_when_block_check_fails(monkeypatch):
+    from fastapi import HTTPException
+    from app.api.v1.endpoints import users
+    from app.schemas.user import UserInDB
+
+    async def get_document(collection, document_id):
+        return {"name": "Ana", "privacy": {"profile_visible": True}}
+
+    async def query_collection(collection, filters=None, **kwargs):
+        if collection == "blocked_users":
+            raise RuntimeError("Firestore no disponible")
+        return []
+
+    monkeypatch.setattr(users, "get_document_async", get_document)
+    monkeypatch.setattr(users, "query_collection_async", query_collection)
+    with pytest.raises(HTTPException) as exc:
+        await users.read_user_profile("u2", current_user=UserInDB(id="u1", name="Luis"), level="full")
+    assert exc.value.status_code == 500
@@ -0,0 +1,123 @@
+"""
+Pruebas del emulador de Firestore en memoria.
+"""
+from datetime import datetime, timedelta
+import pytest
+from firebase_admin import firestore
+from google.api_core.exceptions import Aborted, AlreadyExists
+from app.services.firestore_emulator import FirestoreEmulator, LatencyModel, transactional
+from app.utils.pagination import paginate_query
+
+T0 = datetime(2024, 1, 1)
+
+def make_db(**kwargs):
+    db = FirestoreEmulator(**kwargs)
+    db.seed("posts", {
+        f"p{i}": {"user_id": f"u{i % 3}", "visibility": "public" if i % 4 else "private", "created_at": T0 + timedelta(hours=i), "tags": ["padel"] if i % 2 else []}
+        for i in range(10)
+    })
+    return db
+
+def test_composite_queries_follow_firestore_semantics():
+    db = make_db()
+    posts = db.collection("posts")
+
+    docs = posts.where("user_id", "in", ["u0", "u1"]).where("visibility", "==", "public").order_by("created_at", direction="DESCENDING").limit(3).get()
+    assert [d.id for d in docs] == ["p9", "p7", "p6"]
+    assert [d.id for d in posts.where("tags", "array_contains", "padel").where("created_at", ">=", T0 + timedelta(hours=6)).get()] == ["p7", "p9"]
+    assert posts.where("visibility", "!=", "public").count().get()[0][0].value == 3
+    assert posts.select(["user_id"]).limit(1).get()[0].to_dict() == {"user_id": "u0"}
+    # Sin el campo de orden el documento no aparece
+    db.collection("posts").document("sin_fecha").set({"visibility": "public"})
+    assert "sin_fecha" not in [d.id for d in posts.order_by("created_at").get()]
+
+def test_cursor_pagination_matches_a_full_scan():
+    db = make_db()
+    order_by = [("created_at", "DESCENDING")]
+    query = db.collection("posts").where("visibility", "==", "public")
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = paginate_query(query, order_by, 2, cursor)
+        seen += [d.id for d in page]
+        if cursor is None:
+            break
+    expected = [d.id for d in query.order_by("created_at", direction="DESCENDING").get()]
+    assert seen == expected and len(seen) == 7
+
+def test_batches_are_atomic_and_counted():
+    db = make_db()
+    db.stats.reset()
+    batch = db.batch()
+    batch.set(db.collection("posts").document("p0"), {"tags": firestore.DELETE_FIELD, "edited_at": firestore.SERVER_TIMESTAMP}, merge=True)
+    batch.create(db.collection("posts").document("p1"), {"user_id": "u9"})
+    with pytest.raises(AlreadyExists):
+        batch.commit()
+    assert "edited_at" not in db.collection("posts").document("p0").get().to_dict()
+
+    batch.set(db.collection("posts").document("p0"), {"tags": firestore.DELETE_FIELD, "edited_at": firestore.SERVER_TIMESTAMP}, merge=True)
+    batch.delete(db.collection("posts").document("p2"))
+    batch.commit()
+    data = db.collection("posts").document("p0").get().to_dict()
+    assert "tags" not in data and isinstance(data["edited_at"], datetime)
+    assert not db.collection("posts").document("p2").get().exists
+    assert db.stats.snapshot()["by_collection"]["posts"] == {"commit": 1, "deletes": 1, "get": 3, "reads": 3, "writes": 1}
+
+def test_transactions_retry_on_conflict():
+    db = make_db()
+    ref = db.collection("counters").document("c")
+    ref.set({"n": 0})
+    attempts = []
+
+    @transactional
+    def bump(transaction):
+        value = ref.get(transaction=transaction).to_dict()["n"]
+        if not attempts:
+            # Otro cliente escribe entre la lectura y el commit
+            ref.set({"n": 100})
+        attempts.append(value)
+        transaction.set(ref, {"n": value + 1})
+
+    bump(db.transaction())
+    assert attempts == [0, 100]
+    assert ref.get().to_dict() == {"n": 101}
+    assert db.stats.totals["aborted"] == 1
+
+    @transactional
+    def always_conflicts(transaction):
+        ref.get(transaction=transaction)
+        ref.update({"n": 0})
+        transaction.update(ref, {"n": 1})
+    with pytest.raises(Aborted):
+        always_conflicts(db.transaction(max_attempts=2))
+
+    @transactional
+    def write_then_read(transaction):
+        transaction.set(ref, {"n": 1})
+        ref.get(transaction=transaction)
+    with pytest.raises(ValueError):
+        write_then_read(db.transaction())
+
+def test_latency_is_injected_per_operation_and_snapshots_stream():
+    sleeps = []
+    db = make_db(latency=LatencyModel({"query": 0.01, "commit": 0.02}, per_document=0.001, sleep=sleeps.append))
+    events = []
+    watch = db.collection("posts").where("user_id", "==", "u1").on_snapshot(
+        lambda docs, changes, read_time: events.append(sorted((c.type.name, c.document.id) for c in changes))
+    )
+
+    db.collection("posts").limit(2).get()
+    db.collection("posts").document("p1").delete()
+    db.collection("posts").document("p3").update({"user_id": "u2"})
+    db.collection("posts").document("p10").set({"user_id": "u1"})
+    watch.unsubscribe()
+    db.collection("posts").document("p11").set({"user_id": "u1"})
+
+    assert sleeps[0] == pytest.approx(0.012)
+    assert sleeps[1] == pytest.approx(0.021)
+    # El cambio de p3 no afecta a la consulta y lo escrito tras unsubscribe no llega
+    assert events == [
+        [("ADDED", "p1"), ("ADDED", "p4"), ("ADDED", "p7")],
+        [("REMOVED", "p1")],
+        [("ADDED", "p10")]
+    ]
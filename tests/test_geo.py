@@ -0,0 +1,89 @@
+"""
+Pruebas del índice geográfico por geohash.
+"""
+import pytest
+from unittest.mock import MagicMock
+from app.services import geo
+
+MADRID = (40.4168, -3.7038)
+GETAFE = (40.3057, -3.7329)
+TOLEDO = (39.8628, -4.0273)
+
+def make_doc(doc_id, data):
+    doc = MagicMock()
+    doc.id = doc_id
+    doc.to_dict.return_value = data
+    return doc
+
+class FakeQuery:
+    """Consulta que filtra en memoria y registra los rangos pedidos."""
+
+    def __init__(self, docs, ranges):
+        self.docs = docs
+        self.ranges = ranges
+        self.conditions = []
+
+    def where(self, field, op, value):
+        query = FakeQuery(self.docs, self.ranges)
+        query.conditions = self.conditions + [(field, op, value)]
+        return query
+
+    def get(self):
+        ops = {
+            "==": lambda a, b: a == b,
+            ">=": lambda a, b: a is not None and a >= b,
+            "<": lambda a, b: a is not None and a < b
+        }
+        self.ranges.append([c for c in self.conditions if c[0] == geo.GEOHASH_FIELD])
+        return [
+            doc for doc in self.docs
+            if all(ops[op](doc.to_dict().get(field), value) for field, op, value in self.conditions)
+        ]
+
+def make_db(users):
+    ranges = []
+    docs = [
+        make_doc(uid, {"location": {"latitude": lat, "longitude": lon}, "status": status,
+                       **geo.geo_fields({"latitude": lat, "longitude": lon})})
+        for uid, (lat, lon), status in users
+    ]
+    db = MagicMock()
+    db.collection.return_value = FakeQuery(docs, ranges)
+    return db, ranges
+
+def test_geohash_matches_reference_value():
+    assert geo.encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    lat_min, lat_max, lon_min, lon_max = geo.decode_bbox("u4pruydqqvj")
+    assert lat_min <= 57.64911 <= lat_max
+    assert lon_min <= 10.40744 <= lon_max
+
+def test_haversine_and_radius():
+    assert geo.haversine_km(MADRID, (41.3874, 2.1686)) == pytest.approx(505, abs=2)
+    assert geo.is_within_radius({"latitude": MADRID[0], "longitude": MADRID[1]}, GETAFE, 15)
+    assert not geo.is_within_radius(MADRID, TOLEDO, 15)
+    assert not geo.is_within_radius(MADRID, {"name": "Club"}, 15)
+
+def test_covering_cells_contain_points_in_radius():
+    cells = geo.covering_cells(MADRID, 15)
+    assert len(cells) == 9
+    assert any(geo.encode(*GETAFE).startswith(cell) for cell in cells)
+
+def test_query_reads_only_nearby_cells_and_filters_exactly():
+    db, ranges = make_db([
+        ("cerca", GETAFE, "open"),
+        ("lejos", TOLEDO, "open"),
+        ("cerrado", GETAFE, "full"),
+        ("centro", MADRID, "open")
+    ])
+    results = geo.query_within_radius(db, "matches", MADRID, 15, filters=[("status", "==", "open")])
+
+    assert [doc.id for doc, _ in results] == ["centro", "cerca"]
+    assert results[1][1] == pytest.approx(geo.haversine_km(MADRID, GETAFE))
+    # Una consulta acotada por celda, nunca la colección completa
+    assert len(ranges) == 9
+    assert all(len(r) == 2 for r in ranges)
+
+def test_query_without_center_coordinates_returns_nothing():
+    db, ranges = make_db([("cerca", GETAFE, "open")])
+    assert geo.query_within_radius(db, "users", None, 10) == []
+    assert ranges == []
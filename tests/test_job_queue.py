@@ -0,0 +1,185 @@
+"""
+Pruebas de la cola de trabajos y del worker de análisis.
+"""
+import time
+import pytest
+from unittest.mock import MagicMock
+from app.services.job_queue import (
+    SQLiteBroker,
+    ANALYZE_VIDEO_JOB,
+    LIGHT_JOB_QUEUE_NAME,
+    SEND_PUSH_JOB,
+    queue_for
+)
+from app.worker import Worker, analyze_video
+
+@pytest.fixture
+def broker(tmp_path):
+    return SQLiteBroker(str(tmp_path / "jobs.db"))
+
+def test_enqueue_reserve_ack(broker):
+    job_id = broker.enqueue("test", {"value": 1})
+    job = broker.reserve(visibility_timeout=60)
+    assert job.id == job_id
+    assert job.payload == {"value": 1}
+    assert job.attempts == 1
+    assert broker.reserve() is None
+    assert broker.ack(job)
+    assert broker.get(job_id)["status"] == "done"
+
+def test_enqueue_with_same_id_is_idempotent(broker):
+    broker.enqueue("test", {}, job_id="a1")
+    broker.enqueue("test", {}, job_id="a1")
+    assert broker.depth() == 1
+
+def test_add_reports_insert_and_requeue_revives_only_dead_jobs(broker):
+    assert broker.add("test", {}, "a1", max_attempts=1)
+    assert not broker.add("test", {}, "a1")
+    assert not broker.requeue("a1")
+    job = broker.reserve()
+    assert broker.nack(job, "fallo") == "dead"
+    assert not broker.add("test", {}, "a1")
+
+    assert broker.requeue("a1")
+    job = broker.reserve()
+    assert job.id == "a1" and job.attempts == 1
+    assert broker.ack(job)
+    assert not broker.requeue("a1")
+
+def test_expired_lease_is_redelivered(broker):
+    broker.enqueue("test", {})
+    first = broker.reserve(visibility_timeout=0)
+    time.sleep(0.01)
+    second = broker.reserve(visibility_timeout=60)
+    assert second.id == first.id
+    assert second.attempts == 2
+    # La reserva antigua ya no es válida
+    assert not broker.ack(first)
+    assert broker.ack(second)
+
+def test_nack_retries_then_dead(broker):
+    job_id = broker.enqueue("test", {}, max_attempts=2)
+    job = broker.reserve()
+    assert broker.nack(job, "fallo", delay=0) == "queued"
+    job = broker.reserve()
+    assert job.attempts == 2
+    assert broker.nack(job, "fallo", delay=0) == "dead"
+    assert broker.reserve() is None
+    assert broker.get(job_id)["last_error"] == "fallo"
+
+def make_db(analysis):
+    db = MagicMock()
+    doc = MagicMock()
+    doc.exists = analysis is not None
+    doc.to_dict.return_value = analysis
+    ref = db.collection.return_value.document.return_value
+    ref.get.return_value = doc
+    return db, ref
+
+def test_worker_runs_analysis_and_marks_completed(broker):
+    db, ref = make_db({"video_url": "gs://b/v.mp4", "user_id": "u1", "status": "queued"})
+    pipeline = MagicMock()
+    pipeline.analyze.return_value = {"metrics": {"padel_iq": 70}}
+    worker = Worker(
+        broker=broker,
+        handlers={ANALYZE_VIDEO_JOB: lambda job, p: analyze_video(job, p, db=db)},
+        pipeline_factory=lambda: pipeline
+    )
+    job_id = broker.enqueue(ANALYZE_VIDEO_JOB, {"analysis_id": "a1"})
+
+    assert worker.run_once(pipeline)
+    assert broker.get(job_id)["status"] == "done"
+    statuses = [c.args[0]["status"] for c in ref.update.call_args_list]
+    assert statuses == ["processing", "completed"]
+
+def test_worker_failure_is_retried_and_missing_document_is_not(broker):
+    db, ref = make_db({"video_url": "gs://b/v.mp4", "status": "queued"})
+    pipeline = MagicMock()
+    pipeline.analyze.return_value = {"error": "sin frames"}
+    worker = Worker(broker=broker, handlers={ANALYZE_VIDEO_JOB: lambda job, p: analyze_video(job, p, db=db)})
+    job_id = broker.enqueue(ANALYZE_VIDEO_JOB, {"analysis_id": "a1"}, max_attempts=2)
+
+    worker.run_once(pipeline)
+    assert broker.get(job_id)["status"] == "queued"
+    assert ref.update.call_args.args[0]["status"] == "queued"
+
+    missing_db, _ = make_db(None)
+    worker.handlers = {ANALYZE_VIDEO_JOB: lambda job, p: analyze_video(job, p, db=missing_db)}
+    missing_id = broker.enqueue(ANALYZE_VIDEO_JOB, {"analysis_id": "a2"})
+    while broker.get(missing_id)["status"] == "queued":
+        worker.run_once(pipeline)
+    assert broker.get(missing_id)["status"] == "dead"
+
+def test_light_jobs_use_their_own_queue():
+    assert queue_for(ANALYZE_VIDEO_JOB) == "analysis"
+    assert queue_for(SEND_PUSH_JOB) == LIGHT_JOB_QUEUE_NAME
+
+def test_light_job_runs_without_pipeline(tmp_path):
+    broker = SQLiteBroker(str(tmp_path / "jobs.db"), queue=LIGHT_JOB_QUEUE_NAME)
+    factory = MagicMock()
+    handler = MagicMock()
+    worker = Worker(broker=broker, handlers={SEND_PUSH_JOB: handler}, pipeline_factory=factory)
+    job_id = broker.enqueue(SEND_PUSH_JOB, {"user_id": "u1"})
+
+    assert worker.run_once()
+    assert broker.get(job_id)["status"] == "done"
+    assert handler.call_args.args[1] is None
+    factory.assert_not_called()
+
+def test_purge_removes_only_old_done_jobs(broker):
+    old_id = broker.enqueue(SEND_PUSH_JOB, {})
+    broker.ack(broker.reserve(60))
+    recent_id = broker.enqueue(SEND_PUSH_JOB, {})
+    broker.ack(broker.reserve(60))
+    pending_id = broker.enqueue(SEND_PUSH_JOB, {})
+    broker._connect().execute("UPDATE jobs SET updated_at = 0 WHERE id IN (?, ?)", (old_id, pending_id))
+
+    assert broker.purge(older_than=3600) == 1
+    assert broker.get(old_id) is None
+    assert broker.get(recent_id)["status"] == "done"
+    assert broker.get(pending_id)["status"] == "queued"
+
+def test_analysis_is_retried_when_no_pipeline_is_available(broker):
+    def broken():
+        raise RuntimeError("sin GPU")
+
+    handler = MagicMock()
+    worker = Worker(broker=broker, handlers={ANALYZE_VIDEO_JOB: handler}, pipeline_factory=broken)
+    job_id = broker.enqueue(ANALYZE_VIDEO_JOB, {"analysis_id": "a1"})
+
+    assert worker.run_once()
+    handler.assert_not_called()
+    assert broker.get(job_id)["status"] == "queued"
+
+def test_duplicate_analysis_delivery_keeps_the_document_status(broker, monkeypatch):
+    from app.api import videos
+    from app.services import job_queue
+    from app.services.firestore_emulator import FirestoreEmulator, transactional
+
+    db = FirestoreEmulator()
+    db.seed("video_analyses", {"a1": {"status": "pending"}})
+    monkeypatch.setattr(videos, "get_firebase_client", lambda: db)
+    monkeypatch.setattr(videos.firestore, "transactional", transactional)
+    job_queue.set_broker(broker)
+    analysis = db.collection("video_analyses").document("a1")
+    try:
+        videos.enqueue_analysis_job("a1")
+        assert analysis.get().to_dict() == {"status": "queued", "job_id": "a1"}
+
+        # El worker ya lo terminó y Cloud Tasks entrega otra vez
+        analysis.update({"status": "completed"})
+        videos.enqueue_analysis_job("a1")
+        assert analysis.get().to_dict()["status"] == "completed"
+        assert broker.depth() == 1
+
+        # Un trabajo 'dead' solo se reencola si se pide
+        job = broker.reserve()
+        broker.nack(job, "fallo", final=True)
+        analysis.update({"status": "failed"})
+        videos.enqueue_analysis_job("a1")
+        assert analysis.get().to_dict()["status"] == "failed"
+        videos.enqueue_analysis_job("a1", retry=True)
+        assert analysis.get().to_dict()["status"] == "queued"
+        assert broker.reserve().id == "a1"
+    finally:
+        job_queue.set_broker(None)
@@ -0,0 +1,129 @@
+"""
+Pruebas de la tabla de líderes materializada.
+"""
+import time
+import pytest
+from unittest.mock import MagicMock
+from app.services import leaderboard
+from app.services.leaderboard import MemoryLeaderboardStore
+from app.utils.pagination import InvalidCursorError
+
+def make_doc(doc_id, data, exists=True):
+    doc = MagicMock()
+    doc.id = doc_id
+    doc.exists = exists
+    doc.to_dict.return_value = data
+    return doc
+
+def make_db(points, users):
+    db = MagicMock()
+    db.collection.return_value.select.return_value.stream.return_value = [
+        make_doc(uid, {"points": value}) for uid, value in points.items()
+    ]
+    db.get_all.side_effect = lambda refs, field_paths=None: [
+        make_doc(uid, data) for uid, data in users.items()
+    ]
+    return db
+
+@pytest.fixture
+def store():
+    store = MemoryLeaderboardStore()
+    leaderboard.set_store(store)
+    yield store
+    leaderboard.set_store(None)
+
+def test_ranks_share_position_on_ties(store):
+    for uid, score in {"a": 50, "b": 80, "c": 50, "d": 10}.items():
+        store.set_score("points", uid, score)
+    assert store.rank("points", "b") == 1
+    assert store.rank("points", "a") == 2
+    assert store.rank("points", "c") == 2
+    assert store.rank("points", "d") == 4
+    assert store.rank("points", "nadie") is None
+
+    store.set_score("points", "d", 100)
+    assert store.rank("points", "d") == 1
+    assert store.rank("points", "b") == 2
+    assert store.increment("points", "a", 5) == 55
+    assert store.rank("points", "a") == 3
+
+def test_reconcile_loads_scores_and_profiles(store):
+    db = make_db({"u1": 300, "u2": 100, "u3": 200}, {
+        "u1": {"username": "ana", "name": "Ana"},
+        "u2": {"username": "luis"},
+        "u3": {"username": "eva"}
+    })
+    assert leaderboard.reconcile("points", db) == 3
+    page, next_cursor = leaderboard.get_page("points", 2, db=db)
+
+    assert [e["user_id"] for e in page] == ["u1", "u3"]
+    assert page[0]["username"] == "ana"
+    assert page[0]["points"] == 300
+    assert [e["rank"] for e in page] == [1, 2]
+    # Los perfiles ya están desnormalizados: la página no lee usuarios
+    assert db.get_all.call_count == 1
+
+    page, next_cursor = leaderboard.get_page("points", 2, next_cursor, db=db)
+    assert [e["user_id"] for e in page] == ["u2"]
+    assert page[0]["rank"] == 3
+    assert next_cursor is None
+
+def test_incremental_update_is_visible_without_firestore(store):
+    store.mark_reconciled("points", time.time())
+    store.set_profiles({"u1": {"username": "ana"}, "u2": {"username": "luis"}})
+    leaderboard.record_score("points", "u1", 100)
+    leaderboard.record_score("points", "u2", 150)
+
+    db = MagicMock()
+    page, _ = leaderboard.get_page("points", 10, db=db)
+    assert [e["user_id"] for e in page] == ["u2", "u1"]
+    assert not db.method_calls
+    assert leaderboard.get_rank("points", "u1") == 2
+
+def test_invalid_cursor_is_rejected(store):
+    store.mark_reconciled("points", time.time())
+    with pytest.raises(InvalidCursorError):
+        leaderboard.get_page("points", 10, "no-es-un-cursor")
+
+def test_writes_during_reconcile_are_not_overwritten(store):
+    db = make_db({"u1": 100, "u2": 200}, {})
+
+    def stream():
+        # Llegan mientras se lee la instantánea
+        leaderboard.record_score("points", "u1", 500)
+        leaderboard.remove_user("u2")
+        return [make_doc("u1", {"points": 100}), make_doc("u2", {"points": 200})]
+
+    db.collection.return_value.select.return_value.stream.side_effect = stream
+    assert leaderboard.reconcile("points", db) == 1
+    assert store.score("points", "u1") == 500
+    assert store.score("points", "u2") is None
+
+    # Fuera de la reconciliación no se registra nada
+    leaderboard.record_score("points", "u3", 10)
+    leaderboard.reconcile("points", make_db({"u1": 600}, {}))
+    assert store.score("points", "u1") == 600
+    assert store.score("points", "u3") is None
+
+def test_only_one_caller_gets_the_reconcile_lock(store):
+    assert store.try_reconcile_lock("points", 60)
+    assert not store.try_reconcile_lock("points", 60)
+    assert store.try_reconcile_lock("matches", 60)
+
+def test_first_load_in_progress_is_served_from_firestore(store, monkeypatch):
+    store.try_reconcile_lock("points", 60)
+    db = MagicMock()
+    query = db.collection.return_value.order_by.return_value.order_by.return_value
+    query.limit.return_value.get.return_value = [
+        make_doc("u1", {"points": 300}), make_doc("u2", {"points": 300}), make_doc("u3", {"points": 100})
+    ]
+    db.collection.return_value.where.return_value.count.return_value.get.return_value = [[MagicMock(value=0)]]
+    db.get_all.side_effect = lambda refs, field_paths=None: [make_doc("u1", {"username": "ana"})]
+
+    monkeypatch.setattr(leaderboard, "LEADERBOARD_WAIT_SECONDS", 0)
+    page, next_cursor = leaderboard.get_page("points", 2, db=db)
+    assert [e["user_id"] for e in page] == ["u1", "u2"]
+    assert [e["rank"] for e in page] == [1, 1]
+    assert page[0]["username"] == "ana"
+    assert next_cursor is not None
+    assert store.size("points") == 0
@@ -0,0 +1,73 @@
+"""
+Pruebas del índice de candidatos del matchmaking.
+"""
+from datetime import datetime
+from unittest.mock import MagicMock
+from app.services import matchmaking_index as index
+
+MADRID = {"latitude": 40.4168, "longitude": -3.7038}
+GETAFE = {"latitude": 40.3057, "longitude": -3.7329}
+SEVILLA = {"latitude": 37.3891, "longitude": -5.9845}
+
+def make_match(**extra):
+    data = {"level": "Intermedio", "date": datetime(2026, 5, 1, 10, 0), "location": "Club Norte "}
+    data.update(extra)
+    return data
+
+def test_match_keys_include_wildcards():
+    keys = index.match_keys(make_match(coordinates=MADRID))
+    assert "intermedio|morning|club:club norte" in keys
+    assert "*|*|*" in keys
+    assert any(k.startswith("intermedio|morning|cell:") for k in keys)
+    assert len(keys) == 20
+
+def test_search_finds_matches_by_level_slot_and_place():
+    match = set(index.match_keys(make_match(coordinates=GETAFE)))
+
+    by_club = index.search_keys("intermedio", ["Morning"], ["club norte"])
+    by_cell = index.search_keys("intermedio", ["morning"], [], MADRID)
+    anything = index.search_keys()
+    assert match.intersection(by_club)
+    assert match.intersection(by_cell)
+    assert match.intersection(anything)
+
+    assert not match.intersection(index.search_keys("avanzado", ["morning"], ["club norte"]))
+    assert not match.intersection(index.search_keys("intermedio", ["night"], ["club norte"]))
+    assert not match.intersection(index.search_keys("intermedio", ["morning"], [], SEVILLA))
+
+def test_search_cells_cover_the_radius_at_high_latitudes():
+    # A 65° las celdas de precisión 4 miden ~16 km de ancho: un partido a
+    # 19 km al este queda fuera de su vecindad 3x3
+    north = {"latitude": 65.0, "longitude": 10.15}
+    east = {"latitude": 65.0, "longitude": 10.55}
+    assert index.geo.haversine_km((65.0, 10.15), (65.0, 10.55)) < 20
+    match = set(index.match_keys(make_match(coordinates=east)))
+
+    assert not match.intersection(index.search_keys("intermedio", ["morning"], [], north))
+    assert match.intersection(index.search_keys("intermedio", ["morning"], [], north, radius_km=20))
+    assert index.cell_precision((65.0, 10.15), 20) == 3
+    assert index.cell_precision((40.4, -3.7), 5) == 4
+
+def test_numeric_levels_are_bucketed():
+    assert index.level_bucket(42.5) == index.level_bucket(47) == "iq4"
+    assert index.level_bucket(None) == index.WILDCARD
+
+def test_lookup_chunks_keys_and_deduplicates():
+    db = MagicMock()
+    doc = MagicMock()
+    doc.id = "m1"
+    query = db.collection.return_value.where.return_value.where.return_value
+    query.limit.return_value.get.return_value = [doc]
+
+    keys = [f"k{i}" for i in range(45)]
+    results = index.find_open_matches(db, keys)
+
+    assert results == [doc]
+    calls = db.collection.return_value.where.return_value.where.call_args_list
+    assert [len(c.args[2]) for c in calls] == [30, 15]
+    assert all(c.args[:2] == (index.BUCKET_FIELD, "array_contains_any") for c in calls)
+
+def test_active_pointer_missing_returns_empty():
+    db = MagicMock()
+    db.collection.return_value.document.return_value.get.return_value.exists = False
+    assert index.get_active(db, "u1") == {}
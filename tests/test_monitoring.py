@@ -0,0 +1,99 @@
+"""
+Pruebas de las métricas Prometheus.
+"""
+import pytest
+from types import SimpleNamespace
+from prometheus_client import REGISTRY
+from app.utils import monitoring
+from app.utils.monitoring import (
+    StageTimer,
+    track_firestore,
+    observe_http_request,
+    start_request_documents,
+    queue_item_added,
+    queue_item_done,
+    metrics_response
+)
+
+def sample(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+def test_track_firestore_counts_success_and_errors():
+    ok_before = sample("firestore_operations_total", {"collection": "users", "operation": "get", "status": "ok"})
+    error_before = sample("firestore_operations_total", {"collection": "users", "operation": "get", "status": "error"})
+
+    with track_firestore("users", "get"):
+        pass
+    with pytest.raises(RuntimeError):
+        with track_firestore("users", "get"):
+            raise RuntimeError("fallo")
+
+    assert sample("firestore_operations_total", {"collection": "users", "operation": "get", "status": "ok"}) == ok_before + 1
+    assert sample("firestore_operations_total", {"collection": "users", "operation": "get", "status": "error"}) == error_before + 1
+
+def test_stage_timer_observes_each_stage_once():
+    detect_before = sample("pipeline_stage_duration_seconds_count", {"stage": "detect"})
+    frames_before = sample("pipeline_frames_processed_total")
+
+    timer = StageTimer()
+    for _ in range(3):
+        with timer.stage("detect"):
+            pass
+    timer.add_frames(3)
+    timings = timer.observe()
+
+    assert set(timings) == {"detect", "total"}
+    assert sample("pipeline_stage_duration_seconds_count", {"stage": "detect"}) == detect_before + 1
+    assert sample("pipeline_frames_processed_total") == frames_before + 3
+
+def test_http_and_queue_metrics_exposed():
+    observe_http_request("GET", "/api/v1/users/{user_id}", 200, 0.02)
+    queue_item_added("video_frames", 2)
+    queue_item_done("video_frames")
+
+    body = metrics_response().body.decode()
+    assert 'route="/api/v1/users/{user_id}"' in body
+    assert 'queue_depth{queue="video_frames"}' in body
+
+class FakeDocument:
+    def __init__(self, *path):
+        self._path = path
+
+    def get(self):
+        return SimpleNamespace(exists=True)
+
+class FakeQuery:
+    _parent = SimpleNamespace(id="posts")
+
+    def stream(self):
+        yield from range(3)
+
+monitoring._instrument(FakeDocument, "get", "get", "read", lambda target, result: 1)
+monitoring._instrument_stream(FakeQuery, "stream", "query")
+
+def test_client_instrumentation_counts_request_documents():
+    labels = {"collection": "users", "operation": "get", "status": "ok"}
+    before = sample("firestore_operations_total", labels)
+    documents = start_request_documents()
+
+    FakeDocument("users", "u1").get()
+    assert list(FakeQuery().stream()) == [0, 1, 2]
+    # Dentro de un track_firestore explícito la operación lleva su etiqueta, no la del SDK
+    with track_firestore("users", "profile"):
+        FakeDocument("users", "u2").get()
+
+    assert documents == {"read": 5, "write": 0}
+    assert sample("firestore_operations_total", labels) == before + 1
+
+    reads_before = sample("firestore_documents_total", {"route": "/api/v1/posts", "kind": "read"})
+    observe_http_request("GET", "/api/v1/posts", 200, 0.01, documents)
+    assert sample("firestore_documents_total", {"route": "/api/v1/posts", "kind": "read"}) == reads_before + 5
+
+def test_instrument_firestore_client_wraps_sdk_once():
+    from google.cloud.firestore_v1.document import DocumentReference
+
+    assert monitoring.instrument_firestore_client()
+    wrapped = DocumentReference.get
+    assert monitoring.instrument_firestore_client()
+    assert DocumentReference.get is wrapped
+    assert wrapped._monitoring_original
@@ -0,0 +1,58 @@
+"""
+Pruebas de la retención de notificaciones en segundo plano.
+"""
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+from app.services import notification_retention as retention
+
+def make_docs(n):
+    docs = []
+    for i in range(n):
+        doc = MagicMock()
+        doc.reference = f"ref{i}"
+        docs.append(doc)
+    return docs
+
+def test_record_write_enqueues_every_n_writes(monkeypatch):
+    enqueued = []
+    monkeypatch.setattr(retention, "NOTIFICATION_COMPACT_EVERY", 3)
+    monkeypatch.setattr(retention, "_writes", {})
+    monkeypatch.setattr(retention, "enqueue_job", lambda job_type, payload, job_id=None: enqueued.append((payload, job_id)) or job_id)
+
+    results = [retention.record_write("u1") for _ in range(7)]
+
+    assert [r is not None for r in results] == [False, False, True, False, False, True, False]
+    assert enqueued[0][0] == {"user_id": "u1"}
+    assert enqueued[0][1].startswith(f"{retention.COMPACT_NOTIFICATIONS_JOB}:u1:")
+
+def test_enqueue_failure_does_not_raise(monkeypatch):
+    monkeypatch.setattr(retention, "NOTIFICATION_COMPACT_EVERY", 1)
+    monkeypatch.setattr(retention, "_writes", {})
+
+    def fail(*args, **kwargs):
+        raise ConnectionError("redis caído")
+    monkeypatch.setattr(retention, "enqueue_job", fail)
+    assert retention.record_write("u1") is None
+
+def test_compact_user_deletes_expired_and_overflow_in_batches(monkeypatch):
+    monkeypatch.setattr(retention, "BATCH_SIZE", 2)
+    db = MagicMock()
+    user_query = db.collection.return_value.where.return_value
+
+    expired = user_query.where.return_value.order_by.return_value
+    expired.limit.return_value.get.side_effect = [make_docs(2), make_docs(1)]
+    user_query.count.return_value.get.return_value = [[MagicMock(value=105)]]
+    oldest = user_query.order_by.return_value
+    oldest.limit.return_value.get.side_effect = [make_docs(2), make_docs(2), make_docs(1)]
+
+    deleted = retention.compact_user(db, "u1", max_notifications=100, now=datetime(2026, 5, 1))
+
+    assert deleted == 3 + 5
+    assert [c.args[0] for c in oldest.limit.call_args_list] == [2, 2, 1]
+    cutoff = user_query.where.call_args.args[2]
+    assert cutoff == datetime(2026, 5, 1) - timedelta(days=retention.NOTIFICATION_RETENTION_DAYS)
+    assert db.batch.return_value.commit.call_count == 5
+
+def test_expires_at_follows_retention():
+    created = datetime(2026, 1, 1)
+    assert retention.expires_at(created) == created + timedelta(days=retention.NOTIFICATION_RETENTION_DAYS)
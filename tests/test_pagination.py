@@ -0,0 +1,67 @@
+"""
+Pruebas de la paginación por cursor.
+"""
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock
+from app.utils.pagination import (
+    encode_cursor,
+    decode_cursor,
+    paginate_query,
+    InvalidCursorError,
+    DOCUMENT_ID_FIELD
+)
+
+def make_doc(doc_id, data):
+    doc = MagicMock()
+    doc.id = doc_id
+    doc.to_dict.return_value = data
+    return doc
+
+def make_query(docs):
+    query = MagicMock()
+    query.order_by.return_value = query
+    query.start_after.return_value = query
+    query.limit.return_value.get.return_value = docs
+    return query
+
+def test_cursor_roundtrip_with_datetime():
+    values = {"created_at": datetime(2024, 5, 1, 10, 30), DOCUMENT_ID_FIELD: "post_1"}
+    token = encode_cursor(values)
+    assert "=" not in token
+    assert decode_cursor(token, ["created_at", DOCUMENT_ID_FIELD]) == values
+
+@pytest.mark.parametrize("token", ["no-es-un-cursor", encode_cursor({"otro": 1}), ""])
+def test_decode_cursor_rejects_invalid_tokens(token):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(token, ["created_at", DOCUMENT_ID_FIELD])
+
+def test_paginate_query_returns_next_cursor():
+    docs = [make_doc(f"p{i}", {"created_at": datetime(2024, 1, 10 - i)}) for i in range(3)]
+    query = make_query(docs)
+
+    page, next_cursor = paginate_query(query, [("created_at", "DESCENDING")], 2)
+
+    assert [d.id for d in page] == ["p0", "p1"]
+    query.limit.assert_called_once_with(3)
+    query.start_after.assert_not_called()
+    assert decode_cursor(next_cursor, ["created_at", DOCUMENT_ID_FIELD]) == {
+        "created_at": datetime(2024, 1, 9),
+        DOCUMENT_ID_FIELD: "p1"
+    }
+
+def test_paginate_query_applies_cursor_on_last_page():
+    docs = [make_doc("p2", {"created_at": datetime(2024, 1, 8)})]
+    query = make_query(docs)
+    cursor = encode_cursor({"created_at": datetime(2024, 1, 9), DOCUMENT_ID_FIELD: "p1"})
+
+    page, next_cursor = paginate_query(query, [("created_at", "DESCENDING")], 2, cursor)
+
+    assert [d.id for d in page] == ["p2"]
+    assert next_cursor is None
+    query.start_after.assert_called_once_with({
+        "created_at": datetime(2024, 1, 9),
+        DOCUMENT_ID_FIELD: "p1"
+    })
+    orders = [c[0][0] for c in query.order_by.call_args_list]
+    assert orders == ["created_at", DOCUMENT_ID_FIELD]
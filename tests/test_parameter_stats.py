@@ -0,0 +1,93 @@
+"""
+Pruebas de las estadísticas de parámetros por condiciones de grabación.
+"""
+import statistics
+import pytest
+from app.services import parameter_stats
+from app.services.firestore_emulator import FirestoreEmulator, transactional
+from app.services.parameter_stats import ALL_KEY, ParameterStatsStore, RunningStats, backfill, condition_key
+
+def golpes(*speeds):
+    return {"all": [{"max_wrist_speed": s} for s in speeds]}
+
+def test_running_stats_add_and_merge_match_full_recomputation():
+    values = [12.5, 30.0, 7.25, 41.0, 18.0, 22.5]
+    left, right, whole = RunningStats(), RunningStats(), RunningStats()
+    for v in values[:2]:
+        left.add(v)
+    for v in values[2:]:
+        right.add(v)
+    for v in values:
+        whole.add(v)
+    left.merge(right)
+
+    for stats in (left, whole):
+        assert stats.count == 6
+        assert stats.mean == pytest.approx(statistics.fmean(values))
+        assert stats.variance == pytest.approx(statistics.pvariance(values))
+
+def test_condition_keys_bucket_lighting_camera_and_resolution():
+    assert condition_key({"brightness": 30, "height": 1080, "camera": "GoPro"}) == "dark|GoPro|fhd"
+    assert condition_key({"brightness": 120, "height": 480}) == "normal|unknown|sd"
+    assert condition_key(None) == "unknown|unknown|unknown"
+
+@pytest.fixture(autouse=True)
+def emulator_transactions(monkeypatch):
+    monkeypatch.setattr(parameter_stats.firestore, "transactional", transactional)
+
+def test_store_persists_and_falls_back_to_global_stats():
+    db = FirestoreEmulator()
+    store = ParameterStatsStore(db, min_samples=3)
+    dark = {"brightness": 30, "height": 720}
+    bright = {"brightness": 250, "height": 720}
+
+    store.record(dark, golpes(5, 6, 7))
+    store.record(bright, golpes(40))
+
+    assert store.lookup(dark).mean == pytest.approx(6.0)
+    # Pocas muestras en condiciones brillantes: se usan las globales
+    assert store.lookup(bright).count == 4
+    assert set(db.dump()["parameter_stats"]) == {condition_key(dark), condition_key(bright), ALL_KEY}
+
+    reloaded = ParameterStatsStore(db, min_samples=3)
+    assert reloaded.lookup(dark).mean == pytest.approx(6.0)
+    assert reloaded.lookup(None).count == 4
+
+def test_store_merges_concurrent_writes_in_a_transaction(monkeypatch):
+    db = FirestoreEmulator()
+    store = ParameterStatsStore(db)
+    store.load()
+    merge = parameter_stats._merge_in_transaction
+    conflicts = []
+
+    def merge_with_conflict(transaction, ref, delta):
+        if not conflicts:
+            # Otro proceso guarda sus golpes entre la lectura y el commit
+            ref.get(transaction=transaction)
+            ref.set(RunningStats(10, 50.0, 0.0).to_dict())
+            conflicts.append(ref.id)
+        return merge(transaction, ref, delta)
+    monkeypatch.setattr(parameter_stats, "_merge_in_transaction", merge_with_conflict)
+
+    store.record(None, golpes(20, 30))
+
+    stored = RunningStats.from_dict(db.collection("parameter_stats").document(conflicts[0]).get().to_dict())
+    assert stored.count == 12
+    assert stored.mean == pytest.approx((10 * 50 + 20 + 30) / 12)
+
+def test_backfill_maps_legacy_parameter_conditions():
+    db = FirestoreEmulator()
+    db.seed("historical_analysis", {
+        # Entradas antiguas: video_conditions guardaba los parámetros ajustados
+        "viejo_oscuro": {"golpes_clasificados": golpes(5, 7), "video_conditions": {"min_detection_confidence": 0.3, "scale_factor": 0.9}},
+        "viejo_normal": {"golpes_clasificados": golpes(20), "video_conditions": {"min_detection_confidence": 0.05}},
+        "nuevo": {"golpes_clasificados": golpes(9), "video_conditions": {"brightness": 30, "height": 1080, "camera": "GoPro"}}
+    })
+
+    assert backfill(db) == 3
+
+    stats = db.dump()["parameter_stats"]
+    assert stats["dark|unknown|unknown"]["count"] == 2
+    assert stats["normal|unknown|unknown"]["count"] == 1
+    assert stats["dark|GoPro|fhd"]["count"] == 1
+    assert stats[ALL_KEY]["count"] == 4
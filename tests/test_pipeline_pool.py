@@ -0,0 +1,91 @@
+"""
+Pruebas del pool de pipelines calientes del worker.
+"""
+from app.services.pipeline_pool import PipelinePool
+
+class FakePipeline:
+    created = 0
+
+    def __init__(self):
+        FakePipeline.created += 1
+        self.warmups = 0
+        self.resets = 0
+
+    def warmup(self):
+        self.warmups += 1
+
+    def reset(self):
+        self.resets += 1
+
+def make_pool(**kwargs):
+    FakePipeline.created = 0
+    kwargs.setdefault("memory_probe", lambda: 100.0)
+    return PipelinePool(FakePipeline, **kwargs)
+
+def test_pipelines_are_created_and_warmed_once():
+    pool = make_pool(size=2)
+    pool.start()
+    assert FakePipeline.created == 2
+
+    seen = set()
+    for _ in range(4):
+        with pool.acquire() as pipeline:
+            seen.add(id(pipeline))
+            assert pipeline.warmups == 1
+    assert FakePipeline.created == 2
+    assert len(seen) <= 2
+
+def test_state_is_reset_after_each_job():
+    pool = make_pool(size=1)
+    with pool.acquire() as pipeline:
+        pass
+    with pool.acquire() as same:
+        assert same is pipeline
+    assert pipeline.resets == 2
+
+def test_recycles_after_max_jobs():
+    pool = make_pool(size=1, max_jobs=2)
+    for _ in range(2):
+        with pool.acquire() as pipeline:
+            first = pipeline
+    with pool.acquire() as pipeline:
+        assert pipeline is not first
+    assert pool.recycles == 1
+
+def test_recycles_on_memory_growth_and_rebaselines_if_not_released():
+    memory = {"mb": 100.0}
+    pool = make_pool(size=1, max_rss_growth_mb=50, memory_probe=lambda: memory["mb"])
+    pool.start()
+
+    with pool.acquire():
+        memory["mb"] = 200.0
+    assert pool.recycles == 1
+
+    # La memoria no baja tras reciclar: se toma como nueva base
+    with pool.acquire():
+        pass
+    assert pool.recycles == 1
+    assert pool.baseline_mb == 200.0
+
+def test_failed_recreation_keeps_the_slot_and_retries_on_acquire():
+    pool = make_pool(size=1, max_jobs=1)
+    pool.start()
+    factory = pool.factory
+
+    def broken():
+        raise RuntimeError("sin GPU")
+
+    pool.factory = broken
+    with pool.acquire():
+        pass
+    try:
+        with pool.acquire(timeout=1):
+            pass
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("se esperaba el error de la factory")
+
+    pool.factory = factory
+    with pool.acquire(timeout=1) as pipeline:
+        assert isinstance(pipeline, FakePipeline)
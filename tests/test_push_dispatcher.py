@@ -0,0 +1,67 @@
+"""
+Pruebas del envío de notificaciones push por lotes.
+"""
+from unittest.mock import MagicMock
+from app.services import push_dispatcher
+from app.services.job_queue import Job
+from app.services.push_dispatcher import FakeTransport, PushDispatcher, PushMessage
+
+def make_messages(n):
+    return [PushMessage(f"tok{i}", "Título", "Cuerpo", {"n": i}, user_id=f"u{i}") for i in range(n)]
+
+def make_dispatcher(transport, **kwargs):
+    dispatcher = PushDispatcher(transport, sleep=lambda s: None, **kwargs)
+    dispatcher.breaker = MagicMock(call=lambda func, *args: func(*args))
+    return dispatcher
+
+def test_large_fan_out_is_sent_in_batches_of_500():
+    transport = FakeTransport()
+    summary = make_dispatcher(transport).send(make_messages(1200))
+
+    assert [len(call) for call in transport.calls] == [500, 500, 200]
+    assert summary["sent"] == 1200
+    assert summary["calls"] == 3
+    assert transport.sent[0].data == {"n": "0"}
+
+def test_only_transient_failures_are_retried_with_backoff():
+    sleeps = []
+    transport = FakeTransport(invalid_tokens={"tok1"}, transient_failures={"tok2": 2, "tok3": 5})
+    dispatcher = make_dispatcher(transport, max_retries=3)
+    dispatcher.sleep = sleeps.append
+
+    summary = dispatcher.send(make_messages(4))
+
+    assert [m.token for m in transport.calls[1]] == ["tok2", "tok3"]
+    assert summary["sent"] == 2
+    assert summary["failed"] == 1
+    assert [m.token for m in summary["invalid"]] == ["tok1"]
+    assert sleeps == [1.0, 2.0, 4.0]
+
+def test_deliver_push_prunes_invalid_tokens(monkeypatch):
+    users = {"u1": {"device_token": "good"}, "u2": {"device_token": "bad"}, "u3": {}}
+    monkeypatch.setattr(push_dispatcher, "get_many", lambda db, coll, ids, field_paths=None: {uid: users[uid] for uid in ids if uid in users})
+    db = MagicMock()
+    transport = FakeTransport(invalid_tokens={"bad"})
+    job = Job("j1", push_dispatcher.SEND_PUSH_JOB, {"user_ids": ["u1", "u2", "u3"], "title": "T", "body": "B"}, 1, 3, "lease")
+
+    result = push_dispatcher.deliver_push(job, db=db, dispatcher=make_dispatcher(transport))
+
+    assert result == {"sent": 1, "failed": 0, "pruned": 1, "calls": 1}
+    db.collection.return_value.document.assert_called_with("u2")
+    db.batch.return_value.update.assert_called_once()
+
+def test_invalid_argument_is_a_failure_not_an_invalid_token():
+    transport = FakeTransport(invalid_tokens={"tok0"}, invalid_payload_tokens={"tok1"})
+    summary = make_dispatcher(transport).send(make_messages(2))
+
+    assert [m.token for m in summary["invalid"]] == ["tok0"]
+    assert summary["failed"] == 1
+    assert len(transport.calls) == 1
+
+def test_send_push_enqueues_one_job_for_all_recipients(monkeypatch):
+    enqueued = []
+    monkeypatch.setattr(push_dispatcher, "enqueue_job", lambda job_type, payload: enqueued.append((job_type, payload)) or "job-1")
+
+    assert push_dispatcher.send_push(["u1", "u2", "u1", None], "T", "B") == "job-1"
+    assert push_dispatcher.send_push([], "T", "B") is None
+    assert enqueued == [(push_dispatcher.SEND_PUSH_JOB, {"user_ids": ["u1", "u2"], "title": "T", "body": "B", "data": {}, "image": None})]
@@ -0,0 +1,68 @@
+"""
+Pruebas de los agregados de calificaciones.
+"""
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import pytest
+from app.services import ratings
+from app.services.ratings import apply_rating, summarize
+
+def test_aggregates_match_full_recomputation():
+    history = [5, 3, 4, 4, 1, 5]
+    stats = None
+    for rating in history:
+        stats = apply_rating(stats, rating, window=3)
+    summary = summarize(stats)
+
+    mean = sum(history) / len(history)
+    assert summary["count"] == 6
+    assert summary["average"] == round(mean, 3)
+    assert summary["stddev"] == pytest.approx((sum((r - mean) ** 2 for r in history) / len(history)) ** 0.5, abs=1e-3)
+    # La media reciente pesa más el último 5 que la media total
+    assert summary["recent"] > summary["average"]
+    assert summarize(None) == {"average": None, "count": 0, "stddev": None, "recent": None}
+
+def test_transaction_reads_each_player_once_then_writes():
+    db = MagicMock()
+    stored = {
+        ratings.RATING_STATS_COLLECTION: {"u2": {"count": 2, "sum": 8.0, "sum_sq": 32.0, "recent": 4.0}},
+        "users": {"u2": {"name": "Ana"}, "u3": {"name": "Luis"}}
+    }
+    refs = {}
+    def collection(name):
+        def document(player_id):
+            ref = refs.setdefault((name, player_id), MagicMock(name=f"{name}/{player_id}"))
+            data = stored[name].get(player_id)
+            ref.get.return_value = SimpleNamespace(exists=data is not None, to_dict=lambda: data)
+            return ref
+        return SimpleNamespace(document=document)
+    db.collection.side_effect = collection
+    transaction = MagicMock()
+    rating_ref = MagicMock()
+
+    reputation = ratings._record_in_transaction(transaction, db, rating_ref, {"rating_id": "r1"}, {"u2": 2, "u3": 5})
+
+    assert reputation["u2"]["count"] == 3 and reputation["u2"]["average"] == pytest.approx(10 / 3, abs=1e-3)
+    assert reputation["u3"] == {"average": 5.0, "count": 1, "stddev": 0.0, "recent": 5.0}
+    refs[(ratings.RATING_STATS_COLLECTION, "u2")].get.assert_called_once_with(transaction=transaction)
+    written = [c.args[0] for c in transaction.set.call_args_list]
+    assert written[-1] is rating_ref
+    assert len(written) == 3
+    assert transaction.update.call_count == 2
+
+def test_rating_a_deleted_account_does_not_recreate_its_profile(monkeypatch):
+    from app.services.firestore_emulator import FirestoreEmulator, transactional
+
+    monkeypatch.setattr(ratings.firestore, "transactional", transactional)
+    db = FirestoreEmulator()
+    db.seed("users", {"u2": {"name": "Ana"}})
+    rating_ref = db.collection("match_ratings").document("r1")
+
+    ratings.record_ratings(db, rating_ref, {"rater_id": "u1", "ratings": {"u2": 4, "u3": 5}, "created_at": 1}, {"u2": 4, "u3": 5})
+
+    assert db.collection("users").document("u2").get().to_dict()["total_ratings"] == 1
+    assert not db.collection("users").document("u3").get().exists
+    assert db.collection(ratings.RATING_STATS_COLLECTION).document("u3").get().to_dict()["count"] == 1
+
+    ratings.backfill(db)
+    assert sorted(d.id for d in db.collection("users").get()) == ["u2"]
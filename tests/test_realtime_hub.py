@@ -0,0 +1,113 @@
+"""
+Pruebas de la entrega de notificaciones en tiempo real entre workers.
+"""
+import asyncio
+import pytest
+from app.services.realtime_hub import ConnectionHub, MemoryBroker, MemoryPubSub
+
+class FakeWebSocket:
+    def __init__(self, fail=False):
+        self.sent = []
+        self.closed = False
+        self.fail = fail
+
+    async def send_json(self, payload):
+        if self.fail:
+            raise RuntimeError("socket cerrado")
+        self.sent.append(payload)
+
+    async def close(self):
+        self.closed = True
+
+async def wait_for(predicate, timeout=1.0):
+    for _ in range(int(timeout / 0.01)):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condición no cumplida")
+
+@pytest.mark.asyncio
+async def test_publish_reaches_sockets_on_other_worker():
+    broker = MemoryBroker()
+    worker_a = ConnectionHub(MemoryPubSub(broker))
+    worker_b = ConnectionHub(MemoryPubSub(broker))
+    ws1, ws2, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await worker_b.connect("u1", ws1)
+    await worker_b.connect("u1", ws2)
+    await worker_b.connect("u2", other)
+
+    worker_a.publish("u1", {"type": "notification", "notification": {"id": "n1"}})
+
+    await wait_for(lambda: ws1.sent and ws2.sent)
+    assert ws1.sent == ws2.sent == [{"type": "notification", "notification": {"id": "n1"}}]
+    assert other.sent == []
+    await worker_a.stop()
+    await worker_b.stop()
+
+@pytest.mark.asyncio
+async def test_last_disconnect_unsubscribes_and_failed_socket_is_dropped():
+    broker = MemoryBroker()
+    hub = ConnectionHub(MemoryPubSub(broker))
+    ok, broken = FakeWebSocket(), FakeWebSocket(fail=True)
+    await hub.connect("u1", ok)
+    await hub.connect("u1", broken)
+
+    hub.publish("u1", {"type": "notification"})
+    await wait_for(lambda: hub.connection_count("u1") == 1)
+    assert ok.sent == [{"type": "notification"}]
+
+    await hub.disconnect("u1", ok)
+    assert hub.connection_count() == 0
+    assert broker.publish(hub.channel("u1"), "{}") == 0
+    await hub.stop()
+
+@pytest.mark.asyncio
+async def test_sweep_pings_live_sockets_and_closes_stale_ones():
+    hub = ConnectionHub(MemoryPubSub(), heartbeat_interval=60, heartbeat_timeout=5)
+    live, stale = FakeWebSocket(), FakeWebSocket()
+    await hub.connect("u1", live)
+    await hub.connect("u2", stale)
+    hub._connections["u2"][0].last_seen -= 10
+
+    assert await hub.sweep() == 1
+    assert live.sent == [{"type": "ping"}]
+    assert stale.closed
+    assert hub.connection_count("u2") == 0
+    await hub.stop()
+
+def test_websocket_requires_a_token_for_the_same_user(monkeypatch):
+    from fastapi import FastAPI, HTTPException, WebSocketDisconnect
+    from fastapi.testclient import TestClient
+    from app.api.v1.endpoints import notifications
+
+    def verify(token, auth_client=None):
+        if token != "token-u1":
+            raise HTTPException(status_code=401, detail="Token inválido")
+        return "u1"
+    connected = []
+
+    class RecordingHub:
+        async def connect(self, user_id, websocket):
+            connected.append(user_id)
+
+        async def disconnect(self, user_id, websocket):
+            pass
+
+        def touch(self, user_id, websocket):
+            pass
+    monkeypatch.setattr(notifications, "verify_user_token", verify)
+    monkeypatch.setattr(notifications, "get_hub", RecordingHub)
+    app = FastAPI()
+    app.include_router(notifications.router)
+    client = TestClient(app)
+
+    for path in ("/ws/u1", "/ws/u1?token=otro", "/ws/u2?token=token-u1"):
+        with pytest.raises(WebSocketDisconnect) as rejected:
+            with client.websocket_connect(path) as ws:
+                ws.receive_text()
+        assert rejected.value.code == 1008
+    assert connected == []
+
+    with client.websocket_connect("/ws/u1?token=token-u1"):
+        pass
+    assert connected == ["u1"]
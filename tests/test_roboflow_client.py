@@ -0,0 +1,77 @@
+"""
+Pruebas del cliente de Roboflow contra el servidor local falso.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from app.core.circuit_breaker import get_breaker
+from app.services.roboflow_client import RoboflowClient, RemoteDetectionUnavailable
+from app.services.roboflow_stub import run_roboflow_stub
+
+PLAYER = {"class": "player", "confidence": 0.9, "x": 100, "y": 50, "width": 40, "height": 80}
+
+@pytest.fixture(autouse=True)
+def reset_breaker():
+    get_breaker("roboflow").reset()
+    yield
+    get_breaker("roboflow").reset()
+
+def frame(width=1280, height=720):
+    return np.zeros((height, width, 3), dtype=np.uint8)
+
+def test_boxes_are_scaled_back_to_original_frame():
+    with run_roboflow_stub([PLAYER]) as (url, stub):
+        client = RoboflowClient(url, "key", max_width=640)
+        detections = client.detect(frame())
+        client.close()
+    assert stub.requests == 1
+    assert "api_key=key" in stub.last_query
+    # El frame se envió a la mitad de resolución
+    assert detections[0]["center"] == [200, 100]
+    assert detections[0]["box"] == [160, 20, 240, 180]
+
+def test_only_sampled_frames_are_sent():
+    with run_roboflow_stub([PLAYER]) as (url, stub):
+        client = RoboflowClient(url, "key", sample_every=3)
+        results = [client.detect(frame(), frame_index=i) for i in range(6)]
+        client.close()
+    assert stub.requests == 2
+    assert all(len(r) == 1 for r in results)
+
+def test_concurrent_requests_share_the_session():
+    with run_roboflow_stub([PLAYER], delay=0.2) as (url, stub):
+        client = RoboflowClient(url, "key", sample_every=1, max_in_flight=4, latency_budget=5)
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda i: client.detect(frame(), frame_index=i), range(4)))
+        elapsed = time.monotonic() - start
+        client.close()
+    assert stub.requests == 4
+    assert all(len(r) == 1 for r in results)
+    assert elapsed < 0.6
+
+def test_unsampled_frames_reuse_the_nearest_earlier_sampled_frame():
+    client = RoboflowClient("http://roboflow.invalid", "key", sample_every=3)
+    client._detections = {0: [{"center": [0, 0]}], 6: [{"center": [6, 6]}]}
+    # El frame 7 llega antes que el 3: usa el 6, no la última detección recibida
+    assert client.detect(frame(), frame_index=7) == [{"center": [6, 6]}]
+    assert client.detect(frame(), frame_index=4) == [{"center": [0, 0]}]
+    client.reset()
+    assert client._nearest_sampled(7) is None
+    client.close()
+
+def test_falls_back_to_local_when_latency_exceeds_budget():
+    with run_roboflow_stub([PLAYER], delay=0.05) as (url, stub):
+        client = RoboflowClient(url, "key", sample_every=1, latency_budget=0.01, fallback_seconds=60)
+        for i in range(5):
+            client.detect(frame(), frame_index=i)
+        assert client.use_local
+        with pytest.raises(RemoteDetectionUnavailable):
+            client.detect(frame(), frame_index=5)
+        with pytest.raises(RemoteDetectionUnavailable):
+            client.detect(frame(), frame_index=7)
+        client.close()
+    assert stub.requests == 5
+    # La compresión se redujo al acercarse al presupuesto
+    assert client.jpeg_quality < 80
@@ -0,0 +1,84 @@
+"""
+Pruebas del índice de búsqueda local (FTS5).
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from app.services.search_index import SearchIndex, fold, match_expression
+
+MADRID = {"latitude": 40.4168, "longitude": -3.7038, "city": "Madrid"}
+TOLEDO = {"latitude": 39.8628, "longitude": -4.0273, "city": "Toledo"}
+
+def make_index():
+    index = SearchIndex(":memory:")
+    index.apply("user", [
+        ("u1", {"username": "jmartinez", "name": "José Martínez", "location": MADRID, "level": "avanzado", "birth_date": datetime(1990, 1, 1)}),
+        ("u2", {"username": "marta", "name": "Marta López", "location": TOLEDO, "level": "avanzado"}),
+        ("u3", {"username": "pedro", "name": "Pedro Martín", "location": MADRID, "level": "iniciación"}),
+        ("u4", {"username": "ana", "name": "Ana Ruiz", "location": "Sevilla", "level": "avanzado", "birth_date": datetime(2010, 1, 1)})
+    ])
+    index.apply("post", [
+        ("p1", {"title": "Técnica de bandeja", "content": "La bandeja en pádel", "user_id": "u1", "tags": ["tecnica"], "views": 10}),
+        ("p2", {"title": "Mi partido", "content": "Una bandeja perfecta", "user_id": "u2", "tags": [], "views": 500}),
+        ("p3", {"title": "Vibora", "content": "Golpe de ataque", "user_id": "u1", "tags": ["tecnica"], "views": 50})
+    ])
+    return index
+
+def test_fold_and_query_are_accent_insensitive_prefixes():
+    assert fold("Martínez PÁDEL") == "martinez padel"
+    assert match_expression("la Víbora") == '"vibora"*'
+    assert match_expression("  de  ") is None
+
+def test_user_search_ranks_prefix_matches_and_filters():
+    index = make_index()
+
+    users, total, _ = index.search_users("mart")
+    assert [u["id"] for u in users] == ["u2", "u1", "u3"]
+    assert total == 3
+
+    users, _, _ = index.search_users("martin", level="avanzado")
+    assert [u["id"] for u in users] == ["u1"]
+
+    users, _, _ = index.search_users(None, min_age=18)
+    assert "u4" not in [u["id"] for u in users]
+
+def test_user_search_by_radius_returns_distance():
+    index = make_index()
+
+    users, total, _ = index.search_users(None, center=MADRID, radius_km=20)
+
+    assert [u["id"] for u in users] == ["u1", "u3"]
+    assert users[0]["distance_km"] == 0.0
+    assert total == 2
+
+def test_content_search_pagination_and_updates():
+    index = make_index()
+
+    page1, total, cursor = index.search_content(None, limit=2)
+    page2, _, last_cursor = index.search_content(None, limit=2, cursor=cursor)
+    assert [p["id"] for p in page1 + page2] == ["p2", "p3", "p1"]
+    assert total == 3 and last_cursor is None
+
+    items, _, _ = index.search_content("bandeja", tags=["tecnica"])
+    assert [p["id"] for p in items] == ["p1"]
+
+    index.remove("post", "p1")
+    index.upsert("post", "p3", {"title": "Bandeja y víbora", "user_id": "u1", "views": 50})
+    items, _, _ = index.search_content("bandeja")
+    assert sorted(p["id"] for p in items) == ["p2", "p3"]
+
+def test_snapshot_changes_load_the_index():
+    index = SearchIndex(":memory:")
+    db = MagicMock()
+    index.start_sync(db)
+    callbacks = {c.args[0]: c for c in db.collection.call_args_list}
+    assert set(callbacks) == {"users", "posts", "videos", "video_analysis"}
+
+    callback = db.collection.return_value.on_snapshot.call_args_list[0].args[0]
+    doc = SimpleNamespace(id="u9", to_dict=lambda: {"username": "nuevo"})
+    callback([], [SimpleNamespace(type=SimpleNamespace(name="ADDED"), document=doc)], datetime.now())
+    assert index.count("user") == 1
+    assert not index.ready
+
+    callback([], [SimpleNamespace(type=SimpleNamespace(name="REMOVED"), document=doc)], datetime.now() + timedelta(seconds=1))
+    assert index.count("user") == 0
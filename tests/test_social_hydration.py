@@ -0,0 +1,97 @@
+"""
+Pruebas de la hidratación por lotes del muro social.
+"""
+from unittest.mock import MagicMock
+from app.services.social_hydration import hydrate_posts, fetch_authors
+
+VIEWER_ID = "viewer_1"
+
+def make_doc(doc_id, data, exists=True):
+    doc = MagicMock()
+    doc.id = doc_id
+    doc.exists = exists
+    doc.to_dict.return_value = data
+    return doc
+
+def make_post(post_id, user_id, **extra):
+    data = {
+        "user_id": user_id,
+        "content": f"contenido {post_id}",
+        "created_at": "2024-01-01T00:00:00",
+        "comment_count": 2,
+        "reaction_counts": {"like": 3, "love": 0},
+        "recent_comments": [{"comment_id": "c1", "content": "hola"}]
+    }
+    data.update(extra)
+    return make_doc(post_id, data)
+
+def make_db(authors, viewer_reactions):
+    db = MagicMock()
+    db.get_all.return_value = [make_doc(uid, data) for uid, data in authors.items()]
+    db.collection.return_value.where.return_value.where.return_value.get.return_value = [
+        make_doc(f"{VIEWER_ID}_{post_id}", {"post_id": post_id, "type": r_type})
+        for post_id, r_type in viewer_reactions.items()
+    ]
+    return db
+
+def test_hydrate_posts_uses_constant_round_trips():
+    posts = [make_post(f"p{i}", f"u{i % 3}") for i in range(20)]
+    authors = {f"u{i}": {"username": f"user{i}"} for i in range(3)}
+    db = make_db(authors, {"p1": "like"})
+
+    enriched = hydrate_posts(db, posts, VIEWER_ID)
+
+    assert len(enriched) == 20
+    db.get_all.assert_called_once()
+    assert len(db.get_all.call_args[0][0]) == 3
+    # Una consulta 'in' para las reacciones del usuario, sin lecturas por post
+    assert db.collection.return_value.where.return_value.where.return_value.get.call_count == 1
+    db.collection.return_value.document.return_value.get.assert_not_called()
+    db.batch.assert_not_called()
+
+    first, second = enriched[0], enriched[1]
+    assert first["author"] == {"user_id": "u0", "username": "user0", "name": None, "profile_picture": None}
+    assert first["reactions"] == {"like": 3}
+    assert first["user_reaction"] is None
+    assert second["user_reaction"] == "like"
+    assert first["recent_comments"] == [{"comment_id": "c1", "content": "hola"}]
+
+def test_hydrate_posts_chunks_in_queries():
+    posts = [make_post(f"p{i}", "u0") for i in range(45)]
+    db = make_db({"u0": {}}, {})
+
+    hydrate_posts(db, posts, VIEWER_ID, include_author=False, include_recent_comments=False)
+
+    calls = db.collection.return_value.where.return_value.where.call_args_list
+    assert [len(c[0][2]) for c in calls] == [30, 15]
+    db.get_all.assert_not_called()
+
+def test_hydrate_posts_backfills_legacy_reaction_counts():
+    legacy = make_post("p1", "u0")
+    del legacy.to_dict.return_value["reaction_counts"]
+    db = make_db({"u0": {}}, {})
+    db.collection.return_value.where.return_value.get.return_value = [
+        make_doc("r1", {"post_id": "p1", "type": "like"}),
+        make_doc("r2", {"post_id": "p1", "type": "wow"})
+    ]
+
+    enriched = hydrate_posts(db, [legacy], VIEWER_ID, include_recent_comments=False)
+
+    assert enriched[0]["reactions"] == {"like": 1, "wow": 1}
+    batch = db.batch.return_value
+    batch.update.assert_called_once()
+    assert batch.update.call_args[0][1] == {"reaction_counts": {"like": 1, "wow": 1}}
+    batch.commit.assert_called_once()
+
+def test_fetch_authors_deduplicates_ids():
+    db = make_db({"u1": {"username": "ana"}}, {})
+
+    authors = fetch_authors(db, ["u1", "u1", None, "u2"])
+
+    assert authors == {"u1": {"username": "ana"}}
+    assert len(db.get_all.call_args[0][0]) == 2
+
+def test_hydrate_posts_empty_page():
+    db = MagicMock()
+    assert hydrate_posts(db, [], VIEWER_ID) == []
+    db.get_all.assert_not_called()
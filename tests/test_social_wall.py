@@ -0,0 +1,64 @@
+"""
+Pruebas del muro social.
+"""
+from unittest.mock import MagicMock
+from app.api.v1.endpoints import social_wall
+from app.schemas.user import UserInDB
+
+def test_public_post_notifies_friends_by_name(monkeypatch):
+    db = MagicMock()
+    notifications = MagicMock()
+    pushes = []
+    monkeypatch.setattr(social_wall, "get_db", lambda: db)
+    monkeypatch.setattr(social_wall, "get_storage", MagicMock)
+    monkeypatch.setattr(social_wall.counters, "increment", MagicMock())
+    monkeypatch.setattr(social_wall.timeline, "get_friend_ids", lambda db, user_id: ["f1", "f2"])
+    monkeypatch.setattr(social_wall.timeline, "fan_out_post", MagicMock())
+    monkeypatch.setattr(social_wall, "notification_service", notifications)
+    monkeypatch.setattr(social_wall, "send_push", lambda user_ids, **kwargs: pushes.append((user_ids, kwargs)))
+
+    result = social_wall.create_post(
+        content="Partidazo",
+        visibility="public",
+        location=None,
+        tags="padel, domingo",
+        media_files=None,
+        current_user=UserInDB(id="u1", name="Ana")
+    )
+
+    assert result["post"]["tags"] == ["padel", "domingo"]
+    assert notifications.create_notification.call_count == 2
+    assert notifications.create_notification.call_args.kwargs["message"] == "Ana ha publicado algo nuevo"
+    assert pushes[0][0] == ["f1", "f2"]
+    assert pushes[0][1]["body"] == "Ana ha publicado algo nuevo"
+
+def test_display_name_falls_back_when_user_has_no_name():
+    assert social_wall._display_name(UserInDB(id="u1")) == "Un usuario"
+
+def test_concurrent_comments_keep_both_previews(monkeypatch):
+    from app.services.firestore_emulator import FirestoreEmulator, transactional
+    from app.services.social_hydration import comment_preview
+
+    db = FirestoreEmulator()
+    db.seed("posts", {"p1": {"user_id": "u1", "comment_count": 0, "recent_comments": []}})
+    monkeypatch.setattr(social_wall.firestore, "transactional", transactional)
+    post_ref = db.collection("posts").document("p1")
+    first = comment_preview({"comment_id": "c1", "user_id": "u2", "content": "uno", "created_at": None})
+    second = comment_preview({"comment_id": "c2", "user_id": "u3", "content": "dos", "created_at": None})
+    add_comment = transactional(social_wall._add_comment_in_transaction)
+    original = social_wall._add_comment_in_transaction
+    calls = []
+
+    def interleaved(transaction, ref, preview):
+        if not calls:
+            # El otro comentario se confirma entre la lectura y el commit
+            calls.append(preview)
+            ref.get(transaction=transaction)
+            add_comment(db.transaction(), ref, second)
+        return original(transaction, ref, preview)
+
+    transactional(interleaved)(db.transaction(), post_ref, first)
+
+    post = post_ref.get().to_dict()
+    assert post["comment_count"] == 2
+    assert [c["comment_id"] for c in post["recent_comments"]] == ["c1", "c2"]
@@ -0,0 +1,71 @@
+"""
+Pruebas de los timelines materializados del muro de amigos.
+"""
+from datetime import datetime
+from unittest.mock import MagicMock
+from app.services import timeline
+
+def make_doc(doc_id, data):
+    doc = MagicMock()
+    doc.id = doc_id
+    doc.exists = True
+    doc.to_dict.return_value = data
+    return doc
+
+def written_entries(db):
+    return [c.args for c in db.batch.return_value.set.call_args_list]
+
+def test_fan_out_writes_author_and_friends(monkeypatch):
+    db = MagicMock()
+    created = datetime(2026, 5, 1)
+
+    written = timeline.fan_out_post(db, "autor", "p1", created, ["a", "b", "a"])
+
+    assert written == 3
+    entries = written_entries(db)
+    assert len(entries) == 3
+    assert all(data == {"post_id": "p1", "author_id": "autor", "created_at": created} for _, data in entries)
+    db.collection.return_value.update.assert_not_called()
+
+def test_large_accounts_switch_to_fan_out_on_read(monkeypatch):
+    monkeypatch.setattr(timeline, "TIMELINE_FANOUT_MAX_FRIENDS", 2)
+    monkeypatch.setattr(timeline, "get_many", lambda *args, **kwargs: {})
+    invalidated = []
+    monkeypatch.setattr(timeline, "invalidate_user_profile", invalidated.append)
+    db = MagicMock()
+
+    timeline.fan_out_post(db, "famoso", "p1", datetime(2026, 5, 1), ["a", "b", "c"])
+
+    db.collection.return_value.document.return_value.update.assert_called_once_with({timeline.PULL_FLAG: True})
+    assert invalidated == ["famoso"]
+    entry_writes = [args for args in written_entries(db) if "post_id" in args[1]]
+    assert len(entry_writes) == 1
+    flagged = [args for args in written_entries(db) if "pull_authors" in args[1]]
+    assert len(flagged) == 3
+
+def test_page_merges_entries_with_pull_authors(monkeypatch):
+    db = MagicMock()
+    db.collection.return_value.document.return_value.get.return_value = make_doc(
+        "lector", {"built_at": datetime(2026, 5, 1), "pull_authors": ["famoso"]})
+
+    entries = [make_doc("p3", {"created_at": 3}), make_doc("p1", {"created_at": 1})]
+    pulled = [make_doc("p2", {"created_at": 2, "user_id": "famoso"})]
+    monkeypatch.setattr(timeline, "paginate_query", lambda *args: (entries, None))
+    monkeypatch.setattr(timeline, "paginate_query_in", lambda *args: (pulled, None))
+    monkeypatch.setattr(timeline, "get_many_docs", lambda db, collection, ids: [make_doc(i, {}) for i in ids if i != "p1"])
+
+    posts, cursor = timeline.get_page(db, "lector", 2)
+
+    assert [post.id for post in posts] == ["p3", "p2"]
+    assert cursor is not None
+
+def test_unbuilt_timeline_is_rebuilt(monkeypatch):
+    db = MagicMock()
+    db.collection.return_value.document.return_value.get.return_value.exists = False
+    rebuilt = []
+    monkeypatch.setattr(timeline, "rebuild", lambda db, user_id: rebuilt.append(user_id) or [])
+    monkeypatch.setattr(timeline, "paginate_query", lambda *args: ([], None))
+    monkeypatch.setattr(timeline, "get_many_docs", lambda db, collection, ids: [])
+
+    assert timeline.get_page(db, "nuevo", 10) == ([], None)
+    assert rebuilt == ["nuevo"]
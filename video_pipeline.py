@@ -12,6 +12,14 @@ import numpy as np
 from collections import Counter
 import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.core.circuit_breaker import get_breaker, CircuitOpenError, BulkheadFullError
+
+# Hooks HTTP por frame: sin hueco o con el receptor caído se omiten sin esperar
+hooks_breaker = get_breaker("pipeline_hooks", max_concurrent=4)
+
+def _post_hook(url, payload):
+    response = requests.post(url, json=payload, timeout=2)
+    response.raise_for_status()
 
 class VideoPipeline:
     def __init__(self, config: Union[str, dict], analysis_id: Optional[str] = None, num_workers: int = 4, batch_size: int = 8):
@@ -185,7 +193,9 @@ class VideoPipeline:
     def call_hook(self, hook_type, payload):
         if self.hooks_enabled and self.hook_urls.get(hook_type):
             try:
-                requests.post(self.hook_urls[hook_type], json=payload, timeout=2)
+                hooks_breaker.call(_post_hook, self.hook_urls[hook_type], payload)
+            except (CircuitOpenError, BulkheadFullError) as e:
+                self.log_structured(logging.DEBUG, f'Hook {hook_type} omitido: {e}', step='hook')
             except Exception as e:
                 self.log_structured(logging.WARNING, f'Error en hook {hook_type}: {e}', step='hook')
 